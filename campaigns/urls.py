@@ -33,6 +33,7 @@ urlpatterns = [
     path('<int:campaign_pk>/sessions/<int:session_pk>/combat/<int:encounter_pk>/next-turn/', views.combat_next_turn, name='combat_next_turn'),
     path('<int:campaign_pk>/sessions/<int:session_pk>/combat/<int:encounter_pk>/participant/<int:participant_pk>/update-hp/', views.combat_update_hp, name='combat_update_hp'),
     path('<int:campaign_pk>/sessions/<int:session_pk>/combat/<int:encounter_pk>/attack/', views.combat_attack, name='combat_attack'),
+    path('<int:campaign_pk>/sessions/<int:session_pk>/combat/<int:encounter_pk>/sight/', views.combat_sight, name='combat_sight'),
     path('<int:campaign_pk>/sessions/<int:session_pk>/combat/<int:encounter_pk>/start/', views.combat_start, name='combat_start'),
     path('<int:campaign_pk>/sessions/<int:session_pk>/combat/<int:encounter_pk>/end/', views.combat_end, name='combat_end'),
 
@@ -8,9 +8,14 @@ from .models import Campaign, Session, SessionObjective, CombatEncounter, Combat
 from .forms import CampaignForm, SessionForm, SessionObjectiveForm, CombatEncounterForm, CombatParticipantForm, CombatEffectForm
 from characters.models import Character, Gear
 from dice.utils import roll_shadowrun_dice, calculate_opposed_test, format_dice_results
+from maps.grid_storage import GridTooLargeError
+from maps.line_of_sight import map_lines_of_sight, map_sight_matrix
 
 logger = logging.getLogger(__name__)
 
+# Dice lost when attacking a target out of sight (blind fire)
+BLIND_FIRE_PENALTY = 6
+
 
 @login_required
 def campaign_list(request):
@@ -480,6 +485,37 @@ def combat_update_hp(request, campaign_pk, session_pk, encounter_pk, participant
         return JsonResponse({'success': False, 'error': str(e)})
 
 
+def encounter_map(encounter, map_id=None):
+    """Map an encounter is fought on: map_id if its session uses that map, else the session's first map"""
+    maps = encounter.session.maps_used.defer('grid_data').order_by('pk')
+    if map_id:
+        return maps.filter(pk=int(map_id)).first()
+    return maps.first()
+
+
+def participants_sight(map_obj, pairs):
+    """
+    Line of sight and best cover for (viewer, target) participant pairs,
+    traced together on the map. None for pairs with an unplaced participant,
+    and for every pair on a sectored map too large to read at once.
+    """
+    results = [None] * len(pairs)
+    placed = [
+        (number, ((viewer.map_x, viewer.map_y), (target.map_x, target.map_y)))
+        for number, (viewer, target) in enumerate(pairs)
+        if None not in (viewer.map_x, viewer.map_y, target.map_x, target.map_y)
+    ]
+    if map_obj is None or not placed:
+        return results
+    try:
+        sights = map_lines_of_sight(map_obj, [line for _, line in placed])
+    except GridTooLargeError:
+        return results
+    for (number, _), sight in zip(placed, sights):
+        results[number] = sight
+    return results
+
+
 @login_required
 def combat_attack(request, campaign_pk, session_pk, encounter_pk):
     """
@@ -492,6 +528,11 @@ def combat_attack(request, campaign_pk, session_pk, encounter_pk):
         - damage_base: Base damage value (e.g., "8P" or "6S")
         - weapon_ap: Armor penetration value
         - use_edge: Whether attacker is using Edge
+        - map_id: Map the encounter is fought on (default: the session's first map)
+
+    When both participants are placed on the map, an attack without line
+    of sight loses BLIND_FIRE_PENALTY dice and the best cover between
+    them adds its defense bonus to the defense pool.
     """
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Invalid request method'})
@@ -514,6 +555,11 @@ def combat_attack(request, campaign_pk, session_pk, encounter_pk):
         attacker = get_object_or_404(CombatParticipant, pk=attacker_id)
         target = get_object_or_404(CombatParticipant, pk=target_id)
 
+        sight = participants_sight(encounter_map(encounter, request.POST.get('map_id')), [(attacker, target)])[0]
+        cover = sight['cover'] if sight else None
+        if sight and not sight['visible']:
+            attack_pool = max(1, attack_pool - BLIND_FIRE_PENALTY)
+
         # Parse damage value and type
         damage_value = int(''.join(filter(str.isdigit, damage_base)) or 0)
         damage_type = 'stun' if 'S' in damage_base.upper() else 'physical'
@@ -525,6 +571,8 @@ def combat_attack(request, campaign_pk, session_pk, encounter_pk):
         # Calculate defense pool (Reaction + Intuition + dodge modifiers)
         # For now, use dodge_pool if set, otherwise default to half the target's initiative
         defense_pool = target.dodge_pool if target.dodge_pool > 0 else max(1, target.initiative // 2)
+        if cover:
+            defense_pool += cover['defense_bonus']
 
         # Roll defense dice
         defense_roll = roll_shadowrun_dice(defense_pool)
@@ -563,7 +611,9 @@ def combat_attack(request, campaign_pk, session_pk, encounter_pk):
                         'weapon_ap': weapon_ap,
                         'target_armor': target.armor,
                         'attack_dice': attack_roll['dice_results'],
-                        'defense_dice': defense_roll['dice_results']
+                        'defense_dice': defense_roll['dice_results'],
+                        'line_of_sight': sight['visible'] if sight else None,
+                        'cover': cover
                     }
                 )
 
@@ -588,7 +638,9 @@ def combat_attack(request, campaign_pk, session_pk, encounter_pk):
                     'defense_hits': defense_hits,
                     'result': 'miss',
                     'attack_dice': attack_roll['dice_results'],
-                    'defense_dice': defense_roll['dice_results']
+                    'defense_dice': defense_roll['dice_results'],
+                    'line_of_sight': sight['visible'] if sight else None,
+                    'cover': cover
                 }
             )
 
@@ -619,6 +671,8 @@ def combat_attack(request, campaign_pk, session_pk, encounter_pk):
             'defense_dice': defense_dice_display,
             'attack_glitch': attack_roll['is_glitch'],
             'defense_glitch': defense_roll['is_glitch'],
+            'line_of_sight': sight['visible'] if sight else None,
+            'cover': cover,
             'message': f'{attacker.name} {"hits" if hit_success else "misses"} {target.name}! Attack: {attack_hits} hits, Defense: {defense_hits} hits' +
                       (f', Damage: {damage_dealt} {damage_type}' if damage_dealt > 0 else '')
         })
@@ -628,6 +682,53 @@ def combat_attack(request, campaign_pk, session_pk, encounter_pk):
         return JsonResponse({'success': False, 'error': str(e)})
 
 
+@login_required
+def combat_sight(request, campaign_pk, session_pk, encounter_pk):
+    """
+    Who can see whom among the encounter's placed participants (AJAX)
+
+    GET parameters:
+        - map_id: Map the encounter is fought on (default: the session's first map)
+
+    Every pair is traced in one pass; visible[i][j] and cover[i][j] are
+    participant i's sight of participant j and the best cover between them.
+    """
+    campaign = get_object_or_404(Campaign, pk=campaign_pk)
+    session = get_object_or_404(Session, pk=session_pk, campaign=campaign)
+    encounter = get_object_or_404(CombatEncounter, pk=encounter_pk, session=session)
+
+    # Only GM sees every participant's position
+    if campaign.game_master != request.user:
+        return JsonResponse({'success': False, 'error': 'Only GM can view lines of sight'})
+
+    try:
+        map_obj = encounter_map(encounter, request.GET.get('map_id'))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid map'})
+    if map_obj is None:
+        return JsonResponse({'success': False, 'error': 'No map is used in this session'})
+
+    participants = list(encounter.participants.filter(
+        is_active=True, map_x__isnull=False, map_y__isnull=False
+    ).order_by('-initiative', 'name'))
+    try:
+        visible, cover = map_sight_matrix(map_obj, [(p.map_x, p.map_y) for p in participants])
+    except GridTooLargeError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+    return JsonResponse({
+        'success': True,
+        'map_id': map_obj.pk,
+        'round': encounter.current_round,
+        'participants': [
+            {'id': p.id, 'name': p.name, 'team': p.team, 'x': p.map_x, 'y': p.map_y}
+            for p in participants
+        ],
+        'visible': visible,
+        'cover': cover
+    })
+
+
 @login_required
 def combat_start(request, campaign_pk, session_pk, encounter_pk):
     """Start combat encounter (AJAX)"""
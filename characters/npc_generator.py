@@ -5,6 +5,8 @@ Procedurally generates NPCs with randomized attributes based on archetype and th
 import random
 from decimal import Decimal
 
+from shadowrun_campaign.rng import seeded_random
+
 
 # NPC Threat Levels - determines attribute ranges and skill levels
 THREAT_LEVELS = {
@@ -312,20 +314,22 @@ SHADOWRUN_ALIASES = [
 ]
 
 
-def generate_npc_name(use_alias=True):
+def generate_npc_name(use_alias=True, rng=None):
     """Generate a random NPC name"""
-    first = random.choice(FIRST_NAMES)
-    last = random.choice(LAST_NAMES)
+    rng = rng or random.Random()
+    first = rng.choice(FIRST_NAMES)
+    last = rng.choice(LAST_NAMES)
 
-    if use_alias and random.random() > 0.4:
-        alias = random.choice(SHADOWRUN_ALIASES)
+    if use_alias and rng.random() > 0.4:
+        alias = rng.choice(SHADOWRUN_ALIASES)
         return f'"{alias}" {first} {last}'
 
     return f'{first} {last}'
 
 
-def generate_attributes(archetype_key, threat_level):
+def generate_attributes(archetype_key, threat_level, rng=None):
     """Generate random attributes based on archetype and threat level"""
+    rng = rng or random.Random()
     template = ARCHETYPE_TEMPLATES[archetype_key]
     threat = THREAT_LEVELS[threat_level]
     min_attr, max_attr = threat['attribute_range']
@@ -337,44 +341,44 @@ def generate_attributes(archetype_key, threat_level):
         if attr == 'magic':
             # Handle magic separately
             continue
-        attributes[attr] = random.randint(max(min_attr + 2, 1), min(max_attr + 2, 10))
+        attributes[attr] = rng.randint(max(min_attr + 2, 1), min(max_attr + 2, 10))
 
     # Secondary attributes get medium values
     for attr in template['secondary_attributes']:
-        attributes[attr] = random.randint(max(min_attr + 1, 1), min(max_attr + 1, 10))
+        attributes[attr] = rng.randint(max(min_attr + 1, 1), min(max_attr + 1, 10))
 
     # Tertiary attributes get base values
     for attr in template['tertiary_attributes']:
-        attributes[attr] = random.randint(min_attr, min(max_attr, 10))
+        attributes[attr] = rng.randint(min_attr, min(max_attr, 10))
 
     # Ensure all attributes are set
     all_attrs = ['body', 'agility', 'reaction', 'strength', 'charisma', 'intuition', 'logic', 'willpower']
     for attr in all_attrs:
         if attr not in attributes:
-            attributes[attr] = random.randint(min_attr, min(max_attr, 10))
+            attributes[attr] = rng.randint(min_attr, min(max_attr, 10))
 
     # Edge
     edge_min, edge_max = template['edge_range']
-    attributes['edge'] = random.randint(edge_min, edge_max)
+    attributes['edge'] = rng.randint(edge_min, edge_max)
 
     # Magic
     if 'magic_range' in template:
         mag_min, mag_max = template['magic_range']
-        attributes['magic'] = random.randint(mag_min, mag_max)
+        attributes['magic'] = rng.randint(mag_min, mag_max)
     else:
         attributes['magic'] = template.get('magic', 0)
 
     # Resonance
     if 'resonance_range' in template:
         res_min, res_max = template['resonance_range']
-        attributes['resonance'] = random.randint(res_min, res_max)
+        attributes['resonance'] = rng.randint(res_min, res_max)
     else:
         attributes['resonance'] = template.get('resonance', 0)
 
     # Essence (reduced if cyberware is typical)
     if 'cyberware' in template.get('typical_gear', []):
         # More cyberware = less essence
-        essence_loss = round(random.uniform(0.5, 3.0), 2)
+        essence_loss = round(rng.uniform(0.5, 3.0), 2)
         attributes['essence'] = Decimal(str(max(1.0, 6.0 - essence_loss)))
     else:
         attributes['essence'] = Decimal('6.00')
@@ -382,8 +386,9 @@ def generate_attributes(archetype_key, threat_level):
     return attributes
 
 
-def generate_physical_description(race):
+def generate_physical_description(race, rng=None):
     """Generate random physical description based on race"""
+    rng = rng or random.Random()
     ages = {
         'human': (18, 65),
         'dwarf': (20, 80),
@@ -392,10 +397,10 @@ def generate_physical_description(race):
         'troll': (15, 35)
     }
 
-    age = random.randint(*ages.get(race, (20, 50)))
+    age = rng.randint(*ages.get(race, (20, 50)))
 
     sexes = ['Male', 'Female', 'Non-binary']
-    sex = random.choice(sexes)
+    sex = rng.choice(sexes)
 
     # Height and weight vary by race
     heights = {
@@ -414,16 +419,16 @@ def generate_physical_description(race):
         'troll': ('300 lbs', '450 lbs')
     }
 
-    height = random.choice(heights.get(race, heights['human']))
-    weight = random.choice(weights.get(race, weights['human']))
+    height = rng.choice(heights.get(race, heights['human']))
+    weight = rng.choice(weights.get(race, weights['human']))
 
     eye_colors = ['Brown', 'Blue', 'Green', 'Hazel', 'Gray', 'Amber', 'Cyber-red', 'Chrome']
     hair_colors = ['Black', 'Brown', 'Blonde', 'Red', 'Gray', 'White', 'Dyed blue', 'Dyed green', 'Bald']
     skin_tones = ['Pale', 'Fair', 'Olive', 'Tan', 'Brown', 'Dark', 'Ebony']
 
-    eyes = random.choice(eye_colors)
-    hair = random.choice(hair_colors)
-    skin = random.choice(skin_tones)
+    eyes = rng.choice(eye_colors)
+    hair = rng.choice(hair_colors)
+    skin = rng.choice(skin_tones)
 
     features_list = [
         'Cybernetic eyes', 'Facial scars', 'Tattoos', 'Piercings', 'Mohawk',
@@ -431,8 +436,8 @@ def generate_physical_description(race):
         'Datajack ports visible', 'Missing finger', 'Burn scars', 'Street fashion'
     ]
 
-    num_features = random.randint(1, 3)
-    features = ', '.join(random.sample(features_list, num_features))
+    num_features = rng.randint(1, 3)
+    features = ', '.join(rng.sample(features_list, num_features))
 
     return {
         'age': age,
@@ -446,8 +451,9 @@ def generate_physical_description(race):
     }
 
 
-def generate_background(archetype_key, race):
+def generate_background(archetype_key, race, rng=None):
     """Generate a random background story"""
+    rng = rng or random.Random()
     archetype = ARCHETYPE_TEMPLATES[archetype_key]['name']
 
     # Different backgrounds for civilian/vendor NPCs vs runners
@@ -498,10 +504,10 @@ def generate_background(archetype_key, race):
             "Just trying to make it to tomorrow."
         ]
 
-    return f"{random.choice(origins)} {random.choice(motivations)}"
+    return f"{rng.choice(origins)} {rng.choice(motivations)}"
 
 
-def generate_npc_data(archetype_key, threat_level, race=None, use_alias=True):
+def generate_npc_data(archetype_key, threat_level, race=None, use_alias=True, seed=None):
     """
     Generate complete NPC data
 
@@ -510,6 +516,7 @@ def generate_npc_data(archetype_key, threat_level, race=None, use_alias=True):
         threat_level: Key from THREAT_LEVELS
         race: Optional race override (random if None)
         use_alias: Whether to use shadowrun aliases in names
+        seed: Optional seed; the same seed always produces the same NPC
 
     Returns:
         Dictionary of NPC data ready for Character model
@@ -520,34 +527,36 @@ def generate_npc_data(archetype_key, threat_level, race=None, use_alias=True):
     if threat_level not in THREAT_LEVELS:
         raise ValueError(f"Invalid threat level: {threat_level}")
 
+    rng = seeded_random(seed)
+
     # Select race
     races = ['human', 'dwarf', 'elf', 'ork', 'troll']
     if race is None or race not in races:
-        race = random.choice(races)
+        race = rng.choice(races)
 
     # Generate name
-    name = generate_npc_name(use_alias)
+    name = generate_npc_name(use_alias, rng)
 
     # Generate attributes
-    attributes = generate_attributes(archetype_key, threat_level)
+    attributes = generate_attributes(archetype_key, threat_level, rng)
 
     # Generate physical description
-    physical = generate_physical_description(race)
+    physical = generate_physical_description(race, rng)
 
     # Generate background
-    background = generate_background(archetype_key, race)
+    background = generate_background(archetype_key, race, rng)
 
     # Resources and karma based on threat level
     threat = THREAT_LEVELS[threat_level]
-    base_resources = random.randint(500, 5000) * threat['resource_multiplier']
-    karma_total = threat['karma_base'] + random.randint(0, 50)
+    base_resources = rng.randint(500, 5000) * threat['resource_multiplier']
+    karma_total = threat['karma_base'] + rng.randint(0, 50)
 
     # Lifestyle based on threat level
     lifestyle_map = {
-        'low': random.choice(['street', 'squatter', 'low']),
-        'medium': random.choice(['low', 'medium']),
-        'high': random.choice(['medium', 'high']),
-        'extreme': random.choice(['high', 'luxury'])
+        'low': rng.choice(['street', 'squatter', 'low']),
+        'medium': rng.choice(['low', 'medium']),
+        'high': rng.choice(['medium', 'high']),
+        'extreme': rng.choice(['high', 'luxury'])
     }
 
     lifestyle = lifestyle_map[threat_level]
@@ -608,9 +617,9 @@ def generate_npc_data(archetype_key, threat_level, race=None, use_alias=True):
         # Condition
         'physical_damage': 0,
         'stun_damage': 0,
-        'street_cred': random.randint(0, threat['karma_base'] // 20),
-        'notoriety': random.randint(0, threat['karma_base'] // 30),
-        'public_awareness': random.randint(0, threat['karma_base'] // 40),
+        'street_cred': rng.randint(0, threat['karma_base'] // 20),
+        'notoriety': rng.randint(0, threat['karma_base'] // 30),
+        'public_awareness': rng.randint(0, threat['karma_base'] // 40),
     }
 
     return npc_data
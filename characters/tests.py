@@ -1,3 +1,21 @@
+import random
+
 from django.test import TestCase
 
-# Create your tests here.
+from .npc_generator import generate_npc_data
+
+
+class NPCGeneratorTestCase(TestCase):
+    """Test seeded NPC generation"""
+
+    def test_same_seed_gives_same_npc(self):
+        """Test that a seed reproduces the NPC without touching the global RNG"""
+        random.seed(7)
+        expected = random.random()
+
+        random.seed(7)
+        first = generate_npc_data('street_samurai', 'medium', seed='contact-42')
+        second = generate_npc_data('street_samurai', 'medium', seed='contact-42')
+
+        self.assertEqual(first, second)
+        self.assertEqual(random.random(), expected)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Map, MapTile, MapObject, MapGenerationPreset
+from .models import Map, MapTile, MapObject, MapGenerationPreset, MapGenerationJob
 
 
 class MapTileInline(admin.TabularInline):
@@ -17,7 +17,7 @@ class MapObjectInline(admin.TabularInline):
 @admin.register(Map)
 class MapAdmin(admin.ModelAdmin):
     list_display = ['name', 'owner', 'map_type', 'width', 'height', 'is_public', 'is_generated', 'updated_at']
-    list_filter = ['map_type', 'is_public', 'is_generated', 'created_at']
+    list_filter = ['map_type', 'is_public', 'is_generated', 'tile_storage', 'created_at']
     search_fields = ['name', 'description', 'owner__username']
     readonly_fields = ['created_at', 'updated_at', 'total_tiles']
     filter_horizontal = ['shared_with']
@@ -27,13 +27,13 @@ class MapAdmin(admin.ModelAdmin):
             'fields': ['name', 'description', 'owner']
         }),
         ('Map Settings', {
-            'fields': ['width', 'height', 'tile_size', 'map_type']
+            'fields': ['width', 'height', 'tile_size', 'map_type', 'tile_storage']
         }),
         ('Sharing & Visibility', {
             'fields': ['is_public', 'shared_with']
         }),
         ('Generation Settings', {
-            'fields': ['is_generated', 'generation_seed']
+            'fields': ['is_generated', 'generation_seed', 'generation_algorithm', 'generation_params']
         }),
         ('Metadata', {
             'fields': ['total_tiles', 'created_at', 'updated_at'],
@@ -135,3 +135,11 @@ class MapGenerationPresetAdmin(admin.ModelAdmin):
         if request.user.is_superuser:
             return qs
         return qs.filter(owner=request.user)
+
+
+@admin.register(MapGenerationJob)
+class MapGenerationJobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'owner', 'algorithm', 'width', 'height', 'status', 'phase', 'percent', 'created_at']
+    list_filter = ['status', 'algorithm', 'map_type']
+    search_fields = ['name', 'owner__username']
+    readonly_fields = ['created_at', 'updated_at']
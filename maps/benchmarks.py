@@ -0,0 +1,425 @@
+"""
+Benchmarks for map generation.
+
+Every generation algorithm runs on square maps of several sizes with
+fixed seeds. Each case records:
+
+- generation wall time (median over seeds and repeats) and peak traced
+  memory (tracemalloc, measured in a separate pass so tracing does not
+  skew the timings)
+- the cost of turning the generated grid into preview tiles through
+  generate_preview_tiles, with the grid already cached so only the
+  conversion is measured
+- one A* search between the first and last walkable tiles of the map
+
+Reports are plain JSON so they can be stored as a baseline and compared
+on later runs (see compare_reports). Everything runs in-process and
+offline; the benchmark_generators management command is the entry point.
+
+compare_pathfinders is the pathfinding harness behind the
+benchmark_pathfinding command. Every search in PATH_SEARCHES answers the
+same reproducible start/end pairs on maps from every generator, and each
+answer is checked against reference_dijkstra, a plain Dijkstra search kept
+independent of the optimized code. Exact searches must match its cost on
+every query; approximate ones (HPA*) report how much they overpay. Each
+search reports nodes expanded, latency percentiles and peak memory.
+Generated maps are uniform-cost, so every map is also run as a "rough"
+variant with some tiles made costlier, which exercises the mixed-cost
+code paths (Jump Point Search only runs on uniform maps).
+"""
+import heapq
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from shadowrun_campaign.rng import seeded_random
+
+from .generation_cache import generation_cache, generation_key
+from .generators import GENERATION_ALGORITHMS, get_terrain_config, run_generation_algorithm, terrain_lookup_table
+from .grid_storage import MapGrid
+from .hierarchy import cluster_hierarchy, hierarchical_path
+from .models import Map
+from .pathfinding import COST_DIAGONAL, COST_STRAIGHT, NavigationGrid, Point, astar_grid, find_path, jps_grid
+from .regions import region_index
+from .views import generate_preview_tiles
+
+REPORT_VERSION = 1
+
+BENCHMARK_ALGORITHMS = ['random', *GENERATION_ALGORITHMS]
+BENCHMARK_SIZES = [20, 50, Map.MAX_GRID_SIZE]
+BENCHMARK_SEEDS = ['bench-1', 'bench-2', 'bench-3']
+BENCHMARK_MAP_TYPE = 'urban'
+
+# Default allowed slowdown / growth before a metric counts as a regression
+DEFAULT_THRESHOLDS = {'time': 0.25, 'memory': 0.10}
+
+# Differences below these are noise, whatever the ratio (seconds, bytes)
+NOISE_FLOOR = {'time': 0.002, 'memory': 64 * 1024}
+
+# Generators and query count for the path search comparison
+PATHFINDING_ALGORITHMS = BENCHMARK_ALGORITHMS
+PATHFINDING_PAIRS = 200
+
+# Share of passable tiles made costlier in the rough variant of each map
+PATHFINDING_ROUGH = 0.15
+
+# Queries per map replayed under tracemalloc for the memory figures
+PATHFINDING_MEMORY_PAIRS = 10
+
+# Path searches compared by compare_pathfinders
+PATH_SEARCHES = {
+    'astar': astar_grid,
+    'jps': jps_grid,
+    'find_path': find_path,
+    'hpa': hierarchical_path,
+}
+
+# Searches allowed to return a costlier path than the optimum
+APPROXIMATE_SEARCHES = {'hpa'}
+
+# Searches that only run on uniform-cost grids
+UNIFORM_SEARCHES = {'jps'}
+
+# Metric name -> threshold kind
+METRICS = {
+    'generate_seconds': 'time',
+    'generate_peak_bytes': 'memory',
+    'tiles_seconds': 'time',
+    'tiles_peak_bytes': 'memory',
+    'pathfind_seconds': 'time',
+}
+
+
+def timed(func: Callable) -> float:
+    """Wall time of one call, in seconds"""
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def peak_memory(func: Callable) -> int:
+    """Peak memory allocated during one call, in bytes"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def case_name(algorithm: str, size: int) -> str:
+    return f'{algorithm}@{size}x{size}'
+
+
+def benchmark_case(algorithm: str, size: int, seeds: Iterable[str] = BENCHMARK_SEEDS,
+                   repeat: int = 3, map_type: str = BENCHMARK_MAP_TYPE) -> Dict:
+    """Measure one algorithm at one size"""
+    generate_times, generate_peaks = [], []
+    tiles_times, tiles_peaks = [], []
+    pathfind_times = []
+
+    for seed in seeds:
+        def generate():
+            return run_generation_algorithm(size, size, map_type, seed, algorithm)
+
+        def preview_tiles():
+            return generate_preview_tiles(size, size, map_type, seed, algorithm)
+
+        generate_times.extend(timed(generate) for _ in range(repeat))
+        generate_peaks.append(peak_memory(generate))
+
+        # Warm the cache so generate_preview_tiles only pays for the conversion
+        grid = generate()
+        generation_cache.put(generation_key(size, size, map_type, seed, algorithm), grid)
+        tiles_times.extend(timed(preview_tiles) for _ in range(repeat))
+        tiles_peaks.append(peak_memory(preview_tiles))
+
+        navigation = MapGrid.from_terrain_grid(grid, terrain_lookup_table(get_terrain_config(map_type))).navigation_grid()
+        walkable = [index for index, cost in enumerate(navigation.costs) if cost]
+        start, end = (walkable[0] % size, walkable[0] // size), (walkable[-1] % size, walkable[-1] // size)
+        pathfind_times.append(timed(lambda: astar_grid(navigation, start, end)))
+
+    return {
+        'name': case_name(algorithm, size),
+        'algorithm': algorithm,
+        'size': size,
+        'samples': len(generate_times),
+        'generate_seconds': statistics.median(generate_times),
+        'generate_peak_bytes': max(generate_peaks),
+        'tiles_seconds': statistics.median(tiles_times),
+        'tiles_peak_bytes': max(tiles_peaks),
+        'pathfind_seconds': statistics.median(pathfind_times),
+    }
+
+
+def run_benchmarks(algorithms: Iterable[str] = BENCHMARK_ALGORITHMS, sizes: Iterable[int] = BENCHMARK_SIZES,
+                   seeds: Iterable[str] = BENCHMARK_SEEDS, repeat: int = 3,
+                   progress: Callable[[Dict], None] = None) -> Dict:
+    """
+    Run the algorithm x size matrix.
+
+    Args:
+        progress: Optional callback receiving each case as it finishes
+
+    Returns:
+        JSON-serializable report
+    """
+    seeds = list(seeds)
+    cases = []
+    for algorithm in algorithms:
+        for size in sizes:
+            case = benchmark_case(algorithm, size, seeds, repeat)
+            cases.append(case)
+            if progress:
+                progress(case)
+
+    return {
+        'version': REPORT_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'system': platform.system(),
+        },
+        'seeds': seeds,
+        'repeat': repeat,
+        'cases': cases,
+    }
+
+
+def compare_reports(report: Dict, baseline: Dict, thresholds: Dict = None) -> List[Dict]:
+    """
+    Find metrics that got worse than the baseline allows.
+
+    A metric regresses when it exceeds the baseline value by more than its
+    threshold (a fraction, per kind: 'time' or 'memory') and by more than
+    the noise floor. Cases missing from the baseline are skipped.
+
+    Returns:
+        One dict per regression with case, metric, baseline, current and ratio
+    """
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    baseline_cases = {case['name']: case for case in baseline.get('cases', [])}
+
+    regressions = []
+    for case in report['cases']:
+        previous = baseline_cases.get(case['name'])
+        if previous is None:
+            continue
+        for metric, kind in METRICS.items():
+            if metric not in previous:
+                continue
+            before, after = previous[metric], case[metric]
+            if after - before <= NOISE_FLOOR[kind]:
+                continue
+            if after > before * (1 + thresholds[kind]):
+                regressions.append({
+                    'case': case['name'],
+                    'metric': metric,
+                    'baseline': before,
+                    'current': after,
+                    'ratio': round(after / before, 3) if before else None,
+                })
+    return regressions
+
+
+def parse_sizes(value: str) -> List[int]:
+    """Parse a comma-separated size list such as '20,50,100'"""
+    return [int(part) for part in value.split(',') if part.strip()]
+
+
+def generated_navigation(algorithm: str, size: int, seed: str,
+                         map_type: str = BENCHMARK_MAP_TYPE) -> NavigationGrid:
+    """Navigation grid of a freshly generated square map"""
+    grid = run_generation_algorithm(size, size, map_type, seed, algorithm)
+    return MapGrid.from_terrain_grid(grid, terrain_lookup_table(get_terrain_config(map_type))).navigation_grid()
+
+
+def random_pairs(navigation: NavigationGrid, count: int, seed: str) -> List[Tuple[Point, Point]]:
+    """`count` reproducible (start, end) pairs of passable tiles"""
+    walkable = [index for index, cost in enumerate(navigation.costs) if cost]
+    if not walkable:
+        return []
+    rng = seeded_random(seed, 'pairs')
+    width = navigation.width
+    return [
+        ((start % width, start // width), (end % width, end // width))
+        for start, end in ((rng.choice(walkable), rng.choice(walkable)) for _ in range(count))
+    ]
+
+
+def rough_navigation(navigation: NavigationGrid, fraction: float, seed: str) -> NavigationGrid:
+    """Copy of a grid with a reproducible share of passable tiles costing 2 or 3"""
+    rng = seeded_random(seed, 'rough')
+    costs = [cost * rng.choice((2, 3)) if cost and rng.random() < fraction else cost for cost in navigation.costs]
+    return NavigationGrid(navigation.width, navigation.height, costs)
+
+
+def reference_dijkstra(grid: NavigationGrid, start: Point, end: Point, stats: Optional[Dict] = None) -> Dict:
+    """
+    Textbook Dijkstra search used to check the optimized searches.
+
+    Deliberately shares nothing with them beyond the movement rules: 8
+    directions, corners may be cut, and a step costs COST_STRAIGHT or
+    COST_DIAGONAL times the multiplier of the tile entered. Returns
+    'reachable' and 'total_cost' as the searches do.
+    """
+    width, height, costs = grid.width, grid.height, grid.costs
+    target = end[1] * width + end[0]
+    best = {start[1] * width + start[0]: 0}
+    queue = [(0, start[1] * width + start[0])]
+    expanded = 0
+    while queue:
+        distance, current = heapq.heappop(queue)
+        if distance > best[current]:
+            continue
+        expanded += 1
+        if current == target:
+            break
+        y, x = divmod(current, width)
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                nx, ny = x + dx, y + dy
+                if (dx or dy) and 0 <= nx < width and 0 <= ny < height and costs[ny * width + nx]:
+                    neighbor = ny * width + nx
+                    step = COST_DIAGONAL if dx and dy else COST_STRAIGHT
+                    candidate = distance + step * costs[neighbor]
+                    if candidate < best.get(neighbor, candidate + 1):
+                        best[neighbor] = candidate
+                        heapq.heappush(queue, (candidate, neighbor))
+
+    if stats is not None:
+        stats['expanded'] = expanded
+    if target not in best or not costs[target]:
+        return {'reachable': start == end, 'total_cost': 0.0}
+    return {'reachable': True, 'total_cost': round(best[target] / COST_STRAIGHT, 1)}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def search_summary(seconds: List[float], expanded: List[int], peaks: List[int]) -> Dict:
+    if not seconds:
+        return {}
+    return {
+        'queries': len(seconds),
+        'mean_seconds': statistics.fmean(seconds),
+        'p50_seconds': percentile(seconds, 0.50),
+        'p90_seconds': percentile(seconds, 0.90),
+        'p99_seconds': percentile(seconds, 0.99),
+        'max_seconds': max(seconds),
+        'mean_expanded': statistics.fmean(expanded),
+        'max_expanded': max(expanded),
+        'peak_bytes': max(peaks, default=0),
+    }
+
+
+def pathfinding_case(algorithm: str, size: int, seeds: Iterable[str] = BENCHMARK_SEEDS,
+                     pairs: int = PATHFINDING_PAIRS, rough: float = 0.0) -> Dict:
+    """
+    Run every search in PATH_SEARCHES and reference_dijkstra over the same pairs.
+
+    With `rough`, that share of each generated map's passable tiles is
+    made costlier first. The region index and cluster hierarchy are built
+    once per map, outside the timings (see 'index_seconds').
+    """
+    searches = {name: search for name, search in PATH_SEARCHES.items()
+                if not (rough and name in UNIFORM_SEARCHES)}
+    samples = {name: {'seconds': [], 'expanded': [], 'peaks': []} for name in ['dijkstra', *searches]}
+    mismatches = {name: 0 for name in searches if name not in APPROXIMATE_SEARCHES}
+    excess = {name: [] for name in searches if name in APPROXIMATE_SEARCHES}
+    index_seconds = []
+    queries = unreachable = 0
+
+    for seed in seeds:
+        navigation = generated_navigation(algorithm, size, seed)
+        if rough:
+            navigation = rough_navigation(navigation, rough, seed)
+        index_seconds.append(timed(lambda: (region_index(navigation), cluster_hierarchy(navigation))))
+        queries_for_seed = random_pairs(navigation, pairs, seed)
+
+        for start, end in queries_for_seed:
+            queries += 1
+            reference = None
+            for name, search in [('dijkstra', reference_dijkstra), *searches.items()]:
+                stats = {}
+                started = time.perf_counter()
+                result = search(navigation, start, end, stats=stats)
+                samples[name]['seconds'].append(time.perf_counter() - started)
+                samples[name]['expanded'].append(stats['expanded'])
+                answer = (result['reachable'], result['total_cost'])
+                if reference is None:
+                    reference = answer
+                    unreachable += not answer[0]
+                elif name in excess:
+                    if answer[0] != reference[0] or answer[1] < reference[1]:
+                        excess[name].append(None)
+                    elif reference[1]:
+                        excess[name].append(answer[1] / reference[1] - 1)
+                elif answer != reference:
+                    mismatches[name] += 1
+
+        for start, end in queries_for_seed[:PATHFINDING_MEMORY_PAIRS]:
+            for name, search in [('dijkstra', reference_dijkstra), *searches.items()]:
+                samples[name]['peaks'].append(peak_memory(lambda: search(navigation, start, end)))
+
+    report = {
+        name: search_summary(values['seconds'], values['expanded'], values['peaks'])
+        for name, values in samples.items()
+    }
+    for name, count in mismatches.items():
+        report[name]['cost_mismatches'] = count
+    for name, values in excess.items():
+        # None marks answers that were invalid rather than merely costlier
+        ratios = [value for value in values if value is not None]
+        report[name]['cost_mismatches'] = len(values) - len(ratios)
+        report[name]['mean_excess'] = statistics.fmean(ratios) if ratios else 0.0
+        report[name]['max_excess'] = max(ratios, default=0.0)
+
+    return {
+        'name': case_name(algorithm, size) + ('/rough' if rough else ''),
+        'algorithm': algorithm,
+        'size': size,
+        'rough': rough,
+        'queries': queries,
+        'unreachable': unreachable,
+        'index_seconds': statistics.median(index_seconds) if index_seconds else 0.0,
+        'cost_mismatches': sum(report[name]['cost_mismatches'] for name in searches),
+        'searches': report,
+    }
+
+
+def compare_pathfinders(algorithms: Iterable[str] = PATHFINDING_ALGORITHMS, sizes: Iterable[int] = BENCHMARK_SIZES,
+                        seeds: Iterable[str] = BENCHMARK_SEEDS, pairs: int = PATHFINDING_PAIRS,
+                        rough: float = PATHFINDING_ROUGH, progress: Callable[[Dict], None] = None) -> Dict:
+    """
+    Run pathfinding_case over the algorithm x size matrix, on the plain
+    generated maps and, unless `rough` is 0, on their rough variants.
+    """
+    seeds = list(seeds)
+    cases = []
+    for algorithm in algorithms:
+        for size in sizes:
+            for variant in ([0.0, rough] if rough else [0.0]):
+                case = pathfinding_case(algorithm, size, seeds, pairs, variant)
+                cases.append(case)
+                if progress:
+                    progress(case)
+
+    return {
+        'version': REPORT_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'seeds': seeds,
+        'pairs': pairs,
+        'rough': rough,
+        'cases': cases,
+    }
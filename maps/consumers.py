@@ -5,18 +5,31 @@ Handles WebSocket connections for collaborative map editing, including:
 - User connection/disconnection
 - Tile updates
 - Object updates
-- Fog of war updates
+- Fog of war updates, including automatic reveal of what tokens can see
 - User cursor positions
 - Presence tracking
+- Progress of background generation jobs
+- Path queries, coalesced to the latest one per connection
+- Live path previews, repaired incrementally as tiles change
 """
+import asyncio
 import json
 import logging
 from datetime import datetime
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import Map, MapTile, MapObject
+from .models import Map, MapGenerationJob, MapObject
+from .grid_storage import GridTooLargeError, update_tiles
+from .fog import FogMask, change_fog, fog_payload
+from .jobs import job_group_name, job_payload, job_runner
+from .navigation import navigation_grid
+from .path_cache import cached_path
 from .presence import PresenceManager
+from .replanning import DEFAULT_MAX_SESSIONS, ReplanningSessions
+from .visibility import reveal_vision
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +71,13 @@ class MapConsumer(AsyncWebsocketConsumer):
 
         self.can_edit = can_edit
         self.is_owner = is_owner
+        self.path_sessions = ReplanningSessions(
+            getattr(settings, 'MAP_PATH_SESSIONS_PER_CONNECTION', DEFAULT_MAX_SESSIONS)
+        )
+        # Latest unanswered path query and the task answering queries
+        self.pending_path_query = None
+        self.coalesced_path_queries = 0
+        self.path_query_task = None
 
         # Assign user color based on order of connection
         user_index = await self.presence_manager.get_user_count(self.room_group_name)
@@ -84,6 +104,9 @@ class MapConsumer(AsyncWebsocketConsumer):
         # Get current users in the room
         current_users = await self.presence_manager.get_users(self.room_group_name)
 
+        # Read after joining the group, so no later fog delta can be missed
+        fog_version = await self.get_fog_version()
+
         # Send connection confirmation
         await self.send(text_data=json.dumps({
             'type': 'connected',
@@ -94,7 +117,8 @@ class MapConsumer(AsyncWebsocketConsumer):
                 'can_edit': self.can_edit,
                 'is_owner': self.is_owner,
                 'user_color': self.user_color,
-                'current_users': current_users
+                'current_users': current_users,
+                'fog_version': fog_version
             }
         }))
 
@@ -113,6 +137,10 @@ class MapConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection."""
+        if getattr(self, 'path_query_task', None):
+            self.pending_path_query = None
+            self.path_query_task.cancel()
+
         if hasattr(self, 'user') and self.user.is_authenticated:
             # Remove from presence
             await self.presence_manager.user_left(
@@ -150,7 +178,10 @@ class MapConsumer(AsyncWebsocketConsumer):
                 'tile_update': self.handle_tile_update,
                 'object_update': self.handle_object_update,
                 'fog_update': self.handle_fog_update,
+                'fog_snapshot': self.handle_fog_snapshot,
                 'cursor_move': self.handle_cursor_move,
+                'path_query': self.handle_path_query,
+                'path_session': self.handle_path_session,
                 'ping': self.handle_ping,
             }
 
@@ -192,6 +223,7 @@ class MapConsumer(AsyncWebsocketConsumer):
                     'timestamp': timestamp
                 }
             )
+            await self.reveal_party_vision()
 
     async def handle_object_update(self, data):
         """Handle map object updates."""
@@ -218,6 +250,8 @@ class MapConsumer(AsyncWebsocketConsumer):
                     'timestamp': timestamp
                 }
             )
+            # Tokens may have moved and vision-blocking objects changed
+            await self.reveal_party_vision()
 
     async def handle_fog_update(self, data):
         """Handle fog of war updates."""
@@ -237,12 +271,32 @@ class MapConsumer(AsyncWebsocketConsumer):
                 self.room_group_name,
                 {
                     'type': 'broadcast_fog_update',
-                    'revealed_tiles': result['revealed_tiles'],
-                    'fog_enabled': result['fog_enabled'],
+                    'fog': result,
+                    'user_id': self.user.id
+                }
+            )
+
+    async def reveal_party_vision(self):
+        """Reveal what the map's tokens see now and broadcast the fog delta."""
+        delta = await self.update_vision()
+
+        if delta:
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {
+                    'type': 'broadcast_fog_update',
+                    'fog': delta,
                     'user_id': self.user.id
                 }
             )
 
+    async def handle_fog_snapshot(self, data):
+        """Send the full fog state (clients ask after missing a fog version)."""
+        await self.send(text_data=json.dumps({
+            'type': 'fog_snapshot',
+            'data': await self.get_fog()
+        }))
+
     async def handle_cursor_move(self, data):
         """Handle cursor position updates."""
         x = data.get('x')
@@ -268,6 +322,135 @@ class MapConsumer(AsyncWebsocketConsumer):
             }
         )
 
+    async def handle_path_query(self, data):
+        """
+        Queue a path query, replacing any query still waiting.
+
+        Queries are answered one at a time off the event loop; a query
+        that is overtaken by a newer one before its turn is dropped, so a
+        token drag only ever waits for the search in progress.
+        """
+        if not isinstance(data, dict):
+            await self.send_error("Invalid path query", "INVALID_PATH")
+            return
+        if self.pending_path_query is not None:
+            self.coalesced_path_queries += 1
+        self.pending_path_query = data
+        if self.path_query_task is None or self.path_query_task.done():
+            self.path_query_task = asyncio.create_task(self.answer_path_queries())
+
+    async def answer_path_queries(self):
+        """Answer the latest pending path query until none is left."""
+        while self.pending_path_query is not None:
+            data, self.pending_path_query = self.pending_path_query, None
+            coalesced, self.coalesced_path_queries = self.coalesced_path_queries, 0
+            start = self.parse_point(data.get('start'))
+            end = self.parse_point(data.get('end'))
+            if start is None or end is None:
+                await self.send_error("Invalid path endpoints", "INVALID_PATH")
+                continue
+
+            try:
+                # Outside the shared sync thread, so a search never holds up tile saves
+                answer = await database_sync_to_async(self.find_path, thread_sensitive=False)(
+                    start, end,
+                    data.get('diagonal', True) not in (False, 0, '0', 'false'),
+                    data.get('preview') in (True, 1, '1', 'true'),
+                )
+            except GridTooLargeError as e:
+                await self.send_error(str(e), "MAP_TOO_LARGE")
+                continue
+            except Exception as e:
+                logger.error(f"Error answering path query: {str(e)}", exc_info=True)
+                await self.send_error("Internal error", "INTERNAL_ERROR")
+                continue
+            if answer is None:
+                await self.send_error("Coordinates out of bounds", "INVALID_PATH")
+                continue
+
+            result, search = answer
+            await self.send(text_data=json.dumps({
+                'type': 'path_result',
+                'data': {
+                    'id': data.get('id'),
+                    'path': [{'x': x, 'y': y} for x, y in result['path']],
+                    'total_cost': result['total_cost'],
+                    'reachable': result['reachable'],
+                    'path_length': len(result['path']),
+                    'terrain_breakdown': result['terrain_breakdown'],
+                    'algorithm': search['algorithm'],
+                    'coalesced': coalesced,
+                }
+            }))
+
+    async def handle_path_session(self, data):
+        """Open, move or close a live path preview."""
+        action = data.get('action')
+
+        if action == 'open':
+            start = self.parse_point(data.get('start'))
+            goal = self.parse_point(data.get('goal'))
+            if start is None or goal is None:
+                await self.send_error("Invalid path endpoints", "INVALID_PATH")
+                return
+            try:
+                grid = await self.get_navigation_grid()
+            except GridTooLargeError as e:
+                await self.send_error(str(e), "MAP_TOO_LARGE")
+                return
+            if not (grid.contains(start) and grid.contains(goal)):
+                await self.send_error("Invalid path endpoints", "INVALID_PATH")
+                return
+            # Off the shared sync thread like path queries; the consumer
+            # handles one message at a time, so planner calls never overlap
+            session_id, result = await sync_to_async(self.path_sessions.open, thread_sensitive=False)(
+                grid, start, goal
+            )
+            await self.send_path_plan(session_id, result, replanned=False)
+
+        elif action == 'move':
+            session_id = data.get('session')
+            planner = self.path_sessions.get(session_id)
+            start = self.parse_point(data.get('start'))
+            if planner is None or start is None or not planner.grid.contains(start):
+                await self.send_error("Unknown path session", "INVALID_PATH")
+                return
+            result = await sync_to_async(self.path_sessions.move, thread_sensitive=False)(session_id, start)
+            await self.send_path_plan(session_id, result, replanned=False)
+
+        elif action == 'close':
+            self.path_sessions.close(data.get('session'))
+
+        else:
+            await self.send_error("Unknown path session action", "INVALID_PATH")
+
+    @staticmethod
+    def parse_point(point):
+        """(x, y) from a {x, y} message field, or None"""
+        try:
+            return int(point['x']), int(point['y'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    async def send_path_plan(self, session_id, result, replanned):
+        """Send a path session's current path to the client."""
+        planner = self.path_sessions.get(session_id)
+        await self.send(text_data=json.dumps({
+            'type': 'path_plan',
+            'data': {
+                'session': session_id,
+                'start': {'x': planner.start[0], 'y': planner.start[1]},
+                'goal': {'x': planner.goal[0], 'y': planner.goal[1]},
+                'path': [{'x': x, 'y': y} for x, y in result['path']],
+                'total_cost': result['total_cost'],
+                'reachable': result['reachable'],
+                'path_length': len(result['path']),
+                'terrain_breakdown': result['terrain_breakdown'],
+                'expanded': planner.expanded,
+                'replanned': replanned,
+            }
+        }))
+
     async def handle_ping(self, data):
         """Handle heartbeat ping."""
         await self.send(text_data=json.dumps({
@@ -293,52 +476,26 @@ class MapConsumer(AsyncWebsocketConsumer):
         except Map.DoesNotExist:
             return False, False, False
 
+    def find_path(self, start, end, allow_diagonal, preview):
+        """Answer a path query on the map's current revision, or None if out of bounds."""
+        map_obj = Map.objects.defer('grid_data').get(pk=self.map_id)
+        if not all(0 <= x < map_obj.width and 0 <= y < map_obj.height for x, y in (start, end)):
+            return None
+        search = {}
+        result = cached_path(map_obj, start, end, allow_diagonal, preview, stats=search)
+        return result, search
+
+    @database_sync_to_async
+    def get_navigation_grid(self):
+        """Navigation grid of the map's current revision."""
+        return navigation_grid(Map.objects.defer('grid_data').get(pk=self.map_id))
+
     @database_sync_to_async
     def save_tiles(self, tiles):
         """Save tile updates to database."""
-        saved = []
         try:
             map_obj = Map.objects.get(pk=self.map_id)
-
-            for tile_data in tiles:
-                x = tile_data.get('x')
-                y = tile_data.get('y')
-                terrain_type = tile_data.get('terrain_type')
-                color = tile_data.get('color')
-
-                # Validate coordinates
-                if x is None or y is None:
-                    continue
-                if x < 0 or x >= map_obj.width or y < 0 or y >= map_obj.height:
-                    continue
-
-                # Determine walkable and transparent based on terrain
-                non_walkable = ['wall', 'building', 'water', 'mountain', 'void']
-                non_transparent = ['wall', 'building', 'door', 'forest']
-
-                is_walkable = terrain_type not in non_walkable
-                is_transparent = terrain_type not in non_transparent
-
-                tile, created = MapTile.objects.update_or_create(
-                    map=map_obj, x=x, y=y,
-                    defaults={
-                        'terrain_type': terrain_type,
-                        'color': color,
-                        'is_walkable': is_walkable,
-                        'is_transparent': is_transparent
-                    }
-                )
-
-                saved.append({
-                    'x': x,
-                    'y': y,
-                    'terrain_type': tile.terrain_type,
-                    'color': tile.color,
-                    'is_walkable': tile.is_walkable,
-                    'is_transparent': tile.is_transparent
-                })
-
-            return saved
+            return update_tiles(map_obj, tiles)
         except Exception as e:
             logger.error(f"Error saving tiles: {str(e)}")
             return []
@@ -416,21 +573,18 @@ class MapConsumer(AsyncWebsocketConsumer):
 
     @database_sync_to_async
     def update_fog(self, action, tiles, radius):
-        """Update fog of war state."""
+        """Update fog of war state; returns the delta to broadcast, if anything changed."""
         try:
-            map_obj = Map.objects.get(pk=self.map_id)
+            map_obj = Map.objects.defer('grid_data').get(pk=self.map_id)
 
             if action == 'toggle':
-                map_obj.fog_of_war_enabled = not map_obj.fog_of_war_enabled
-                map_obj.save()
-
-            elif action == 'reset':
-                map_obj.revealed_tiles = []
-                map_obj.save()
+                return change_fog(map_obj, toggle=True)
 
-            elif action in ['reveal', 'hide']:
-                revealed = list(map_obj.revealed_tiles) if map_obj.revealed_tiles else []
+            if action == 'reset':
+                return change_fog(map_obj, FogMask.clear)
 
+            if action in ['reveal', 'hide']:
+                areas = []
                 for tile in tiles:
                     # Handle both list format [x, y] and dict format {x, y}
                     if isinstance(tile, list):
@@ -440,31 +594,42 @@ class MapConsumer(AsyncWebsocketConsumer):
 
                     if x is None or y is None:
                         continue
+                    areas.append((int(x), int(y)))
 
-                    # Apply radius
-                    for dy in range(-radius + 1, radius):
-                        for dx in range(-radius + 1, radius):
-                            tx, ty = x + dx, y + dy
-                            if 0 <= tx < map_obj.width and 0 <= ty < map_obj.height:
-                                coord = [tx, ty]
-                                if action == 'reveal':
-                                    if coord not in revealed:
-                                        revealed.append(coord)
-                                elif action == 'hide':
-                                    if coord in revealed:
-                                        revealed.remove(coord)
-
-                map_obj.revealed_tiles = revealed
-                map_obj.save()
-
-            return {
-                'revealed_tiles': map_obj.revealed_tiles,
-                'fog_enabled': map_obj.fog_of_war_enabled
-            }
+                def edit(fog):
+                    for x, y in areas:
+                        # A radius of 1 is the tile itself
+                        fog.set_area(x, y, int(radius) - 1, action == 'reveal')
+
+                return change_fog(map_obj, edit)
+
+            return None
         except Exception as e:
             logger.error(f"Error updating fog: {str(e)}")
             return None
 
+    @database_sync_to_async
+    def update_vision(self):
+        """Update the party's field of view; returns the fog delta to broadcast, if anything was revealed."""
+        try:
+            map_obj = Map.objects.defer('grid_data').get(pk=self.map_id)
+            if not map_obj.fog_of_war_enabled:
+                return None
+            return reveal_vision(map_obj)['fog']
+        except Exception as e:
+            logger.error(f"Error updating vision: {str(e)}")
+            return None
+
+    @database_sync_to_async
+    def get_fog_version(self):
+        """Current fog of war version."""
+        return Map.objects.values_list('fog_version', flat=True).get(pk=self.map_id)
+
+    @database_sync_to_async
+    def get_fog(self):
+        """Full fog of war state."""
+        return fog_payload(Map.objects.defer('grid_data').get(pk=self.map_id))
+
     # Broadcast handlers (called by channel_layer.group_send)
 
     async def broadcast_tile_update(self, event):
@@ -479,6 +644,12 @@ class MapConsumer(AsyncWebsocketConsumer):
             }
         }))
 
+        # Repair this connection's live paths around the painted tiles
+        if getattr(self, 'path_sessions', None):
+            repaired = await sync_to_async(self.path_sessions.update_tiles, thread_sensitive=False)(event['tiles'])
+            for session_id, result in repaired:
+                await self.send_path_plan(session_id, result, replanned=True)
+
     async def broadcast_object_update(self, event):
         """Send object update to WebSocket client."""
         await self.send(text_data=json.dumps({
@@ -497,8 +668,10 @@ class MapConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps({
             'type': 'fog_update',
             'data': {
-                'revealed_tiles': event['revealed_tiles'],
-                'fog_enabled': event['fog_enabled'],
+                'version': event['fog']['version'],
+                'runs': event['fog']['runs'],
+                'revealed_count': event['fog']['revealed_count'],
+                'fog_enabled': event['fog']['enabled'],
                 'user_id': event['user_id']
             }
         }))
@@ -549,3 +722,57 @@ class MapConsumer(AsyncWebsocketConsumer):
                 'code': code
             }
         }))
+
+
+class GenerationJobConsumer(AsyncWebsocketConsumer):
+    """
+    WebSocket consumer streaming the progress of one generation job.
+
+    Sends the current job state on connect, then a job_progress message
+    for every phase change until the client disconnects.
+    """
+
+    async def connect(self):
+        """Handle WebSocket connection."""
+        self.job_id = int(self.scope['url_route']['kwargs']['job_id'])
+        self.group_name = job_group_name(self.job_id)
+        self.user = self.scope['user']
+
+        if not self.user.is_authenticated:
+            await self.close(code=4001)
+            return
+
+        job = await self.get_job()
+        if job is None:
+            logger.warning(f"User {self.user.username} denied access to generation job {self.job_id}")
+            await self.close(code=4003)
+            return
+
+        # Progress broadcasts must be delivered on this event loop
+        job_runner.attach_loop(asyncio.get_running_loop())
+
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        # The job may have moved on before we joined the group
+        job = await self.get_job()
+        await self.send(text_data=json.dumps({
+            'type': 'job_progress',
+            'data': job_payload(job)
+        }))
+
+    async def disconnect(self, close_code):
+        """Handle WebSocket disconnection."""
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def job_progress(self, event):
+        """Send a job progress update to the WebSocket client."""
+        await self.send(text_data=json.dumps({
+            'type': 'job_progress',
+            'data': event['job']
+        }))
+
+    @database_sync_to_async
+    def get_job(self):
+        """Load the job if it belongs to the connected user."""
+        return MapGenerationJob.objects.filter(pk=self.job_id, owner=self.user).first()
@@ -3,7 +3,7 @@ Cover system for procedural map generation.
 Defines cover templates and placement logic for different map types.
 """
 import random
-from typing import List, Tuple, Dict
+from typing import Dict, List, Optional, Tuple
 
 # Cover levels and their properties
 COVER_LEVELS = {
@@ -114,16 +114,19 @@ COVER_TEMPLATES = {
 }
 
 
-def get_cover_template(map_type: str) -> Dict:
+def get_cover_template(map_type: str, rng: Optional[random.Random] = None) -> Dict:
     """
     Get a random cover template appropriate for the map type.
 
     Args:
         map_type: Type of map ('urban', 'corporate', 'wilderness', 'underground', 'mixed')
+        rng: Random stream to draw from (a fresh unseeded one if omitted)
 
     Returns:
         Dictionary with cover object properties
     """
+    rng = rng or random.Random()
+
     # For mixed maps, randomly select from all categories
     if map_type == 'mixed':
         all_templates = []
@@ -133,13 +136,13 @@ def get_cover_template(map_type: str) -> Dict:
         if not all_templates:
             map_type = 'urban'  # Fallback
         else:
-            return random.choice(all_templates).copy()
+            return rng.choice(all_templates).copy()
 
     templates = COVER_TEMPLATES.get(map_type, COVER_TEMPLATES['urban'])
     if not templates:
         templates = COVER_TEMPLATES['urban']
 
-    return random.choice(templates).copy()
+    return rng.choice(templates).copy()
 
 
 def calculate_cover_positions(
@@ -147,7 +150,8 @@ def calculate_cover_positions(
     width: int,
     height: int,
     density: float = 0.1,
-    map_type: str = 'urban'
+    map_type: str = 'urban',
+    rng: Optional[random.Random] = None
 ) -> List[Dict]:
     """
     Calculate positions and properties for cover objects.
@@ -158,6 +162,7 @@ def calculate_cover_positions(
         height: Map height
         density: Cover density (0.0 to 1.0), percentage of floor tiles to have cover
         map_type: Type of map for context-aware cover selection
+        rng: Random stream to draw from (a fresh unseeded one if omitted)
 
     Returns:
         List of dictionaries with cover object data ready for MapObject creation
@@ -165,6 +170,8 @@ def calculate_cover_positions(
     if density <= 0 or not floor_tiles:
         return []
 
+    rng = rng or random.Random()
+
     # Calculate number of cover objects to place
     num_cover = int(len(floor_tiles) * density)
     num_cover = max(1, num_cover)  # At least one cover object
@@ -182,12 +189,12 @@ def calculate_cover_positions(
     num_cover = min(num_cover, len(available_positions))
 
     # Randomly select positions
-    selected_positions = random.sample(available_positions, num_cover)
+    selected_positions = rng.sample(available_positions, num_cover)
 
     # Create cover objects
     cover_objects = []
     for x, y in selected_positions:
-        template = get_cover_template(map_type)
+        template = get_cover_template(map_type, rng)
         cover_level = template['cover_level']
         cover_props = COVER_LEVELS[cover_level]
 
@@ -3,6 +3,7 @@ from django.contrib.auth.models import User
 from django.db import models as django_models
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Row, Column, Field, Div, HTML
+from .gallery import MAX_GALLERY_VARIANTS
 from .models import Map, MapTile, MapObject, MapGenerationPreset
 
 
@@ -16,6 +17,13 @@ class MapForm(forms.ModelForm):
         help_text='Select specific users to share this map with (in addition to public setting)'
     )
 
+    large_map = forms.BooleanField(
+        required=False,
+        label='Large sectored map',
+        help_text=f'Allow up to {Map.MAX_SECTORED_SIZE}x{Map.MAX_SECTORED_SIZE} tiles; '
+                  f'the map is loaded in sectors as you scroll'
+    )
+
     class Meta:
         model = Map
         fields = ['name', 'description', 'width', 'height', 'tile_size', 'map_type', 'is_public', 'shared_with']
@@ -28,6 +36,11 @@ class MapForm(forms.ModelForm):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
 
+        # Storage mode is fixed once a map exists
+        if self.instance.pk:
+            self.fields['large_map'].initial = self.instance.is_sectored
+            self.fields['large_map'].disabled = True
+
         # Filter users to exclude the current map owner
         if user:
             self.fields['shared_with'].queryset = User.objects.exclude(pk=user.pk).order_by('username')
@@ -47,12 +60,38 @@ class MapForm(forms.ModelForm):
                 Column('map_type', css_class='form-group col-md-6'),
                 Column('is_public', css_class='form-group col-md-6'),
             ),
+            Field('large_map', css_class='form-check-input'),
             HTML('<hr><h5>Sharing Settings</h5>'),
             HTML('<p class="text-muted small">Share this map with specific users. Public maps are visible to everyone.</p>'),
             Field('shared_with', css_class='form-check'),
             Submit('submit', 'Save Map', css_class='btn btn-primary')
         )
 
+    def clean(self):
+        cleaned_data = super().clean()
+        clean_map_size(self, cleaned_data.get('large_map'))
+        return cleaned_data
+
+    def save(self, commit=True):
+        instance = super().save(commit=False)
+        if not instance.pk and self.cleaned_data.get('large_map'):
+            instance.tile_storage = Map.TILE_STORAGE_SECTORED
+        if commit:
+            instance.save()
+            self.save_m2m()
+        return instance
+
+
+def clean_map_size(form, large_map):
+    """Limit width/height to the single-grid size unless the map is sectored"""
+    if large_map:
+        return
+    for field in ('width', 'height'):
+        value = form.cleaned_data.get(field)
+        if value is not None and value > Map.MAX_GRID_SIZE:
+            form.add_error(field, f'Maps larger than {Map.MAX_GRID_SIZE} tiles per side must be '
+                                  f'created as large sectored maps.')
+
 
 class MapObjectForm(forms.ModelForm):
     """Form for creating and editing map objects"""
@@ -265,6 +304,27 @@ class MapGenerationForm(forms.ModelForm):
         help_text='Width of maze paths (1-3)'
     )
 
+    large_map = forms.BooleanField(
+        required=False,
+        label='Large sectored map',
+        help_text=f'Allow up to {Map.MAX_SECTORED_SIZE}x{Map.MAX_SECTORED_SIZE} tiles; sectors are '
+                  f'generated from the seed the first time they are viewed (no preview)'
+    )
+
+    variants = forms.IntegerField(
+        required=False,
+        min_value=2,
+        max_value=MAX_GALLERY_VARIANTS,
+        widget=forms.HiddenInput(),
+        help_text='Preview this many seeds side by side instead of a single map'
+    )
+
+    connect_regions = forms.BooleanField(
+        required=False,
+        label='Connect disconnected areas',
+        help_text='Tunnel walkable pockets cut off from the main area into it'
+    )
+
     # Cover System Parameters
     cover_density = forms.FloatField(
         required=False,
@@ -297,6 +357,7 @@ class MapGenerationForm(forms.ModelForm):
                 Column('map_type', css_class='form-group col-md-4'),
             ),
             Field('seed', css_class='form-control'),
+            Field('large_map', css_class='form-check-input'),
 
             HTML('<hr><h5>Algorithm Parameters</h5>'),
             HTML('<div id="bsp-params" style="display:none;">'),
@@ -328,6 +389,7 @@ class MapGenerationForm(forms.ModelForm):
             HTML('<h6>Maze Parameters</h6>'),
             Field('path_width', css_class='form-control'),
             HTML('</div>'),
+            Field('connect_regions', css_class='form-check-input'),
 
             HTML('<hr><h5>Cover System</h5>'),
             HTML('<p class="text-muted small">Add procedural cover objects (furniture, vehicles, etc.) for tactical gameplay</p>'),
@@ -343,6 +405,11 @@ class MapGenerationForm(forms.ModelForm):
             Submit('submit', 'Preview Map', css_class='btn btn-primary')
         )
 
+    def clean(self):
+        cleaned_data = super().clean()
+        clean_map_size(self, cleaned_data.get('large_map'))
+        return cleaned_data
+
 
 class MapGenerationPresetForm(forms.ModelForm):
     """Form for creating and editing map generation presets"""
@@ -0,0 +1,94 @@
+"""
+Variant galleries for map generation previews.
+
+A gallery generates one parameter set under several seeds at once so a GM
+can compare the results side by side and pick one. Variants that are not
+already in the generation cache run in parallel on the job runner's
+process pool, so a gallery takes about as long as a single generation on a
+multi-core host. Every grid is left in the generation cache, so previewing
+or saving the chosen seed afterwards does not generate it again.
+
+Clients receive thumbnails rather than tiles: each map is downsampled to
+at most THUMBNAIL_SIZE cells on its longer side and sent as base64 terrain
+codes that index a colour palette shared by all variants.
+"""
+import base64
+import math
+import random
+from typing import Dict, List, Optional
+
+from shadowrun_campaign.rng import seeded_random
+
+from .generation_cache import generation_cache, generation_key
+from .generators import get_terrain_config, terrain_lookup_table
+from .jobs import job_runner
+from .terrain_grid import TerrainGrid
+
+# Upper bound on variants per gallery request
+MAX_GALLERY_VARIANTS = 16
+
+# Longest thumbnail side, in cells
+THUMBNAIL_SIZE = 48
+
+
+def variant_seeds(seed: Optional[str], count: int) -> List[str]:
+    """
+    Distinct seeds for a gallery.
+
+    A base seed always yields the same variant seeds; without one the
+    seeds are random.
+    """
+    rng = seeded_random(seed, 'gallery') if seed else random.Random()
+    return [str(value) for value in rng.sample(range(1000, 100000), count)]
+
+
+def thumbnail(grid: TerrainGrid, size: int = THUMBNAIL_SIZE) -> Dict:
+    """Downsample a grid to at most `size` cells per side (nearest cell)"""
+    step = max(1, math.ceil(max(grid.width, grid.height) / size))
+    cells = grid.cells[::step, ::step]
+    return {
+        'width': cells.shape[1],
+        'height': cells.shape[0],
+        'cells': base64.b64encode(cells.tobytes()).decode('ascii'),
+    }
+
+
+def generate_variants(width: int, height: int, map_type: str, seeds: List[str],
+                      algorithm: str = 'random', params: Optional[Dict] = None) -> List[TerrainGrid]:
+    """
+    Generate one grid per seed, running cache misses in parallel.
+
+    Returns:
+        TerrainGrids in the order of `seeds`
+    """
+    keys = [generation_key(width, height, map_type, seed, algorithm, params) for seed in seeds]
+    grids = [generation_cache.get(key) for key in keys]
+
+    missing = [index for index, grid in enumerate(grids) if grid is None]
+    if len(missing) == 1:
+        # Not worth a round trip to the pool
+        index = missing[0]
+        grids[index] = generation_cache.get_or_generate(width, height, map_type, seeds[index], algorithm, params)
+    elif missing:
+        generated = job_runner.generate_many([
+            (width, height, map_type, seeds[index], algorithm, params) for index in missing
+        ])
+        for index, grid in zip(missing, generated):
+            grids[index] = generation_cache.put(keys[index], grid)
+    return grids
+
+
+def gallery_payload(width: int, height: int, map_type: str, seed: Optional[str], count: int,
+                    algorithm: str = 'random', params: Optional[Dict] = None) -> Dict:
+    """JSON gallery of `count` variants: palette plus one thumbnail per seed"""
+    seeds = variant_seeds(seed, count)
+    grids = generate_variants(width, height, map_type, seeds, algorithm, params)
+    return {
+        'width': width,
+        'height': height,
+        'palette': [info['color'] for info in terrain_lookup_table(get_terrain_config(map_type))],
+        'variants': [
+            {'seed': variant_seed, 'thumbnail': thumbnail(grid)}
+            for variant_seed, grid in zip(seeds, grids)
+        ],
+    }
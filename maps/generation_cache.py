@@ -0,0 +1,135 @@
+"""
+Content-addressed cache of generated terrain.
+
+Generation is a pure function of (algorithm, width, height, map_type, seed,
+params), so results are stored under a SHA-256 digest of those inputs and
+reused by the preview, the commit after a preview and background jobs
+instead of running the algorithm again.
+
+The cache is an in-process LRU bounded by the total number of terrain
+cells held (one byte each). Cached grids are read-only; copy the cells
+before modifying them.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from django.conf import settings
+
+from .generators import run_generation_algorithm
+from .terrain_grid import TerrainGrid
+
+# Default cap on cached terrain, in cells (bytes)
+DEFAULT_MAX_CELLS = 16 * 1024 * 1024
+
+
+def generation_key(width: int, height: int, map_type: str, seed: str,
+                   algorithm: str = 'random', params: Optional[Dict] = None) -> str:
+    """Stable digest identifying one generation result"""
+    canonical = json.dumps(
+        {
+            'algorithm': algorithm,
+            'width': width,
+            'height': height,
+            'map_type': map_type,
+            'seed': str(seed),
+            'params': params or {},
+        },
+        sort_keys=True,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class GenerationCache:
+    """
+    Thread-safe LRU of TerrainGrids keyed by generation_key.
+
+    Least recently used grids are evicted once the cached cells exceed
+    `max_cells`; a grid larger than the whole cache is never stored.
+    """
+
+    def __init__(self, max_cells: int = DEFAULT_MAX_CELLS):
+        self.max_cells = max_cells
+        self._grids: 'OrderedDict[str, TerrainGrid]' = OrderedDict()
+        self._cells = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._grids)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._grids
+
+    def get(self, key: str) -> Optional[TerrainGrid]:
+        """Return a cached grid and mark it as recently used"""
+        with self._lock:
+            grid = self._grids.get(key)
+            if grid is None:
+                self.misses += 1
+                return None
+            self._grids.move_to_end(key)
+            self.hits += 1
+            return grid
+
+    def put(self, key: str, grid: TerrainGrid) -> TerrainGrid:
+        """Store a grid (made read-only), evicting old entries as needed"""
+        size = grid.cells.nbytes
+        grid.cells.setflags(write=False)
+        if size > self.max_cells:
+            return grid
+
+        with self._lock:
+            previous = self._grids.pop(key, None)
+            if previous is not None:
+                self._cells -= previous.cells.nbytes
+            self._grids[key] = grid
+            self._cells += size
+
+            while self._cells > self.max_cells:
+                _, evicted = self._grids.popitem(last=False)
+                self._cells -= evicted.cells.nbytes
+                self.evictions += 1
+        return grid
+
+    def get_or_generate(self, width: int, height: int, map_type: str, seed: str,
+                        algorithm: str = 'random', params: Optional[Dict] = None) -> TerrainGrid:
+        """Return the cached grid for these inputs, generating it on a miss"""
+        key = generation_key(width, height, map_type, seed, algorithm, params)
+        grid = self.get(key)
+        if grid is None:
+            grid = self.put(key, run_generation_algorithm(width, height, map_type, seed, algorithm, params))
+        return grid
+
+    def clear(self) -> None:
+        """Drop every cached grid and reset the counters"""
+        with self._lock:
+            self._grids.clear()
+            self._cells = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict:
+        """Counters for monitoring cache effectiveness"""
+        with self._lock:
+            return {
+                'entries': len(self._grids),
+                'cells': self._cells,
+                'max_cells': self.max_cells,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+generation_cache = GenerationCache(getattr(settings, 'MAP_GENERATION_CACHE_CELLS', DEFAULT_MAX_CELLS))
+
+
+def cached_generation(width: int, height: int, map_type: str, seed: str,
+                      algorithm: str = 'random', params: Optional[Dict] = None) -> TerrainGrid:
+    """Generate terrain through the shared cache"""
+    return generation_cache.get_or_generate(width, height, map_type, seed, algorithm, params)
@@ -3,7 +3,63 @@ Advanced map generation algorithms for procedural map creation.
 Includes BSP (Binary Space Partitioning), Cellular Automata, and other algorithms.
 """
 import random
-from typing import List, Tuple, Dict
+from typing import List, Dict
+
+import numpy as np
+
+from shadowrun_campaign.rng import seeded_random
+
+from .regions import connect_regions
+from .terrain_grid import BaseTerrain, TerrainGrid, TERRAIN_NAMES
+
+
+# Terrain settings per map type, keyed by the generators' base terrain names
+TERRAIN_CONFIG = {
+    'urban': {
+        'floor': {'type': 'street', 'color': '#555555', 'walkable': True, 'transparent': True},
+        'wall': {'type': 'building', 'color': '#8B4513', 'walkable': False, 'transparent': False},
+        'door': {'type': 'door', 'color': '#CD853F', 'walkable': True, 'transparent': False},
+        'secondary': {'type': 'sidewalk', 'color': '#AAAAAA', 'walkable': True, 'transparent': True},
+    },
+    'wilderness': {
+        'floor': {'type': 'grass', 'color': '#7CFC00', 'walkable': True, 'transparent': True},
+        'wall': {'type': 'water', 'color': '#4169E1', 'walkable': False, 'transparent': True},
+        'cave': {'type': 'forest', 'color': '#228B22', 'walkable': True, 'transparent': False},
+        'secondary': {'type': 'mountain', 'color': '#8B7355', 'walkable': False, 'transparent': True},
+    },
+    'corporate': {
+        'floor': {'type': 'floor', 'color': '#E8E8E8', 'walkable': True, 'transparent': True},
+        'wall': {'type': 'wall', 'color': '#696969', 'walkable': False, 'transparent': False},
+        'door': {'type': 'door', 'color': '#8B4513', 'walkable': True, 'transparent': False},
+        'tunnel': {'type': 'stairs', 'color': '#A9A9A9', 'walkable': True, 'transparent': True},
+    },
+    'underground': {
+        'floor': {'type': 'tunnel', 'color': '#8B7355', 'walkable': True, 'transparent': True},
+        'wall': {'type': 'wall', 'color': '#2F4F4F', 'walkable': False, 'transparent': False},
+        'cave': {'type': 'cave', 'color': '#654321', 'walkable': True, 'transparent': True},
+        'tunnel': {'type': 'sewer', 'color': '#556B2F', 'walkable': True, 'transparent': True},
+    },
+    'mixed': {
+        'floor': {'type': 'floor', 'color': '#E8E8E8', 'walkable': True, 'transparent': True},
+        'wall': {'type': 'wall', 'color': '#696969', 'walkable': False, 'transparent': False},
+        'door': {'type': 'door', 'color': '#8B4513', 'walkable': True, 'transparent': False},
+        'cave': {'type': 'grass', 'color': '#7CFC00', 'walkable': True, 'transparent': True},
+    }
+}
+
+
+def get_terrain_config(map_type):
+    """Return the terrain settings for a map type (corporate by default)"""
+    return TERRAIN_CONFIG.get(map_type, TERRAIN_CONFIG['corporate'])
+
+
+def terrain_lookup_table(config):
+    """
+    Build a list indexed by base terrain code giving each code's terrain settings.
+
+    Base terrains a map type does not define fall back to its 'floor' entry.
+    """
+    return [config.get(name, config['floor']) for name in TERRAIN_NAMES]
 
 
 class Room:
@@ -28,14 +84,14 @@ class BSPNode:
         self.right = None
         self.room = None
 
-    def split(self, min_room_size: int = 5) -> bool:
+    def split(self, rng: random.Random, min_room_size: int = 5) -> bool:
         """Split the node into two children"""
         # If already split, don't split again
         if self.left or self.right:
             return False
 
         # Decide split direction based on width/height ratio
-        split_horizontally = random.choice([True, False])
+        split_horizontally = rng.choice([True, False])
         if self.width > self.height and self.width / self.height >= 1.25:
             split_horizontally = False
         elif self.height > self.width and self.height / self.width >= 1.25:
@@ -52,7 +108,7 @@ class BSPNode:
             return False
 
         # Split position
-        split_pos = random.randint(min_room_size, max_size)
+        split_pos = rng.randint(min_room_size, max_size)
 
         # Create child nodes
         if split_horizontally:
@@ -64,15 +120,15 @@ class BSPNode:
 
         return True
 
-    def create_rooms(self, min_room_size: int = 5, max_room_size: int = 10) -> List[Room]:
+    def create_rooms(self, rng: random.Random, min_room_size: int = 5, max_room_size: int = 10) -> List[Room]:
         """Create rooms in leaf nodes"""
         if self.left or self.right:
             # This is not a leaf, create rooms in children
             rooms = []
             if self.left:
-                rooms.extend(self.left.create_rooms(min_room_size, max_room_size))
+                rooms.extend(self.left.create_rooms(rng, min_room_size, max_room_size))
             if self.right:
-                rooms.extend(self.right.create_rooms(min_room_size, max_room_size))
+                rooms.extend(self.right.create_rooms(rng, min_room_size, max_room_size))
             return rooms
         else:
             # This is a leaf, create a room
@@ -82,16 +138,16 @@ class BSPNode:
             max_height = min(max_room_size, self.height - 2)
             max_height = max(min_room_size, max_height)
 
-            room_width = random.randint(min_room_size, max_width) if max_width > min_room_size else min_room_size
-            room_height = random.randint(min_room_size, max_height) if max_height > min_room_size else min_room_size
+            room_width = rng.randint(min_room_size, max_width) if max_width > min_room_size else min_room_size
+            room_height = rng.randint(min_room_size, max_height) if max_height > min_room_size else min_room_size
 
             # Make sure room fits in the node
             room_width = min(room_width, self.width - 2)
             room_height = min(room_height, self.height - 2)
 
             # Position room within node
-            x_offset = random.randint(0, max(0, self.width - room_width - 1))
-            y_offset = random.randint(0, max(0, self.height - room_height - 1))
+            x_offset = rng.randint(0, max(0, self.width - room_width - 1))
+            y_offset = rng.randint(0, max(0, self.height - room_height - 1))
             room_x = self.x + x_offset
             room_y = self.y + y_offset
 
@@ -99,10 +155,10 @@ class BSPNode:
             return [self.room]
 
 
-def generate_bsp_map(width: int, height: int, seed: str = None, params: dict = None) -> List[Tuple[int, int, str]]:
+def generate_bsp_map(width: int, height: int, seed: str = None, params: dict = None) -> TerrainGrid:
     """
     Generate a map using Binary Space Partitioning algorithm.
-    Returns a list of (x, y, terrain_type) tuples.
+    Returns a TerrainGrid (iterates as (x, y, terrain_type) tuples).
 
     Parameters:
         width: Map width
@@ -113,8 +169,7 @@ def generate_bsp_map(width: int, height: int, seed: str = None, params: dict = N
             - max_room_size: Maximum room dimension (default: 10)
             - corridor_width: Width of corridors (default: 1)
     """
-    if seed:
-        random.seed(hash(seed))
+    rng = seeded_random(seed)
 
     # Parse parameters
     if params is None:
@@ -124,10 +179,7 @@ def generate_bsp_map(width: int, height: int, seed: str = None, params: dict = N
     corridor_width = params.get('corridor_width', 1)
 
     # Initialize all tiles as walls
-    tiles = {}
-    for y in range(height):
-        for x in range(width):
-            tiles[(x, y)] = 'wall'
+    grid = TerrainGrid(width, height, BaseTerrain.WALL)
 
     # Create BSP tree
     root = BSPNode(0, 0, width, height)
@@ -136,21 +188,18 @@ def generate_bsp_map(width: int, height: int, seed: str = None, params: dict = N
     nodes = [root]
     while nodes:
         node = nodes.pop(0)
-        if node.split(min_room_size=min_room_size):
+        if node.split(rng, min_room_size=min_room_size):
             if node.left:
                 nodes.append(node.left)
             if node.right:
                 nodes.append(node.right)
 
     # Create rooms
-    rooms = root.create_rooms(min_room_size=min_room_size, max_room_size=max_room_size)
+    rooms = root.create_rooms(rng, min_room_size=min_room_size, max_room_size=max_room_size)
 
     # Fill rooms with floor tiles
     for room in rooms:
-        for y in range(room.y, room.y + room.height):
-            for x in range(room.x, room.x + room.width):
-                if 0 <= x < width and 0 <= y < height:
-                    tiles[(x, y)] = 'floor'
+        grid.fill_rect(room.x, room.y, room.width, room.height, BaseTerrain.FLOOR)
 
     # Create corridors between rooms
     for i in range(len(rooms) - 1):
@@ -158,48 +207,35 @@ def generate_bsp_map(width: int, height: int, seed: str = None, params: dict = N
         room2 = rooms[i + 1]
 
         # Create L-shaped corridor with configurable width
-        if random.choice([True, False]):
+        if rng.choice([True, False]):
             # Horizontal then vertical
-            for x in range(min(room1.center_x, room2.center_x), max(room1.center_x, room2.center_x) + 1):
-                for w in range(corridor_width):
-                    if 0 <= x < width and 0 <= room1.center_y + w < height:
-                        tiles[(x, room1.center_y + w)] = 'floor'
-            for y in range(min(room1.center_y, room2.center_y), max(room1.center_y, room2.center_y) + 1):
-                for w in range(corridor_width):
-                    if 0 <= room2.center_x + w < width and 0 <= y < height:
-                        tiles[(room2.center_x + w, y)] = 'floor'
+            grid.hline(room1.center_x, room2.center_x, room1.center_y, BaseTerrain.FLOOR, corridor_width)
+            grid.vline(room2.center_x, room1.center_y, room2.center_y, BaseTerrain.FLOOR, corridor_width)
         else:
             # Vertical then horizontal
-            for y in range(min(room1.center_y, room2.center_y), max(room1.center_y, room2.center_y) + 1):
-                for w in range(corridor_width):
-                    if 0 <= room1.center_x + w < width and 0 <= y < height:
-                        tiles[(room1.center_x + w, y)] = 'floor'
-            for x in range(min(room1.center_x, room2.center_x), max(room1.center_x, room2.center_x) + 1):
-                for w in range(corridor_width):
-                    if 0 <= x < width and 0 <= room2.center_y + w < height:
-                        tiles[(x, room2.center_y + w)] = 'floor'
+            grid.vline(room1.center_x, room1.center_y, room2.center_y, BaseTerrain.FLOOR, corridor_width)
+            grid.hline(room1.center_x, room2.center_x, room2.center_y, BaseTerrain.FLOOR, corridor_width)
 
     # Add doors at room entrances (randomly)
     for room in rooms:
         # Add doors at random edges
-        if random.random() < 0.3:
-            door_x = random.randint(room.x, room.x + room.width - 1)
+        if rng.random() < 0.3:
+            door_x = rng.randint(room.x, room.x + room.width - 1)
             if 0 <= door_x < width and room.y > 0:
-                if tiles[(door_x, room.y - 1)] == 'floor':
-                    tiles[(door_x, room.y)] = 'door'
-
-    # Convert to list format
-    result = []
-    for (x, y), terrain in tiles.items():
-        result.append((x, y, terrain))
+                if grid.cells[room.y - 1, door_x] == BaseTerrain.FLOOR:
+                    grid.set(door_x, room.y, BaseTerrain.DOOR)
 
-    return result
+    return grid
 
 
-def generate_cellular_automata_map(width: int, height: int, seed: str = None, params: dict = None) -> List[Tuple[int, int, str]]:
+def generate_cellular_automata_map(width: int, height: int, seed: str = None, params: dict = None) -> TerrainGrid:
     """
     Generate a cave-like map using Cellular Automata algorithm.
-    Returns a list of (x, y, terrain_type) tuples.
+    Returns a TerrainGrid (iterates as (x, y, terrain_type) tuples).
+
+    The grid is held as a 2D uint8 array (1 = wall, 0 = cave) and every
+    iteration is applied to the whole array at once, so the cost per
+    iteration no longer grows with Python-level loops over the cells.
 
     Parameters:
         width: Map width
@@ -209,8 +245,7 @@ def generate_cellular_automata_map(width: int, height: int, seed: str = None, pa
             - iterations: Number of smoothing iterations (default: 5)
             - wall_probability: Initial wall density 0-1 (default: 0.45)
     """
-    if seed:
-        random.seed(hash(seed))
+    rng = seeded_random(seed)
 
     # Parse parameters
     if params is None:
@@ -218,47 +253,52 @@ def generate_cellular_automata_map(width: int, height: int, seed: str = None, pa
     iterations = params.get('iterations', 5)
     wall_probability = params.get('wall_probability', 0.45)
 
-    # Initialize random map
-    tiles = {}
-    for y in range(height):
-        for x in range(width):
-            # Edges are always walls
-            if x == 0 or y == 0 or x == width - 1 or y == height - 1:
-                tiles[(x, y)] = 'wall'
-            else:
-                tiles[(x, y)] = 'wall' if random.random() < wall_probability else 'cave'
+    # Initialize random map (drawn from the seeded stream so seeds stay reproducible)
+    noise_rng = np.random.default_rng(rng.getrandbits(64))
+    walls = (noise_rng.random((height, width)) < wall_probability).astype(np.uint8)
 
-    # Apply cellular automata rules
+    # Edges are always walls
+    walls[0, :] = 1
+    walls[-1, :] = 1
+    walls[:, 0] = 1
+    walls[:, -1] = 1
+
+    # Apply cellular automata rules (4-5 rule) to the interior
     for _ in range(iterations):
-        new_tiles = tiles.copy()
-        for y in range(1, height - 1):
-            for x in range(1, width - 1):
-                wall_count = count_walls_around(tiles, x, y, width, height)
+        wall_count = count_wall_neighbours(walls)
+        interior = walls[1:-1, 1:-1]
+        interior[wall_count > 4] = 1
+        interior[wall_count < 4] = 0
+        # If exactly 4, keep current state
 
-                # Cellular automata rules (4-5 rule)
-                if wall_count > 4:
-                    new_tiles[(x, y)] = 'wall'
-                elif wall_count < 4:
-                    new_tiles[(x, y)] = 'cave'
-                # If exactly 4, keep current state
+    # Smooth pass - remove single isolated tiles
+    wall_count = count_wall_neighbours(walls)
+    interior = walls[1:-1, 1:-1]
+    isolated_walls = (interior == 1) & (wall_count < 3)
+    enclosed_caves = (interior == 0) & (wall_count > 6)
+    interior[isolated_walls] = 0
+    interior[enclosed_caves] = 1
 
-        tiles = new_tiles
+    # Convert wall flags to terrain codes
+    return TerrainGrid.from_array(np.where(walls == 1, BaseTerrain.WALL, BaseTerrain.CAVE))
 
-    # Smooth pass - remove single isolated tiles
-    for y in range(1, height - 1):
-        for x in range(1, width - 1):
-            wall_count = count_walls_around(tiles, x, y, width, height)
-            if tiles[(x, y)] == 'wall' and wall_count < 3:
-                tiles[(x, y)] = 'cave'
-            elif tiles[(x, y)] == 'cave' and wall_count > 6:
-                tiles[(x, y)] = 'wall'
 
-    # Convert to list format
-    result = []
-    for (x, y), terrain in tiles.items():
-        result.append((x, y, terrain))
+def count_wall_neighbours(walls: np.ndarray) -> np.ndarray:
+    """
+    Count walls in the 8-neighbourhood of every interior cell.
 
-    return result
+    Takes a (height, width) uint8 array of 1 = wall / 0 = open and returns a
+    (height - 2, width - 2) array of counts, built from eight shifted slices
+    of the grid instead of per-cell lookups.
+    """
+    height, width = walls.shape
+    counts = np.zeros((height - 2, width - 2), dtype=np.uint8)
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            if dx == 0 and dy == 0:
+                continue
+            counts += walls[1 + dy:height - 1 + dy, 1 + dx:width - 1 + dx]
+    return counts
 
 
 def count_walls_around(tiles: Dict, x: int, y: int, width: int, height: int, radius: int = 1) -> int:
@@ -278,10 +318,10 @@ def count_walls_around(tiles: Dict, x: int, y: int, width: int, height: int, rad
     return count
 
 
-def generate_random_walk_map(width: int, height: int, seed: str = None, params: dict = None) -> List[Tuple[int, int, str]]:
+def generate_random_walk_map(width: int, height: int, seed: str = None, params: dict = None) -> TerrainGrid:
     """
     Generate a map using random walk algorithm (creates winding paths).
-    Returns a list of (x, y, terrain_type) tuples.
+    Returns a TerrainGrid (iterates as (x, y, terrain_type) tuples).
 
     Parameters:
         width: Map width
@@ -291,8 +331,7 @@ def generate_random_walk_map(width: int, height: int, seed: str = None, params:
             - steps: Number of walk steps (default: width * height // 2)
             - tunnel_width_probability: Chance to make wider tunnels 0-1 (default: 0.3)
     """
-    if seed:
-        random.seed(hash(seed))
+    rng = seeded_random(seed)
 
     # Parse parameters
     if params is None:
@@ -301,20 +340,18 @@ def generate_random_walk_map(width: int, height: int, seed: str = None, params:
     tunnel_width_probability = params.get('tunnel_width_probability', 0.3)
 
     # Initialize all tiles as walls
-    tiles = {}
-    for y in range(height):
-        for x in range(width):
-            tiles[(x, y)] = 'wall'
+    grid = TerrainGrid(width, height, BaseTerrain.WALL)
+    cells = grid.cells
 
     # Start from center
     current_x = width // 2
     current_y = height // 2
-    tiles[(current_x, current_y)] = 'tunnel'
+    cells[current_y, current_x] = BaseTerrain.TUNNEL
 
     # Random walk
     directions = [(0, -1), (1, 0), (0, 1), (-1, 0)]  # up, right, down, left
     for _ in range(steps):
-        dx, dy = random.choice(directions)
+        dx, dy = rng.choice(directions)
         new_x = current_x + dx
         new_y = current_y + dy
 
@@ -322,28 +359,23 @@ def generate_random_walk_map(width: int, height: int, seed: str = None, params:
         if 1 <= new_x < width - 1 and 1 <= new_y < height - 1:
             current_x = new_x
             current_y = new_y
-            tiles[(current_x, current_y)] = 'tunnel'
+            cells[current_y, current_x] = BaseTerrain.TUNNEL
 
             # Sometimes create wider paths
-            if random.random() < tunnel_width_probability:
+            if rng.random() < tunnel_width_probability:
                 for dx2, dy2 in directions:
                     adj_x = current_x + dx2
                     adj_y = current_y + dy2
                     if 1 <= adj_x < width - 1 and 1 <= adj_y < height - 1:
-                        tiles[(adj_x, adj_y)] = 'tunnel'
-
-    # Convert to list format
-    result = []
-    for (x, y), terrain in tiles.items():
-        result.append((x, y, terrain))
+                        cells[adj_y, adj_x] = BaseTerrain.TUNNEL
 
-    return result
+    return grid
 
 
-def generate_maze_map(width: int, height: int, seed: str = None, params: dict = None) -> List[Tuple[int, int, str]]:
+def generate_maze_map(width: int, height: int, seed: str = None, params: dict = None) -> TerrainGrid:
     """
     Generate a maze using recursive backtracking.
-    Returns a list of (x, y, terrain_type) tuples.
+    Returns a TerrainGrid (iterates as (x, y, terrain_type) tuples).
 
     Parameters:
         width: Map width
@@ -352,8 +384,7 @@ def generate_maze_map(width: int, height: int, seed: str = None, params: dict =
         params: Dictionary with optional parameters:
             - path_width: Width of maze paths (default: 1)
     """
-    if seed:
-        random.seed(hash(seed))
+    rng = seeded_random(seed)
 
     # Parse parameters
     if params is None:
@@ -361,17 +392,14 @@ def generate_maze_map(width: int, height: int, seed: str = None, params: dict =
     path_width = params.get('path_width', 1)
 
     # Initialize all tiles as walls
-    tiles = {}
-    for y in range(height):
-        for x in range(width):
-            tiles[(x, y)] = 'wall'
+    grid = TerrainGrid(width, height, BaseTerrain.WALL)
 
     # Create maze using recursive backtracking
     # Start from (1, 1) and ensure odd dimensions for proper maze
     start_x, start_y = 1, 1
     stack = [(start_x, start_y)]
     visited = {(start_x, start_y)}
-    tiles[(start_x, start_y)] = 'floor'
+    grid.set(start_x, start_y, BaseTerrain.FLOOR)
 
     directions = [(0, -2), (2, 0), (0, 2), (-2, 0)]  # up, right, down, left (step by 2)
 
@@ -387,24 +415,13 @@ def generate_maze_map(width: int, height: int, seed: str = None, params: dict =
 
         if neighbors:
             # Choose random unvisited neighbor
-            nx, ny, dx, dy = random.choice(neighbors)
-
-            # Carve path to neighbor with configurable width
-            for w in range(path_width):
-                # Carve current cell and path
-                if 0 <= current_x + w < width and 0 <= current_y + w < height:
-                    tiles[(current_x + w, current_y)] = 'floor'
-                    tiles[(current_x, current_y + w)] = 'floor'
-                # Carve connecting cell
-                if 0 <= current_x + dx // 2 + w < width and 0 <= current_y + dy // 2 < height:
-                    tiles[(current_x + dx // 2 + w, current_y + dy // 2)] = 'floor'
-                if 0 <= current_x + dx // 2 < width and 0 <= current_y + dy // 2 + w < height:
-                    tiles[(current_x + dx // 2, current_y + dy // 2 + w)] = 'floor'
-                # Carve neighbor cell
-                if 0 <= nx + w < width and 0 <= ny < height:
-                    tiles[(nx + w, ny)] = 'floor'
-                if 0 <= nx < width and 0 <= ny + w < height:
-                    tiles[(nx, ny + w)] = 'floor'
+            nx, ny, dx, dy = rng.choice(neighbors)
+            mid_x, mid_y = current_x + dx // 2, current_y + dy // 2
+
+            # Carve current cell, connecting cell and neighbor cell with configurable width
+            for cell_x, cell_y in ((current_x, current_y), (mid_x, mid_y), (nx, ny)):
+                grid.hline(cell_x, cell_x + path_width - 1, cell_y, BaseTerrain.FLOOR)
+                grid.vline(cell_x, cell_y, cell_y + path_width - 1, BaseTerrain.FLOOR)
 
             visited.add((nx, ny))
             stack.append((nx, ny))
@@ -412,9 +429,61 @@ def generate_maze_map(width: int, height: int, seed: str = None, params: dict =
             # Backtrack
             stack.pop()
 
-    # Convert to list format
-    result = []
-    for (x, y), terrain in tiles.items():
-        result.append((x, y, terrain))
+    return grid
+
+
+def generate_random_tiles(width, height, seed, config):
+    """Generate random tiles (original algorithm)"""
+    rng = seeded_random(seed)
+
+    rolls = np.random.default_rng(rng.getrandbits(64)).random((height, width))
+    secondary = BaseTerrain.SECONDARY if 'secondary' in config else BaseTerrain.FLOOR
+
+    cells = np.full((height, width), BaseTerrain.FLOOR, dtype=np.uint8)  # 65% primary terrain
+    cells[rolls < 0.35] = secondary  # 20% secondary terrain
+    cells[rolls < 0.15] = BaseTerrain.WALL  # 15% obstacles
+
+    return TerrainGrid.from_array(cells)
+
+
+GENERATION_ALGORITHMS = {
+    'bsp': generate_bsp_map,
+    'cellular_automata': generate_cellular_automata_map,
+    'random_walk': generate_random_walk_map,
+    'maze': generate_maze_map,
+}
+
+
+def run_generation_algorithm(width, height, map_type, seed, algorithm='random', params=None):
+    """
+    Run the selected generation algorithm.
+
+    With params['connect_regions'] set, passable pockets cut off from the
+    largest region are tunnelled into it afterwards (see
+    regions.connect_regions).
+
+    Returns:
+        TerrainGrid of base terrain codes
+    """
+    if params is None:
+        params = {}
 
-    return result
+    generator = GENERATION_ALGORITHMS.get(algorithm)
+    if generator is not None:
+        grid = generator(width, height, seed, params)
+    else:
+        # Random/default algorithm
+        grid = generate_random_tiles(width, height, seed, get_terrain_config(map_type))
+
+    if params.get('connect_regions'):
+        connect_regions(grid, terrain_lookup_table(get_terrain_config(map_type)))
+    return grid
+
+
+def cover_candidate_tiles(grid, config):
+    """Collect walkable floor tiles for cover placement as (x, y, base_terrain) tuples"""
+    candidates = [
+        name for name in ('floor', 'cave', 'tunnel')
+        if config.get(name, config['floor'])['walkable']
+    ]
+    return list(grid.positions(candidates))
@@ -0,0 +1,549 @@
+"""
+Packed grid storage for map tiles.
+
+Maps using the 'packed' tile storage mode keep the base terrain,
+walkability, transparency, movement cost and colour of every cell in one
+encoded byte array on Map.grid_data. MapTile rows only exist for cells
+that carry notes or custom properties.
+
+Everything that reads or writes map tiles goes through the accessors in
+this module (load_grid, map_tiles, update_tiles, write_tile_data), which
+handle the packed mode, the legacy one-row-per-tile mode and, via
+maps.sectors, sectored large maps.
+
+Encoded layout (little-endian):
+    header   magic 'SRGD', version, compression, width, height, palette size
+    palette  JSON list of hex colours (UTF-8), length-prefixed
+    payload  terrain codes | flags | movement costs | colour indices (uint16),
+             each layer width * height entries, optionally zlib or RLE compressed
+"""
+import json
+import struct
+import zlib
+from collections import namedtuple
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F
+
+from .models import Map, MapTile
+from .pathfinding import TERRAIN_COSTS, NavigationGrid
+from .tile_writer import bulk_create_tiles, default_tile_data, replace_map_tiles
+
+MAGIC = b'SRGD'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sBBHHHI')
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_RLE = 2
+COMPRESSION_CODES = {
+    'none': COMPRESSION_NONE,
+    'zlib': COMPRESSION_ZLIB,
+    'rle': COMPRESSION_RLE,
+}
+
+FLAG_WALKABLE = 0x01
+FLAG_TRANSPARENT = 0x02
+
+# Terrain types in MapTile.TERRAIN_CHOICES order; the index is the stored code
+TERRAIN_TYPES = tuple(choice[0] for choice in MapTile.TERRAIN_CHOICES)
+TERRAIN_TYPE_CODES = {terrain: code for code, terrain in enumerate(TERRAIN_TYPES)}
+
+# Terrain rules applied when a tile is painted
+NON_WALKABLE_TERRAIN = {'wall', 'building', 'water', 'mountain', 'void'}
+NON_TRANSPARENT_TERRAIN = {'wall', 'building', 'door', 'forest'}
+
+DEFAULT_COLOR = '#CCCCCC'
+
+# Read-only view of a single tile; mirrors the MapTile attributes templates use
+GridTile = namedtuple('GridTile', [
+    'x', 'y', 'terrain_type', 'color', 'is_walkable', 'is_transparent',
+    'movement_cost', 'notes', 'custom_properties',
+])
+
+
+class GridFormatError(ValueError):
+    """Raised when packed grid data cannot be decoded"""
+
+
+class GridTooLargeError(ValueError):
+    """Raised when a read would assemble too much of a sectored map at once"""
+
+
+def terrain_properties(terrain_type: str) -> Dict:
+    """Walkability, transparency and movement cost implied by a terrain type"""
+    terrain_cost = TERRAIN_COSTS.get(terrain_type)
+    return {
+        'is_walkable': terrain_type not in NON_WALKABLE_TERRAIN,
+        'is_transparent': terrain_type not in NON_TRANSPARENT_TERRAIN,
+        'movement_cost': terrain_cost if terrain_cost is not None else 1,
+    }
+
+
+def rle_encode(data: bytes) -> bytes:
+    """Run-length encode bytes as (count, value) pairs with counts up to 255"""
+    values = np.frombuffer(data, dtype=np.uint8)
+    if values.size == 0:
+        return b''
+
+    starts = np.concatenate(([0], np.flatnonzero(values[1:] != values[:-1]) + 1))
+    lengths = np.diff(np.append(starts, values.size))
+
+    # Split runs longer than 255 into several pairs
+    pieces = (lengths + 254) // 255
+    counts = np.full(int(pieces.sum()), 255, dtype=np.uint8)
+    counts[np.cumsum(pieces) - 1] = lengths - 255 * (pieces - 1)
+
+    encoded = np.empty(counts.size * 2, dtype=np.uint8)
+    encoded[0::2] = counts
+    encoded[1::2] = np.repeat(values[starts], pieces)
+    return encoded.tobytes()
+
+
+def rle_decode(data: bytes) -> bytes:
+    """Reverse rle_encode"""
+    if len(data) % 2:
+        raise GridFormatError('Truncated run-length data')
+    pairs = np.frombuffer(data, dtype=np.uint8).reshape(-1, 2)
+    return np.repeat(pairs[:, 1], pairs[:, 0]).tobytes()
+
+
+class MapGrid:
+    """
+    In-memory tile layers for a whole map.
+
+    Layers are (height, width) arrays: terrain codes (index into
+    TERRAIN_TYPES), walkable/transparent booleans, movement costs and
+    colour indices into `palette`.
+    """
+
+    def __init__(self, width: int, height: int, terrain: np.ndarray, walkable: np.ndarray,
+                 transparent: np.ndarray, movement_cost: np.ndarray, colors: np.ndarray,
+                 palette: List[str]):
+        self.width = width
+        self.height = height
+        self.terrain = terrain
+        self.walkable = walkable
+        self.transparent = transparent
+        self.movement_cost = movement_cost
+        self.colors = colors
+        self.palette = palette
+        self._palette_index = {color: index for index, color in enumerate(palette)}
+
+    @classmethod
+    def blank(cls, width: int, height: int, terrain_type: str = 'floor', color: str = DEFAULT_COLOR,
+              is_walkable: bool = True, is_transparent: bool = True, movement_cost: int = 1) -> 'MapGrid':
+        """A grid with every cell set to the same tile settings"""
+        shape = (height, width)
+        return cls(
+            width, height,
+            terrain=np.full(shape, TERRAIN_TYPE_CODES[terrain_type], dtype=np.uint8),
+            walkable=np.full(shape, is_walkable, dtype=bool),
+            transparent=np.full(shape, is_transparent, dtype=bool),
+            movement_cost=np.full(shape, movement_cost, dtype=np.uint8),
+            colors=np.zeros(shape, dtype=np.uint16),
+            palette=[color],
+        )
+
+    @classmethod
+    def from_tile_data(cls, width: int, height: int, tile_data: Iterable) -> 'MapGrid':
+        """Build a grid from tile dictionaries or MapTile-like objects"""
+        grid = cls.blank(width, height)
+        for tile in tile_data:
+            if not isinstance(tile, dict):
+                tile = {field: getattr(tile, field) for field in GridTile._fields if hasattr(tile, field)}
+            grid.set_tile(
+                tile['x'], tile['y'],
+                terrain_type=tile['terrain_type'],
+                color=tile.get('color', DEFAULT_COLOR),
+                is_walkable=tile.get('is_walkable', True),
+                is_transparent=tile.get('is_transparent', True),
+                movement_cost=tile.get('movement_cost', 1),
+            )
+        return grid
+
+    @classmethod
+    def from_terrain_grid(cls, terrain_grid, table: List[Dict]) -> 'MapGrid':
+        """
+        Build a grid from a generator TerrainGrid in one pass per layer.
+
+        `table` is indexed by base terrain code and holds the map type's
+        terrain settings ({'type', 'color', 'walkable', 'transparent'}).
+        """
+        palette = []
+        for info in table:
+            if info['color'] not in palette:
+                palette.append(info['color'])
+
+        return cls(
+            terrain_grid.width, terrain_grid.height,
+            terrain=terrain_grid.translate(np.array([TERRAIN_TYPE_CODES[info['type']] for info in table], dtype=np.uint8)),
+            walkable=terrain_grid.translate(np.array([info['walkable'] for info in table], dtype=bool)),
+            transparent=terrain_grid.translate(np.array([info['transparent'] for info in table], dtype=bool)),
+            movement_cost=np.ones((terrain_grid.height, terrain_grid.width), dtype=np.uint8),
+            colors=terrain_grid.translate(np.array([palette.index(info['color']) for info in table], dtype=np.uint16)),
+            palette=palette,
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'MapGrid':
+        """Decode packed grid data"""
+        data = bytes(data)
+        if len(data) < HEADER.size:
+            raise GridFormatError('Packed grid data is too short')
+
+        magic, version, compression, width, height, palette_size, palette_length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise GridFormatError('Unrecognized packed grid format')
+
+        offset = HEADER.size
+        palette = json.loads(data[offset:offset + palette_length].decode('utf-8'))
+        if len(palette) != palette_size:
+            raise GridFormatError('Packed grid palette is corrupt')
+        payload = data[offset + palette_length:]
+
+        if compression == COMPRESSION_ZLIB:
+            payload = zlib.decompress(payload)
+        elif compression == COMPRESSION_RLE:
+            payload = rle_decode(payload)
+        elif compression != COMPRESSION_NONE:
+            raise GridFormatError(f'Unknown compression code {compression}')
+
+        cells = width * height
+        if len(payload) != cells * 5:
+            raise GridFormatError('Packed grid payload has the wrong size')
+
+        shape = (height, width)
+        layers = np.frombuffer(payload, dtype=np.uint8, count=cells * 3).reshape(3, height, width)
+        flags = layers[1]
+        return cls(
+            width, height,
+            terrain=layers[0].copy(),
+            walkable=(flags & FLAG_WALKABLE).astype(bool),
+            transparent=(flags & FLAG_TRANSPARENT).astype(bool),
+            movement_cost=layers[2].copy(),
+            colors=np.frombuffer(payload, dtype='<u2', offset=cells * 3).reshape(shape).astype(np.uint16),
+            palette=palette,
+        )
+
+    def to_bytes(self, compression: str = 'zlib') -> bytes:
+        """Encode the grid; compression is 'zlib', 'rle' or 'none'"""
+        compression_code = COMPRESSION_CODES[compression]
+        flags = (self.walkable * FLAG_WALKABLE) | (self.transparent * FLAG_TRANSPARENT)
+        payload = b''.join([
+            self.terrain.astype(np.uint8).tobytes(),
+            flags.astype(np.uint8).tobytes(),
+            self.movement_cost.astype(np.uint8).tobytes(),
+            self.colors.astype('<u2').tobytes(),
+        ])
+
+        if compression_code == COMPRESSION_ZLIB:
+            payload = zlib.compress(payload, 6)
+        elif compression_code == COMPRESSION_RLE:
+            payload = rle_encode(payload)
+
+        palette = json.dumps(self.palette, separators=(',', ':')).encode('utf-8')
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, compression_code,
+                             self.width, self.height, len(self.palette), len(palette))
+        return header + palette + payload
+
+    def region(self, x: int, y: int, width: int, height: int) -> 'MapGrid':
+        """Copy a rectangular part of the grid (clipped to the grid bounds)"""
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, self.width), min(y + height, self.height)
+        window = (slice(y0, y1), slice(x0, x1))
+        return MapGrid(
+            x1 - x0, y1 - y0,
+            terrain=self.terrain[window].copy(),
+            walkable=self.walkable[window].copy(),
+            transparent=self.transparent[window].copy(),
+            movement_cost=self.movement_cost[window].copy(),
+            colors=self.colors[window].copy(),
+            palette=list(self.palette),
+        )
+
+    def paste(self, other: 'MapGrid', x: int, y: int) -> None:
+        """Copy another grid into this one with its top-left corner at (x, y)"""
+        window = (slice(y, y + other.height), slice(x, x + other.width))
+        remap = np.array([self.color_index(color) for color in other.palette], dtype=np.uint16)
+        self.terrain[window] = other.terrain
+        self.walkable[window] = other.walkable
+        self.transparent[window] = other.transparent
+        self.movement_cost[window] = other.movement_cost
+        self.colors[window] = remap[other.colors]
+
+    def color_index(self, color: str) -> int:
+        """Palette index for a colour, adding it to the palette if needed"""
+        index = self._palette_index.get(color)
+        if index is None:
+            index = len(self.palette)
+            self.palette.append(color)
+            self._palette_index[color] = index
+        return index
+
+    def set_tile(self, x: int, y: int, terrain_type: str, color: Optional[str] = None,
+                 is_walkable: bool = True, is_transparent: bool = True, movement_cost: int = 1) -> None:
+        """Overwrite every layer for one cell (unknown terrain is stored as 'custom')"""
+        self.terrain[y, x] = TERRAIN_TYPE_CODES.get(terrain_type, TERRAIN_TYPE_CODES['custom'])
+        self.walkable[y, x] = is_walkable
+        self.transparent[y, x] = is_transparent
+        self.movement_cost[y, x] = min(max(int(movement_cost), 1), 255)
+        self.colors[y, x] = self.color_index(color or DEFAULT_COLOR)
+
+    def tile(self, x: int, y: int, notes: str = '', custom_properties: Optional[Dict] = None) -> GridTile:
+        """Read one cell as a GridTile"""
+        return GridTile(
+            x=x,
+            y=y,
+            terrain_type=TERRAIN_TYPES[self.terrain[y, x]],
+            color=self.palette[self.colors[y, x]],
+            is_walkable=bool(self.walkable[y, x]),
+            is_transparent=bool(self.transparent[y, x]),
+            movement_cost=int(self.movement_cost[y, x]),
+            notes=notes,
+            custom_properties=custom_properties if custom_properties is not None else {},
+        )
+
+    def iter_tiles(self, annotations: Optional[Dict] = None) -> Iterator[GridTile]:
+        """
+        Yield every cell in row-major order.
+
+        `annotations` maps (x, y) to a (notes, custom_properties) pair taken
+        from the sparse MapTile rows.
+        """
+        annotations = annotations or {}
+        terrain = self.terrain.tolist()
+        colors = self.colors.tolist()
+        walkable = self.walkable.tolist()
+        transparent = self.transparent.tolist()
+        costs = self.movement_cost.tolist()
+        palette = self.palette
+
+        for y in range(self.height):
+            for x in range(self.width):
+                notes, custom_properties = annotations.get((x, y), ('', {}))
+                yield GridTile(
+                    x, y, TERRAIN_TYPES[terrain[y][x]], palette[colors[y][x]],
+                    walkable[y][x], transparent[y][x], costs[y][x], notes, custom_properties,
+                )
+
+    def navigation_grid(self) -> NavigationGrid:
+        """Movement costs in the flat layout used by pathfinding.astar_grid"""
+        terrain_costs = np.array([TERRAIN_COSTS.get(name) or 0 for name in TERRAIN_TYPES], dtype=np.int32)
+        base = terrain_costs[self.terrain]
+        costs = np.where(self.walkable & (base > 0), np.maximum(base, self.movement_cost), 0)
+        return NavigationGrid(
+            self.width, self.height, costs.ravel().tolist(), self.terrain.ravel().tolist(), TERRAIN_TYPES
+        )
+
+    def tiles_dict(self) -> Dict:
+        """Tile lookup in the format expected by pathfinding.astar"""
+        terrain = self.terrain.tolist()
+        walkable = self.walkable.tolist()
+        costs = self.movement_cost.tolist()
+        return {
+            (x, y): {
+                'is_walkable': walkable[y][x],
+                'terrain_type': TERRAIN_TYPES[terrain[y][x]],
+                'movement_cost': costs[y][x],
+            }
+            for y in range(self.height)
+            for x in range(self.width)
+        }
+
+
+def _annotation_rows(map_obj: Map):
+    """Sparse MapTile rows that carry notes or custom properties"""
+    return MapTile.objects.filter(map=map_obj).exclude(notes='', custom_properties={})
+
+
+def load_grid(map_obj: Map) -> MapGrid:
+    """
+    Load the tile layers of a map, whichever storage mode it uses.
+
+    For sectored maps this assembles the stored sectors, with sectors
+    nobody has viewed yet as unloaded void, and raises GridTooLargeError
+    for maps over maps.sectors.MAX_READ_SECTORS sectors; prefer
+    maps.sectors.load_region for partial reads.
+    """
+    if map_obj.tile_storage == Map.TILE_STORAGE_SECTORED:
+        from .sectors import load_region
+        return load_region(map_obj, 0, 0, map_obj.width, map_obj.height, generate=False)
+
+    if map_obj.tile_storage == Map.TILE_STORAGE_PACKED:
+        if map_obj.grid_data:
+            return MapGrid.from_bytes(map_obj.grid_data)
+        return MapGrid.blank(map_obj.width, map_obj.height)
+
+    rows = MapTile.objects.filter(map=map_obj).values(
+        'x', 'y', 'terrain_type', 'color', 'is_walkable', 'is_transparent', 'movement_cost'
+    )
+    return MapGrid.from_tile_data(map_obj.width, map_obj.height, rows)
+
+
+def bump_revision(map_obj: Map) -> int:
+    """
+    Record a terrain change, invalidating caches keyed by Map.revision.
+
+    The increment happens in the database so concurrent writers never
+    reuse a revision; map_obj.revision is refreshed to the new value.
+    """
+    Map.objects.filter(pk=map_obj.pk).update(revision=F('revision') + 1)
+    map_obj.revision = Map.objects.values_list('revision', flat=True).get(pk=map_obj.pk)
+    return map_obj.revision
+
+
+def save_grid(map_obj: Map, grid: MapGrid, compression: str = 'zlib') -> None:
+    """Store a grid on the map and switch it to packed storage"""
+    map_obj.tile_storage = Map.TILE_STORAGE_PACKED
+    map_obj.grid_data = grid.to_bytes(compression)
+    map_obj.save(update_fields=['tile_storage', 'grid_data', 'updated_at'])
+    bump_revision(map_obj)
+
+
+def map_tiles(map_obj: Map) -> List:
+    """All tiles of a map in row-major order, for display"""
+    if map_obj.tile_storage == Map.TILE_STORAGE_ROWS:
+        return list(map_obj.tiles.all())
+
+    annotations = {
+        (tile.x, tile.y): (tile.notes, tile.custom_properties)
+        for tile in _annotation_rows(map_obj)
+    }
+    return list(load_grid(map_obj).iter_tiles(annotations))
+
+
+def initialize_tiles(map_obj: Map, terrain_type: str = 'floor', color: str = DEFAULT_COLOR,
+                     is_walkable: bool = True, is_transparent: bool = True) -> None:
+    """Fill a new map with identical tiles (sectored maps fill sectors as they are viewed)"""
+    if map_obj.tile_storage == Map.TILE_STORAGE_SECTORED:
+        return
+    if map_obj.tile_storage == Map.TILE_STORAGE_PACKED:
+        save_grid(map_obj, MapGrid.blank(
+            map_obj.width, map_obj.height, terrain_type=terrain_type, color=color,
+            is_walkable=is_walkable, is_transparent=is_transparent,
+        ))
+    else:
+        bulk_create_tiles(map_obj, default_tile_data(
+            map_obj.width, map_obj.height, terrain_type=terrain_type, color=color,
+            is_walkable=is_walkable, is_transparent=is_transparent,
+        ))
+
+
+def write_tile_data(map_obj: Map, tile_data: Iterable[Dict]) -> None:
+    """Replace every tile of a map with the given tile dictionaries"""
+    if map_obj.tile_storage == Map.TILE_STORAGE_SECTORED:
+        from .sectors import replace_sectors
+        replace_sectors(map_obj, MapGrid.from_tile_data(map_obj.width, map_obj.height, tile_data))
+    elif map_obj.tile_storage == Map.TILE_STORAGE_PACKED:
+        with transaction.atomic():
+            save_grid(map_obj, MapGrid.from_tile_data(map_obj.width, map_obj.height, tile_data))
+            _annotation_rows(map_obj).delete()
+    else:
+        replace_map_tiles(map_obj, tile_data)
+        bump_revision(map_obj)
+
+
+def write_terrain_grid(map_obj: Map, terrain_grid, table: List[Dict]) -> None:
+    """Replace every tile of a map with a generator TerrainGrid"""
+    if map_obj.tile_storage == Map.TILE_STORAGE_SECTORED:
+        from .sectors import replace_sectors
+        replace_sectors(map_obj, MapGrid.from_terrain_grid(terrain_grid, table))
+    elif map_obj.tile_storage == Map.TILE_STORAGE_PACKED:
+        with transaction.atomic():
+            save_grid(map_obj, MapGrid.from_terrain_grid(terrain_grid, table))
+            _annotation_rows(map_obj).delete()
+    else:
+        grid = MapGrid.from_terrain_grid(terrain_grid, table)
+        replace_map_tiles(map_obj, (tile._asdict() for tile in grid.iter_tiles()))
+        bump_revision(map_obj)
+
+
+def update_tiles(map_obj: Map, tiles: Iterable[Dict]) -> List[Dict]:
+    """
+    Paint tiles on a map, applying the terrain rules for walkability,
+    transparency and movement cost.
+
+    Each update is a dict with x, y, terrain_type and color. Updates with
+    missing or out-of-range coordinates or unknown terrain are skipped.
+
+    Returns:
+        List of saved tile dictionaries
+    """
+    updates = []
+    for tile_data in tiles:
+        x = tile_data.get('x')
+        y = tile_data.get('y')
+        terrain_type = tile_data.get('terrain_type')
+
+        if x is None or y is None or terrain_type not in TERRAIN_TYPE_CODES:
+            continue
+        if x < 0 or x >= map_obj.width or y < 0 or y >= map_obj.height:
+            continue
+
+        updates.append({
+            'x': x,
+            'y': y,
+            'terrain_type': terrain_type,
+            'color': tile_data.get('color') or DEFAULT_COLOR,
+            **terrain_properties(terrain_type),
+        })
+
+    if not updates:
+        return []
+
+    with transaction.atomic():
+        # Lock the map row so concurrent painters don't overwrite each other
+        # and each write moves the revision on by exactly one
+        locked = Map.objects.select_for_update().get(pk=map_obj.pk)
+        previous_revision = locked.revision
+        if map_obj.tile_storage == Map.TILE_STORAGE_SECTORED:
+            from .sectors import update_sector_tiles
+            update_sector_tiles(locked, updates)
+            # Creating the touched sectors bumps the revision by itself, and
+            # grids cached before that lack their terrain, so don't patch them
+            previous_revision = locked.revision
+            bump_revision(locked)
+        elif map_obj.tile_storage == Map.TILE_STORAGE_PACKED:
+            grid = load_grid(locked)
+            for update in updates:
+                grid.set_tile(**update)
+            save_grid(locked, grid)
+            map_obj.grid_data = locked.grid_data
+        else:
+            for update in updates:
+                MapTile.objects.update_or_create(
+                    map=map_obj, x=update['x'], y=update['y'],
+                    defaults={key: value for key, value in update.items() if key not in ('x', 'y')}
+                )
+            bump_revision(locked)
+        map_obj.revision = locked.revision
+
+    from .navigation import navigation_cache
+    from .visibility import opacity_cache
+    navigation_cache.patch(map_obj.pk, previous_revision, map_obj.revision, updates)
+    opacity_cache.patch(map_obj.pk, previous_revision, map_obj.revision, updates)
+
+    return [
+        {key: update[key] for key in ('x', 'y', 'terrain_type', 'color', 'is_walkable', 'is_transparent')}
+        for update in updates
+    ]
+
+
+def pack_map(map_obj: Map, compression: str = 'zlib') -> None:
+    """
+    Convert a one-row-per-tile map to packed storage.
+
+    Rows without notes or custom properties are deleted; annotated rows are
+    kept so their notes survive.
+    """
+    if map_obj.tile_storage != Map.TILE_STORAGE_ROWS:
+        return
+
+    with transaction.atomic():
+        grid = load_grid(map_obj)
+        save_grid(map_obj, grid, compression)
+        MapTile.objects.filter(map=map_obj, notes='', custom_properties={}).delete()
+
@@ -0,0 +1,609 @@
+"""
+Hierarchical pathfinding (HPA*) over a map cut into square clusters.
+
+Wherever two neighbouring clusters touch along a run of passable tiles,
+the run gets one or two transitions (a pair of tiles, one on each side);
+diagonal-only crossings get their own transitions so no connection is
+lost. Transition tiles are the nodes of an abstract graph whose edges are
+the step across the border and the cheapest in-cluster route between two
+nodes of one cluster.
+
+A ClusterHierarchy keeps each cluster's movement costs in compact form
+and is updated cluster by cluster (ClusterHierarchy.updated), so it can
+stand in for maps that are never loaded whole: maps.sector_hierarchy
+keeps one per sectored map, with one cluster per stored sector. Clusters
+it was never given are blocked. In-cluster costs between a cluster's
+nodes are computed the first time a search reaches the cluster, so a
+query pays only for the clusters near its route.
+
+A query links its start and goal into their clusters, searches the
+abstract graph, refines every in-cluster hop with find_path on that
+cluster alone and cuts the detours through transitions with
+straight-line shortcuts (smooth_path). Paths are near-optimal rather
+than optimal (see the hpa figures of the benchmark_pathfinding command),
+which suits drag-to-move previews; exact searches keep using find_path.
+
+On maps that fit in memory find_path is as fast or faster, so the
+endpoints only use the hierarchy for previews on sectored maps whose
+start/goal box is too large to read (see maps.path_cache).
+hierarchical_path answers queries on an in-memory NavigationGrid with the
+same machinery, for the benchmarks and tests.
+"""
+import heapq
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .pathfinding import (
+    COST_DIAGONAL,
+    COST_STRAIGHT,
+    NavigationGrid,
+    Point,
+    find_path,
+    path_result,
+    search_buffers,
+    unreachable_result,
+)
+
+# Cluster side, in tiles, for in-memory grids
+CLUSTER_SIZE = 16
+
+# Border runs longer than this get a transition at each end instead of one in the middle
+ENTRANCE_SPLIT = 6
+
+# Furthest along the path, in steps, a smoothing shortcut may reach
+SHORTCUT_REACH = 2 * CLUSTER_SIZE
+
+# (column, row) of a cluster
+ClusterKey = Tuple[int, int]
+
+# (node, node, cost of stepping to the second, cost of stepping back) across a border
+Transition = Tuple[int, int, int, int]
+
+
+class Cluster:
+    """
+    Movement costs and terrain of one cluster, in compact form.
+
+    Attributes:
+        left, top: Map coordinates of the cluster's first tile
+        costs: Row-major cost multipliers (tile_step_cost)
+        terrain: Row-major terrain codes, indices into `terrain_names`
+    """
+
+    __slots__ = ('left', 'top', 'width', 'height', 'costs', 'terrain', 'terrain_names')
+
+    def __init__(self, left: int, top: int, grid: NavigationGrid):
+        self.left, self.top = left, top
+        self.width, self.height = grid.width, grid.height
+        self.costs = array('i', grid.costs)
+        self.terrain = array('H', grid.terrain) if grid.terrain is not None else None
+        self.terrain_names = grid.terrain_names
+
+    def navigation_grid(self) -> NavigationGrid:
+        """The cluster on its own, with its first tile at (0, 0)"""
+        return NavigationGrid(self.width, self.height, self.costs, self.terrain, self.terrain_names)
+
+    def cost_at(self, point: Point) -> int:
+        return self.costs[(point[1] - self.top) * self.width + point[0] - self.left]
+
+    def terrain_at(self, point: Point) -> str:
+        if self.terrain is None:
+            return 'floor'
+        return self.terrain_names[self.terrain[(point[1] - self.top) * self.width + point[0] - self.left]]
+
+
+class ClusterHierarchy:
+    """
+    Abstract graph of cluster transitions for a map of width x height tiles.
+
+    Nodes are tiles, numbered y * width + x.
+
+    Attributes:
+        clusters: Cluster key -> Cluster, for every cluster whose tiles are known
+        transitions: (key, key) -> [Transition, ...] for neighbouring clusters, first node in the first cluster
+        nodes: Cluster key -> sorted transition nodes inside it
+        inter: Node -> [(node, cost), ...] steps across a cluster border
+        intra: Cluster key -> {node: [(node, cost), ...]} cheapest in-cluster costs,
+            filled in as searches reach the cluster
+        rebuilt: Cluster keys whose tiles or nodes changed in the update that made this hierarchy
+    """
+
+    def __init__(self, width: int, height: int, cluster_size: int = CLUSTER_SIZE):
+        self.width = width
+        self.height = height
+        self.cluster_size = cluster_size
+        self.columns = -(-width // cluster_size)
+        self.rows = -(-height // cluster_size)
+        self.clusters: Dict[ClusterKey, Cluster] = {}
+        self.transitions: Dict[Tuple[ClusterKey, ClusterKey], List[Transition]] = {}
+        self.nodes: Dict[ClusterKey, List[int]] = {}
+        self.inter: Dict[int, List[Tuple[int, int]]] = {}
+        self.intra: Dict[ClusterKey, Dict[int, List[Tuple[int, int]]]] = {}
+        self.rebuilt: Set[ClusterKey] = set()
+
+    def updated(self, grids: Dict[ClusterKey, Optional[NavigationGrid]]) -> 'ClusterHierarchy':
+        """
+        Copy of the hierarchy with some clusters' tiles replaced.
+
+        `grids` maps cluster keys to the cluster's tiles as a NavigationGrid
+        of its own (None forgets the cluster, which blocks it). Only the
+        borders around those clusters are scanned again, and in-cluster
+        costs are dropped only for them and for neighbours whose
+        transition tiles changed. The hierarchy itself is left untouched
+        so searches already running on it are not disturbed.
+        """
+        hierarchy = ClusterHierarchy(self.width, self.height, self.cluster_size)
+        hierarchy.clusters = dict(self.clusters)
+        for key, grid in grids.items():
+            if grid is None:
+                hierarchy.clusters.pop(key, None)
+            else:
+                left, top, _, _ = self.bounds(key)
+                hierarchy.clusters[key] = Cluster(left, top, grid)
+
+        # Corner crossings also depend on the two clusters beside them
+        changed = set(grids)
+        around = changed | {other for key in changed for other in self._neighbours(key)}
+        hierarchy.transitions = dict(self.transitions)
+        pairs = {pair for key in around for pair in self._pairs(key)}
+        for pair in pairs:
+            transitions = hierarchy._find_transitions(*pair)
+            if transitions:
+                hierarchy.transitions[pair] = transitions
+            else:
+                hierarchy.transitions.pop(pair, None)
+
+        # Border step costs depend on the tiles on both sides, so every
+        # cluster next to a rescanned border is linked again
+        hierarchy.nodes = dict(self.nodes)
+        hierarchy.inter = dict(self.inter)
+        dirty = set(changed)
+        for key in {key for pair in pairs for key in pair}:
+            nodes = sorted({
+                transition[0 if key == pair[0] else 1]
+                for pair in self._pairs(key) for transition in hierarchy.transitions.get(pair, ())
+            })
+            old_nodes = self.nodes.get(key, [])
+            if nodes != old_nodes:
+                dirty.add(key)
+            for node in old_nodes:
+                hierarchy.inter.pop(node, None)
+            if nodes:
+                hierarchy.nodes[key] = nodes
+                hierarchy._link(key)
+            else:
+                hierarchy.nodes.pop(key, None)
+
+        hierarchy.intra = {key: edges for key, edges in self.intra.items() if key not in dirty}
+        hierarchy.rebuilt = dirty
+        return hierarchy
+
+    # Geometry
+
+    def cluster_of_point(self, point: Point) -> ClusterKey:
+        return point[0] // self.cluster_size, point[1] // self.cluster_size
+
+    def cluster_of(self, node: int) -> ClusterKey:
+        y, x = divmod(node, self.width)
+        return x // self.cluster_size, y // self.cluster_size
+
+    def bounds(self, key: ClusterKey) -> Tuple[int, int, int, int]:
+        """(left, top, width, height) of a cluster's tiles"""
+        left, top = key[0] * self.cluster_size, key[1] * self.cluster_size
+        return left, top, min(self.cluster_size, self.width - left), min(self.cluster_size, self.height - top)
+
+    def cost_at(self, point: Point) -> int:
+        """Cost multiplier of a tile, 0 for tiles of unknown clusters"""
+        cluster = self.clusters.get(self.cluster_of_point(point))
+        return cluster.cost_at(point) if cluster is not None else 0
+
+    def terrain_at(self, point: Point) -> str:
+        return self.clusters[self.cluster_of_point(point)].terrain_at(point)
+
+    def _neighbours(self, key: ClusterKey) -> List[ClusterKey]:
+        column, row = key
+        return [
+            (column + d_column, row + d_row)
+            for d_row in (-1, 0, 1) for d_column in (-1, 0, 1)
+            if (d_row or d_column) and 0 <= column + d_column < self.columns and 0 <= row + d_row < self.rows
+        ]
+
+    def _pairs(self, key: ClusterKey) -> List[Tuple[ClusterKey, ClusterKey]]:
+        """Every (cluster, neighbour) pair touching `key`, in row-major order"""
+        return [tuple(sorted((key, other), key=lambda k: (k[1], k[0]))) for other in self._neighbours(key)]
+
+    # Construction
+
+    def _find_transitions(self, first: ClusterKey, second: ClusterKey) -> List[Transition]:
+        """Transitions between two neighbouring clusters (`first` above or left of `second`)"""
+        if first not in self.clusters or second not in self.clusters:
+            return []
+        cost = self.cost_at
+        width = self.width
+        left, top, cluster_width, cluster_height = self.bounds(first)
+        right, bottom = left + cluster_width - 1, top + cluster_height - 1
+
+        if first[0] != second[0] and first[1] != second[1]:
+            # Clusters meeting at a corner: only a diagonal step crosses, and
+            # it needs its own transition when both tiles beside it are blocked
+            if second[0] > first[0]:
+                a, b, beside = (right, bottom), (right + 1, bottom + 1), [(right + 1, bottom), (right, bottom + 1)]
+            else:
+                a, b, beside = (left, bottom), (left - 1, bottom + 1), [(left - 1, bottom), (left, bottom + 1)]
+            if cost(a) and cost(b) and not any(cost(point) for point in beside):
+                return [(a[1] * width + a[0], b[1] * width + b[0],
+                         COST_DIAGONAL * cost(b), COST_DIAGONAL * cost(a))]
+            return []
+
+        if second[0] > first[0]:
+            # Vertical border: the first cluster's right-hand column
+            tiles = [((right, y), (right + 1, y)) for y in range(top, bottom + 1)]
+        else:
+            tiles = [((x, bottom), (x, bottom + 1)) for x in range(left, right + 1)]
+        first_costs = [cost(a) for a, _ in tiles]
+        second_costs = [cost(b) for _, b in tiles]
+        picks = []
+        for i, j in border_crossings(first_costs, second_costs):
+            a, b = tiles[i][0], tiles[j][1]
+            step = COST_STRAIGHT if i == j else COST_DIAGONAL
+            picks.append((a[1] * width + a[0], b[1] * width + b[0], step * second_costs[j], step * first_costs[i]))
+        return picks
+
+    def _link(self, key: ClusterKey) -> None:
+        """Border steps out of a cluster's nodes"""
+        links: Dict[int, List[Tuple[int, int]]] = {}
+        for pair in self._pairs(key):
+            for a, b, forward, backward in self.transitions.get(pair, ()):
+                if key == pair[0]:
+                    links.setdefault(a, []).append((b, forward))
+                else:
+                    links.setdefault(b, []).append((a, backward))
+        self.inter.update(links)
+
+    def _connect(self, key: ClusterKey) -> Dict[int, List[Tuple[int, int]]]:
+        """Cheapest in-cluster costs between every ordered pair of the cluster's nodes"""
+        cluster = self.clusters[key]
+        grid = cluster.navigation_grid()
+        local = {node: grid.to_padded(self._local(cluster, node)) for node in self.nodes.get(key, [])}
+        node_of = {index: node for node, index in local.items()}
+        edges = {}
+        for node, index in local.items():
+            reached = cluster_search(grid, index, (0, 0, grid.width, grid.height), set(node_of) - {index})
+            edges[node] = sorted((node_of[target], cost) for target, cost in reached.items())
+        self.intra[key] = edges
+        return edges
+
+    def _local(self, cluster: Cluster, node: int) -> Point:
+        y, x = divmod(node, self.width)
+        return x - cluster.left, y - cluster.top
+
+    def neighbours(self, node: int) -> List[Tuple[int, int]]:
+        key = self.cluster_of(node)
+        edges = self.intra.get(key)
+        if edges is None:
+            edges = self._connect(key)
+        return edges.get(node, []) + self.inter.get(node, [])
+
+
+def border_crossings(first: List[int], second: List[int]) -> List[Tuple[int, int]]:
+    """
+    Transitions across a straight border, as (i, j) positions along it.
+
+    `first` and `second` are the costs of the tiles on either side; i
+    indexes `first` and j `second`. Straight crossings have i == j,
+    diagonal-only ones (no open straight pair on either side) differ by one.
+    """
+    length = len(first)
+    open_pairs = [bool(a and b) for a, b in zip(first, second)]
+    crossings = []
+    i = 0
+    while i < length:
+        if not open_pairs[i]:
+            i += 1
+            continue
+        run_start = i
+        while i < length and open_pairs[i]:
+            i += 1
+        run_end = i - 1
+        if run_end - run_start + 1 > ENTRANCE_SPLIT:
+            crossings += [(run_start, run_start), (run_end, run_end)]
+        else:
+            middle = (run_start + run_end) // 2
+            crossings.append((middle, middle))
+
+    for i in range(length - 1):
+        if open_pairs[i] or open_pairs[i + 1]:
+            continue
+        if first[i] and second[i + 1]:
+            crossings.append((i, i + 1))
+        if first[i + 1] and second[i]:
+            crossings.append((i + 1, i))
+    return crossings
+
+
+def cluster_search(grid: NavigationGrid, source: int, bounds: Tuple[int, int, int, int],
+                   targets: Set[int], reverse: bool = False) -> Dict[int, int]:
+    """
+    Dijkstra from `source` that never leaves `bounds` (left, top, width, height).
+
+    Returns {target: cost} for the targets reached. With `reverse`, costs
+    are from each target to `source` instead.
+    """
+    left, top, width, height = bounds
+    right, bottom = left + width, top + height
+    cost = grid.padded
+    size = len(cost)
+    stride = grid.stride
+    steps = grid.steps(True)
+    buffers = search_buffers
+    stamp = buffers.begin(size)
+    g, seen, closed, heap = buffers.g, buffers.seen, buffers.closed, buffers.heap
+    heappush, heappop = heapq.heappush, heapq.heappop
+
+    g[source] = 0
+    seen[source] = stamp
+    heappush(heap, source)
+    found = {}
+    remaining = len(targets)
+
+    while heap and remaining:
+        current = heappop(heap) % size
+        if closed[current] == stamp:
+            continue
+        closed[current] = stamp
+        g_current = g[current]
+        if current in targets:
+            found[current] = g_current
+            remaining -= 1
+
+        entry = cost[current]
+        for offset, step in steps:
+            neighbor = current + offset
+            multiplier = cost[neighbor]
+            if not multiplier or closed[neighbor] == stamp:
+                continue
+            y, x = divmod(neighbor, stride)
+            if not (left < x <= right and top < y <= bottom):
+                continue
+            tentative = g_current + step * (entry if reverse else multiplier)
+            if seen[neighbor] != stamp or tentative < g[neighbor]:
+                seen[neighbor] = stamp
+                g[neighbor] = tentative
+                heappush(heap, tentative * size + neighbor)
+
+    return found
+
+
+def grid_clusters(grid: NavigationGrid, cluster_size: int = CLUSTER_SIZE) -> Dict[ClusterKey, NavigationGrid]:
+    """An in-memory grid cut into clusters, each a NavigationGrid of its own"""
+    clusters = {}
+    for top in range(0, grid.height, cluster_size):
+        for left in range(0, grid.width, cluster_size):
+            width, height = min(cluster_size, grid.width - left), min(cluster_size, grid.height - top)
+            rows = [slice((y * grid.width) + left, (y * grid.width) + left + width) for y in range(top, top + height)]
+            costs = [cost for row in rows for cost in grid.costs[row]]
+            terrain = [code for row in rows for code in grid.terrain[row]] if grid.terrain is not None else None
+            key = (left // cluster_size, top // cluster_size)
+            clusters[key] = NavigationGrid(width, height, costs, terrain, grid.terrain_names)
+    return clusters
+
+
+def cluster_hierarchy(grid: NavigationGrid, cluster_size: int = CLUSTER_SIZE) -> ClusterHierarchy:
+    """The hierarchy of an in-memory grid, built on first use and kept on the grid"""
+    hierarchy = grid.hierarchy
+    if hierarchy is None or hierarchy.cluster_size != cluster_size:
+        hierarchy = ClusterHierarchy(grid.width, grid.height, cluster_size).updated(grid_clusters(grid, cluster_size))
+        grid.hierarchy = hierarchy
+    return hierarchy
+
+
+def path_cost(grid, path: List[Point]) -> int:
+    """Scaled cost of walking a path of adjacent tiles (`grid` has cost_at)"""
+    total = 0
+    for previous, point in zip(path, path[1:]):
+        diagonal = previous[0] != point[0] and previous[1] != point[1]
+        total += (COST_DIAGONAL if diagonal else COST_STRAIGHT) * grid.cost_at(point)
+    return total
+
+
+def straight_line(a: Point, b: Point) -> List[Point]:
+    """Tiles nearest the straight line from a to b, one per step along the longer axis, both ends included"""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    steps = max(abs(dx), abs(dy))
+    if not steps:
+        return [a]
+    return [(a[0] + (2 * dx * t + steps) // (2 * steps), a[1] + (2 * dy * t + steps) // (2 * steps))
+            for t in range(steps + 1)]
+
+
+def smooth_path(grid, path: List[Point], reach: int = SHORTCUT_REACH) -> List[Point]:
+    """
+    Straighten a path of adjacent tiles (`grid` has cost_at).
+
+    From each anchor the path is replaced by a straight line to the
+    furthest later tile (up to `reach` steps on) that the line reaches
+    over passable tiles for no more than the path's cost, so the detours
+    through cluster transitions are cut off wherever the way is open.
+    """
+    cost_at = grid.cost_at
+
+    def step_cost(a, b):
+        return (COST_DIAGONAL if a[0] != b[0] and a[1] != b[1] else COST_STRAIGHT) * cost_at(b)
+
+    walked = [0]
+    for previous, point in zip(path, path[1:]):
+        walked.append(walked[-1] + step_cost(previous, point))
+
+    smoothed = [path[0]]
+    anchor, last = 0, len(path) - 1
+    while anchor < last:
+        best, shortcut = anchor + 1, [path[anchor], path[anchor + 1]]
+        for j in range(anchor + 2, min(anchor + reach, last) + 1):
+            line = straight_line(path[anchor], path[j])
+            total = 0
+            for previous, point in zip(line, line[1:]):
+                if not cost_at(point):
+                    break
+                total += step_cost(previous, point)
+            else:
+                if total <= walked[j] - walked[anchor]:
+                    best, shortcut = j, line
+                    continue
+            break
+        smoothed.extend(shortcut[1:])
+        anchor = best
+    return smoothed
+
+
+def hierarchy_path(hierarchy: ClusterHierarchy, start: Point, end: Point, stats: Optional[Dict] = None) -> Dict:
+    """
+    Near-optimal path through a cluster hierarchy, in find_path's result format.
+
+    Unreachable if the abstract graph has no route, which also covers
+    ends in clusters the hierarchy does not know. `stats`, if given,
+    receives 'algorithm' ('hpa') and 'expanded': abstract nodes plus tiles
+    expanded while linking and refining.
+    """
+    if stats is not None:
+        stats.update(algorithm='hpa', expanded=0)
+    if start == end:
+        return {'path': [start], 'total_cost': 0.0, 'reachable': True, 'terrain_breakdown': {}}
+    start_key, end_key = hierarchy.cluster_of_point(start), hierarchy.cluster_of_point(end)
+    if start_key not in hierarchy.clusters or not hierarchy.cost_at(end):
+        return unreachable_result()
+
+    width = hierarchy.width
+    source, target = start[1] * width + start[0], end[1] * width + end[0]
+    exits = _link_endpoint(hierarchy, start_key, source, target)
+    entries = _link_endpoint(hierarchy, end_key, target, source, reverse=True)
+    abstract, expanded = _abstract_search(hierarchy, source, target, exits, entries)
+    if not abstract:
+        if stats is not None:
+            stats['expanded'] = expanded
+        return unreachable_result()
+
+    # Tile paths for the in-cluster hops; border crossings are single steps
+    path = [start]
+    grids: Dict[ClusterKey, NavigationGrid] = {}
+    for previous, current in zip(abstract, abstract[1:]):
+        key = hierarchy.cluster_of(previous)
+        point = (current % width, current // width)
+        if key != hierarchy.cluster_of(current):
+            path.append(point)
+            continue
+        cluster = hierarchy.clusters[key]
+        if key not in grids:
+            grids[key] = cluster.navigation_grid()
+        segment_stats = {}
+        segment = find_path(grids[key], hierarchy._local(cluster, previous), hierarchy._local(cluster, current),
+                            stats=segment_stats)
+        expanded += segment_stats['expanded']
+        path.extend((x + cluster.left, y + cluster.top) for x, y in segment['path'][1:])
+
+    path = smooth_path(hierarchy, path)
+    if stats is not None:
+        stats['expanded'] = expanded
+    return path_result(hierarchy, path, path_cost(hierarchy, path))
+
+
+def _link_endpoint(hierarchy: ClusterHierarchy, key: ClusterKey, node: int, other: int,
+                   reverse: bool = False) -> Dict[int, int]:
+    """
+    In-cluster costs between an endpoint and its cluster's nodes (and the
+    other endpoint, if it is in the same cluster), by global node.
+    """
+    cluster = hierarchy.clusters.get(key)
+    if cluster is None:
+        return {}
+    grid = cluster.navigation_grid()
+    wanted = list(hierarchy.nodes.get(key, []))
+    if hierarchy.cluster_of(other) == key:
+        wanted.append(other)
+    local = {grid.to_padded(hierarchy._local(cluster, target)): target for target in wanted}
+    reached = cluster_search(grid, grid.to_padded(hierarchy._local(cluster, node)),
+                             (0, 0, grid.width, grid.height), set(local), reverse)
+    return {local[index]: cost for index, cost in reached.items()}
+
+
+def hierarchical_path(grid: NavigationGrid, start: Point, end: Point, stats: Optional[Dict] = None,
+                      cluster_size: int = CLUSTER_SIZE) -> Dict:
+    """
+    Near-optimal path on an in-memory grid through its cluster hierarchy.
+
+    Queries within one cluster of distance, or between tiles the grid's
+    region index knows are disconnected, are handed to find_path. If the
+    abstract graph has no route, find_path decides, so a path is never
+    missed.
+    """
+    if (start == end or not (grid.contains(start) and grid.contains(end)) or not grid.cost_at(end) or
+            max(abs(start[0] - end[0]), abs(start[1] - end[1])) <= cluster_size or
+            (grid.regions is not None and not grid.regions.connected(start, end))):
+        return find_path(grid, start, end, stats=stats)
+
+    result = hierarchy_path(cluster_hierarchy(grid, cluster_size), start, end, stats)
+    if not result['reachable']:
+        return find_path(grid, start, end, stats=stats)
+    return result
+
+
+def _abstract_search(hierarchy: ClusterHierarchy, source: int, target: int,
+                     exits: Dict[int, int], entries: Dict[int, int]) -> Tuple[List[int], int]:
+    """
+    A* over the abstract graph from `source` to `target`.
+
+    `exits` are in-cluster costs from the source to its cluster's nodes
+    (and to the target when they share a cluster) and `entries` from the
+    target cluster's nodes to the target.
+
+    Returns:
+        (nodes of the abstract path or [] if there is none, expanded nodes)
+    """
+    width = hierarchy.width
+    goal_y, goal_x = divmod(target, width)
+    saving = 2 * COST_STRAIGHT - COST_DIAGONAL
+
+    def heuristic(node):
+        y, x = divmod(node, width)
+        dx, dy = abs(x - goal_x), abs(y - goal_y)
+        return COST_STRAIGHT * (dx + dy) - saving * min(dx, dy)
+
+    g = {source: 0}
+    parent = {source: -1}
+    closed = set()
+    heap = [(heuristic(source), source)]
+    expanded = 0
+
+    while heap:
+        _, current = heapq.heappop(heap)
+        if current in closed:
+            continue
+        closed.add(current)
+        expanded += 1
+
+        if current == target:
+            path = []
+            while current != -1:
+                path.append(current)
+                current = parent[current]
+            path.reverse()
+            return path, expanded
+
+        if current == source:
+            # The start may itself be a transition tile
+            links = list(exits.items()) + hierarchy.inter.get(source, [])
+        else:
+            links = hierarchy.neighbours(current)
+            if current in entries:
+                links = links + [(target, entries[current])]
+
+        g_current = g[current]
+        for neighbor, step_cost in links:
+            if neighbor in closed:
+                continue
+            tentative = g_current + step_cost
+            if tentative < g.get(neighbor, tentative + 1):
+                g[neighbor] = tentative
+                parent[neighbor] = current
+                heapq.heappush(heap, (tentative + heuristic(neighbor), neighbor))
+
+    return [], expanded
@@ -0,0 +1,246 @@
+"""
+Background map generation jobs.
+
+A request creates a MapGenerationJob and hands it to the job runner, which
+runs the generator in a ProcessPoolExecutor worker so neither the request
+thread nor the event loop waits on it (grids already in the generation
+cache skip the worker). When the worker returns, the packed grid and any
+cover objects are written in one transaction.
+
+Progress (phase and percent) is stored on the job row and broadcast to the
+job's channel group. With the in-memory channel layer, broadcasts are
+scheduled on the event loop the progress consumers run on, because its
+queues cannot be fed from other threads.
+"""
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connections, transaction
+
+from shadowrun_campaign.rng import seeded_random
+
+from .cover_system import calculate_cover_positions
+from .generators import cover_candidate_tiles, get_terrain_config, run_generation_algorithm, terrain_lookup_table
+from .generation_cache import generation_cache, generation_key
+from .grid_storage import MapGrid
+from .models import Map, MapGenerationJob, MapObject
+from .terrain_grid import TerrainGrid
+
+logger = logging.getLogger(__name__)
+
+# Percent reported when a job enters each phase
+PHASE_PERCENT = {
+    'queued': 0,
+    'generating': 10,
+    'saving': 80,
+    'complete': 100,
+    'failed': 100,
+}
+
+
+def job_group_name(job_id: int) -> str:
+    """Channel group receiving progress for one job"""
+    return f'generation_job_{job_id}'
+
+
+def job_payload(job: MapGenerationJob) -> Dict:
+    """JSON-serializable job state sent to clients"""
+    return {
+        'id': job.pk,
+        'name': job.name,
+        'status': job.status,
+        'phase': job.phase,
+        'percent': job.percent,
+        'error': job.error,
+        'map_id': job.map_id,
+        'map_url': f'/maps/{job.map_id}/' if job.map_id else None,
+    }
+
+
+def job_cache_key(job: MapGenerationJob) -> str:
+    return generation_key(job.width, job.height, job.map_type, job.seed, job.algorithm, job.params)
+
+
+def persist_generated_map(job: MapGenerationJob, terrain_grid: TerrainGrid) -> Map:
+    """Create the map, its packed grid and cover objects for a finished job"""
+    config = get_terrain_config(job.map_type)
+    grid_data = MapGrid.from_terrain_grid(terrain_grid, terrain_lookup_table(config)).to_bytes()
+    floor_tiles = cover_candidate_tiles(terrain_grid, config)
+
+    with transaction.atomic():
+        map_obj = Map.objects.create(
+            name=job.name,
+            owner=job.owner,
+            width=job.width,
+            height=job.height,
+            map_type=job.map_type,
+            is_generated=True,
+            generation_seed=job.seed,
+            generation_algorithm=job.algorithm,
+            generation_params=job.params,
+            tile_storage=Map.TILE_STORAGE_PACKED,
+            grid_data=grid_data,
+        )
+
+        if job.cover_density and floor_tiles:
+            cover_objects = calculate_cover_positions(
+                floor_tiles=floor_tiles,
+                width=job.width,
+                height=job.height,
+                density=job.cover_density,
+                map_type=job.map_type,
+                rng=seeded_random(job.seed, 'cover')
+            )
+            MapObject.objects.bulk_create([
+                MapObject(map=map_obj, **cover_data) for cover_data in cover_objects
+            ])
+            logger.info(f"Placed {len(cover_objects)} cover objects on map '{map_obj.name}'")
+
+        job.map = map_obj
+        job.save(update_fields=['map', 'updated_at'])
+    return map_obj
+
+
+class GenerationJobRunner:
+    """
+    Runs generation jobs on a lazily created process pool.
+
+    Thread-safe; one instance (`job_runner`) is shared by the process.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self._max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # Event loop the progress consumers run on (see attach_loop)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._max_workers or getattr(settings, 'MAP_GENERATION_WORKERS', None),
+                    # Workers only import the generators, which don't need Django set up
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._executor
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Deliver progress broadcasts on the given event loop"""
+        self._loop = loop
+
+    def submit(self, job: MapGenerationJob) -> Future:
+        """
+        Start a queued job.
+
+        Returns:
+            Future resolved with the job id once the job is complete or failed
+        """
+        finished = Future()
+        self.set_progress(job, 'generating', status=MapGenerationJob.STATUS_RUNNING)
+
+        # Reuse a grid that was already generated (e.g. previewed) in this process
+        cached = generation_cache.get(job_cache_key(job))
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            self._finish(job.pk, future, finished)
+            return finished
+
+        args = (job.width, job.height, job.map_type, job.seed, job.algorithm, job.params)
+        try:
+            future = self._submit_generation(args)
+        except Exception as e:
+            logger.error(f"Could not start generation job {job.pk}: {str(e)}", exc_info=True)
+            self.set_progress(job, 'failed', status=MapGenerationJob.STATUS_FAILED, error=str(e))
+            finished.set_result(job.pk)
+            return finished
+
+        future.add_done_callback(lambda done: self._finish(job.pk, done, finished))
+        return finished
+
+    def _submit_generation(self, args: Tuple) -> Future:
+        """Queue run_generation_algorithm(*args) on the pool"""
+        try:
+            return self.executor().submit(run_generation_algorithm, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool
+            self.shutdown(wait=False)
+            return self.executor().submit(run_generation_algorithm, *args)
+
+    def generate_many(self, requests: List[Tuple]) -> List[TerrainGrid]:
+        """
+        Generate several grids in parallel and wait for all of them.
+
+        Args:
+            requests: run_generation_algorithm argument tuples
+
+        Returns:
+            TerrainGrids in the order of `requests`
+        """
+        futures = [self._submit_generation(args) for args in requests]
+        return [future.result() for future in futures]
+
+    def _finish(self, job_id: int, future: Future, finished: Future) -> None:
+        """Persist a worker result (normally runs on the executor's callback thread)"""
+        try:
+            job = MapGenerationJob.objects.select_related('owner').get(pk=job_id)
+            try:
+                terrain_grid = generation_cache.put(job_cache_key(job), future.result())
+                self.set_progress(job, 'saving')
+                persist_generated_map(job, terrain_grid)
+                self.set_progress(job, 'complete', status=MapGenerationJob.STATUS_COMPLETE)
+                logger.info(f"Generation job {job_id} created map {job.map_id}")
+            except Exception as e:
+                logger.error(f"Generation job {job_id} failed: {str(e)}", exc_info=True)
+                self.set_progress(job, 'failed', status=MapGenerationJob.STATUS_FAILED, error=str(e))
+        except Exception as e:
+            logger.error(f"Error finishing generation job {job_id}: {str(e)}", exc_info=True)
+        finally:
+            connections.close_all()
+            finished.set_result(job_id)
+
+    def set_progress(self, job: MapGenerationJob, phase: str, status: Optional[str] = None,
+                     error: str = '') -> None:
+        """Record a phase change on the job and broadcast it"""
+        job.phase = phase
+        job.percent = PHASE_PERCENT[phase]
+        job.error = error
+        if status:
+            job.status = status
+        job.save(update_fields=['phase', 'percent', 'status', 'error', 'updated_at'])
+        self.publish(job)
+
+    def publish(self, job: MapGenerationJob) -> None:
+        """Send the job state to its channel group"""
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+
+        group = job_group_name(job.pk)
+        event = {'type': 'job_progress', 'job': job_payload(job)}
+        loop = self._loop
+        try:
+            if loop is not None and loop.is_running():
+                asyncio.run_coroutine_threadsafe(channel_layer.group_send(group, event), loop)
+            else:
+                async_to_sync(channel_layer.group_send)(group, event)
+        except Exception as e:
+            logger.warning(f"Could not broadcast progress for generation job {job.pk}: {str(e)}")
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+job_runner = GenerationJobRunner()
@@ -0,0 +1,119 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from maps.benchmarks import (
+    BENCHMARK_ALGORITHMS,
+    BENCHMARK_SEEDS,
+    BENCHMARK_SIZES,
+    DEFAULT_THRESHOLDS,
+    compare_reports,
+    parse_sizes,
+    run_benchmarks,
+)
+from maps.models import Map
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'maps' / 'benchmark_baseline.json'
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the map generation algorithms and compare against a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--algorithms',
+            default=','.join(BENCHMARK_ALGORITHMS),
+            help='Comma-separated algorithms to run (default: all)'
+        )
+        parser.add_argument(
+            '--sizes',
+            default=','.join(str(size) for size in BENCHMARK_SIZES),
+            help=f'Comma-separated square map sizes (default: {",".join(str(s) for s in BENCHMARK_SIZES)})'
+        )
+        parser.add_argument(
+            '--seeds',
+            default=','.join(BENCHMARK_SEEDS),
+            help='Comma-separated fixed seeds (default: %(default)s)'
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per seed (default: 3)')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument(
+            '--baseline',
+            default=str(DEFAULT_BASELINE),
+            help='Baseline report to compare against (default: maps/benchmark_baseline.json)'
+        )
+        parser.add_argument(
+            '--save-baseline',
+            action='store_true',
+            help='Store this run as the new baseline instead of comparing'
+        )
+        parser.add_argument(
+            '--time-threshold',
+            type=float,
+            default=DEFAULT_THRESHOLDS['time'],
+            help='Allowed slowdown as a fraction (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--memory-threshold',
+            type=float,
+            default=DEFAULT_THRESHOLDS['memory'],
+            help='Allowed peak memory growth as a fraction (default: %(default)s)'
+        )
+
+    def handle(self, *args, **options):
+        algorithms = [name for name in options['algorithms'].split(',') if name]
+        unknown = set(algorithms) - set(BENCHMARK_ALGORITHMS)
+        if unknown:
+            raise CommandError(f'Unknown algorithm(s): {", ".join(sorted(unknown))}')
+
+        try:
+            sizes = parse_sizes(options['sizes'])
+        except ValueError:
+            raise CommandError(f'Invalid size list: {options["sizes"]}')
+        if any(not 3 <= size <= Map.MAX_GRID_SIZE for size in sizes):
+            raise CommandError(f'Sizes must be between 3 and {Map.MAX_GRID_SIZE}')
+
+        seeds = [seed for seed in options['seeds'].split(',') if seed]
+
+        def progress(case):
+            self.stdout.write(
+                f"  {case['name']:<28} generate {case['generate_seconds'] * 1000:8.2f} ms "
+                f"{case['generate_peak_bytes'] / 1024:9.1f} KiB | "
+                f"tiles {case['tiles_seconds'] * 1000:8.2f} ms | "
+                f"pathfind {case['pathfind_seconds'] * 1000:8.2f} ms"
+            )
+
+        report = run_benchmarks(algorithms, sizes, seeds, options['repeat'], progress=progress)
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Report written to {options['output']}")
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.write_text(json.dumps(report, indent=2))
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {baseline_path}'))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(
+                f'No baseline at {baseline_path}; run with --save-baseline to record one.'
+            ))
+            return
+
+        regressions = compare_reports(report, json.loads(baseline_path.read_text()), {
+            'time': options['time_threshold'],
+            'memory': options['memory_threshold'],
+        })
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+            return
+
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(
+                f"  {regression['case']} {regression['metric']}: "
+                f"{regression['baseline']:.6g} -> {regression['current']:.6g} (x{regression['ratio']})"
+            ))
+        raise CommandError(f'{len(regressions)} benchmark regression(s) against {baseline_path}')
@@ -0,0 +1,96 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from maps.benchmarks import (
+    BENCHMARK_ALGORITHMS,
+    BENCHMARK_SEEDS,
+    BENCHMARK_SIZES,
+    PATHFINDING_ALGORITHMS,
+    PATHFINDING_PAIRS,
+    PATHFINDING_ROUGH,
+    compare_pathfinders,
+    parse_sizes,
+)
+from maps.models import Map
+
+
+class Command(BaseCommand):
+    help = 'Check the path searches against a reference Dijkstra and benchmark them on generated maps'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--algorithms',
+            default=','.join(PATHFINDING_ALGORITHMS),
+            help='Comma-separated generation algorithms (default: all)'
+        )
+        parser.add_argument(
+            '--sizes',
+            default=','.join(str(size) for size in BENCHMARK_SIZES),
+            help=f'Comma-separated square map sizes (default: {",".join(str(s) for s in BENCHMARK_SIZES)})'
+        )
+        parser.add_argument(
+            '--seeds',
+            default=','.join(BENCHMARK_SEEDS),
+            help='Comma-separated fixed seeds (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--pairs',
+            type=int,
+            default=PATHFINDING_PAIRS,
+            help='Start/end pairs per map (default: %(default)s)'
+        )
+        parser.add_argument(
+            '--rough',
+            type=float,
+            default=PATHFINDING_ROUGH,
+            help='Share of tiles made costlier in the extra mixed-cost run of each map, 0 to skip '
+                 '(default: %(default)s)'
+        )
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        algorithms = [name for name in options['algorithms'].split(',') if name]
+        unknown = set(algorithms) - set(BENCHMARK_ALGORITHMS)
+        if unknown:
+            raise CommandError(f'Unknown algorithm(s): {", ".join(sorted(unknown))}')
+
+        try:
+            sizes = parse_sizes(options['sizes'])
+        except ValueError:
+            raise CommandError(f'Invalid size list: {options["sizes"]}')
+        if any(not 3 <= size <= Map.MAX_GRID_SIZE for size in sizes):
+            raise CommandError(f'Sizes must be between 3 and {Map.MAX_GRID_SIZE}')
+
+        seeds = [seed for seed in options['seeds'].split(',') if seed]
+        if not 0 <= options['rough'] < 1:
+            raise CommandError('--rough must be at least 0 and below 1')
+
+        def progress(case):
+            self.stdout.write(
+                f"  {case['name']:<34} {case['queries']} queries, {case['unreachable']} unreachable, "
+                f"indexes {case['index_seconds'] * 1000:.1f} ms"
+            )
+            for name, search in case['searches'].items():
+                line = (
+                    f"    {name:<10} p50 {search['p50_seconds'] * 1000:7.3f} ms  "
+                    f"p90 {search['p90_seconds'] * 1000:7.3f} ms  p99 {search['p99_seconds'] * 1000:7.3f} ms  "
+                    f"{search['mean_expanded']:8.1f} expanded  {search['peak_bytes'] / 1024:7.1f} KiB"
+                )
+                if 'max_excess' in search:
+                    line += f"  +{search['mean_excess']:.1%} mean / +{search['max_excess']:.1%} max cost"
+                if search.get('cost_mismatches'):
+                    line += self.style.ERROR(f"  {search['cost_mismatches']} wrong")
+                self.stdout.write(line)
+
+        report = compare_pathfinders(algorithms, sizes, seeds, options['pairs'], options['rough'], progress=progress)
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Report written to {options['output']}")
+
+        mismatches = sum(case['cost_mismatches'] for case in report['cases'])
+        if mismatches:
+            raise CommandError(f'{mismatches} answers disagree with the reference Dijkstra')
+        self.stdout.write(self.style.SUCCESS('Every answer agrees with the reference Dijkstra.'))
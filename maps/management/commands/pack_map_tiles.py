@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from maps.grid_storage import pack_map
+from maps.models import Map
+
+
+class Command(BaseCommand):
+    help = 'Convert maps stored as one MapTile row per tile to packed grid storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('map_ids', nargs='*', type=int, help='Only convert these map IDs')
+        parser.add_argument(
+            '--compression',
+            choices=['zlib', 'rle', 'none'],
+            default='zlib',
+            help='Compression used for the packed grid (default: zlib)'
+        )
+
+    def handle(self, *args, **options):
+        maps = Map.objects.filter(tile_storage=Map.TILE_STORAGE_ROWS)
+        if options['map_ids']:
+            maps = maps.filter(pk__in=options['map_ids'])
+
+        converted = 0
+        for map_obj in maps.iterator():
+            pack_map(map_obj, compression=options['compression'])
+            converted += 1
+            self.stdout.write(f'  Packed map {map_obj.pk}: {map_obj.name} ({len(map_obj.grid_data)} bytes)')
+
+        self.stdout.write(self.style.SUCCESS(f'Packed {converted} map(s).'))
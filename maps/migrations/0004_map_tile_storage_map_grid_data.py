@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maps', '0003_map_fog_of_war_enabled_map_revealed_tiles'),
+    ]
+
+    operations = [
+        # Existing maps keep their MapTile rows; new maps default to packed storage
+        migrations.AddField(
+            model_name='map',
+            name='tile_storage',
+            field=models.CharField(choices=[('rows', 'One MapTile row per tile'), ('packed', 'Packed grid')], default='rows', help_text='How tile terrain is stored (packed maps only keep MapTile rows for annotated tiles)', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='map',
+            name='tile_storage',
+            field=models.CharField(choices=[('rows', 'One MapTile row per tile'), ('packed', 'Packed grid')], default='packed', help_text='How tile terrain is stored (packed maps only keep MapTile rows for annotated tiles)', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='map',
+            name='grid_data',
+            field=models.BinaryField(blank=True, help_text='Encoded terrain, walkability, transparency, movement cost and colour of every tile', null=True),
+        ),
+    ]
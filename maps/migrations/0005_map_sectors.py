@@ -0,0 +1,56 @@
+# Generated by Django 5.0.1 on 2026-10-17 01:04
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maps', '0004_map_tile_storage_map_grid_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='map',
+            name='generation_algorithm',
+            field=models.CharField(blank=True, help_text='Algorithm used to generate the map (sectored maps generate new sectors with it)', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='map',
+            name='generation_params',
+            field=models.JSONField(blank=True, default=dict, help_text='Algorithm-specific generation parameters'),
+        ),
+        migrations.AlterField(
+            model_name='map',
+            name='height',
+            field=models.IntegerField(default=20, validators=[django.core.validators.MinValueValidator(5), django.core.validators.MaxValueValidator(4096)]),
+        ),
+        migrations.AlterField(
+            model_name='map',
+            name='tile_storage',
+            field=models.CharField(choices=[('rows', 'One MapTile row per tile'), ('packed', 'Packed grid'), ('sectored', 'Sectored (large maps, sectors loaded on demand)')], default='packed', help_text='How tile terrain is stored (packed maps only keep MapTile rows for annotated tiles)', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='map',
+            name='width',
+            field=models.IntegerField(default=20, validators=[django.core.validators.MinValueValidator(5), django.core.validators.MaxValueValidator(4096)]),
+        ),
+        migrations.CreateModel(
+            name='MapSector',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sector_x', models.IntegerField(validators=[django.core.validators.MinValueValidator(0)])),
+                ('sector_y', models.IntegerField(validators=[django.core.validators.MinValueValidator(0)])),
+                ('grid_data', models.BinaryField(help_text='Encoded tile layers for this sector')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('map', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sectors', to='maps.map')),
+            ],
+            options={
+                'ordering': ['sector_y', 'sector_x'],
+                'unique_together': {('map', 'sector_x', 'sector_y')},
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.1 on 2026-10-17 01:09
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maps', '0005_map_sectors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapGenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('width', models.IntegerField(validators=[django.core.validators.MinValueValidator(5), django.core.validators.MaxValueValidator(100)])),
+                ('height', models.IntegerField(validators=[django.core.validators.MinValueValidator(5), django.core.validators.MaxValueValidator(100)])),
+                ('map_type', models.CharField(choices=[('urban', 'Urban'), ('wilderness', 'Wilderness'), ('corporate', 'Corporate Facility'), ('underground', 'Underground/Sewer'), ('mixed', 'Mixed Environment')], default='urban', max_length=20)),
+                ('algorithm', models.CharField(default='random', max_length=50)),
+                ('seed', models.CharField(max_length=50)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('cover_density', models.FloatField(default=0.0)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('complete', 'Complete'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('phase', models.CharField(default='queued', help_text='Current step of the job', max_length=20)),
+                ('percent', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('map', models.ForeignKey(blank=True, help_text='Map created when the job finished', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generation_jobs', to='maps.map')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='generation_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-17 01:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maps', '0006_mapgenerationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='map',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented whenever terrain changes; keys caches derived from the tiles'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.1 on 2026-10-17 02:01
+
+import struct
+
+import numpy as np
+from django.db import migrations, models
+
+# Layout of Map.fog_data, as in maps.fog
+FOG_HEADER = struct.Struct('<HH')
+
+
+def pack_revealed_tiles(apps, schema_editor):
+    """Convert each map's [[x, y], ...] revealed list into the fog bitmap"""
+    Map = apps.get_model('maps', 'Map')
+    for map_obj in Map.objects.only('pk', 'width', 'height', 'revealed_tiles').iterator():
+        if not map_obj.revealed_tiles:
+            continue
+        revealed = np.zeros((map_obj.height, map_obj.width), dtype=bool)
+        for tile in map_obj.revealed_tiles:
+            try:
+                x, y = int(tile[0]), int(tile[1])
+            except (TypeError, ValueError, IndexError, KeyError):
+                continue
+            if 0 <= x < map_obj.width and 0 <= y < map_obj.height:
+                revealed[y, x] = True
+        data = FOG_HEADER.pack(map_obj.width, map_obj.height) + np.packbits(revealed, bitorder='little').tobytes()
+        Map.objects.filter(pk=map_obj.pk).update(fog_data=data)
+
+
+def unpack_revealed_tiles(apps, schema_editor):
+    """Turn fog bitmaps back into [[x, y], ...] lists"""
+    Map = apps.get_model('maps', 'Map')
+    for map_obj in Map.objects.exclude(fog_data=None).only('pk', 'fog_data').iterator():
+        data = bytes(map_obj.fog_data)
+        if not data:
+            continue
+        width, height = FOG_HEADER.unpack_from(data)
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8, offset=FOG_HEADER.size),
+                             count=width * height, bitorder='little').reshape(height, width)
+        ys, xs = np.nonzero(bits)
+        Map.objects.filter(pk=map_obj.pk).update(revealed_tiles=[[int(x), int(y)] for x, y in zip(xs, ys)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maps', '0007_map_revision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='map',
+            name='fog_data',
+            field=models.BinaryField(blank=True, help_text='Revealed tiles for fog of war, one bit per tile (see maps.fog)', null=True),
+        ),
+        migrations.RunPython(pack_revealed_tiles, unpack_revealed_tiles),
+        migrations.RemoveField(
+            model_name='map',
+            name='revealed_tiles',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-17 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('maps', '0008_map_fog_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='map',
+            name='fog_version',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented on every fog of war change; clients use it to detect missed updates'),
+        ),
+    ]
@@ -6,6 +6,10 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 class Map(models.Model):
     """Main map model for campaign maps"""
 
+    # Largest side for maps held in a single grid, and for sectored maps
+    MAX_GRID_SIZE = 100
+    MAX_SECTORED_SIZE = 4096
+
     # Map ownership and metadata
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -16,11 +20,11 @@ class Map(models.Model):
     # Map dimensions (in tiles)
     width = models.IntegerField(
         default=20,
-        validators=[MinValueValidator(5), MaxValueValidator(100)]
+        validators=[MinValueValidator(5), MaxValueValidator(MAX_SECTORED_SIZE)]
     )
     height = models.IntegerField(
         default=20,
-        validators=[MinValueValidator(5), MaxValueValidator(100)]
+        validators=[MinValueValidator(5), MaxValueValidator(MAX_SECTORED_SIZE)]
     )
 
     # Map settings
@@ -66,16 +70,55 @@ class Map(models.Model):
         blank=True,
         help_text="Seed used for map generation (for reproducibility)"
     )
+    generation_algorithm = models.CharField(
+        max_length=50,
+        blank=True,
+        help_text="Algorithm used to generate the map (sectored maps generate new sectors with it)"
+    )
+    generation_params = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Algorithm-specific generation parameters"
+    )
 
     # Fog of War
     fog_of_war_enabled = models.BooleanField(
         default=False,
         help_text="Enable fog of war for this map"
     )
-    revealed_tiles = models.JSONField(
-        default=list,
+    fog_data = models.BinaryField(
+        null=True,
+        blank=True,
+        help_text="Revealed tiles for fog of war, one bit per tile (see maps.fog)"
+    )
+    fog_version = models.PositiveIntegerField(
+        default=0,
+        help_text="Incremented on every fog of war change; clients use it to detect missed updates"
+    )
+
+    # Tile storage
+    TILE_STORAGE_ROWS = 'rows'
+    TILE_STORAGE_PACKED = 'packed'
+    TILE_STORAGE_SECTORED = 'sectored'
+    TILE_STORAGE_CHOICES = [
+        (TILE_STORAGE_ROWS, 'One MapTile row per tile'),
+        (TILE_STORAGE_PACKED, 'Packed grid'),
+        (TILE_STORAGE_SECTORED, 'Sectored (large maps, sectors loaded on demand)'),
+    ]
+    tile_storage = models.CharField(
+        max_length=10,
+        choices=TILE_STORAGE_CHOICES,
+        default=TILE_STORAGE_PACKED,
+        help_text="How tile terrain is stored (packed maps only keep MapTile rows for annotated tiles)"
+    )
+    grid_data = models.BinaryField(
+        null=True,
         blank=True,
-        help_text="List of revealed tile coordinates [[x, y], ...] for fog of war"
+        help_text="Encoded terrain, walkability, transparency, movement cost and colour of every tile"
+    )
+    revision = models.PositiveIntegerField(
+        default=0,
+        help_text="Incremented whenever terrain changes; keys caches derived from the tiles"
     )
 
     class Meta:
@@ -89,6 +132,36 @@ class Map(models.Model):
         """Total number of tiles in the map"""
         return self.width * self.height
 
+    @property
+    def is_sectored(self):
+        """Is the terrain split into independently loaded sectors?"""
+        return self.tile_storage == self.TILE_STORAGE_SECTORED
+
+
+class MapSector(models.Model):
+    """
+    A fixed-size square block of a sectored map's terrain.
+
+    Sectors are created the first time they are viewed (generated from the
+    map's seed and algorithm, or blank) and hold the same packed encoding
+    as Map.grid_data, covering SECTOR_SIZE x SECTOR_SIZE tiles (smaller at
+    the right and bottom edges).
+    """
+
+    map = models.ForeignKey(Map, on_delete=models.CASCADE, related_name='sectors')
+    sector_x = models.IntegerField(validators=[MinValueValidator(0)])
+    sector_y = models.IntegerField(validators=[MinValueValidator(0)])
+    grid_data = models.BinaryField(help_text="Encoded tile layers for this sector")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['sector_y', 'sector_x']
+        unique_together = ['map', 'sector_x', 'sector_y']
+
+    def __str__(self):
+        return f"{self.map.name} - Sector ({self.sector_x}, {self.sector_y})"
+
 
 class MapTile(models.Model):
     """Individual tiles that make up a map"""
@@ -307,3 +380,59 @@ class MapGenerationPreset(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class MapGenerationJob(models.Model):
+    """A map generation request running in the background worker pool"""
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='generation_jobs')
+    map = models.ForeignKey(
+        Map,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='generation_jobs',
+        help_text="Map created when the job finished"
+    )
+
+    # Generation settings
+    name = models.CharField(max_length=200)
+    width = models.IntegerField(validators=[MinValueValidator(5), MaxValueValidator(Map.MAX_GRID_SIZE)])
+    height = models.IntegerField(validators=[MinValueValidator(5), MaxValueValidator(Map.MAX_GRID_SIZE)])
+    map_type = models.CharField(max_length=20, choices=Map.MAP_TYPE_CHOICES, default='urban')
+    algorithm = models.CharField(max_length=50, default='random')
+    seed = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    cover_density = models.FloatField(default=0.0)
+
+    # Progress
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETE = 'complete'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETE, 'Complete'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    phase = models.CharField(max_length=20, default='queued', help_text="Current step of the job")
+    percent = models.IntegerField(
+        default=0,
+        validators=[MinValueValidator(0), MaxValueValidator(100)]
+    )
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_COMPLETE, self.STATUS_FAILED)
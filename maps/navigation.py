@@ -0,0 +1,142 @@
+"""
+Per-map navigation grid cache.
+
+Pathfinding needs every tile's movement cost, and loading and decoding a
+map's tiles costs far more than the search itself. NavigationGrids are
+therefore kept in process memory, keyed by map id and valid for one
+Map.revision. The map row (which the views load anyway for permission
+checks) carries the current revision, so a cached grid is used without
+touching the tiles, and a terrain write anywhere, in any process, makes
+stale entries miss.
+
+Tile paints in this process (grid_storage.update_tiles, used by
+map_tile_update and MapConsumer.save_tiles) patch the cached grid to the
+new revision instead of dropping it, so painting does not force a rebuild.
+
+Sectored maps are read through load_grid, which never generates sectors;
+navigation_window builds an uncached grid over part of such a map.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .grid_storage import load_grid
+from .models import Map
+from .pathfinding import NavigationGrid
+from .sectors import load_region
+
+# Default number of maps whose navigation grids are kept
+DEFAULT_MAX_MAPS = 64
+
+
+class NavigationCache:
+    """
+    Thread-safe LRU of (revision, NavigationGrid) keyed by map id.
+    """
+
+    def __init__(self, max_maps: int = DEFAULT_MAX_MAPS):
+        self.max_maps = max_maps
+        self._grids: 'OrderedDict[int, Tuple[int, NavigationGrid]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.patches = 0
+
+    def __len__(self) -> int:
+        return len(self._grids)
+
+    def get(self, map_id: int, revision: int) -> Optional[NavigationGrid]:
+        """Cached grid for this revision of a map, if any"""
+        with self._lock:
+            entry = self._grids.get(map_id)
+            if entry is None or entry[0] != revision:
+                self.misses += 1
+                return None
+            self._grids.move_to_end(map_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, map_id: int, revision: int, grid: NavigationGrid) -> NavigationGrid:
+        with self._lock:
+            current = self._grids.get(map_id)
+            # Never replace a newer revision with an older one
+            if current is None or current[0] <= revision:
+                self._grids[map_id] = (revision, grid)
+                self._grids.move_to_end(map_id)
+            while len(self._grids) > self.max_maps:
+                self._grids.popitem(last=False)
+        return grid
+
+    def patch(self, map_id: int, previous_revision: int, revision: int, tiles: List[Dict]) -> None:
+        """
+        Bring a cached grid from `previous_revision` to `revision` by
+        applying painted tiles. A grid cached at any other revision is
+        dropped, since other writes happened in between.
+
+        The patched copy is built outside the lock and only stored if the
+        entry is still at `previous_revision` by then.
+        """
+        with self._lock:
+            entry = self._grids.get(map_id)
+            if entry is None:
+                return
+            if entry[0] != previous_revision:
+                del self._grids[map_id]
+                return
+
+        # Copying the grid is the slow part; keep other maps' lookups running
+        grid = entry[1].patched(tiles)
+
+        with self._lock:
+            current = self._grids.get(map_id)
+            if current is not None and current[0] == previous_revision:
+                self._grids[map_id] = (revision, grid)
+                self.patches += 1
+
+    def discard(self, map_id: int) -> None:
+        with self._lock:
+            self._grids.pop(map_id, None)
+
+    def clear(self) -> None:
+        """Drop every cached grid and reset the counters"""
+        with self._lock:
+            self._grids.clear()
+            self.hits = self.misses = self.patches = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'maps': len(self._grids),
+                'max_maps': self.max_maps,
+                'hits': self.hits,
+                'misses': self.misses,
+                'patches': self.patches,
+            }
+
+
+navigation_cache = NavigationCache(getattr(settings, 'MAP_NAVIGATION_CACHE_MAPS', DEFAULT_MAX_MAPS))
+
+
+def navigation_grid(map_obj: Map) -> NavigationGrid:
+    """
+    Navigation grid for the map's current revision, built on first use.
+
+    Only a cache miss reads the tiles; the map may be loaded with
+    grid_data deferred.
+    """
+    grid = navigation_cache.get(map_obj.pk, map_obj.revision)
+    if grid is None:
+        grid = navigation_cache.put(map_obj.pk, map_obj.revision, load_grid(map_obj).navigation_grid())
+    return grid
+
+
+def navigation_window(map_obj: Map, x: int, y: int, width: int, height: int) -> NavigationGrid:
+    """
+    Navigation grid for a rectangle of a sectored map, not cached.
+
+    Tile (x, y) of the map is tile (0, 0) of the grid. Sectors that have
+    not been created are blocked rather than generated.
+    """
+    return load_region(map_obj, x, y, width, height, generate=False).navigation_grid()
@@ -0,0 +1,187 @@
+"""
+Cache of path query results.
+
+Players ask for the same few routes over and over (entrance to objective,
+door to door) on maps that have not changed. Answers are kept in an
+in-process LRU keyed by (map id, map revision, start, end, diagonal,
+preview), so a repeated query skips the search and the navigation grid
+altogether.
+
+Every terrain write bumps Map.revision, and the revision is part of the
+key, so writes in any process make older answers miss. Once a newer
+revision of a map is seen, that map's older entries are dropped too,
+so they stop taking up room.
+
+cached_path is the entry point for the pathfinding endpoints: it answers
+from the cache or runs the search on the map's navigation grid. Paths on
+sectored maps are searched within the box around start and goal, widened
+by SECTORED_PATH_MARGIN tiles, so a query reads only the stored sectors
+near the route. Previews whose box is too large to read go through the
+map's sector hierarchy (maps.sector_hierarchy) instead.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from django.conf import settings
+
+from .grid_storage import GridTooLargeError
+from .models import Map
+from .navigation import navigation_grid, navigation_window
+from .pathfinding import Point, find_path
+from .regions import region_index
+from .sector_hierarchy import sector_path
+from .sectors import SECTOR_SIZE
+
+# Default number of cached path results
+DEFAULT_MAX_ENTRIES = 4096
+
+# Tiles searched around the start/goal box of a path on a sectored map
+SECTORED_PATH_MARGIN = SECTOR_SIZE
+
+PathKey = Tuple[int, int, Point, Point, bool, bool]
+
+
+def path_key(map_id: int, revision: int, start: Point, end: Point,
+             allow_diagonal: bool = True, preview: bool = False) -> PathKey:
+    return (int(map_id), revision, tuple(start), tuple(end), bool(allow_diagonal), bool(preview))
+
+
+class PathCache:
+    """
+    Thread-safe LRU of path results keyed by path_key.
+
+    Cached results are shared; callers must not modify them.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._results: 'OrderedDict[PathKey, Dict]' = OrderedDict()
+        # Map id -> (latest revision seen, keys cached for it)
+        self._maps: Dict[int, Tuple[int, Set[PathKey]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: PathKey) -> Optional[Dict]:
+        """Cached result for a query, if any"""
+        with self._lock:
+            self._see_revision(key[0], key[1])
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: PathKey, result: Dict) -> Dict:
+        with self._lock:
+            self._see_revision(key[0], key[1])
+            latest, keys = self._maps[key[0]]
+            # A slow query may finish after the map moved on
+            if key[1] < latest:
+                return result
+            self._results[key] = result
+            self._results.move_to_end(key)
+            keys.add(key)
+            while len(self._results) > self.max_entries:
+                evicted, _ = self._results.popitem(last=False)
+                self._maps[evicted[0]][1].discard(evicted)
+                self.evictions += 1
+        return result
+
+    def _see_revision(self, map_id: int, revision: int) -> None:
+        """Drop a map's entries for revisions older than `revision`"""
+        latest, keys = self._maps.get(map_id, (revision, set()))
+        if revision > latest:
+            for key in keys:
+                del self._results[key]
+            self.invalidations += len(keys)
+            latest, keys = revision, set()
+        self._maps[map_id] = (latest, keys)
+
+    def discard(self, map_id: int) -> None:
+        with self._lock:
+            _, keys = self._maps.pop(map_id, (0, set()))
+            for key in keys:
+                del self._results[key]
+
+    def clear(self) -> None:
+        """Drop every cached result and reset the counters"""
+        with self._lock:
+            self._results.clear()
+            self._maps.clear()
+            self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._results),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+path_cache = PathCache(getattr(settings, 'MAP_PATH_CACHE_ENTRIES', DEFAULT_MAX_ENTRIES))
+
+
+def cached_path(map_obj: Map, start: Point, end: Point, allow_diagonal: bool = True,
+                preview: bool = False, stats: Optional[Dict] = None) -> Dict:
+    """
+    Path between two tiles of the map's current revision.
+
+    Searches with find_path only when the answer is not cached. On a
+    sectored map whose start/goal box is too large to read, `preview`
+    queries (drag previews) that allow diagonals take a near-optimal path
+    from the sector hierarchy; other such queries raise
+    maps.grid_storage.GridTooLargeError. `stats`, if given, receives the
+    search's 'algorithm' and 'expanded', with algorithm 'cache' on a hit.
+    """
+    key = path_key(map_obj.pk, map_obj.revision, start, end, allow_diagonal, preview)
+    result = path_cache.get(key)
+    if result is not None:
+        if stats is not None:
+            stats.update(algorithm='cache', expanded=0)
+        return result
+
+    if map_obj.is_sectored:
+        try:
+            result = window_path(map_obj, start, end, allow_diagonal, stats)
+        except GridTooLargeError:
+            if not (preview and allow_diagonal):
+                raise
+            result = sector_path(map_obj, start, end, stats)
+    else:
+        # The region index answers queries between disconnected areas without a search
+        grid = navigation_grid(map_obj)
+        region_index(grid)
+        result = find_path(grid, start, end, allow_diagonal, stats=stats)
+    return path_cache.put(key, result)
+
+
+def window_path(map_obj: Map, start: Point, end: Point, allow_diagonal: bool, stats: Optional[Dict]) -> Dict:
+    """
+    Search a sectored map within the start/goal box plus SECTORED_PATH_MARGIN.
+
+    The window's grid serves this one query, so it gets no region index.
+    Raises GridTooLargeError if the window is too large to read.
+    """
+    left = max(min(start[0], end[0]) - SECTORED_PATH_MARGIN, 0)
+    top = max(min(start[1], end[1]) - SECTORED_PATH_MARGIN, 0)
+    right = min(max(start[0], end[0]) + SECTORED_PATH_MARGIN + 1, map_obj.width)
+    bottom = min(max(start[1], end[1]) + SECTORED_PATH_MARGIN + 1, map_obj.height)
+
+    grid = navigation_window(map_obj, left, top, right - left, bottom - top)
+    result = find_path(grid, (start[0] - left, start[1] - top), (end[0] - left, end[1] - top), allow_diagonal, stats)
+    return {**result, 'path': [(x + left, y + top) for x, y in result['path']]}
@@ -1,4 +1,21 @@
+"""
+Grid pathfinding with terrain movement costs.
+
+Searches run on a NavigationGrid: flat per-tile cost multipliers indexed
+y * width + x (0 = impassable) with scaled integer step costs, COST_STRAIGHT
+for orthogonal and COST_DIAGONAL for diagonal moves. Internally the grid is
+padded with an impassable border so neighbour lookups need no bounds
+checks. Score, parent and open-list buffers are kept per thread and reused
+between queries; a query stamp marks which entries belong to the current
+search so they never have to be cleared.
+"""
+import base64
+import copy
 import heapq
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 # Movement cost per terrain type (in movement points, normal terrain = 1)
 # None = impassable
@@ -34,89 +51,705 @@ TERRAIN_COST_LABELS = {
 }
 
 
-def astar(tiles_dict, start, end, width, height, allow_diagonal=True):
+# Scaled integer step costs (diagonal ~ 1.4x straight)
+COST_STRAIGHT = 10
+COST_DIAGONAL = 14
+
+# Largest movement range budget whose costs (tenths of a point) fit in uint16
+MAX_MOVEMENT_BUDGET = 6553
+
+# Limits on one flow-field batch request
+MAX_FLOW_GOALS = 64
+MAX_FLOW_STARTS = 256
+
+Point = Tuple[int, int]
+
+
+def tile_step_cost(terrain_type: str, is_walkable: bool, movement_cost: int = 1) -> int:
     """
-    A* pathfinding with terrain cost calculation.
+    Cost multiplier for entering a tile, or 0 if it is impassable.
+
+    GM-customized movement costs apply when higher than the terrain default.
+    """
+    base_cost = TERRAIN_COSTS.get(terrain_type)
+    if not is_walkable or base_cost is None:
+        return 0
+    return max(base_cost, movement_cost)
+
+
+def uniform_cost(costs: Sequence[int]) -> int:
+    """The one multiplier shared by every passable tile, or 0 if they differ"""
+    multipliers = set(costs)
+    multipliers.discard(0)
+    return multipliers.pop() if len(multipliers) == 1 else 0
+
+
+class NavigationGrid:
+    """
+    Movement costs of a map laid out for the array-based searches.
+
+    Args:
+        costs: Row-major cost multipliers (tile_step_cost), y * width + x
+        terrain: Row-major terrain codes, indices into `terrain_names`
+        terrain_names: Terrain type for each code
+    """
+
+    def __init__(self, width: int, height: int, costs: Sequence[int],
+                 terrain: Optional[Sequence[int]] = None, terrain_names: Sequence[str] = ()):
+        self.width = width
+        self.height = height
+        self.costs = [int(cost) for cost in costs]
+        self.terrain = list(terrain) if terrain is not None else None
+        self.terrain_names = tuple(terrain_names)
+        self.uniform_cost = uniform_cost(self.costs)
+        # Derived indexes, built on demand: the HPA* cluster abstraction
+        # (maps.hierarchy, benchmarks only) and connected regions (maps.regions)
+        self.hierarchy = None
+        self.regions = None
+
+        # Padded copy: one impassable cell on every side
+        self.stride = width + 2
+        self.padded = [0] * (self.stride * (height + 2))
+        for y in range(height):
+            row_start = (y + 1) * self.stride + 1
+            self.padded[row_start:row_start + width] = self.costs[y * width:(y + 1) * width]
+
+    @classmethod
+    def from_tiles_dict(cls, tiles_dict: Dict, width: int, height: int) -> 'NavigationGrid':
+        """Build from the {(x, y): tile} format used by the original A* search"""
+        names = []
+        codes = {}
+        costs = [0] * (width * height)
+        terrain = [0] * (width * height)
+        for (x, y), tile in tiles_dict.items():
+            if not (0 <= x < width and 0 <= y < height):
+                continue
+            name = tile.get('terrain_type', 'floor')
+            if name not in codes:
+                codes[name] = len(names)
+                names.append(name)
+            index = y * width + x
+            terrain[index] = codes[name]
+            costs[index] = tile_step_cost(name, tile['is_walkable'], tile.get('movement_cost', 1))
+        return cls(width, height, costs, terrain, names)
+
+    def patched(self, tiles: Sequence[Dict]) -> 'NavigationGrid':
+        """
+        Copy of the grid with some tiles changed.
+
+        Each tile is a dict with x, y, terrain_type, is_walkable and
+        movement_cost (as returned by grid_storage.update_tiles). The grid
+        itself is left untouched so searches already running on it are
+        not disturbed.
+        """
+        grid = copy.copy(self)
+        grid.costs = list(self.costs)
+        grid.padded = list(self.padded)
+        grid.terrain = list(self.terrain) if self.terrain is not None else None
+        grid.hierarchy = grid.regions = None
+        grid.apply_tiles(tiles)
+
+        if self.regions is not None:
+            grid.regions = self.regions.patched(grid, tiles)
+        return grid
+
+    def apply_tiles(self, tiles: Sequence[Dict]) -> List[int]:
+        """
+        Change some tiles in place.
+
+        Only for grids nothing else is searching, such as a replanning
+        session's private copy; shared grids are updated with patched.
+        Derived indexes are dropped.
+
+        Returns:
+            Padded indices of the tiles whose cost changed
+        """
+        names = list(self.terrain_names)
+        changed = []
+        for tile in tiles:
+            x, y = tile['x'], tile['y']
+            cost = tile_step_cost(tile['terrain_type'], tile['is_walkable'], tile.get('movement_cost', 1))
+            index = self.to_padded((x, y))
+            if self.padded[index] != cost:
+                changed.append(index)
+            self.costs[y * self.width + x] = cost
+            self.padded[index] = cost
+            if self.terrain is not None:
+                if tile['terrain_type'] not in names:
+                    names.append(tile['terrain_type'])
+                self.terrain[y * self.width + x] = names.index(tile['terrain_type'])
+
+        self.terrain_names = tuple(names)
+        if changed:
+            # Still uniform if every new cost is the shared one or a wall
+            new_costs = {self.padded[index] for index in changed} - {0}
+            if not (self.uniform_cost and new_costs <= {self.uniform_cost}):
+                self.uniform_cost = uniform_cost(self.costs)
+        self.hierarchy = self.regions = None
+        return changed
+
+    def contains(self, point: Point) -> bool:
+        return 0 <= point[0] < self.width and 0 <= point[1] < self.height
+
+    def cost_at(self, point: Point) -> int:
+        return self.costs[point[1] * self.width + point[0]]
+
+    def terrain_at(self, point: Point) -> str:
+        if self.terrain is None:
+            return 'floor'
+        return self.terrain_names[self.terrain[point[1] * self.width + point[0]]]
+
+    def to_padded(self, point: Point) -> int:
+        return (point[1] + 1) * self.stride + point[0] + 1
+
+    def from_padded(self, index: int) -> Point:
+        y, x = divmod(index, self.stride)
+        return x - 1, y - 1
+
+    def steps(self, allow_diagonal: bool = True) -> List[Tuple[int, int]]:
+        """(padded index offset, base step cost) for each move direction"""
+        stride = self.stride
+        steps = [(-1, COST_STRAIGHT), (1, COST_STRAIGHT), (-stride, COST_STRAIGHT), (stride, COST_STRAIGHT)]
+        if allow_diagonal:
+            steps += [(-stride - 1, COST_DIAGONAL), (-stride + 1, COST_DIAGONAL),
+                      (stride - 1, COST_DIAGONAL), (stride + 1, COST_DIAGONAL)]
+        return steps
+
+
+class SearchBuffers(threading.local):
+    """
+    Per-thread scratch space reused by every search on that thread.
+
+    An entry of `g`/`parent` is valid for the current search only when its
+    `seen` stamp equals `stamp`, and a cell is closed when its `closed`
+    stamp does.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.stamp = 0
+        self.g: List[int] = []
+        self.parent: List[int] = []
+        self.seen: List[int] = []
+        self.closed: List[int] = []
+        self.heap: List[int] = []
+
+    def begin(self, size: int) -> int:
+        """Prepare for a search over `size` cells and return its stamp"""
+        if size > self.size:
+            grow = size - self.size
+            self.g.extend([0] * grow)
+            self.parent.extend([0] * grow)
+            self.seen.extend([0] * grow)
+            self.closed.extend([0] * grow)
+            self.size = size
+        self.heap.clear()
+        self.stamp += 1
+        return self.stamp
+
+
+search_buffers = SearchBuffers()
+
+
+def unreachable_result() -> Dict:
+    return {'path': [], 'total_cost': 0.0, 'reachable': False, 'terrain_breakdown': {}}
+
+
+def path_result(grid: NavigationGrid, path: List[Point], cost: int) -> Dict:
+    """Result dict for a found path, in the format map_pathfind returns"""
+    breakdown = {}
+    for point in path[1:]:
+        terrain = grid.terrain_at(point)
+        breakdown[terrain] = breakdown.get(terrain, 0) + 1
+    return {
+        'path': path,
+        'total_cost': round(cost / COST_STRAIGHT, 1),
+        'reachable': True,
+        'terrain_breakdown': breakdown,
+    }
+
+
+def astar_grid(grid: NavigationGrid, start: Point, end: Point, allow_diagonal: bool = True,
+               stats: Optional[Dict] = None) -> Dict:
+    """
+    A* over a NavigationGrid.
+
+    If `stats` is given, the number of expanded cells is stored in it
+    under 'expanded'.
 
-    tiles_dict: {(x, y): {'is_walkable': bool, 'terrain_type': str, 'movement_cost': int}}
     Returns: {'path': [(x, y), ...], 'total_cost': float, 'reachable': bool, 'terrain_breakdown': {...}}
     """
+    if stats is not None:
+        stats['expanded'] = 0
     if start == end:
         return {'path': [start], 'total_cost': 0.0, 'reachable': True, 'terrain_breakdown': {}}
+    if not (grid.contains(start) and grid.contains(end)) or not grid.cost_at(end):
+        return unreachable_result()
 
-    def heuristic(a, b):
-        if allow_diagonal:
-            return max(abs(a[0] - b[0]), abs(a[1] - b[1]))
-        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+    cost = grid.padded
+    size = len(cost)
+    stride = grid.stride
+    steps = grid.steps(allow_diagonal)
+    buffers = search_buffers
+    stamp = buffers.begin(size)
+    g, parent, seen, closed, heap = buffers.g, buffers.parent, buffers.seen, buffers.closed, buffers.heap
+    heappush, heappop = heapq.heappush, heapq.heappop
 
-    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-    if allow_diagonal:
-        directions += [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+    source = grid.to_padded(start)
+    target = grid.to_padded(end)
+    goal_y, goal_x = divmod(target, stride)
+    # Octile distance when diagonals are allowed, Manhattan otherwise
+    diagonal_saving = 2 * COST_STRAIGHT - COST_DIAGONAL if allow_diagonal else 0
 
-    open_heap = [(heuristic(start, end), 0.0, start)]
-    g_score = {start: 0.0}
-    came_from = {}
+    g[source] = 0
+    parent[source] = -1
+    seen[source] = stamp
+    # Heap entries encode (f, cell) as f * size + cell
+    heappush(heap, source)
+    expanded = 0
 
-    while open_heap:
-        _f, g, current = heapq.heappop(open_heap)
+    while heap:
+        current = heappop(heap) % size
+        if closed[current] == stamp:
+            continue
+        closed[current] = stamp
+        expanded += 1
 
-        if current == end:
+        if current == target:
+            if stats is not None:
+                stats['expanded'] = expanded
             path = []
-            node = current
-            while node in came_from:
-                path.append(node)
-                node = came_from[node]
-            path.append(start)
+            while current != -1:
+                path.append(grid.from_padded(current))
+                current = parent[current]
             path.reverse()
+            return path_result(grid, path, g[target])
+
+        g_current = g[current]
+        for offset, step in steps:
+            neighbor = current + offset
+            multiplier = cost[neighbor]
+            if not multiplier or closed[neighbor] == stamp:
+                continue
+            tentative = g_current + step * multiplier
+            if seen[neighbor] != stamp or tentative < g[neighbor]:
+                seen[neighbor] = stamp
+                g[neighbor] = tentative
+                parent[neighbor] = current
+                y, x = divmod(neighbor, stride)
+                dx = x - goal_x if x > goal_x else goal_x - x
+                dy = y - goal_y if y > goal_y else goal_y - y
+                h = COST_STRAIGHT * (dx + dy) - diagonal_saving * (dx if dx < dy else dy)
+                heappush(heap, (tentative + h) * size + neighbor)
+
+    if stats is not None:
+        stats['expanded'] = expanded
+    return unreachable_result()
+
+
+def _jump_straight(cost: List[int], current: int, offset: int, side: int, target: int) -> int:
+    """
+    Follow a straight line from `current` until a jump point.
+
+    `side` is the padded offset perpendicular to `offset`. Returns the
+    padded index of the jump point, or -1 if the line runs into a wall.
+    """
+    while True:
+        current += offset
+        if not cost[current]:
+            return -1
+        if current == target:
+            return current
+        # Forced neighbour: a wall beside us that opens up one step ahead
+        if ((not cost[current + side] and cost[current + side + offset]) or
+                (not cost[current - side] and cost[current - side + offset])):
+            return current
+
+
+def _jump_diagonal(cost: List[int], current: int, dx: int, dy: int, stride: int, target: int) -> int:
+    """Follow a diagonal (dx, dy are padded offsets) until a jump point, or -1"""
+    offset = dx + dy
+    while True:
+        current += offset
+        if not cost[current]:
+            return -1
+        if current == target:
+            return current
+        if ((not cost[current - dx] and cost[current - dx + dy]) or
+                (not cost[current - dy] and cost[current + dx - dy])):
+            return current
+        # A jump point along either straight component makes this one too
+        if (_jump_straight(cost, current, dx, stride, target) != -1 or
+                _jump_straight(cost, current, dy, 1, target) != -1):
+            return current
+
+
+def _sign(value: int) -> int:
+    return (value > 0) - (value < 0)
+
 
-            # Build terrain breakdown for display
-            breakdown = {}
-            for pos in path[1:]:
-                tile = tiles_dict.get(pos, {})
-                terrain = tile.get('terrain_type', 'floor')
-                breakdown[terrain] = breakdown.get(terrain, 0) + 1
-
-            return {
-                'path': path,
-                'total_cost': round(g_score[end], 1),
-                'reachable': True,
-                'terrain_breakdown': breakdown,
-            }
-
-        if g > g_score.get(current, float('inf')):
+def jps_grid(grid: NavigationGrid, start: Point, end: Point, stats: Optional[Dict] = None) -> Dict:
+    """
+    Jump Point Search over a uniform-cost NavigationGrid, with diagonals.
+
+    Runs A* over jump points only: straight and diagonal runs across open
+    ground are skipped in one step instead of expanding every symmetric
+    cell along them. Movement rules and step costs are those of astar_grid
+    (diagonals may cut corners), so on a grid where every passable tile
+    has the same multiplier the total cost always equals astar_grid's,
+    though the path itself may be a different one of equal cost.
+
+    Use find_path to fall back to astar_grid on mixed-cost grids.
+    """
+    if stats is not None:
+        stats['expanded'] = 0
+    if start == end:
+        return {'path': [start], 'total_cost': 0.0, 'reachable': True, 'terrain_breakdown': {}}
+    if not (grid.contains(start) and grid.contains(end)) or not grid.cost_at(end):
+        return unreachable_result()
+    multiplier = grid.uniform_cost
+    if not multiplier:
+        raise ValueError('Jump Point Search needs a uniform-cost grid')
+
+    cost = grid.padded
+    size = len(cost)
+    stride = grid.stride
+    buffers = search_buffers
+    stamp = buffers.begin(size)
+    g, parent, seen, closed, heap = buffers.g, buffers.parent, buffers.seen, buffers.closed, buffers.heap
+    heappush, heappop = heapq.heappush, heapq.heappop
+    straight, diagonal = COST_STRAIGHT * multiplier, COST_DIAGONAL * multiplier
+
+    source = grid.to_padded(start)
+    target = grid.to_padded(end)
+    goal_y, goal_x = divmod(target, stride)
+    all_directions = [(dx, dy) for dx in (-1, 0, 1) for dy in (-stride, 0, stride) if dx or dy]
+
+    g[source] = 0
+    parent[source] = -1
+    seen[source] = stamp
+    heappush(heap, source)
+    expanded = 0
+
+    while heap:
+        current = heappop(heap) % size
+        if closed[current] == stamp:
             continue
+        closed[current] = stamp
+        expanded += 1
+
+        if current == target:
+            break
+
+        # Prune to the natural and forced neighbours for the direction of travel
+        y, x = divmod(current, stride)
+        if parent[current] == -1:
+            directions = all_directions
+        else:
+            parent_y, parent_x = divmod(parent[current], stride)
+            dx, dy = _sign(x - parent_x), _sign(y - parent_y) * stride
+            if dx and dy:
+                directions = [(dx, 0), (0, dy), (dx, dy)]
+                if not cost[current - dx]:
+                    directions.append((-dx, dy))
+                if not cost[current - dy]:
+                    directions.append((dx, -dy))
+            elif dx:
+                directions = [(dx, 0)]
+                if not cost[current + stride]:
+                    directions.append((dx, stride))
+                if not cost[current - stride]:
+                    directions.append((dx, -stride))
+            else:
+                directions = [(0, dy)]
+                if not cost[current + 1]:
+                    directions.append((1, dy))
+                if not cost[current - 1]:
+                    directions.append((-1, dy))
 
-        cx, cy = current
+        g_current = g[current]
         for dx, dy in directions:
-            nx, ny = cx + dx, cy + dy
-            neighbor = (nx, ny)
+            if dx and dy:
+                jump = _jump_diagonal(cost, current, dx, dy, stride, target)
+            else:
+                jump = _jump_straight(cost, current, dx or dy, stride if dx else 1, target)
+            if jump == -1 or closed[jump] == stamp:
+                continue
+
+            jump_y, jump_x = divmod(jump, stride)
+            run = abs(jump_x - x) or abs(jump_y - y)
+            tentative = g_current + run * (diagonal if dx and dy else straight)
+            if seen[jump] != stamp or tentative < g[jump]:
+                seen[jump] = stamp
+                g[jump] = tentative
+                parent[jump] = current
+                hx = jump_x - goal_x if jump_x > goal_x else goal_x - jump_x
+                hy = jump_y - goal_y if jump_y > goal_y else goal_y - jump_y
+                h = straight * (hx + hy) - (2 * straight - diagonal) * (hx if hx < hy else hy)
+                heappush(heap, (tentative + h) * size + jump)
+    else:
+        if stats is not None:
+            stats['expanded'] = expanded
+        return unreachable_result()
 
-            if not (0 <= nx < width and 0 <= ny < height):
+    if stats is not None:
+        stats['expanded'] = expanded
+
+    # Fill in the cells between consecutive jump points
+    path = [end]
+    current = target
+    while parent[current] != -1:
+        previous = parent[current]
+        step_y, step_x = divmod(previous, stride)
+        cell_y, cell_x = divmod(current, stride)
+        offset = _sign(step_x - cell_x) + _sign(step_y - cell_y) * stride
+        while current != previous:
+            current += offset
+            path.append(grid.from_padded(current))
+    path.reverse()
+    return path_result(grid, path, g[target])
+
+
+def find_path(grid: NavigationGrid, start: Point, end: Point, allow_diagonal: bool = True,
+              stats: Optional[Dict] = None) -> Dict:
+    """
+    Cheapest path between two tiles with the best search for the grid.
+
+    Jump Point Search when every passable tile costs the same and diagonal
+    moves are allowed, A* otherwise. If the grid has a region index, tiles
+    in different regions are rejected without searching. `stats`, if
+    given, also receives the 'algorithm' used.
+    """
+    if grid.regions is not None and not grid.regions.connected(start, end):
+        if stats is not None:
+            stats.update(algorithm='regions', expanded=0)
+        return unreachable_result()
+    if allow_diagonal and grid.uniform_cost:
+        algorithm, result = 'jps', jps_grid(grid, start, end, stats)
+    else:
+        algorithm, result = 'astar', astar_grid(grid, start, end, allow_diagonal, stats)
+    if stats is not None:
+        stats['algorithm'] = algorithm
+    return result
+
+
+def movement_range(grid: NavigationGrid, origin: Point, budget: float, allow_diagonal: bool = True) -> Dict[int, int]:
+    """
+    Every tile reachable from `origin` within `budget` movement points.
+
+    A Dijkstra flood fill with the same step costs as astar_grid that stops
+    expanding once costs exceed the budget.
+
+    Returns:
+        {y * width + x: cost in tenths of a movement point}, including the origin at 0
+    """
+    if not grid.contains(origin):
+        return {}
+
+    cost = grid.padded
+    size = len(cost)
+    stride = grid.stride
+    steps = grid.steps(allow_diagonal)
+    limit = int(round(budget * COST_STRAIGHT))
+    buffers = search_buffers
+    stamp = buffers.begin(size)
+    g, seen, closed, heap = buffers.g, buffers.seen, buffers.closed, buffers.heap
+    heappush, heappop = heapq.heappush, heapq.heappop
+
+    source = grid.to_padded(origin)
+    g[source] = 0
+    seen[source] = stamp
+    heappush(heap, source)
+    reached = {}
+
+    while heap:
+        current = heappop(heap) % size
+        if closed[current] == stamp:
+            continue
+        closed[current] = stamp
+
+        y, x = divmod(current, stride)
+        g_current = g[current]
+        reached[(y - 1) * grid.width + x - 1] = g_current
+
+        for offset, step in steps:
+            neighbor = current + offset
+            multiplier = cost[neighbor]
+            if not multiplier or closed[neighbor] == stamp:
+                continue
+            tentative = g_current + step * multiplier
+            if tentative > limit:
                 continue
+            if seen[neighbor] != stamp or tentative < g[neighbor]:
+                seen[neighbor] = stamp
+                g[neighbor] = tentative
+                heappush(heap, tentative * size + neighbor)
+
+    return reached
+
 
-            tile = tiles_dict.get(neighbor)
-            if tile is None or not tile['is_walkable']:
+def movement_range_payload(grid: NavigationGrid, reached: Dict[int, int]) -> Dict:
+    """
+    Compact JSON encoding of a movement_range result.
+
+    Covers the bounding box of the reached tiles: `reachable` is a base64
+    bitmap over the box in row-major order (least significant bit first)
+    and `costs` holds base64 little-endian uint16 costs, in tenths of a
+    movement point, for the set bits in the same order.
+    """
+    if not reached:
+        return {'bounds': None, 'count': 0, 'reachable': '', 'costs': ''}
+
+    indices = np.fromiter(reached.keys(), dtype=np.int64, count=len(reached))
+    costs = np.fromiter(reached.values(), dtype=np.int64, count=len(reached))
+    order = np.argsort(indices)
+    indices, costs = indices[order], costs[order]
+    ys, xs = np.divmod(indices, grid.width)
+    left, top = int(xs.min()), int(ys.min())
+    box_width, box_height = int(xs.max()) - left + 1, int(ys.max()) - top + 1
+
+    bitmap = np.zeros(box_width * box_height, dtype=bool)
+    bitmap[(ys - top) * box_width + (xs - left)] = True
+    return {
+        'bounds': {'x': left, 'y': top, 'width': box_width, 'height': box_height},
+        'count': len(reached),
+        'reachable': base64.b64encode(np.packbits(bitmap, bitorder='little').tobytes()).decode('ascii'),
+        'costs': base64.b64encode(np.minimum(costs, 0xFFFF).astype('<u2').tobytes()).decode('ascii'),
+    }
+
+
+def budget_stop(grid: NavigationGrid, path: List[Point], budget: float) -> Point:
+    """Furthest point along a path that a mover with `budget` movement points reaches"""
+    limit = int(round(budget * COST_STRAIGHT))
+    spent = 0
+    stop = path[0]
+    for previous, point in zip(path, path[1:]):
+        diagonal = previous[0] != point[0] and previous[1] != point[1]
+        spent += (COST_DIAGONAL if diagonal else COST_STRAIGHT) * grid.cost_at(point)
+        if spent > limit:
+            break
+        stop = point
+    return stop
+
+
+class DistanceField:
+    """
+    Cost of the cheapest path from every tile to the nearest of a set of goals.
+
+    Built with one reverse Dijkstra pass (see distance_field); paths for
+    any number of starting tiles are then read off by walking downhill,
+    which costs O(path length) per start.
+    """
+
+    UNREACHED = -1
+
+    def __init__(self, grid: NavigationGrid, goals: List[Point], distances: List[int], allow_diagonal: bool):
+        self.grid = grid
+        self.goals = goals
+        self.distances = distances
+        self.steps = grid.steps(allow_diagonal)
+
+    def distance(self, point: Point) -> Optional[int]:
+        """Scaled cost from a tile to the nearest goal, or None if no goal is reachable"""
+        if not self.grid.contains(point):
+            return None
+        value = self.distances[self.grid.to_padded(point)]
+        return None if value == self.UNREACHED else value
+
+    def _best_step(self, current: int) -> Tuple[int, int]:
+        """Neighbour of `current` on a cheapest path, with the total cost through it"""
+        cost, distances = self.grid.padded, self.distances
+        best, best_total = -1, None
+        for offset, step in self.steps:
+            neighbor = current + offset
+            remaining = distances[neighbor]
+            if remaining == self.UNREACHED or not cost[neighbor]:
                 continue
+            total = remaining + step * cost[neighbor]
+            if best_total is None or total < best_total:
+                best, best_total = neighbor, total
+        return best, best_total
+
+    def path_from(self, start: Point) -> Dict:
+        """Cheapest path from `start` to its nearest goal, in astar_grid's result format"""
+        grid = self.grid
+        if not grid.contains(start):
+            return unreachable_result()
+
+        current = grid.to_padded(start)
+        distances = self.distances
+        if distances[current] == 0:
+            return {'path': [start], 'total_cost': 0.0, 'reachable': True, 'terrain_breakdown': {}}
 
-            terrain = tile.get('terrain_type', 'floor')
-            base_cost = TERRAIN_COSTS.get(terrain)
-            if base_cost is None:
+        # The start itself may be impassable (e.g. a token standing in a doorway
+        # that has since been walled up), so its cost is taken from its neighbours
+        best, total = self._best_step(current)
+        if best == -1:
+            return unreachable_result()
+
+        path = [start]
+        while True:
+            current = best
+            path.append(grid.from_padded(current))
+            if distances[current] == 0:
+                break
+            best, _ = self._best_step(current)
+        return path_result(grid, path, total)
+
+
+def distance_field(grid: NavigationGrid, goals: List[Point], allow_diagonal: bool = True) -> DistanceField:
+    """
+    Reverse Dijkstra from one or more goals over the whole grid.
+
+    Step costs match astar_grid: moving onto a tile costs its multiplier
+    times COST_STRAIGHT or COST_DIAGONAL, so distances[tile] equals the
+    total_cost (scaled) of astar_grid from that tile to its nearest goal.
+    """
+    cost = grid.padded
+    size = len(cost)
+    steps = grid.steps(allow_diagonal)
+    distances = [DistanceField.UNREACHED] * size
+    buffers = search_buffers
+    stamp = buffers.begin(size)
+    closed, heap = buffers.closed, buffers.heap
+    heappush, heappop = heapq.heappush, heapq.heappop
+
+    goals = [goal for goal in goals if grid.contains(goal) and grid.cost_at(goal)]
+    for goal in goals:
+        index = grid.to_padded(goal)
+        distances[index] = 0
+        heappush(heap, index)
+
+    while heap:
+        current = heappop(heap) % size
+        if closed[current] == stamp:
+            continue
+        closed[current] = stamp
+
+        # Reversed edge: a neighbour reaches `current` by paying its cost
+        entry = cost[current]
+        d_current = distances[current]
+        for offset, step in steps:
+            neighbor = current + offset
+            if not cost[neighbor] or closed[neighbor] == stamp:
                 continue
+            tentative = d_current + step * entry
+            known = distances[neighbor]
+            if known == DistanceField.UNREACHED or tentative < known:
+                distances[neighbor] = tentative
+                heappush(heap, tentative * size + neighbor)
 
-            # Respect GM-customized movement_cost if higher than terrain default
-            stored_cost = tile.get('movement_cost', 1)
-            actual_cost = max(base_cost, stored_cost)
+    return DistanceField(grid, goals, distances, allow_diagonal)
 
-            # Diagonal movement costs ~1.414× more
-            if dx != 0 and dy != 0:
-                actual_cost *= 1.414
 
-            tentative_g = g_score[current] + actual_cost
+def astar(tiles_dict, start, end, width, height, allow_diagonal=True):
+    """
+    A* pathfinding with terrain cost calculation.
 
-            if tentative_g < g_score.get(neighbor, float('inf')):
-                came_from[neighbor] = current
-                g_score[neighbor] = tentative_g
-                f_new = tentative_g + heuristic(neighbor, end)
-                heapq.heappush(open_heap, (f_new, tentative_g, neighbor))
+    tiles_dict: {(x, y): {'is_walkable': bool, 'terrain_type': str, 'movement_cost': int}}
+    Returns: {'path': [(x, y), ...], 'total_cost': float, 'reachable': bool, 'terrain_breakdown': {...}}
 
-    return {'path': [], 'total_cost': 0.0, 'reachable': False, 'terrain_breakdown': {}}
+    Prefer astar_grid with a NavigationGrid (e.g. MapGrid.navigation_grid())
+    when running more than one search on the same map.
+    """
+    return astar_grid(NavigationGrid.from_tiles_dict(tiles_dict, width, height), start, end, allow_diagonal)
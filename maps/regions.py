@@ -0,0 +1,330 @@
+"""
+Connected regions of passable tiles.
+
+A RegionIndex labels every passable tile of a NavigationGrid with the id
+of its connected region (8-connected, matching the searches' movement
+rules: a diagonal step may cut a corner). Two tiles with different labels
+have no path between them, so the pathfinding endpoints can reject such
+queries in constant time instead of searching the whole reachable area
+first.
+
+The index hangs off its NavigationGrid and is carried over by
+NavigationGrid.patched: a painted passable tile joins or
+merges its neighbours' regions (relabelling the smaller ones through
+their cell sets), and a painted wall floods outwards from its neighbours
+only until they meet again, to find out whether it split its region.
+
+The generators use the same labelling to report disconnected pockets on
+generated maps and, on request, to tunnel them into the largest region
+(connect_regions).
+"""
+from collections import deque
+from typing import Dict, Iterable, List, Sequence, Set
+
+import numpy as np
+
+from .pathfinding import NavigationGrid, Point, tile_step_cost
+from .terrain_grid import BaseTerrain, TerrainGrid
+
+
+class RegionIndex:
+    """
+    Region label of every tile of one NavigationGrid.
+
+    Attributes:
+        labels: Padded-index region ids, 0 for impassable tiles
+        cells: Region id -> set of its padded indices; sets are shared with
+            the index this one was patched from until a patch changes them
+    """
+
+    def __init__(self, grid: NavigationGrid, labels: List[int], cells: Dict[int, Set[int]], next_label: int):
+        self.grid = grid
+        self.labels = labels
+        self.cells = cells
+        self.next_label = next_label
+        # Regions whose cell sets belong to this index and may be modified
+        self._owned: Set[int] = set()
+
+    @property
+    def sizes(self) -> Dict[int, int]:
+        """Region id -> number of tiles"""
+        return {label: len(cells) for label, cells in self.cells.items()}
+
+    @classmethod
+    def build(cls, grid: NavigationGrid) -> 'RegionIndex':
+        index = cls(grid, [0] * len(grid.padded), {}, 1)
+        cost, labels = grid.padded, index.labels
+        for cell in range(len(cost)):
+            if cost[cell] and not labels[cell]:
+                index._flood(cell, index._new_label())
+        return index
+
+    def patched(self, grid: NavigationGrid, tiles: Iterable[Dict]) -> 'RegionIndex':
+        """Index for `grid`, a patched copy of this index's grid"""
+        index = RegionIndex(grid, list(self.labels), dict(self.cells), self.next_label)
+        cost, labels = grid.padded, index.labels
+        closed = []
+        for tile in tiles:
+            cell = grid.to_padded((tile['x'], tile['y']))
+            if cost[cell] and not labels[cell]:
+                index._open(cell)
+            elif not cost[cell] and labels[cell]:
+                closed.append(cell)
+        if closed:
+            index._close(closed)
+        return index
+
+    def _new_label(self) -> int:
+        label = self.next_label
+        self.next_label += 1
+        self._owned.add(label)
+        return label
+
+    def _writable(self, label: int) -> Set[int]:
+        """Cell set of a region, copied first if it is still shared"""
+        if label not in self._owned:
+            self.cells[label] = set(self.cells[label])
+            self._owned.add(label)
+        return self.cells[label]
+
+    def _open(self, cell: int) -> None:
+        """A tile became passable: join it to the regions around it, merging them"""
+        labels, cost = self.labels, self.grid.padded
+        # Walls painted in the same patch may still carry their old label
+        around = {labels[cell + offset] for offset, _ in self.grid.steps(True) if cost[cell + offset]} - {0}
+        if not around:
+            label = self._new_label()
+            labels[cell] = label
+            self.cells[label] = {cell}
+            return
+        keep = max(around, key=lambda region: len(self.cells[region]))
+        kept = self._writable(keep)
+        for region in around - {keep}:
+            # Relabel the smaller regions only, through their cell sets
+            merged = self.cells.pop(region)
+            self._owned.discard(region)
+            for other in merged:
+                labels[other] = keep
+            kept |= merged
+        labels[cell] = keep
+        kept.add(cell)
+
+    def _close(self, closed: List[int]) -> None:
+        """Remove tiles that became impassable, then split the regions they may have cut"""
+        labels, cost = self.labels, self.grid.padded
+        for cell in closed:
+            label = labels[cell]
+            if not label:
+                continue
+            labels[cell] = 0
+            region = self._writable(label)
+            region.discard(cell)
+            if not region:
+                del self.cells[label]
+                self._owned.discard(label)
+
+        seeds: Dict[int, List[int]] = {}
+        for cell in closed:
+            for offset, _ in self.grid.steps(True):
+                neighbour = cell + offset
+                if cost[neighbour] and labels[neighbour]:
+                    seeds.setdefault(labels[neighbour], []).append(neighbour)
+        for label, cells in seeds.items():
+            self._split(label, list(dict.fromkeys(cells)))
+
+    def _split(self, label: int, seeds: List[int]) -> None:
+        """
+        Give each part of a region that is no longer connected its own label.
+
+        One breadth-first search grows from each seed (the region's tiles
+        next to the removed ones), in turns; searches that meet are merged.
+        A search that runs out of tiles before meeting the others has
+        enclosed a separate region and relabels what it visited, and the
+        work stops as soon as a single search is left. A wall that splits
+        nothing therefore costs only the loops around it, and a split costs
+        the size of the smaller parts.
+        """
+        if len(seeds) < 2:
+            return
+        labels, cost = self.labels, self.grid.padded
+        region = self._writable(label)
+        offsets = [offset for offset, _ in self.grid.steps(True)]
+
+        # Union-find over the searches; each root keeps a queue and its visited cells
+        parent = list(range(len(seeds)))
+        owner = {seed: number for number, seed in enumerate(seeds)}
+        queues = {number: deque([seed]) for number, seed in enumerate(seeds)}
+        visited = {number: [seed] for number, seed in enumerate(seeds)}
+
+        def find(number):
+            while parent[number] != number:
+                parent[number] = parent[parent[number]]
+                number = parent[number]
+            return number
+
+        def union(first, second):
+            first, second = find(first), find(second)
+            if first == second:
+                return
+            if len(visited[first]) < len(visited[second]):
+                first, second = second, first
+            parent[second] = first
+            queues[first].extend(queues.pop(second))
+            visited[first].extend(visited.pop(second))
+
+        for number, seed in enumerate(seeds):
+            for offset in offsets:
+                neighbour = owner.get(seed + offset)
+                if neighbour is not None:
+                    union(number, neighbour)
+
+        while len(queues) > 1:
+            for root in list(queues):
+                if len(queues) < 2:
+                    break
+                if root not in queues:
+                    continue
+                queue = queues[root]
+                if not queue:
+                    # Enclosed: everything this search reached is a region of its own
+                    queues.pop(root)
+                    part = set(visited.pop(root))
+                    new = self._new_label()
+                    for other in part:
+                        labels[other] = new
+                    self.cells[new] = part
+                    region -= part
+                    continue
+                current = queue.popleft()
+                for offset in offsets:
+                    neighbour = current + offset
+                    if not cost[neighbour] or labels[neighbour] != label:
+                        continue
+                    seen = owner.get(neighbour)
+                    if seen is None:
+                        # This search may have been merged into another one meanwhile
+                        root = find(root)
+                        owner[neighbour] = root
+                        queues[root].append(neighbour)
+                        visited[root].append(neighbour)
+                    else:
+                        union(root, seen)
+
+    def _flood(self, source: int, label: int) -> None:
+        """Label every unlabelled passable tile connected to `source`"""
+        cost, labels = self.grid.padded, self.labels
+        neighbours = [offset for offset, _ in self.grid.steps(True)]
+        labels[source] = label
+        cells = {source}
+        queue = deque([source])
+        while queue:
+            current = queue.popleft()
+            for offset in neighbours:
+                neighbor = current + offset
+                if cost[neighbor] and not labels[neighbor]:
+                    labels[neighbor] = label
+                    cells.add(neighbor)
+                    queue.append(neighbor)
+        self.cells[label] = cells
+
+    def region_of(self, point: Point) -> int:
+        """Region id of a tile, 0 if it is impassable or off the map"""
+        if not self.grid.contains(point):
+            return 0
+        return self.labels[self.grid.to_padded(point)]
+
+    def connected(self, start: Point, end: Point) -> bool:
+        """
+        Whether a path from `start` to `end` can exist.
+
+        Searches may start on an impassable tile (a token standing where a
+        wall was painted), so such a start counts as belonging to every
+        region around it.
+        """
+        grid = self.grid
+        if not (grid.contains(start) and grid.contains(end)):
+            return False
+        target = self.labels[grid.to_padded(end)]
+        if not target:
+            return start == end
+        source = grid.to_padded(start)
+        if self.labels[source]:
+            return self.labels[source] == target
+        return any(self.labels[source + offset] == target for offset, _ in grid.steps(True))
+
+    def summary(self) -> Dict:
+        """Region count and sizes, largest first"""
+        sizes = sorted(self.sizes.values(), reverse=True)
+        return {
+            'count': len(sizes),
+            'sizes': sizes,
+            'pocket_tiles': sum(sizes[1:]),
+        }
+
+
+def region_index(grid: NavigationGrid) -> RegionIndex:
+    """The grid's region index, built on first use and kept on the grid"""
+    if grid.regions is None:
+        grid.regions = RegionIndex.build(grid)
+    return grid.regions
+
+
+def region_summary(grid: TerrainGrid, lookup: Sequence[Dict]) -> Dict:
+    """RegionIndex.summary of a generated grid"""
+    return RegionIndex.build(terrain_navigation(grid, lookup)).summary()
+
+
+def terrain_navigation(grid: TerrainGrid, lookup: Sequence[Dict]) -> NavigationGrid:
+    """Passability of a generated grid under a terrain lookup table"""
+    step_costs = np.array([tile_step_cost(info['type'], info['walkable']) for info in lookup])
+    return NavigationGrid(grid.width, grid.height, step_costs[grid.cells].ravel().tolist())
+
+
+def connect_regions(grid: TerrainGrid, lookup: Sequence[Dict]) -> int:
+    """
+    Tunnel every pocket of a generated grid into its largest region.
+
+    One breadth-first search grows outwards from the largest region
+    through walls and all; whenever it reaches a tile of a pocket that is
+    not yet connected, its route back (the shortest from the largest
+    region, possibly through pockets joined earlier) is carved as floor.
+    The grid is modified in place.
+
+    Returns:
+        Number of pockets connected
+    """
+    navigation = terrain_navigation(grid, lookup)
+    index = RegionIndex.build(navigation)
+    sizes = index.sizes
+    if len(sizes) < 2:
+        return 0
+
+    labels = index.labels
+    main = max(sizes, key=sizes.get)
+    stride = navigation.stride
+    inside = [False] * len(labels)
+    for y in range(grid.height):
+        row_start = (y + 1) * stride + 1
+        inside[row_start:row_start + grid.width] = [True] * grid.width
+
+    parent = {cell: -1 for cell, label in enumerate(labels) if label == main}
+    joined = {main}
+    queue = deque(parent)
+    while queue and len(joined) < len(sizes):
+        current = queue.popleft()
+        for offset in (1, -1, stride, -stride):
+            neighbor = current + offset
+            if not inside[neighbor] or neighbor in parent:
+                continue
+            parent[neighbor] = current
+            label = labels[neighbor]
+            if label and label not in joined:
+                joined.add(label)
+                # Carve from the pocket edge back to the connected area
+                cell = parent[neighbor]
+                while cell != -1 and labels[cell] not in joined:
+                    x, y = navigation.from_padded(cell)
+                    grid.cells[y, x] = BaseTerrain.FLOOR
+                    cell = parent[cell]
+            queue.append(neighbor)
+    return len(joined) - 1
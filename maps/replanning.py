@@ -0,0 +1,269 @@
+"""
+Incremental path replanning (D* Lite) for live path previews.
+
+A PathPlanner searches backwards from its goal and keeps its search state
+(g and rhs values plus the open list) between queries. When tiles change,
+only the tiles next to the edit are re-examined and the repair spreads
+just as far as costs actually changed, so replanning after a paint stroke
+costs in proportion to the stroke's effect on the path rather than to the
+size of the map. The start may also move (a token walking its path)
+without starting over.
+
+Step costs and movement rules are those of astar_grid, so a planner's
+path always has astar_grid's total cost. Each planner owns a private copy
+of the map's NavigationGrid and updates it in place.
+
+ReplanningSessions groups the planners of one WebSocket connection, keyed
+by (start, goal); MapConsumer applies every broadcast tile update to them
+and pushes the repaired paths to the client.
+"""
+import heapq
+import math
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .pathfinding import COST_DIAGONAL, COST_STRAIGHT, NavigationGrid, Point, path_result, unreachable_result
+
+INFINITY = math.inf
+
+# Default number of live planners per connection
+DEFAULT_MAX_SESSIONS = 8
+
+
+class PathPlanner:
+    """
+    D* Lite search from a start to a fixed goal on a private grid.
+
+    Attributes:
+        expanded: Tiles expanded by the most recent plan or repair
+    """
+
+    def __init__(self, grid: NavigationGrid, start: Point, goal: Point, allow_diagonal: bool = True):
+        self.grid = NavigationGrid(grid.width, grid.height, grid.costs, grid.terrain, grid.terrain_names)
+        self.start = start
+        self.goal = goal
+        self.steps = self.grid.steps(allow_diagonal)
+        self.diagonal_saving = 2 * COST_STRAIGHT - COST_DIAGONAL if allow_diagonal else 0
+        self.source = self.grid.to_padded(start)
+        self.target = self.grid.to_padded(goal)
+        # On-map cells of the padded grid
+        self.inside = [False] * len(self.grid.padded)
+        for y in range(grid.height):
+            row_start = (y + 1) * self.grid.stride + 1
+            self.inside[row_start:row_start + grid.width] = [True] * grid.width
+        self.km = 0
+        self.g: Dict[int, float] = {}
+        self.rhs: Dict[int, float] = {self.target: 0}
+        self.open: Dict[int, Tuple[float, float]] = {}
+        self.heap: List[Tuple[float, float, int]] = []
+        self.expanded = 0
+        self._push(self.target)
+
+    def _heuristic(self, cell: int) -> int:
+        """Octile (or Manhattan) distance from the start; every multiplier is at least 1"""
+        stride = self.grid.stride
+        y, x = divmod(cell, stride)
+        start_y, start_x = divmod(self.source, stride)
+        dx, dy = abs(x - start_x), abs(y - start_y)
+        return COST_STRAIGHT * (dx + dy) - self.diagonal_saving * min(dx, dy)
+
+    def _key(self, cell: int) -> Tuple[float, float]:
+        best = min(self.g.get(cell, INFINITY), self.rhs.get(cell, INFINITY))
+        return best + self._heuristic(cell) + self.km, best
+
+    def _push(self, cell: int) -> None:
+        key = self._key(cell)
+        self.open[cell] = key
+        heapq.heappush(self.heap, (key[0], key[1], cell))
+
+    def _top(self) -> Tuple[Tuple[float, float], int]:
+        """Smallest live open-list entry (stale heap entries are dropped)"""
+        heap = self.heap
+        while heap:
+            k1, k2, cell = heap[0]
+            if self.open.get(cell) == (k1, k2):
+                return (k1, k2), cell
+            heapq.heappop(heap)
+        return (INFINITY, INFINITY), -1
+
+    def _successor_cost(self, cell: int) -> float:
+        """Cheapest step out of `cell` plus the remaining cost from there"""
+        cost, g = self.grid.padded, self.g
+        best = INFINITY
+        for offset, step in self.steps:
+            neighbor = cell + offset
+            multiplier = cost[neighbor]
+            if multiplier:
+                total = step * multiplier + g.get(neighbor, INFINITY)
+                if total < best:
+                    best = total
+        return best
+
+    def _update(self, cell: int) -> None:
+        if cell != self.target:
+            self.rhs[cell] = self._successor_cost(cell)
+        self._requeue(cell)
+
+    def _requeue(self, cell: int) -> None:
+        """Queue `cell` if it is inconsistent, drop it otherwise"""
+        self.open.pop(cell, None)
+        if self.g.get(cell, INFINITY) != self.rhs.get(cell, INFINITY):
+            self._push(cell)
+
+    def _predecessors(self, cell: int) -> List[Tuple[int, int]]:
+        """(tile, step cost) for each on-map neighbour that can step onto `cell`"""
+        inside = self.inside
+        return [(cell - offset, step) for offset, step in self.steps if inside[cell - offset]]
+
+    def plan(self) -> Dict:
+        """Bring the search up to date and return the current path"""
+        expanded = 0
+        g, rhs = self.g, self.rhs
+        cost = self.grid.padded
+        source, target = self.source, self.target
+        while True:
+            top_key, cell = self._top()
+            if cell == -1 or not (top_key < self._key(source) or
+                                  rhs.get(source, INFINITY) != g.get(source, INFINITY)):
+                break
+            expanded += 1
+            new_key = self._key(cell)
+            if top_key < new_key:
+                self._push(cell)
+                continue
+            del self.open[cell]
+            entry = cost[cell]
+            g_old = g.get(cell, INFINITY)
+            if g_old > rhs[cell]:
+                # Cost went down: predecessors can only improve through `cell`
+                g_cell = g[cell] = rhs[cell]
+                if entry:
+                    for predecessor, step in self._predecessors(cell):
+                        through = step * entry + g_cell
+                        if predecessor != target and through < rhs.get(predecessor, INFINITY):
+                            rhs[predecessor] = through
+                            self._requeue(predecessor)
+            else:
+                # Cost went up: predecessors that relied on `cell` look again
+                g[cell] = INFINITY
+                self._update(cell)
+                if entry:
+                    for predecessor, step in self._predecessors(cell):
+                        if rhs.get(predecessor, INFINITY) == step * entry + g_old:
+                            self._update(predecessor)
+        self.expanded = expanded
+        return self.path()
+
+    def path(self) -> Dict:
+        """Current path, in astar_grid's result format"""
+        grid = self.grid
+        if self.start == self.goal:
+            return {'path': [self.start], 'total_cost': 0.0, 'reachable': True, 'terrain_breakdown': {}}
+        if not grid.cost_at(self.goal):
+            return unreachable_result()
+        total = self.rhs.get(self.source, INFINITY)
+        if total == INFINITY:
+            return unreachable_result()
+
+        cost, g = grid.padded, self.g
+        current = self.source
+        path = [self.start]
+        limit = grid.width * grid.height
+        while current != self.target and len(path) <= limit:
+            best, best_total = -1, INFINITY
+            for offset, step in self.steps:
+                neighbor = current + offset
+                if cost[neighbor]:
+                    candidate = step * cost[neighbor] + g.get(neighbor, INFINITY)
+                    if candidate < best_total:
+                        best, best_total = neighbor, candidate
+            if best == -1:
+                return unreachable_result()
+            current = best
+            path.append(grid.from_padded(current))
+        if current != self.target:
+            return unreachable_result()
+        return path_result(grid, path, int(total))
+
+    def update_tiles(self, tiles: Sequence[Dict]) -> bool:
+        """
+        Apply changed tiles (grid_storage.update_tiles dicts) to the search.
+
+        Returns:
+            Whether any tile's movement cost changed; call plan() to repair
+        """
+        changed = self.grid.apply_tiles(tiles)
+        for cell in changed:
+            # Only the cost of stepping onto `cell` changed: its neighbours' rhs
+            for predecessor, _ in self._predecessors(cell):
+                self._update(predecessor)
+        return bool(changed)
+
+    def move_start(self, start: Point) -> None:
+        """Move the start (e.g. the token advanced) keeping the search state"""
+        self.km += self._heuristic(self.grid.to_padded(start))
+        self.start = start
+        self.source = self.grid.to_padded(start)
+
+
+class ReplanningSessions:
+    """
+    Live planners of one connection, keyed by (start, goal).
+
+    The least recently used planner is dropped beyond `max_sessions`.
+    """
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._planners: 'OrderedDict[int, PathPlanner]' = OrderedDict()
+        self._keys: Dict[Tuple[Point, Point], int] = {}
+        self._next_id = 1
+
+    def __len__(self) -> int:
+        return len(self._planners)
+
+    def open(self, grid: NavigationGrid, start: Point, goal: Point) -> Tuple[int, Dict]:
+        """Planner for (start, goal), reusing a live one; returns (session id, path)"""
+        session_id = self._keys.get((start, goal))
+        if session_id is not None:
+            self._planners.move_to_end(session_id)
+            planner = self._planners[session_id]
+            planner.expanded = 0
+            return session_id, planner.path()
+
+        session_id = self._next_id
+        self._next_id += 1
+        planner = PathPlanner(grid, start, goal)
+        self._planners[session_id] = planner
+        self._keys[(start, goal)] = session_id
+        while len(self._planners) > self.max_sessions:
+            self.close(next(iter(self._planners)))
+        return session_id, planner.plan()
+
+    def get(self, session_id: int) -> Optional[PathPlanner]:
+        return self._planners.get(session_id)
+
+    def move(self, session_id: int, start: Point) -> Optional[Dict]:
+        planner = self._planners.get(session_id)
+        if planner is None:
+            return None
+        del self._keys[(planner.start, planner.goal)]
+        duplicate = self._keys.get((start, planner.goal))
+        if duplicate is not None:
+            self.close(duplicate)
+        planner.move_start(start)
+        self._keys[(start, planner.goal)] = session_id
+        return planner.plan()
+
+    def close(self, session_id: int) -> None:
+        planner = self._planners.pop(session_id, None)
+        if planner is not None:
+            self._keys.pop((planner.start, planner.goal), None)
+
+    def update_tiles(self, tiles: Sequence[Dict]) -> List[Tuple[int, Dict]]:
+        """Apply changed tiles to every planner; returns (session id, path) for each repaired one"""
+        repaired = []
+        for session_id, planner in self._planners.items():
+            if planner.update_tiles(tiles):
+                repaired.append((session_id, planner.plan()))
+        return repaired
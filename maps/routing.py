@@ -1,11 +1,13 @@
 """
 WebSocket URL routing for maps app.
 
-Defines WebSocket URL patterns for real-time collaborative map editing.
+Defines WebSocket URL patterns for real-time collaborative map editing
+and generation job progress.
 """
 from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/maps/(?P<map_id>\d+)/$', consumers.MapConsumer.as_asgi()),
+    re_path(r'ws/maps/jobs/(?P<job_id>\d+)/$', consumers.GenerationJobConsumer.as_asgi()),
 ]
@@ -0,0 +1,128 @@
+"""
+Per-map HPA* hierarchies for sectored maps.
+
+Exact searches on a sectored map read the box around start and goal
+(maps.path_cache.window_path), which stops at MAX_READ_SECTORS sectors,
+so a drag preview across a large map cannot be answered that way. Such
+previews go through a ClusterHierarchy (maps.hierarchy) with one cluster
+per stored sector instead. Sectors that were never created are left out,
+which blocks them just as load_region's unloaded void does, and nothing is
+generated.
+
+Hierarchies are kept in process memory per map and brought up to date
+when a query sees a newer Map.revision: the sectors' (pk, updated_at)
+stamps are listed, and only sectors that were created, painted or
+replaced since the last look are read again, MAX_READ_SECTORS at a time.
+A paint stroke therefore costs a read of the painted sectors rather than
+a rebuild, and writes from other processes are picked up the same way.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from .hierarchy import ClusterHierarchy, hierarchy_path
+from .models import Map, MapSector
+from .pathfinding import Point
+from .sectors import MAX_READ_SECTORS, SECTOR_SIZE, SectorKey, load_sectors
+
+# Default number of maps whose sector hierarchies are kept
+DEFAULT_MAX_MAPS = 8
+
+# Sector key -> (pk, updated_at) of the stored row the hierarchy was built from
+SectorStamps = Dict[SectorKey, Tuple]
+
+
+class SectorHierarchyCache:
+    """
+    Thread-safe LRU of (revision, sector stamps, ClusterHierarchy) keyed by map id.
+    """
+
+    def __init__(self, max_maps: int = DEFAULT_MAX_MAPS):
+        self.max_maps = max_maps
+        self._entries: 'OrderedDict[int, Tuple[int, SectorStamps, ClusterHierarchy]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sectors_read = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def hierarchy(self, map_obj: Map) -> ClusterHierarchy:
+        """
+        The map's hierarchy at its current revision.
+
+        On a miss the stored sectors are compared with the cached stamps
+        outside the lock, and the refreshed hierarchy is only stored if no
+        newer revision was stored meanwhile.
+        """
+        with self._lock:
+            entry = self._entries.get(map_obj.pk)
+            if entry is not None and entry[0] == map_obj.revision:
+                self._entries.move_to_end(map_obj.pk)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        if entry is None or (entry[2].width, entry[2].height) != (map_obj.width, map_obj.height):
+            entry = (0, {}, ClusterHierarchy(map_obj.width, map_obj.height, SECTOR_SIZE))
+        stamps, hierarchy = self._refresh(map_obj, entry[1], entry[2])
+
+        with self._lock:
+            current = self._entries.get(map_obj.pk)
+            if current is None or current[0] <= map_obj.revision:
+                self._entries[map_obj.pk] = (map_obj.revision, stamps, hierarchy)
+                self._entries.move_to_end(map_obj.pk)
+            while len(self._entries) > self.max_maps:
+                self._entries.popitem(last=False)
+        return hierarchy
+
+    def _refresh(self, map_obj: Map, stamps: SectorStamps,
+                 hierarchy: ClusterHierarchy) -> Tuple[SectorStamps, ClusterHierarchy]:
+        """Read the sectors whose stamps changed into the hierarchy"""
+        current = {
+            (sector_x, sector_y): (pk, updated_at)
+            for sector_x, sector_y, pk, updated_at in MapSector.objects.filter(map=map_obj).values_list(
+                'sector_x', 'sector_y', 'pk', 'updated_at'
+            )
+        }
+        removed = {key: None for key in stamps if key not in current}
+        if removed:
+            hierarchy = hierarchy.updated(removed)
+        changed = [key for key, stamp in current.items() if stamps.get(key) != stamp]
+        for first in range(0, len(changed), MAX_READ_SECTORS):
+            batch = load_sectors(map_obj, changed[first:first + MAX_READ_SECTORS], generate=False)
+            hierarchy = hierarchy.updated({key: sector.navigation_grid() for key, sector in batch.items()})
+        with self._lock:
+            self.sectors_read += len(changed)
+        return current, hierarchy
+
+    def discard(self, map_id: int) -> None:
+        with self._lock:
+            self._entries.pop(map_id, None)
+
+    def clear(self) -> None:
+        """Drop every cached hierarchy and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.sectors_read = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'maps': len(self._entries),
+                'max_maps': self.max_maps,
+                'hits': self.hits,
+                'misses': self.misses,
+                'sectors_read': self.sectors_read,
+            }
+
+
+sector_hierarchies = SectorHierarchyCache(getattr(settings, 'MAP_SECTOR_HIERARCHY_MAPS', DEFAULT_MAX_MAPS))
+
+
+def sector_path(map_obj: Map, start: Point, end: Point, stats: Optional[Dict] = None) -> Dict:
+    """Near-optimal path on a sectored map through its sector hierarchy (see hierarchy_path)"""
+    return hierarchy_path(sector_hierarchies.hierarchy(map_obj), start, end, stats)
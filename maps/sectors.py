@@ -0,0 +1,281 @@
+"""
+Sectored storage for large maps.
+
+Maps using the 'sectored' tile storage mode are split into fixed-size
+square sectors (MapSector rows), each holding the packed grid encoding
+for SECTOR_SIZE x SECTOR_SIZE tiles. Sectors are only created when they
+are first read: generated maps run their generation algorithm for that
+sector from a seed derived from the map seed and sector position, other
+maps get blank floor. Memory use and load time therefore follow the area
+a client is looking at, not the size of the map.
+
+Only the viewport and tile paints create sectors. Reads on behalf of
+pathfinding, vision and line of sight (load_region with generate=False,
+which load_grid uses) see ungenerated sectors as unloaded void, blocked
+and opaque, and are limited to MAX_READ_SECTORS sectors, so no query can
+make a viewer pay for generating the whole map. Creating sectors bumps
+Map.revision, so cached grids pick up the newly generated terrain.
+
+Each sector is generated with a margin of extra tiles that is cropped
+away afterwards, so algorithms that wall in their edges (caves, mazes)
+do not leave a solid grid of walls along every sector boundary.
+"""
+import base64
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from django.db import transaction
+
+from .generators import get_terrain_config, run_generation_algorithm, terrain_lookup_table
+from .grid_storage import TERRAIN_TYPES, GridTooLargeError, MapGrid, bump_revision, load_grid
+from .models import Map, MapSector
+
+SECTOR_SIZE = 32
+
+# Extra tiles generated around each sector and cropped away
+GENERATION_MARGIN = 8
+
+# Upper bound on sectors returned for one viewport request
+MAX_VIEWPORT_SECTORS = 64
+
+# Upper bound on sectors assembled for one region read (512 x 512 tiles)
+MAX_READ_SECTORS = 256
+
+# Tile settings for sectors of maps that were not generated (matches map_create)
+BLANK_TILE = {'terrain_type': 'floor', 'color': '#E8E8E8'}
+
+# Tile settings standing in for sectors that have not been created yet
+UNLOADED_TILE = {'terrain_type': 'void', 'color': '#000000', 'is_walkable': False, 'is_transparent': False}
+
+SectorKey = Tuple[int, int]
+
+
+def sector_grid_size(map_obj: Map) -> SectorKey:
+    """Number of sector columns and rows covering the map"""
+    return (
+        (map_obj.width + SECTOR_SIZE - 1) // SECTOR_SIZE,
+        (map_obj.height + SECTOR_SIZE - 1) // SECTOR_SIZE,
+    )
+
+
+def sector_bounds(map_obj: Map, sector_x: int, sector_y: int) -> Tuple[int, int, int, int]:
+    """Tile rectangle (x, y, width, height) covered by a sector"""
+    x = sector_x * SECTOR_SIZE
+    y = sector_y * SECTOR_SIZE
+    return x, y, min(SECTOR_SIZE, map_obj.width - x), min(SECTOR_SIZE, map_obj.height - y)
+
+
+def sector_of(x: int, y: int) -> SectorKey:
+    """Sector containing tile (x, y)"""
+    return x // SECTOR_SIZE, y // SECTOR_SIZE
+
+
+def sector_seed(seed: str, sector_x: int, sector_y: int) -> str:
+    """Generation seed for one sector, derived from the map seed"""
+    return f"{seed}:{sector_x}:{sector_y}"
+
+
+def viewport_sectors(map_obj: Map, x: int, y: int, width: int, height: int) -> List[SectorKey]:
+    """
+    Sectors overlapping a tile rectangle, clipped to the map.
+
+    Returns at most MAX_VIEWPORT_SECTORS keys in row-major order.
+    """
+    columns, rows = sector_grid_size(map_obj)
+    x0, y0 = max(x, 0) // SECTOR_SIZE, max(y, 0) // SECTOR_SIZE
+    x1 = min((x + width - 1) // SECTOR_SIZE, columns - 1)
+    y1 = min((y + height - 1) // SECTOR_SIZE, rows - 1)
+
+    keys = [
+        (sector_x, sector_y)
+        for sector_y in range(y0, y1 + 1)
+        for sector_x in range(x0, x1 + 1)
+    ]
+    return keys[:MAX_VIEWPORT_SECTORS]
+
+
+def build_sector(map_obj: Map, sector_x: int, sector_y: int) -> MapGrid:
+    """Create the initial contents of a sector that has never been stored"""
+    _, _, width, height = sector_bounds(map_obj, sector_x, sector_y)
+
+    if not (map_obj.is_generated and map_obj.generation_algorithm):
+        return MapGrid.blank(width, height, **BLANK_TILE)
+
+    margin = GENERATION_MARGIN
+    terrain_grid = run_generation_algorithm(
+        width + 2 * margin, height + 2 * margin, map_obj.map_type,
+        sector_seed(map_obj.generation_seed, sector_x, sector_y),
+        map_obj.generation_algorithm, map_obj.generation_params,
+    )
+    table = terrain_lookup_table(get_terrain_config(map_obj.map_type))
+    return MapGrid.from_terrain_grid(terrain_grid, table).region(margin, margin, width, height)
+
+
+def load_sectors(map_obj: Map, keys: Iterable[SectorKey], generate: bool = True) -> Dict[SectorKey, MapGrid]:
+    """
+    Load sectors by (sector_x, sector_y), creating any that don't exist yet.
+
+    Existing sectors are read with one query; missing ones are built and
+    inserted in one bulk_create, which bumps the map's revision. If another
+    request creates the same sector first, its stored copy wins. With
+    `generate` off, missing sectors are returned as UNLOADED_TILE grids
+    and nothing is written.
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+
+    stored = _stored_sectors(map_obj, keys)
+    missing = [key for key in keys if key not in stored]
+    if missing and generate:
+        MapSector.objects.bulk_create([
+            MapSector(
+                map=map_obj, sector_x=sector_x, sector_y=sector_y,
+                grid_data=build_sector(map_obj, sector_x, sector_y).to_bytes(),
+            )
+            for sector_x, sector_y in missing
+        ], ignore_conflicts=True)
+        stored.update(_stored_sectors(map_obj, missing))
+        bump_revision(map_obj)
+
+    return {
+        key: MapGrid.from_bytes(stored[key]) if key in stored
+        else MapGrid.blank(*sector_bounds(map_obj, *key)[2:], **UNLOADED_TILE)
+        for key in keys
+    }
+
+
+def _stored_sectors(map_obj: Map, keys: List[SectorKey]) -> Dict[SectorKey, bytes]:
+    """Encoded data of the stored sectors among `keys`"""
+    wanted = set(keys)
+    rows = MapSector.objects.filter(
+        map=map_obj,
+        sector_x__range=(min(x for x, _ in keys), max(x for x, _ in keys)),
+        sector_y__range=(min(y for _, y in keys), max(y for _, y in keys)),
+    ).values_list('sector_x', 'sector_y', 'grid_data')
+    return {
+        (sector_x, sector_y): grid_data
+        for sector_x, sector_y, grid_data in rows
+        if (sector_x, sector_y) in wanted
+    }
+
+
+def load_region(map_obj: Map, x: int, y: int, width: int, height: int, generate: bool = True) -> MapGrid:
+    """
+    Assemble the tiles of a rectangle of a sectored map into one grid.
+
+    `generate` is passed to load_sectors. Raises GridTooLargeError if the
+    rectangle covers more than MAX_READ_SECTORS sectors.
+    """
+    x0, y0 = max(x, 0), max(y, 0)
+    width = min(x + width, map_obj.width) - x0
+    height = min(y + height, map_obj.height) - y0
+
+    columns, rows = sector_grid_size(map_obj)
+    keys = [
+        (sector_x, sector_y)
+        for sector_y in range(y0 // SECTOR_SIZE, min((y0 + height - 1) // SECTOR_SIZE + 1, rows))
+        for sector_x in range(x0 // SECTOR_SIZE, min((x0 + width - 1) // SECTOR_SIZE + 1, columns))
+    ]
+    if len(keys) > MAX_READ_SECTORS:
+        raise GridTooLargeError(
+            f'A {width}x{height} region spans {len(keys)} sectors; at most {MAX_READ_SECTORS} can be read at once'
+        )
+
+    region = MapGrid.blank(width, height, **BLANK_TILE)
+    for (sector_x, sector_y), sector in load_sectors(map_obj, keys, generate).items():
+        sector_left, sector_top, _, _ = sector_bounds(map_obj, sector_x, sector_y)
+        # Part of the sector inside the requested rectangle
+        left, top = max(x0 - sector_left, 0), max(y0 - sector_top, 0)
+        part = sector.region(left, top, x0 + width - sector_left - left, y0 + height - sector_top - top)
+        region.paste(part, sector_left + left - x0, sector_top + top - y0)
+    return region
+
+
+def update_sector_tiles(map_obj: Map, updates: List[Dict]) -> None:
+    """
+    Apply validated tile updates (see grid_storage.update_tiles), touching
+    only the sectors that contain them.
+    """
+    by_sector: Dict[SectorKey, List[Dict]] = {}
+    for update in updates:
+        by_sector.setdefault(sector_of(update['x'], update['y']), []).append(update)
+
+    with transaction.atomic():
+        # Make sure every touched sector exists, then lock them for the write
+        load_sectors(map_obj, by_sector)
+        locked = MapSector.objects.select_for_update().filter(
+            map=map_obj,
+            sector_x__in={key[0] for key in by_sector},
+            sector_y__in={key[1] for key in by_sector},
+        )
+        for sector in locked:
+            key = (sector.sector_x, sector.sector_y)
+            if key not in by_sector:
+                continue
+            grid = MapGrid.from_bytes(sector.grid_data)
+            left, top, _, _ = sector_bounds(map_obj, *key)
+            for update in by_sector[key]:
+                grid.set_tile(**{**update, 'x': update['x'] - left, 'y': update['y'] - top})
+            sector.grid_data = grid.to_bytes()
+            sector.save(update_fields=['grid_data', 'updated_at'])
+
+
+def replace_sectors(map_obj: Map, grid: MapGrid) -> None:
+    """Store a whole-map grid as sectors, replacing any existing ones"""
+    columns, rows = sector_grid_size(map_obj)
+    sectors = []
+    for sector_y in range(rows):
+        for sector_x in range(columns):
+            x, y, width, height = sector_bounds(map_obj, sector_x, sector_y)
+            sectors.append(MapSector(
+                map=map_obj, sector_x=sector_x, sector_y=sector_y,
+                grid_data=grid.region(x, y, width, height).to_bytes(),
+            ))
+
+    with transaction.atomic():
+        MapSector.objects.filter(map=map_obj).delete()
+        MapSector.objects.bulk_create(sectors)
+        bump_revision(map_obj)
+
+
+def viewport_payload(map_obj: Map, x: int, y: int, width: int, height: int) -> Dict:
+    """
+    Compact JSON description of the sectors overlapping a viewport.
+
+    Each sector carries its colour palette plus base64 row-major layers:
+    terrain codes (uint8, indices into `terrain_types`) and colour indices
+    (little-endian uint16, indices into the sector palette). Maps that are
+    not sectored are cut into sectors on the fly so clients can use one
+    code path.
+    """
+    keys = viewport_sectors(map_obj, x, y, width, height)
+    if map_obj.is_sectored:
+        grids = load_sectors(map_obj, keys)
+    else:
+        whole = load_grid(map_obj)
+        grids = {key: whole.region(*sector_bounds(map_obj, *key)) for key in keys}
+
+    sectors = []
+    for sector_x, sector_y in keys:
+        grid = grids[(sector_x, sector_y)]
+        left, top, sector_width, sector_height = sector_bounds(map_obj, sector_x, sector_y)
+        sectors.append({
+            'sector_x': sector_x,
+            'sector_y': sector_y,
+            'x': left,
+            'y': top,
+            'width': sector_width,
+            'height': sector_height,
+            'palette': grid.palette,
+            'terrain': base64.b64encode(grid.terrain.astype(np.uint8).tobytes()).decode('ascii'),
+            'colors': base64.b64encode(grid.colors.astype('<u2').tobytes()).decode('ascii'),
+        })
+
+    return {
+        'sector_size': SECTOR_SIZE,
+        'map_width': map_obj.width,
+        'map_height': map_obj.height,
+        'terrain_types': TERRAIN_TYPES,
+        'sectors': sectors,
+    }
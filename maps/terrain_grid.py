@@ -0,0 +1,153 @@
+"""
+Compact terrain storage shared by the map generators.
+
+A TerrainGrid holds one uint8 terrain code per cell instead of a dict of
+(x, y) -> terrain string, and offers slice-based drawing primitives so the
+generators can write whole rooms, corridors and borders at once.
+"""
+from enum import IntEnum
+from typing import Iterator, Sequence, Tuple, Union
+
+import numpy as np
+
+
+class BaseTerrain(IntEnum):
+    """Algorithm-level terrain codes, mapped to real terrain per map type"""
+    WALL = 0
+    FLOOR = 1
+    DOOR = 2
+    CAVE = 3
+    TUNNEL = 4
+    SECONDARY = 5
+
+
+# Lookup table from terrain code to the base terrain name used by the views
+TERRAIN_NAMES = tuple(terrain.name.lower() for terrain in BaseTerrain)
+TERRAIN_CODES = {name: code for code, name in enumerate(TERRAIN_NAMES)}
+
+TerrainLike = Union[BaseTerrain, int, str]
+
+
+def terrain_code(terrain: TerrainLike) -> int:
+    """Resolve a terrain name or code to its integer code"""
+    if isinstance(terrain, str):
+        return TERRAIN_CODES[terrain]
+    return int(terrain)
+
+
+class TerrainGrid:
+    """
+    2D grid of base terrain codes backed by a (height, width) uint8 array.
+
+    Iterating the grid yields (x, y, terrain_name) tuples in row-major order,
+    matching the list format the generators used to return.
+    """
+
+    def __init__(self, width: int, height: int, fill: TerrainLike = BaseTerrain.WALL):
+        self.width = width
+        self.height = height
+        self.cells = np.full((height, width), terrain_code(fill), dtype=np.uint8)
+
+    @classmethod
+    def from_array(cls, cells: np.ndarray) -> 'TerrainGrid':
+        """Wrap an existing (height, width) array of terrain codes without copying"""
+        grid = cls.__new__(cls)
+        grid.height, grid.width = cells.shape
+        grid.cells = np.ascontiguousarray(cells, dtype=np.uint8)
+        return grid
+
+    @classmethod
+    def from_tiles(cls, width: int, height: int, tiles) -> 'TerrainGrid':
+        """Build a grid from an iterable of (x, y, terrain_name) tuples"""
+        grid = cls(width, height)
+        for x, y, terrain in tiles:
+            grid.set(x, y, terrain)
+        return grid
+
+    def __len__(self) -> int:
+        return self.width * self.height
+
+    def __iter__(self) -> Iterator[Tuple[int, int, str]]:
+        names = TERRAIN_NAMES
+        for y, row in enumerate(self.cells.tolist()):
+            for x, code in enumerate(row):
+                yield x, y, names[code]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, TerrainGrid):
+            return NotImplemented
+        return np.array_equal(self.cells, other.cells)
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get(self, x: int, y: int) -> str:
+        """Return the base terrain name at (x, y)"""
+        return TERRAIN_NAMES[self.cells[y, x]]
+
+    def set(self, x: int, y: int, terrain: TerrainLike) -> None:
+        """Set a single cell; coordinates outside the grid are ignored"""
+        if self.in_bounds(x, y):
+            self.cells[y, x] = terrain_code(terrain)
+
+    def fill(self, terrain: TerrainLike) -> None:
+        """Set every cell to one terrain"""
+        self.cells.fill(terrain_code(terrain))
+
+    def fill_rect(self, x: int, y: int, width: int, height: int, terrain: TerrainLike) -> None:
+        """Fill a rectangle, clipped to the grid bounds"""
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, self.width), min(y + height, self.height)
+        if x0 < x1 and y0 < y1:
+            self.cells[y0:y1, x0:x1] = terrain_code(terrain)
+
+    def fill_border(self, terrain: TerrainLike) -> None:
+        """Set the outermost ring of cells"""
+        code = terrain_code(terrain)
+        self.cells[0, :] = code
+        self.cells[-1, :] = code
+        self.cells[:, 0] = code
+        self.cells[:, -1] = code
+
+    def hline(self, x0: int, x1: int, y: int, terrain: TerrainLike, thickness: int = 1) -> None:
+        """Draw a horizontal line from x0 to x1 inclusive, thickening downwards"""
+        left, right = min(x0, x1), max(x0, x1)
+        self.fill_rect(left, y, right - left + 1, thickness, terrain)
+
+    def vline(self, x: int, y0: int, y1: int, terrain: TerrainLike, thickness: int = 1) -> None:
+        """Draw a vertical line from y0 to y1 inclusive, thickening rightwards"""
+        top, bottom = min(y0, y1), max(y0, y1)
+        self.fill_rect(x, top, thickness, bottom - top + 1, terrain)
+
+    def count(self, terrain: TerrainLike) -> int:
+        """Number of cells holding the given terrain"""
+        return int(np.count_nonzero(self.cells == terrain_code(terrain)))
+
+    def mask(self, terrains: Sequence[TerrainLike]) -> np.ndarray:
+        """Boolean (height, width) array of cells matching any of the terrains"""
+        return np.isin(self.cells, [terrain_code(t) for t in terrains])
+
+    def positions(self, terrains: Sequence[TerrainLike]) -> Iterator[Tuple[int, int, str]]:
+        """Yield (x, y, terrain_name) for cells matching any of the terrains"""
+        ys, xs = np.nonzero(self.mask(terrains))
+        codes = self.cells[ys, xs]
+        for x, y, code in zip(xs.tolist(), ys.tolist(), codes.tolist()):
+            yield x, y, TERRAIN_NAMES[code]
+
+    def rows(self) -> Iterator[memoryview]:
+        """Yield each row as a memoryview of terrain codes (no copying)"""
+        for y in range(self.height):
+            yield memoryview(self.cells[y])
+
+    def to_bytes(self) -> bytes:
+        """Export the terrain codes as row-major bytes"""
+        return self.cells.tobytes()
+
+    def translate(self, table: Sequence) -> np.ndarray:
+        """
+        Map every terrain code through a lookup table in one pass.
+
+        `table` is indexed by terrain code; the result has the grid's shape
+        and the table's dtype (e.g. a table of walkable flags or colour ids).
+        """
+        return np.asarray(table)[self.cells]
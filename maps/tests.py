@@ -1,3 +1,1823 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import tempfile
+import random
+import subprocess
+import sys
+import time
 
-# Create your tests here.
+import numpy as np
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from campaigns.models import Campaign, CombatEncounter, CombatLog, CombatParticipant, Session
+from characters.models import Character
+
+from .generators import (
+    GENERATION_ALGORITHMS,
+    generate_cellular_automata_map,
+    run_generation_algorithm,
+    count_walls_around,
+    count_wall_neighbours,
+    get_terrain_config,
+    terrain_lookup_table,
+)
+from .grid_storage import (
+    GridTooLargeError, MapGrid, initialize_tiles, load_grid, map_tiles, pack_map, rle_decode, rle_encode, update_tiles,
+)
+from .hierarchy import ClusterHierarchy, grid_clusters, hierarchical_path, path_cost, smooth_path
+from .benchmarks import (
+    compare_reports, generated_navigation, pathfinding_case, random_pairs, reference_dijkstra, rough_navigation,
+)
+from .consumers import GenerationJobConsumer, MapConsumer
+from .fog import FogMask, fog_payload, fog_runs, load_fog, save_fog
+from .gallery import THUMBNAIL_SIZE, thumbnail
+from .generation_cache import GenerationCache, generation_cache, generation_key
+from .jobs import job_runner
+from .line_of_sight import CoverGrid, lines_of_sight, sight_matrix
+from .navigation import navigation_cache, navigation_grid
+from .path_cache import PathCache, path_cache, path_key
+from .pathfinding import (
+    NavigationGrid,
+    astar,
+    astar_grid,
+    distance_field,
+    find_path,
+    jps_grid,
+    movement_range,
+)
+from .models import Map, MapGenerationJob, MapGenerationPreset, MapObject, MapSector
+from .regions import RegionIndex, connect_regions, region_index, region_summary
+from .replanning import PathPlanner, ReplanningSessions
+from .sector_hierarchy import sector_hierarchies
+from .sectors import SECTOR_SIZE, load_region, load_sectors
+from .visibility import OpacityGrid, PartyVision, Token, opacity_cache, opacity_grid, vision_cache
+from .terrain_grid import BaseTerrain, TerrainGrid
+from .tile_writer import bulk_create_tiles, default_tile_data, replace_map_tiles
+from .views import generate_preview_tiles
+
+
+class CellularAutomataGeneratorTestCase(TestCase):
+    """Test the array-backed cellular automata generator"""
+
+    def test_returns_every_tile_once(self):
+        """Test that the generator covers the whole grid exactly once"""
+        tiles = generate_cellular_automata_map(30, 20, seed='caves')
+
+        self.assertEqual(len(tiles), 30 * 20)
+        self.assertEqual({(x, y) for x, y, _ in tiles}, {(x, y) for y in range(20) for x in range(30)})
+        self.assertTrue(all(terrain in ('wall', 'cave') for _, _, terrain in tiles))
+
+    def test_edges_are_walls(self):
+        """Test that the map border is always wall"""
+        tiles = {(x, y): terrain for x, y, terrain in generate_cellular_automata_map(25, 25, seed='edge')}
+
+        for i in range(25):
+            self.assertEqual(tiles[(i, 0)], 'wall')
+            self.assertEqual(tiles[(i, 24)], 'wall')
+            self.assertEqual(tiles[(0, i)], 'wall')
+            self.assertEqual(tiles[(24, i)], 'wall')
+
+    def test_seed_is_reproducible(self):
+        """Test that the same seed produces the same map"""
+        first = generate_cellular_automata_map(40, 40, seed='repeat')
+        second = generate_cellular_automata_map(40, 40, seed='repeat')
+
+        self.assertEqual(first, second)
+
+    def test_neighbour_counts_match_per_cell_counter(self):
+        """Test that the shifted-slice counts agree with count_walls_around"""
+        walls = np.random.default_rng(7).integers(0, 2, size=(12, 15), dtype=np.uint8)
+        lookup = {(x, y): 'wall' if walls[y, x] else 'cave' for y in range(12) for x in range(15)}
+
+        counts = count_wall_neighbours(walls)
+
+        for y in range(1, 11):
+            for x in range(1, 14):
+                self.assertEqual(counts[y - 1, x - 1], count_walls_around(lookup, x, y, 15, 12))
+
+
+class TerrainGridTestCase(TestCase):
+    """Test the TerrainGrid primitives and generator integration"""
+
+    def test_rect_and_lines_clip_to_bounds(self):
+        """Test that drawing primitives clip instead of wrapping around"""
+        grid = TerrainGrid(10, 8)
+        grid.fill_rect(-2, -2, 4, 4, BaseTerrain.FLOOR)
+        grid.hline(7, 20, 5, BaseTerrain.DOOR, thickness=2)
+        grid.set(-1, 3, BaseTerrain.CAVE)
+
+        self.assertEqual(grid.count(BaseTerrain.FLOOR), 4)
+        self.assertEqual(grid.count(BaseTerrain.DOOR), 6)
+        self.assertEqual(grid.count(BaseTerrain.CAVE), 0)
+        self.assertEqual(grid.get(1, 1), 'floor')
+        self.assertEqual(grid.get(9, 6), 'door')
+
+    def test_iteration_matches_tuple_contract(self):
+        """Test that iterating a grid yields row-major (x, y, terrain) tuples"""
+        grid = TerrainGrid(3, 2, 'floor')
+        grid.set(2, 1, 'wall')
+
+        self.assertEqual(list(grid), [
+            (0, 0, 'floor'), (1, 0, 'floor'), (2, 0, 'floor'),
+            (0, 1, 'floor'), (1, 1, 'floor'), (2, 1, 'wall'),
+        ])
+        self.assertEqual(TerrainGrid.from_tiles(3, 2, list(grid)), grid)
+
+    def test_all_algorithms_fill_the_grid(self):
+        """Test that every algorithm returns a full-size grid of known terrain"""
+        for algorithm in ('random', 'bsp', 'cellular_automata', 'random_walk', 'maze'):
+            tiles = generate_preview_tiles(24, 18, 'corporate', 'grid', algorithm)
+
+            self.assertEqual(len(tiles), 24 * 18, algorithm)
+            self.assertEqual(tiles[0]['x'], 0)
+            self.assertEqual(tiles[-1]['y'], 17)
+
+
+class TileWriterTestCase(TestCase):
+    """Test bulk tile persistence"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='gm', password='testpass123')
+        self.map = Map.objects.create(
+            name='Bulk Map', owner=self.user, width=100, height=100, tile_storage=Map.TILE_STORAGE_ROWS
+        )
+
+    def test_bulk_create_writes_every_tile(self):
+        """Test that a full-size map is written completely"""
+        created = bulk_create_tiles(self.map, default_tile_data(100, 100, terrain_type='floor'))
+
+        self.assertEqual(created, 10000)
+        self.assertEqual(self.map.tiles.count(), 10000)
+        self.assertEqual(self.map.tiles.filter(terrain_type='floor').count(), 10000)
+
+    def test_replace_map_tiles_swaps_contents(self):
+        """Test that replacing tiles removes the previous set"""
+        bulk_create_tiles(self.map, default_tile_data(100, 100, terrain_type='floor'))
+        replace_map_tiles(self.map, default_tile_data(100, 100, terrain_type='wall', is_walkable=False))
+
+        self.assertEqual(self.map.tiles.count(), 10000)
+        self.assertFalse(self.map.tiles.filter(terrain_type='floor').exists())
+
+    def test_map_create_view_initializes_tiles(self):
+        """Test that creating a map through the view initializes all tiles"""
+        self.client.login(username='gm', password='testpass123')
+        response = self.client.post(reverse('maps:create'), {
+            'name': 'Created Map',
+            'width': 40,
+            'height': 30,
+            'tile_size': 50,
+            'map_type': 'urban',
+        })
+
+        created = Map.objects.get(name='Created Map')
+        self.assertRedirects(response, reverse('maps:detail', kwargs={'pk': created.pk}))
+        self.assertEqual(len(map_tiles(created)), 40 * 30)
+
+
+class PackedGridStorageTestCase(TestCase):
+    """Test packed grid encoding and the tile accessors"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='packer', password='testpass123')
+        self.client.login(username='packer', password='testpass123')
+
+    def test_round_trip_for_every_compression(self):
+        """Test that encoding and decoding preserves every layer"""
+        grid = MapGrid.blank(12, 9)
+        grid.set_tile(3, 4, 'wall', '#696969', is_walkable=False, is_transparent=False)
+        grid.set_tile(11, 8, 'water', '#4169E1', is_walkable=False, movement_cost=4)
+
+        for compression in ('zlib', 'rle', 'none'):
+            decoded = MapGrid.from_bytes(grid.to_bytes(compression))
+            self.assertEqual(decoded.tile(3, 4), grid.tile(3, 4), compression)
+            self.assertEqual(decoded.tile(11, 8).movement_cost, 4)
+            self.assertEqual(decoded.tile(0, 0).terrain_type, 'floor')
+
+    def test_rle_handles_long_runs(self):
+        """Test that runs longer than 255 bytes survive RLE"""
+        data = bytes([7]) * 1000 + bytes([1, 2, 2])
+        self.assertEqual(rle_decode(rle_encode(data)), data)
+
+    def test_new_maps_store_no_tile_rows(self):
+        """Test that a created map is a single row with a packed grid"""
+        self.client.post(reverse('maps:create'), {
+            'name': 'Packed', 'width': 100, 'height': 100, 'tile_size': 50, 'map_type': 'urban',
+        })
+        map_obj = Map.objects.get(name='Packed')
+
+        self.assertEqual(map_obj.tile_storage, Map.TILE_STORAGE_PACKED)
+        self.assertEqual(map_obj.tiles.count(), 0)
+        self.assertLess(len(map_obj.grid_data), 1000)
+        self.assertEqual(len(map_tiles(map_obj)), 10000)
+
+    def test_tile_update_and_pathfind_read_packed_grid(self):
+        """Test that painting a wall is visible to the pathfinding endpoint"""
+        map_obj = Map.objects.create(name='Corridor', owner=self.user, width=5, height=5)
+        initialize_tiles(map_obj)
+
+        for y in range(5):
+            self.client.post(reverse('maps:tile_update', kwargs={'pk': map_obj.pk}), {
+                'x': 2, 'y': y, 'terrain_type': 'wall', 'color': '#696969',
+            })
+
+        response = self.client.post(reverse('maps:pathfind', kwargs={'pk': map_obj.pk}), {
+            'start_x': 0, 'start_y': 0, 'end_x': 4, 'end_y': 4,
+        })
+        self.assertFalse(response.json()['reachable'])
+        self.assertEqual(map_tiles(Map.objects.get(pk=map_obj.pk))[2].terrain_type, 'wall')
+
+    def test_pack_map_keeps_annotated_rows(self):
+        """Test converting a row-per-tile map keeps only annotated rows"""
+        map_obj = Map.objects.create(
+            name='Legacy', owner=self.user, width=6, height=6, tile_storage=Map.TILE_STORAGE_ROWS
+        )
+        initialize_tiles(map_obj, terrain_type='grass', color='#7CFC00')
+        map_obj.tiles.filter(x=1, y=1).update(notes='Hidden stash')
+
+        pack_map(map_obj)
+
+        self.assertEqual(map_obj.tiles.count(), 1)
+        tiles = map_tiles(map_obj)
+        self.assertEqual(tiles[7].notes, 'Hidden stash')
+        self.assertEqual(tiles[0].terrain_type, 'grass')
+
+
+class SectoredMapTestCase(TestCase):
+    """Test lazily generated sectors for large maps"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='explorer', password='testpass123')
+        self.client.login(username='explorer', password='testpass123')
+        self.map = Map.objects.create(
+            name='Sprawl', owner=self.user, width=1000, height=1000, map_type='underground',
+            tile_storage=Map.TILE_STORAGE_SECTORED, is_generated=True, generation_seed='sprawl',
+            generation_algorithm='cellular_automata',
+        )
+
+    def test_viewport_only_creates_visible_sectors(self):
+        """Test that fetching a viewport generates just the sectors it overlaps"""
+        response = self.client.get(reverse('maps:sectors', kwargs={'pk': self.map.pk}), {
+            'x': 40, 'y': 10, 'width': 40, 'height': 20,
+        })
+
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual([(s['sector_x'], s['sector_y']) for s in data['sectors']], [(1, 0), (2, 0)])
+        self.assertEqual(MapSector.objects.filter(map=self.map).count(), 2)
+        self.assertEqual(len(base64.b64decode(data['sectors'][0]['terrain'])), SECTOR_SIZE * SECTOR_SIZE)
+
+    def test_sectors_are_stable_once_stored(self):
+        """Test that a stored sector is returned unchanged on later loads"""
+        first = load_sectors(self.map, [(3, 4)])[(3, 4)]
+        second = load_sectors(self.map, [(3, 4)])[(3, 4)]
+
+        self.assertEqual(first.to_bytes(), second.to_bytes())
+        self.assertEqual(MapSector.objects.filter(map=self.map).count(), 1)
+
+    def test_edge_sectors_are_clipped(self):
+        """Test that sectors on the right and bottom edges only cover the map"""
+        last = (1000 - 1) // SECTOR_SIZE
+        sector = load_sectors(self.map, [(last, last)])[(last, last)]
+
+        self.assertEqual((sector.width, sector.height), (1000 - last * SECTOR_SIZE,) * 2)
+
+    def test_tile_update_touches_one_sector(self):
+        """Test that painting a tile rewrites only the sector containing it"""
+        response = self.client.post(reverse('maps:tile_update', kwargs={'pk': self.map.pk}), {
+            'x': 700, 'y': 650, 'terrain_type': 'water', 'color': '#4169E1',
+        })
+
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(MapSector.objects.filter(map=self.map).count(), 1)
+        tile = load_region(self.map, 699, 649, 3, 3).tile(1, 1)
+        self.assertEqual((tile.terrain_type, tile.color, tile.is_walkable), ('water', '#4169E1', False))
+
+    def test_region_spanning_sectors(self):
+        """Test that a region crossing sector boundaries matches the sectors it reads"""
+        region = load_region(self.map, SECTOR_SIZE - 5, SECTOR_SIZE - 5, 10, 10)
+        sectors = load_sectors(self.map, [(0, 0), (1, 1)])
+
+        self.assertEqual(region.tile(0, 0)[2:], sectors[(0, 0)].tile(SECTOR_SIZE - 5, SECTOR_SIZE - 5)[2:])
+        self.assertEqual(region.tile(9, 9)[2:], sectors[(1, 1)].tile(4, 4)[2:])
+
+    def test_pathfinding_does_not_generate_sectors(self):
+        """Test that path queries read stored sectors only and treat the rest as blocked"""
+        revision = self.map.revision
+        self.client.get(reverse('maps:sectors', kwargs={'pk': self.map.pk}), {
+            'x': 0, 'y': 0, 'width': 2 * SECTOR_SIZE, 'height': SECTOR_SIZE,
+        })
+        self.map.refresh_from_db()
+        self.assertGreater(self.map.revision, revision)
+
+        region = load_region(self.map, 0, 0, 2 * SECTOR_SIZE, SECTOR_SIZE)
+        walkable = [(x, y) for y in range(SECTOR_SIZE) for x in range(40, 2 * SECTOR_SIZE)
+                    if region.tile(x, y).is_walkable]
+        start, end = walkable[0], walkable[-1]
+        queries = [(start, end), (start, (300, 300)), ((600, 600), (610, 610))]
+
+        for (start_x, start_y), (end_x, end_y) in queries:
+            response = self.client.post(reverse('maps:pathfind', kwargs={'pk': self.map.pk}), {
+                'start_x': start_x, 'start_y': start_y, 'end_x': end_x, 'end_y': end_y,
+            })
+            data = response.json()
+            self.assertTrue(data['success'])
+            if data['reachable']:
+                self.assertEqual((data['path'][0], data['path'][-1]),
+                                 ({'x': start_x, 'y': start_y}, {'x': end_x, 'y': end_y}))
+            else:
+                self.assertNotEqual((end_x, end_y), end)
+
+        self.assertEqual(MapSector.objects.filter(map=self.map).count(), 2)
+
+    def test_whole_map_queries_are_refused(self):
+        """Test that whole-map reads of a huge sectored map fail cleanly without generating"""
+        response = self.client.post(reverse('maps:movement_range', kwargs={'pk': self.map.pk}), {
+            'x': 10, 'y': 10, 'budget': 5,
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('sectors', response.json()['error'])
+        with self.assertRaises(GridTooLargeError):
+            load_grid(self.map)
+        self.assertEqual(MapSector.objects.filter(map=self.map).count(), 0)
+
+    def test_create_form_requires_large_map_above_grid_size(self):
+        """Test that maps over the single-grid limit must be created sectored"""
+        data = {'name': 'Huge', 'width': 500, 'height': 400, 'tile_size': 20, 'map_type': 'urban'}
+
+        response = self.client.post(reverse('maps:create'), data)
+        self.assertFalse(Map.objects.filter(name='Huge').exists())
+        self.assertEqual(response.status_code, 200)
+
+        self.client.post(reverse('maps:create'), {**data, 'large_map': 'on'})
+        created = Map.objects.get(name='Huge')
+        self.assertTrue(created.is_sectored)
+        self.assertIsNone(created.grid_data)
+        self.assertEqual(created.sectors.count(), 0)
+        self.assertContains(self.client.get(reverse('maps:detail', kwargs={'pk': created.pk})), 'sectorViewport')
+
+
+
+class GenerationJobTestCase(TransactionTestCase):
+    """Test background generation jobs in the worker pool"""
+
+    @classmethod
+    def tearDownClass(cls):
+        job_runner.shutdown()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='decker', password='testpass123')
+        self.client.login(username='decker', password='testpass123')
+
+    def wait_for_job(self, job_id, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                job = MapGenerationJob.objects.get(pk=job_id)
+            except OperationalError:
+                # The shared in-memory test database reports a lock instead of waiting
+                job = None
+            if job is not None and job.is_finished:
+                return job
+            time.sleep(0.1)
+        self.fail(f'Generation job {job_id} did not finish')
+
+    def test_job_persists_generated_map(self):
+        """Test that a queued job returns immediately and later creates the map"""
+        response = self.client.post(reverse('maps:generation_job_create'), {
+            'name': 'Warehouse', 'width': 60, 'height': 40, 'map_type': 'corporate',
+            'algorithm': 'bsp', 'seed': 'crate', 'cover_density': 0.1,
+        })
+
+        self.assertEqual(response.status_code, 202)
+        job = self.wait_for_job(response.json()['job']['id'])
+
+        self.assertEqual((job.status, job.phase, job.percent), (MapGenerationJob.STATUS_COMPLETE, 'complete', 100))
+        map_obj = job.map
+        self.assertEqual((map_obj.width, map_obj.height, map_obj.generation_algorithm), (60, 40, 'bsp'))
+        self.assertEqual(len(map_tiles(map_obj)), 60 * 40)
+        self.assertTrue(map_obj.map_objects.filter(object_type='cover').exists())
+
+        status = self.client.get(reverse('maps:generation_job_status', kwargs={'pk': job.pk})).json()
+        self.assertEqual(status['job']['map_id'], map_obj.pk)
+
+    async def test_progress_is_broadcast_to_job_group(self):
+        """Test that phase changes reach a connected WebSocket client"""
+        job = await database_sync_to_async(MapGenerationJob.objects.create)(
+            owner=self.user, name='Caves', width=30, height=30, map_type='underground',
+            algorithm='cellular_automata', seed='drip',
+        )
+        communicator = WebsocketCommunicator(GenerationJobConsumer.as_asgi(), f'/ws/maps/jobs/{job.pk}/')
+        communicator.scope['user'] = self.user
+        communicator.scope['url_route'] = {'kwargs': {'job_id': str(job.pk)}}
+
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())['data']['phase'], 'queued')
+
+        await database_sync_to_async(job_runner.submit)(job)
+
+        phases = []
+        while not phases or phases[-1] not in ('complete', 'failed'):
+            message = await communicator.receive_json_from(timeout=60)
+            phases.append(message['data']['phase'])
+        await communicator.disconnect()
+
+        self.assertEqual(phases, ['generating', 'saving', 'complete'])
+
+    async def test_other_users_cannot_follow_job(self):
+        """Test that the progress socket rejects users who don't own the job"""
+        other = await database_sync_to_async(User.objects.create_user)(username='snoop', password='x')
+        job = await database_sync_to_async(MapGenerationJob.objects.create)(
+            owner=self.user, name='Private', width=10, height=10, seed='1',
+        )
+        communicator = WebsocketCommunicator(GenerationJobConsumer.as_asgi(), f'/ws/maps/jobs/{job.pk}/')
+        communicator.scope['user'] = other
+        communicator.scope['url_route'] = {'kwargs': {'job_id': str(job.pk)}}
+
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+
+class GenerationCacheTestCase(TestCase):
+    """Test the content-addressed generation cache"""
+
+    def setUp(self):
+        generation_cache.clear()
+        self.user = User.objects.create_user(username='cartographer', password='testpass123')
+        self.client.login(username='cartographer', password='testpass123')
+
+    def test_key_is_stable_and_input_sensitive(self):
+        """Test that keys ignore parameter order but not parameter values"""
+        key = generation_key(40, 30, 'urban', 'abc', 'bsp', {'min_room_size': 4, 'max_room_size': 9})
+
+        self.assertEqual(key, generation_key(40, 30, 'urban', 'abc', 'bsp', {'max_room_size': 9, 'min_room_size': 4}))
+        self.assertNotEqual(key, generation_key(40, 30, 'urban', 'abd', 'bsp', {'min_room_size': 4, 'max_room_size': 9}))
+        self.assertNotEqual(key, generation_key(40, 30, 'urban', 'abc', 'bsp', {'min_room_size': 5, 'max_room_size': 9}))
+
+    def test_least_recently_used_grid_is_evicted(self):
+        """Test that the cell cap evicts the least recently used grid"""
+        cache = GenerationCache(max_cells=1000)
+        for key in ('a', 'b'):
+            cache.put(key, TerrainGrid(20, 20))
+        cache.get('a')
+        cache.put('c', TerrainGrid(20, 20))
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        cache.put('huge', TerrainGrid(50, 50))
+        self.assertNotIn('huge', cache)
+
+    def test_commit_after_preview_reuses_grid(self):
+        """Test that saving a previewed map does not run the generator again"""
+        form_data = {
+            'name': 'Tunnels', 'width': 50, 'height': 40, 'map_type': 'underground',
+            'algorithm': 'random_walk', 'seed': 'rats',
+        }
+        preview = self.client.post(reverse('maps:generate_preview'), form_data).json()
+        self.assertEqual(generation_cache.stats()['misses'], 1)
+
+        saved = self.client.post(reverse('maps:generate'), {**form_data, 'confirm_save': 'true'}).json()
+
+        self.assertTrue(saved['success'])
+        self.assertEqual(generation_cache.stats()['misses'], 1)
+        self.assertEqual(generation_cache.stats()['hits'], 1)
+        map_obj = Map.objects.get(name='Tunnels')
+        self.assertEqual(
+            [(t.terrain_type, t.color) for t in map_tiles(map_obj)],
+            [(t['terrain_type'], t['color']) for t in preview['tiles']],
+        )
+
+    def test_preset_load_does_not_generate(self):
+        """Test that loading a preset only returns its settings, whatever its parameters hold"""
+        preset = MapGenerationPreset.objects.create(
+            name='Office', owner=self.user, width=30, height=30, map_type='corporate',
+            generation_algorithm='bsp', custom_parameters={'seed': 'abc', 'iterations': '5'},
+        )
+
+        response = self.client.get(reverse('maps:preset_load', kwargs={'pk': preset.pk}))
+
+        self.assertEqual(response.json()['preset']['custom_parameters'], {'seed': 'abc', 'iterations': '5'})
+        self.assertEqual(len(generation_cache), 0)
+
+
+class SeededGenerationTestCase(TestCase):
+    """Test that generation uses private, digest-seeded random streams"""
+
+    def test_same_seed_matches_across_processes(self):
+        """Test that a seed gives the same grid in a process with a different hash salt"""
+        script = (
+            "import sys; from maps.generators import run_generation_algorithm as run; "
+            "sys.stdout.write(run(40, 30, 'urban', 'seattle', 'bsp').cells.tobytes().hex())"
+        )
+        env = {**os.environ, 'PYTHONHASHSEED': '12345'}
+        output = subprocess.run(
+            [sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True,
+        ).stdout
+
+        local = run_generation_algorithm(40, 30, 'urban', 'seattle', 'bsp')
+        self.assertEqual(output, local.cells.tobytes().hex())
+
+    def test_generators_leave_global_random_untouched(self):
+        """Test that seeded generation neither reseeds nor advances the global RNG"""
+        random.seed(99)
+        expected = [random.random() for _ in range(3)]
+
+        random.seed(99)
+        for algorithm in [*GENERATION_ALGORITHMS, 'random']:
+            run_generation_algorithm(30, 30, 'mixed', 'fixed', algorithm)
+        self.assertEqual([random.random() for _ in range(3)], expected)
+
+
+class GalleryTestCase(TestCase):
+    """Test gallery previews of several seeds"""
+
+    @classmethod
+    def tearDownClass(cls):
+        job_runner.shutdown()
+        super().tearDownClass()
+
+    def setUp(self):
+        generation_cache.clear()
+        User.objects.create_user(username='designer', password='testpass123')
+        self.client.login(username='designer', password='testpass123')
+        self.form_data = {
+            'name': 'Warrens', 'width': 100, 'height': 60, 'map_type': 'underground',
+            'algorithm': 'cellular_automata', 'seed': 'docks', 'variants': 4,
+        }
+
+    def test_thumbnail_is_downsampled(self):
+        """Test that thumbnails keep the aspect ratio within THUMBNAIL_SIZE"""
+        thumb = thumbnail(TerrainGrid(100, 60))
+
+        self.assertEqual((thumb['width'], thumb['height']), (34, 20))
+        self.assertLessEqual(thumb['width'], THUMBNAIL_SIZE)
+        self.assertEqual(len(base64.b64decode(thumb['cells'])), 34 * 20)
+
+    def test_gallery_returns_reproducible_variants(self):
+        """Test that a gallery has distinct seeds, repeatable for the same base seed"""
+        data = self.client.post(reverse('maps:generate_preview'), self.form_data).json()
+
+        self.assertTrue(data['success'])
+        seeds = [variant['seed'] for variant in data['variants']]
+        self.assertEqual(len(set(seeds)), 4)
+        self.assertNotIn('preview_data', self.client.session)
+
+        again = self.client.post(reverse('maps:generate_preview'), self.form_data).json()
+        self.assertEqual(again, data)
+        self.assertEqual(generation_cache.stats()['hits'], 4)
+
+    def test_chosen_variant_preview_is_cached(self):
+        """Test that previewing a gallery seed reuses the grid generated for the gallery"""
+        data = self.client.post(reverse('maps:generate_preview'), self.form_data).json()
+        chosen = data['variants'][2]
+        misses = generation_cache.stats()['misses']
+
+        preview = self.client.post(reverse('maps:generate_preview'), {
+            **self.form_data, 'variants': '', 'seed': chosen['seed'],
+        }).json()
+
+        self.assertEqual(preview['seed'], chosen['seed'])
+        self.assertEqual(generation_cache.stats()['misses'], misses)
+        cells = base64.b64decode(chosen['thumbnail']['cells'])
+        self.assertEqual(data['palette'][cells[0]], preview['tiles'][0]['color'])
+
+
+class GeneratorBenchmarkTestCase(TestCase):
+    """Test the generator benchmark report and baseline comparison"""
+
+    def test_compare_reports_applies_thresholds_and_noise_floor(self):
+        """Test that only metrics beyond both the threshold and the noise floor regress"""
+        baseline = {'cases': [{'name': 'bsp@50x50', 'generate_seconds': 0.010, 'tiles_seconds': 0.0001,
+                               'generate_peak_bytes': 1000000}]}
+        report = {'cases': [{'name': 'bsp@50x50', 'generate_seconds': 0.020, 'tiles_seconds': 0.0010,
+                             'generate_peak_bytes': 1050000, 'tiles_peak_bytes': 10 ** 9,
+                             'pathfind_seconds': 1.0}]}
+
+        regressions = compare_reports(report, baseline)
+
+        self.assertEqual([r['metric'] for r in regressions], ['generate_seconds'])
+        self.assertEqual(regressions[0]['ratio'], 2.0)
+        self.assertEqual(compare_reports(report, baseline, {'time': 1.5}), [])
+
+    def test_command_writes_report_and_detects_regression(self):
+        """Test that the command writes a JSON report and fails against a faster baseline"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'report.json')
+            baseline = os.path.join(directory, 'baseline.json')
+            options = {'algorithms': 'bsp,maze', 'sizes': '50', 'seeds': 'a', 'repeat': 1,
+                       'baseline': baseline, 'stdout': open(os.devnull, 'w')}
+
+            call_command('benchmark_generators', output=output, save_baseline=True, **options)
+            with open(output) as f:
+                report = json.load(f)
+            self.assertEqual([case['name'] for case in report['cases']], ['bsp@50x50', 'maze@50x50'])
+
+            report['cases'][1]['generate_seconds'] = 0.0
+            with open(baseline, 'w') as f:
+                json.dump(report, f)
+            with self.assertRaises(CommandError):
+                call_command('benchmark_generators', **options)
+
+
+class ArrayAStarTestCase(TestCase):
+    """Test the array-based A* search"""
+
+    def setUp(self):
+        # 6x5 room with a wall at x=3 open only at the bottom, and water at (1, 1)
+        self.grid = MapGrid.blank(6, 5)
+        for y in range(4):
+            self.grid.set_tile(3, y, 'wall', '#696969', is_walkable=False)
+        self.grid.set_tile(1, 1, 'water', '#4169E1', movement_cost=4)
+
+    def test_finds_cheapest_path_with_integer_costs(self):
+        """Test that the path goes around the wall and reports costs in movement points"""
+        result = astar_grid(self.grid.navigation_grid(), (0, 0), (5, 0))
+
+        self.assertTrue(result['reachable'])
+        self.assertEqual(result['path'][0], (0, 0))
+        self.assertEqual(result['path'][-1], (5, 0))
+        self.assertIn((3, 4), result['path'])
+        self.assertNotIn((1, 1), result['path'])
+        # Three straight steps and five diagonal steps at 1.4 each
+        self.assertEqual(result['total_cost'], 10.0)
+        self.assertEqual(result['terrain_breakdown'], {'floor': 8})
+
+    def test_orthogonal_search_and_unreachable_targets(self):
+        """Test Manhattan movement and that walls and out-of-bounds targets are unreachable"""
+        navigation = self.grid.navigation_grid()
+
+        self.assertEqual(astar_grid(navigation, (0, 0), (2, 0), allow_diagonal=False)['total_cost'], 2.0)
+        self.assertFalse(astar_grid(navigation, (0, 0), (3, 1))['reachable'])
+        self.assertFalse(astar_grid(navigation, (0, 0), (6, 0))['reachable'])
+
+    def test_reused_buffers_do_not_leak_between_searches(self):
+        """Test that consecutive searches on different grids give independent results"""
+        open_result = astar_grid(MapGrid.blank(6, 5).navigation_grid(), (0, 0), (5, 0))
+        walled_result = astar_grid(self.grid.navigation_grid(), (0, 0), (5, 0))
+
+        self.assertEqual(open_result['total_cost'], 5.0)
+        self.assertEqual(walled_result['total_cost'], 10.0)
+
+    def test_tiles_dict_wrapper_matches_grid_search(self):
+        """Test that the tiles_dict API gives the same result as the navigation grid"""
+        self.assertEqual(
+            astar(self.grid.tiles_dict(), (0, 4), (5, 0), 6, 5),
+            astar_grid(self.grid.navigation_grid(), (0, 4), (5, 0)),
+        )
+        navigation = NavigationGrid.from_tiles_dict(self.grid.tiles_dict(), 6, 5)
+        self.assertEqual(navigation.costs, self.grid.navigation_grid().costs)
+
+
+class NavigationCacheTestCase(TestCase):
+    """Test the revision-keyed navigation grid cache"""
+
+    def setUp(self):
+        navigation_cache.clear()
+        self.user = User.objects.create_user(username='scout', password='testpass123')
+        self.client.login(username='scout', password='testpass123')
+        self.map = Map.objects.create(name='Yard', owner=self.user, width=5, height=5)
+        initialize_tiles(self.map)
+
+    def pathfind(self):
+        return self.client.post(reverse('maps:pathfind', kwargs={'pk': self.map.pk}), {
+            'start_x': 0, 'start_y': 0, 'end_x': 4, 'end_y': 0,
+        }).json()
+
+    def test_repeated_queries_do_not_load_tiles(self):
+        """Test that a cached map is pathfound without reading the tile grid"""
+        self.pathfind()
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.pathfind()
+
+        self.assertEqual(result['total_cost'], 4.0)
+        self.assertFalse(any('grid_data' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(navigation_cache.stats()['hits'], 1)
+
+    def test_tile_update_patches_cached_grid(self):
+        """Test that painting tiles moves the cached grid to the new revision"""
+        self.pathfind()
+        revision = Map.objects.get(pk=self.map.pk).revision
+
+        for y in range(4):
+            self.client.post(reverse('maps:tile_update', kwargs={'pk': self.map.pk}), {
+                'x': 2, 'y': y, 'terrain_type': 'wall', 'color': '#696969',
+            })
+        result = self.pathfind()
+
+        self.assertEqual(Map.objects.get(pk=self.map.pk).revision, revision + 4)
+        self.assertEqual(navigation_cache.stats()['patches'], 4)
+        self.assertEqual(navigation_cache.stats()['misses'], 1)
+        self.assertIn((2, 4), [(step['x'], step['y']) for step in result['path']])
+
+    def test_patch_keeps_grid_cached_while_patching(self):
+        """Test that a patch finishing after a newer grid was cached leaves that grid in place"""
+        newer = load_grid(self.map).navigation_grid()
+        map_id = self.map.pk
+
+        class RacingGrid:
+            """Grid whose patch is overtaken by a rebuild at a later revision"""
+            def patched(self, tiles):
+                navigation_cache.put(map_id, 7, newer)
+                return self
+
+        navigation_cache.put(map_id, 5, RacingGrid())
+        navigation_cache.patch(map_id, 5, 6, [])
+
+        self.assertIs(navigation_cache.get(map_id, 7), newer)
+        self.assertEqual(navigation_cache.stats()['patches'], 0)
+
+    def test_other_writes_invalidate_by_revision(self):
+        """Test that a whole-map write makes the cached grid miss"""
+        self.pathfind()
+        initialize_tiles(Map.objects.get(pk=self.map.pk), terrain_type='water', is_walkable=False)
+
+        self.assertFalse(self.pathfind()['reachable'])
+        self.assertEqual(navigation_cache.stats()['misses'], 2)
+
+
+class MovementRangeTestCase(TestCase):
+    """Test the bounded flood fill and its endpoint"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='runner', password='testpass123')
+        self.client.login(username='runner', password='testpass123')
+        self.map = Map.objects.create(name='Street', owner=self.user, width=7, height=3)
+        initialize_tiles(self.map)
+        update_tiles(self.map, [{'x': 3, 'y': y, 'terrain_type': 'wall'} for y in range(3)])
+
+    def test_flood_fill_respects_budget_and_terrain(self):
+        """Test that costs match A* and tiles beyond the budget or walls are excluded"""
+        navigation = load_grid(self.map).navigation_grid()
+        reached = movement_range(navigation, (0, 1), 2)
+
+        self.assertEqual(reached[1 * 7 + 0], 0)
+        self.assertEqual(reached[1 * 7 + 2], 20)
+        self.assertEqual(reached[2 * 7 + 1], 14)
+        self.assertNotIn(0 * 7 + 2, reached)
+        self.assertEqual(len(reached), 7)
+        for index, cost in reached.items():
+            target = (index % 7, index // 7)
+            self.assertEqual(astar_grid(navigation, (0, 1), target)['total_cost'], cost / 10)
+
+    def test_endpoint_returns_bitmap_and_costs(self):
+        """Test that the endpoint encodes the range as a bounding-box bitmap plus costs"""
+        data = self.client.post(reverse('maps:movement_range', kwargs={'pk': self.map.pk}), {
+            'x': 6, 'y': 0, 'budget': 1.5,
+        }).json()
+
+        self.assertTrue(data['success'])
+        self.assertEqual(data['bounds'], {'x': 5, 'y': 0, 'width': 2, 'height': 2})
+        self.assertEqual(base64.b64decode(data['reachable']), bytes([0b1111]))
+        self.assertEqual(np.frombuffer(base64.b64decode(data['costs']), dtype='<u2').tolist(), [10, 0, 14, 10])
+
+    def test_budget_from_character_rate(self):
+        """Test that a character's walk rate can be used as the budget"""
+        character = Character.objects.create(user=self.user, name='Razor', agility=1)
+
+        data = self.client.post(reverse('maps:movement_range', kwargs={'pk': self.map.pk}), {
+            'x': 0, 'y': 0, 'character_id': character.pk, 'rate': 'walk',
+        }).json()
+
+        self.assertEqual(data['budget'], 2)
+        self.assertEqual(data['count'], 6)
+
+    def test_invalid_character_id_is_rejected(self):
+        """Test that a non-numeric character id is a bad request, not a server error"""
+        response = self.client.post(reverse('maps:movement_range', kwargs={'pk': self.map.pk}), {
+            'x': 0, 'y': 0, 'character_id': 'razor',
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+
+class FlowFieldTestCase(TestCase):
+    """Test batch pathfinding from a reverse Dijkstra distance field"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='gm', password='testpass123')
+        self.client.login(username='gm', password='testpass123')
+        self.map = Map.objects.create(name='Plaza', owner=self.user, width=8, height=6)
+        initialize_tiles(self.map)
+        update_tiles(self.map, [{'x': 4, 'y': y, 'terrain_type': 'wall'} for y in range(5)])
+        update_tiles(self.map, [{'x': 1, 'y': 2, 'terrain_type': 'water'}])
+
+    def test_paths_match_astar_costs(self):
+        """Test that every start gets the same cost as a direct A* search to its nearest goal"""
+        navigation = load_grid(self.map).navigation_grid()
+        goals = [(7, 0), (0, 5)]
+        field = distance_field(navigation, goals)
+
+        for start in [(0, 0), (2, 2), (3, 0), (6, 4), (4, 5)]:
+            result = field.path_from(start)
+            expected = min(
+                (astar_grid(navigation, start, goal) for goal in goals),
+                key=lambda r: r['total_cost'] if r['reachable'] else float('inf'),
+            )
+            self.assertEqual(result['total_cost'], expected['total_cost'], start)
+            self.assertIn(result['path'][-1], goals)
+            self.assertEqual(result['path'][0], start)
+
+    def test_walled_in_start_is_unreachable(self):
+        """Test that starts with no route to any goal report unreachable"""
+        update_tiles(self.map, [{'x': 4, 'y': 5, 'terrain_type': 'wall'}])
+        field = distance_field(load_grid(self.map).navigation_grid(), [(7, 0)])
+
+        self.assertFalse(field.path_from((0, 0))['reachable'])
+        self.assertTrue(field.path_from((5, 5))['reachable'])
+
+    def test_endpoint_moves_encounter_team_toward_nearest_runner(self):
+        """Test that the endpoint takes goals and starts from combat participants"""
+        campaign = Campaign.objects.create(name='Seattle', game_master=self.user)
+        session = Session.objects.create(campaign=campaign, session_number=1, title='Run')
+        session.maps_used.add(self.map)
+        encounter = CombatEncounter.objects.create(session=session, name='Ambush')
+        CombatParticipant.objects.create(encounter=encounter, name='Runner', team='player', map_x=7, map_y=0)
+        ganger = CombatParticipant.objects.create(encounter=encounter, name='Ganger', team='enemy', map_x=0, map_y=0)
+        CombatParticipant.objects.create(encounter=encounter, name='Offmap', team='enemy')
+
+        data = self.client.post(
+            reverse('maps:flow_paths', kwargs={'pk': self.map.pk}),
+            json.dumps({'encounter_id': encounter.pk, 'goal_team': 'player', 'start_team': 'enemy',
+                        'starts': [[6, 5]], 'budget': 3}),
+            content_type='application/json',
+        ).json()
+
+        self.assertTrue(data['success'])
+        self.assertEqual(data['goals'], [{'x': 7, 'y': 0}])
+        self.assertEqual(len(data['paths']), 2)
+        mover = data['paths'][1]
+        self.assertEqual(mover['participant_id'], ganger.pk)
+        self.assertEqual(mover['path'][-1], {'x': 7, 'y': 0})
+        # Three movement points cover at most three steps
+        self.assertIn(mover['stop'], mover['path'][1:4])
+
+    def test_malformed_bodies_and_budgets_are_rejected(self):
+        """Test that non-object bodies and non-finite or out-of-range budgets are bad requests"""
+        url = reverse('maps:flow_paths', kwargs={'pk': self.map.pk})
+        bodies = ['[[7, 0]]', '{"goals": [[7, 0]], "starts": [[0, 0]], "budget": NaN}',
+                  json.dumps({'goals': [[7, 0]], 'starts': [[0, 0]], 'budget': -1}),
+                  json.dumps({'goals': [[7, 0]], 'starts': [[0, 0]], 'budget': 10 ** 9})]
+
+        bodies += [json.dumps({'goals': [[1, 1]], 'encounter_id': 'abc', 'start_team': 'enemy'}),
+                   json.dumps({'goals': [[1, 1]], 'encounter_id': 1, 'start_team': ['enemy']})]
+
+        for body in bodies:
+            response = self.client.post(url, body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+
+    def test_encounters_on_other_maps_are_not_found(self):
+        """Test that participants are only read from encounters whose session uses this map"""
+        campaign = Campaign.objects.create(name='Tacoma', game_master=self.user)
+        session = Session.objects.create(campaign=campaign, session_number=1, title='Elsewhere')
+        encounter = CombatEncounter.objects.create(session=session, name='Other Map')
+        CombatParticipant.objects.create(encounter=encounter, name='Spy', team='enemy', map_x=3, map_y=3)
+
+        response = self.client.post(
+            reverse('maps:flow_paths', kwargs={'pk': self.map.pk}),
+            json.dumps({'goals': [[7, 0]], 'encounter_id': encounter.pk, 'start_team': 'enemy'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class JumpPointSearchTestCase(TestCase):
+    """Test Jump Point Search against A*"""
+
+    def test_uniform_cost_detection_follows_patches(self):
+        """Test that grids know when every passable tile costs the same"""
+        navigation = MapGrid.blank(4, 4).navigation_grid()
+        self.assertEqual(navigation.uniform_cost, 1)
+
+        walled = navigation.patched([{'x': 1, 'y': 1, 'terrain_type': 'wall', 'is_walkable': False}])
+        self.assertEqual(walled.uniform_cost, 1)
+
+        flooded = walled.patched([{'x': 2, 'y': 2, 'terrain_type': 'water', 'is_walkable': True}])
+        self.assertEqual(flooded.uniform_cost, 0)
+        self.assertEqual(navigation.uniform_cost, 1)
+
+    def test_costs_match_astar_on_random_grids(self):
+        """Test that JPS finds paths of the same cost as A*, including around corners and on costlier floors"""
+        rng = random.Random(7)
+        for _ in range(40):
+            width, height = rng.randint(2, 20), rng.randint(2, 20)
+            multiplier = rng.choice([1, 2])
+            navigation = NavigationGrid(width, height, [
+                0 if rng.random() < 0.3 else multiplier for _ in range(width * height)
+            ])
+            for _ in range(10):
+                start = (rng.randrange(width), rng.randrange(height))
+                end = (rng.randrange(width), rng.randrange(height))
+                expected = astar_grid(navigation, start, end)
+                result = jps_grid(navigation, start, end)
+
+                self.assertEqual(result['reachable'], expected['reachable'])
+                self.assertEqual(result['total_cost'], expected['total_cost'])
+                if result['reachable']:
+                    self.assertEqual((result['path'][0], result['path'][-1]), (start, end))
+                    for previous, point in zip(result['path'], result['path'][1:]):
+                        self.assertEqual(max(abs(previous[0] - point[0]), abs(previous[1] - point[1])), 1)
+                        self.assertTrue(navigation.cost_at(point))
+
+    def test_expands_fewer_cells_on_generated_rooms(self):
+        """Test that JPS expands fewer cells than A* on a BSP map"""
+        navigation = generated_navigation('bsp', 60, 'jps')
+        astar_expanded = jps_expanded = 0
+        for start, end in random_pairs(navigation, 20, 'jps'):
+            stats = {}
+            astar_grid(navigation, start, end, stats=stats)
+            astar_expanded += stats['expanded']
+            jps_grid(navigation, start, end, stats=stats)
+            jps_expanded += stats['expanded']
+
+        self.assertLess(jps_expanded, astar_expanded / 2)
+
+    def test_find_path_falls_back_to_astar_on_mixed_costs(self):
+        """Test that mixed-cost grids and orthogonal movement use A*"""
+        grid = MapGrid.blank(6, 5)
+        stats = {}
+        find_path(grid.navigation_grid(), (0, 0), (5, 4), stats=stats)
+        self.assertEqual(stats['algorithm'], 'jps')
+
+        find_path(grid.navigation_grid(), (0, 0), (5, 4), allow_diagonal=False, stats=stats)
+        self.assertEqual(stats['algorithm'], 'astar')
+
+        grid.set_tile(1, 1, 'water', '#4169E1', movement_cost=4)
+        result = find_path(grid.navigation_grid(), (0, 0), (5, 4), stats=stats)
+        self.assertEqual(stats['algorithm'], 'astar')
+        self.assertEqual(result, astar_grid(grid.navigation_grid(), (0, 0), (5, 4)))
+        with self.assertRaises(ValueError):
+            jps_grid(grid.navigation_grid(), (0, 0), (5, 4))
+
+    def test_pathfinding_benchmark_reports_no_mismatches(self):
+        """Test that the benchmark runs every search on the same queries"""
+        case = pathfinding_case('cellular_automata', 30, seeds=['a'], pairs=15)
+
+        self.assertEqual(case['queries'], 15)
+        self.assertEqual(case['cost_mismatches'], 0)
+        self.assertEqual(set(case['searches']), {'dijkstra', 'astar', 'jps', 'find_path', 'hpa'})
+
+
+class HierarchicalPathTestCase(TestCase):
+    """Test the HPA* cluster hierarchy"""
+
+    def random_grid(self, rng, width, height):
+        return NavigationGrid(width, height, [
+            0 if rng.random() < 0.25 else rng.choice([1, 1, 2, 4]) for _ in range(width * height)
+        ])
+
+    def test_paths_are_valid_and_never_miss_a_route(self):
+        """Test that HPA* finds a path whenever A* does, at no lower cost"""
+        rng = random.Random(11)
+        for _ in range(10):
+            navigation = self.random_grid(rng, rng.randint(20, 40), rng.randint(20, 40))
+            for _ in range(10):
+                start = (rng.randrange(navigation.width), rng.randrange(navigation.height))
+                end = (rng.randrange(navigation.width), rng.randrange(navigation.height))
+                expected = astar_grid(navigation, start, end)
+                result = hierarchical_path(navigation, start, end, cluster_size=6)
+
+                self.assertEqual(result['reachable'], expected['reachable'])
+                if result['reachable']:
+                    self.assertGreaterEqual(result['total_cost'], expected['total_cost'])
+                    self.assertEqual((result['path'][0], result['path'][-1]), (start, end))
+                    for previous, point in zip(result['path'], result['path'][1:]):
+                        self.assertEqual(max(abs(previous[0] - point[0]), abs(previous[1] - point[1])), 1)
+                        self.assertTrue(navigation.cost_at(point))
+
+    def test_long_queries_expand_less_than_astar(self):
+        """Test that a corner-to-corner query searches far fewer cells than A*"""
+        navigation = generated_navigation('cellular_automata', 100, 'hpa')
+        navigation = navigation.patched([{'x': 50, 'y': 50, 'terrain_type': 'water', 'is_walkable': True}])
+        walkable = [index for index, cost in enumerate(navigation.costs) if cost]
+        start = (walkable[0] % 100, walkable[0] // 100)
+        end = (walkable[-1] % 100, walkable[-1] // 100)
+
+        flat, stats = {}, {}
+        expected = astar_grid(navigation, start, end, stats=flat)
+        result = hierarchical_path(navigation, start, end, stats=stats)
+
+        self.assertEqual(stats['algorithm'], 'hpa')
+        self.assertEqual(result['reachable'], expected['reachable'])
+        self.assertLess(stats['expanded'], flat['expanded'] / 2)
+
+    def test_updates_rebuild_only_touched_clusters(self):
+        """Test that replacing or forgetting clusters recomputes only them and matches a full rebuild"""
+        rng = random.Random(5)
+        navigation = self.random_grid(rng, 32, 32)
+        hierarchy = ClusterHierarchy(32, 32, 8).updated(grid_clusters(navigation, 8))
+
+        # An interior tile of cluster (1, 1)
+        navigation = navigation.patched([{'x': 12, 'y': 12, 'terrain_type': 'wall', 'is_walkable': False}])
+        hierarchy = hierarchy.updated({(1, 1): grid_clusters(navigation, 8)[(1, 1)]})
+        self.assertEqual(hierarchy.rebuilt, {(1, 1)})
+
+        for _ in range(50):
+            x, y = rng.randrange(32), rng.randrange(32)
+            walkable = rng.random() < 0.5
+            navigation = navigation.patched([{'x': x, 'y': y, 'terrain_type': 'floor', 'is_walkable': walkable}])
+            for node in list(hierarchy.inter):
+                hierarchy.neighbours(node)
+            hierarchy = hierarchy.updated({(x // 8, y // 8): grid_clusters(navigation, 8)[(x // 8, y // 8)]})
+        clusters = grid_clusters(navigation, 8)
+        hierarchy = hierarchy.updated({(2, 2): None})
+        del clusters[(2, 2)]
+
+        rebuilt = ClusterHierarchy(32, 32, 8).updated(clusters)
+        self.assertEqual(hierarchy.transitions, rebuilt.transitions)
+        self.assertEqual(hierarchy.nodes, rebuilt.nodes)
+        for node in rebuilt.inter:
+            self.assertEqual(sorted(hierarchy.neighbours(node)), sorted(rebuilt.neighbours(node)))
+
+    def test_smoothing_cuts_detours_without_adding_cost(self):
+        """Test that smooth_path straightens open stretches and keeps paths valid and no costlier"""
+        navigation = NavigationGrid(10, 5, [1] * 50)
+        detour = [(0, 0), (1, 1), (2, 2), (3, 3), (4, 3), (5, 2), (6, 1), (7, 0), (8, 0), (9, 0)]
+
+        self.assertEqual(smooth_path(navigation, detour), [(x, 0) for x in range(10)])
+
+        rng = random.Random(3)
+        for _ in range(10):
+            navigation = self.random_grid(rng, 40, 40)
+            for _ in range(10):
+                start = (rng.randrange(40), rng.randrange(40))
+                end = (rng.randrange(40), rng.randrange(40))
+                path = astar_grid(navigation, start, end)['path']
+                if not path:
+                    continue
+                smoothed = smooth_path(navigation, path)
+                self.assertEqual((smoothed[0], smoothed[-1]), (start, end))
+                self.assertLessEqual(path_cost(navigation, smoothed), path_cost(navigation, path))
+                for previous, point in zip(smoothed, smoothed[1:]):
+                    self.assertEqual(max(abs(previous[0] - point[0]), abs(previous[1] - point[1])), 1)
+                    self.assertTrue(navigation.cost_at(point))
+
+    def test_long_previews_on_sectored_maps_use_the_sector_hierarchy(self):
+        """Test that previews too long to search exactly follow stored sectors and pick up paints"""
+        path_cache.clear()
+        sector_hierarchies.clear()
+        user = User.objects.create_user(username='runner', password='testpass123')
+        self.client.login(username='runner', password='testpass123')
+        map_obj = Map.objects.create(name='Barrens', owner=user, width=1000, height=1000,
+                                     tile_storage=Map.TILE_STORAGE_SECTORED)
+        # An L of stored floor sectors: along the top, then down column 19
+        corner = 19
+        load_sectors(map_obj, [(x, 0) for x in range(corner + 1)] + [(corner, y) for y in range(1, corner + 1)])
+        url = reverse('maps:pathfind', kwargs={'pk': map_obj.pk})
+        end = (corner * SECTOR_SIZE + 5, corner * SECTOR_SIZE + 5)
+        query = {'start_x': 5, 'start_y': 5, 'end_x': end[0], 'end_y': end[1], 'preview': '1'}
+
+        data = self.client.post(url, query).json()
+        self.assertTrue(data['reachable'])
+        side = (corner + 1) * SECTOR_SIZE
+        band = NavigationGrid(side, side, [
+            1 if y < SECTOR_SIZE or corner * SECTOR_SIZE <= x else 0 for y in range(side) for x in range(side)
+        ])
+        path = [(p['x'], p['y']) for p in data['path']]
+        self.assertEqual((path[0], path[-1]), ((5, 5), end))
+        self.assertTrue(all(band.cost_at(point) for point in path))
+        self.assertLessEqual(data['total_cost'], astar_grid(band, (5, 5), end)['total_cost'] * 1.05)
+
+        # Exact queries still cannot read that far
+        self.assertEqual(self.client.post(url, {**query, 'preview': '0'}).status_code, 400)
+
+        # A wall across the top band cuts the route; only its sector is read again
+        update_tiles(map_obj, [{'x': 300, 'y': y, 'terrain_type': 'wall'} for y in range(SECTOR_SIZE)])
+        self.assertFalse(self.client.post(url, query).json()['reachable'])
+        self.assertEqual(sector_hierarchies.stats()['sectors_read'], 2 * corner + 2)
+        self.assertEqual(MapSector.objects.filter(map=map_obj).count(), 2 * corner + 1)
+
+
+class RegionIndexTestCase(TestCase):
+    """Test connected-region labelling and unreachable-query rejection"""
+
+    def setUp(self):
+        # Two rooms split by a wall at x=4 with a single gap at (4, 2)
+        self.grid = MapGrid.blank(9, 5)
+        for y in range(5):
+            if y != 2:
+                self.grid.set_tile(4, y, 'wall', '#696969', is_walkable=False)
+
+    def test_walls_split_and_floors_merge_regions(self):
+        """Test that patched indexes follow edits exactly like a rebuild"""
+        navigation = self.grid.navigation_grid()
+        index = region_index(navigation)
+        self.assertEqual(index.summary(), {'count': 1, 'sizes': [41], 'pocket_tiles': 0})
+
+        closed = navigation.patched([{'x': 4, 'y': 2, 'terrain_type': 'wall', 'is_walkable': False}])
+        self.assertEqual(closed.regions.summary()['sizes'], [20, 20])
+        self.assertFalse(closed.regions.connected((0, 0), (8, 4)))
+        self.assertTrue(closed.regions.connected((0, 0), (3, 4)))
+        # Standing on the wall itself still reaches both sides
+        self.assertTrue(closed.regions.connected((4, 2), (8, 4)))
+
+        reopened = closed.patched([{'x': 4, 'y': 0, 'terrain_type': 'floor', 'is_walkable': True}])
+        self.assertEqual(reopened.regions.summary()['sizes'], [41])
+        self.assertTrue(reopened.regions.connected((0, 4), (8, 4)))
+        self.assertEqual(reopened.regions.summary(), RegionIndex.build(reopened).summary())
+
+    def test_random_edits_match_a_rebuild(self):
+        """Test that batches of paints keep labels, cell sets and connectivity in step with a rebuild"""
+        rng = random.Random(8)
+        for _ in range(30):
+            width, height = rng.randint(3, 20), rng.randint(3, 20)
+            navigation = NavigationGrid(width, height, [int(rng.random() > 0.45) for _ in range(width * height)])
+            region_index(navigation)
+            for _ in range(20):
+                navigation = navigation.patched([
+                    {'x': rng.randrange(width), 'y': rng.randrange(height), **rng.choice([
+                        {'terrain_type': 'floor', 'is_walkable': True},
+                        {'terrain_type': 'wall', 'is_walkable': False},
+                    ])}
+                    for _ in range(rng.randint(1, 3))
+                ])
+                patched, rebuilt = navigation.regions, RegionIndex.build(navigation)
+
+                self.assertEqual(patched.summary(), rebuilt.summary())
+                pairs = set(zip(patched.labels, rebuilt.labels))
+                self.assertEqual(len(pairs), len({label for label, _ in pairs}))
+                for label, cells in patched.cells.items():
+                    self.assertTrue(all(patched.labels[cell] == label for cell in cells))
+
+    def test_find_path_rejects_disconnected_queries_without_searching(self):
+        """Test that an indexed grid answers unreachable queries with no expansions"""
+        navigation = self.grid.navigation_grid().patched(
+            [{'x': 4, 'y': 2, 'terrain_type': 'wall', 'is_walkable': False}]
+        )
+        stats = {}
+        find_path(navigation, (0, 0), (8, 4), stats=stats)
+        self.assertGreater(stats['expanded'], 0)
+
+        region_index(navigation)
+        result = find_path(navigation, (0, 0), (8, 4), stats=stats)
+        self.assertFalse(result['reachable'])
+        self.assertEqual(stats, {'algorithm': 'regions', 'expanded': 0})
+        self.assertEqual(find_path(navigation, (0, 0), (3, 3))['total_cost'], 4.2)
+
+    def test_connect_regions_tunnels_pockets(self):
+        """Test that stitching carves tunnels from the main region to every pocket"""
+        lookup = terrain_lookup_table(get_terrain_config('corporate'))
+        grid = TerrainGrid(12, 5, BaseTerrain.WALL)
+        grid.fill_rect(0, 0, 6, 5, BaseTerrain.FLOOR)
+        grid.fill_rect(8, 1, 2, 2, BaseTerrain.FLOOR)
+        grid.fill_rect(11, 4, 1, 1, BaseTerrain.FLOOR)
+        self.assertEqual(region_summary(grid, lookup)['count'], 3)
+
+        self.assertEqual(connect_regions(grid, lookup), 2)
+        self.assertEqual(region_summary(grid, lookup)['count'], 1)
+        # Two tiles to the room, five along the bottom row to the corner
+        self.assertEqual(int((grid.cells == BaseTerrain.WALL).sum()), 60 - 30 - 4 - 1 - 7)
+
+    def test_generation_reports_and_stitches_pockets(self):
+        """Test that previews report pockets and connect_regions removes them"""
+        user = User.objects.create_user(username='decker', password='testpass123')
+        self.client.login(username='decker', password='testpass123')
+        form_data = {
+            'name': 'Caves', 'width': 30, 'height': 30, 'map_type': 'wilderness',
+            'algorithm': 'cellular_automata', 'seed': 'a',
+        }
+
+        data = self.client.post(reverse('maps:generate_preview'), form_data).json()
+        self.assertGreater(data['regions']['count'], 1)
+        self.assertEqual(data['regions']['pocket_tiles'], sum(data['regions']['sizes'][1:]))
+
+        data = self.client.post(reverse('maps:generate_preview'), {**form_data, 'connect_regions': 'on'}).json()
+        self.assertEqual(data['regions']['count'], 1)
+
+    def test_pathfind_endpoint_rejects_walled_off_targets(self):
+        """Test that map_pathfind reports walled-off tiles unreachable"""
+        navigation_cache.clear()
+        user = User.objects.create_user(username='fixer', password='testpass123')
+        self.client.login(username='fixer', password='testpass123')
+        map_obj = Map.objects.create(name='Vault', owner=user, width=9, height=5)
+        initialize_tiles(map_obj)
+        update_tiles(map_obj, [{'x': 4, 'y': y, 'terrain_type': 'wall'} for y in range(5)])
+
+        data = self.client.post(reverse('maps:pathfind', kwargs={'pk': map_obj.pk}), {
+            'start_x': 0, 'start_y': 0, 'end_x': 8, 'end_y': 4,
+        }).json()
+
+        self.assertTrue(data['success'])
+        self.assertFalse(data['reachable'])
+        map_obj.refresh_from_db()
+        self.assertIsNotNone(navigation_cache.get(map_obj.pk, map_obj.revision).regions)
+
+
+class ReplanningTestCase(TransactionTestCase):
+    """Test D* Lite path repair and live path sessions"""
+
+    def setUp(self):
+        self.grid = MapGrid.blank(30, 20)
+        rng = random.Random(7)
+        for _ in range(120):
+            self.grid.set_tile(rng.randrange(30), rng.randrange(20), 'wall', '#696969', is_walkable=False)
+        for point in ((0, 0), (29, 19)):
+            self.grid.set_tile(*point, 'floor', '#808080', is_walkable=True)
+
+    def test_repaired_paths_match_astar(self):
+        """Test that a planner's costs equal fresh A* searches after every edit"""
+        navigation = self.grid.navigation_grid()
+        planner = PathPlanner(navigation, (0, 0), (29, 19))
+        self.assertEqual(planner.plan()['total_cost'], astar_grid(navigation, (0, 0), (29, 19))['total_cost'])
+
+        rng = random.Random(11)
+        for step in range(40):
+            tiles = [
+                {'x': rng.randrange(30), 'y': rng.randrange(20), 'terrain_type': terrain,
+                 'is_walkable': terrain != 'wall'}
+                for terrain in rng.choices(['wall', 'floor', 'rubble'], k=3)
+            ]
+            navigation = navigation.patched(tiles)
+            planner.update_tiles(tiles)
+            if step % 10 == 9:
+                planner.move_start(planner.plan()['path'][1] if planner.path()['reachable'] else planner.start)
+            result, expected = planner.plan(), astar_grid(navigation, planner.start, (29, 19))
+            self.assertEqual((result['reachable'], result['total_cost']), (expected['reachable'], expected['total_cost']))
+
+    def test_repair_expands_only_around_the_edit(self):
+        """Test that blocking the path costs less than replanning and distant edits cost nothing"""
+        grid = MapGrid.blank(60, 60)
+        rng = random.Random(7)
+        for _ in range(600):
+            grid.set_tile(rng.randrange(60), rng.randrange(60), 'wall', '#696969', is_walkable=False)
+        for point in ((0, 30), (59, 30)):
+            grid.set_tile(*point, 'floor', '#808080', is_walkable=True)
+        navigation = grid.navigation_grid()
+        planner = PathPlanner(navigation, (0, 30), (59, 30))
+        x, y = planner.plan()['path'][8]
+
+        wall = [{'x': x, 'y': row, 'terrain_type': 'wall', 'is_walkable': False} for row in range(y - 3, y + 4)]
+        self.assertTrue(planner.update_tiles(wall))
+        repaired = planner.plan()
+        fresh = PathPlanner(navigation.patched(wall), (0, 30), (59, 30))
+        self.assertEqual(repaired['total_cost'], fresh.plan()['total_cost'])
+        self.assertLess(planner.expanded, fresh.expanded / 2)
+
+        planner.update_tiles([{'x': 59, 'y': 0, 'terrain_type': 'wall', 'is_walkable': False}])
+        planner.plan()
+        self.assertEqual(planner.expanded, 0)
+
+    def test_sessions_are_reused_and_capped(self):
+        """Test that equal endpoints share a session and the oldest is dropped"""
+        navigation = self.grid.navigation_grid()
+        sessions = ReplanningSessions(max_sessions=2)
+        first, _ = sessions.open(navigation, (0, 0), (29, 19))
+        self.assertEqual(sessions.open(navigation, (0, 0), (29, 19))[0], first)
+
+        sessions.open(navigation, (1, 1), (29, 19))
+        sessions.open(navigation, (2, 2), (29, 19))
+        self.assertEqual(len(sessions), 2)
+        self.assertIsNone(sessions.get(first))
+
+    async def test_tile_broadcast_repairs_open_sessions(self):
+        """Test that painting a wall on a live path pushes a repaired path over the socket"""
+        user = await database_sync_to_async(User.objects.create_user)(username='runner', password='x')
+        map_obj = await database_sync_to_async(Map.objects.create)(name='Alley', owner=user, width=12, height=7)
+        await database_sync_to_async(initialize_tiles)(map_obj)
+
+        communicator = WebsocketCommunicator(MapConsumer.as_asgi(), f'/ws/maps/{map_obj.pk}/')
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'map_id': str(map_obj.pk)}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())['type'], 'connected')
+
+        await communicator.send_json_to({'type': 'path_session', 'data': {
+            'action': 'open', 'start': {'x': 0, 'y': 3}, 'goal': {'x': 11, 'y': 3},
+        }})
+        plan = (await communicator.receive_json_from())['data']
+        self.assertEqual((plan['total_cost'], plan['replanned']), (11.0, False))
+        self.assertEqual(plan['path_length'], len(plan['path']))
+        self.assertIn('terrain_breakdown', plan)
+
+        await communicator.send_json_to({'type': 'tile_update', 'data': {
+            'tiles': [{'x': 6, 'y': y, 'terrain_type': 'wall'} for y in range(1, 6)],
+        }})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'tile_update')
+        message = await communicator.receive_json_from()
+        await communicator.disconnect()
+
+        self.assertEqual(message['type'], 'path_plan')
+        self.assertEqual(message['data']['session'], plan['session'])
+        self.assertTrue(message['data']['replanned'])
+        self.assertNotIn({'x': 6, 'y': 3}, message['data']['path'])
+        self.assertGreater(message['data']['total_cost'], 11.0)
+
+
+class PathCacheTestCase(TestCase):
+    """Test the revision-keyed path result cache"""
+
+    def setUp(self):
+        navigation_cache.clear()
+        path_cache.clear()
+        self.user = User.objects.create_user(username='fixer', password='testpass123')
+        self.client.login(username='fixer', password='testpass123')
+        self.map = Map.objects.create(name='Arcology', owner=self.user, width=10, height=6)
+        initialize_tiles(self.map)
+
+    def pathfind(self, **extra):
+        return self.client.post(reverse('maps:pathfind', kwargs={'pk': self.map.pk}), {
+            'start_x': 0, 'start_y': 2, 'end_x': 9, 'end_y': 5, **extra,
+        }).json()
+
+    def test_lru_evicts_and_newer_revisions_drop_old_entries(self):
+        """Test that the cache stays bounded and a revision bump purges the map's entries"""
+        cache = PathCache(max_entries=2)
+        result = {'path': [], 'total_cost': 0.0, 'reachable': False, 'terrain_breakdown': {}}
+        for end in ((1, 1), (2, 2), (3, 3)):
+            cache.put(path_key(1, 0, (0, 0), end), result)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(path_key(1, 0, (0, 0), (1, 1))))
+        self.assertIs(cache.get(path_key(1, 0, (0, 0), (3, 3))), result)
+
+        cache.put(path_key(2, 0, (0, 0), (1, 1)), result)
+        self.assertIsNone(cache.get(path_key(1, 1, (0, 0), (3, 3))))
+        # Late answers for the old revision are not stored
+        cache.put(path_key(1, 0, (0, 0), (3, 3)), result)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats()['invalidations'], 1)
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_repeated_queries_hit_until_tiles_change(self):
+        """Test that map_pathfind serves repeats from the cache and misses after a paint"""
+        first = self.pathfind()
+        self.assertEqual(first['total_cost'], 10.2)
+        with self.assertNumQueries(4):
+            # Session, user, map and owner only: no tiles are read
+            self.assertEqual(self.pathfind(), first)
+        self.assertEqual(path_cache.stats()['hits'], 1)
+
+        self.assertEqual(self.pathfind(diagonal='false')['total_cost'], 12.0)
+        self.assertEqual(path_cache.stats()['misses'], 2)
+
+        update_tiles(self.map, [{'x': 5, 'y': y, 'terrain_type': 'wall'} for y in range(6)])
+        self.assertFalse(self.pathfind()['reachable'])
+        self.assertEqual(path_cache.stats()['invalidations'], 2)
+
+    def test_stats_are_staff_only(self):
+        """Test that the cache counters endpoint rejects non-staff users"""
+        self.pathfind()
+        url = reverse('maps:pathfinding_stats')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        data = self.client.get(url).json()
+        self.assertEqual(data['path_cache']['misses'], 1)
+        self.assertIn('hits', data['navigation_cache'])
+
+
+class PathQueryConsumerTestCase(TransactionTestCase):
+    """Test path queries over the map WebSocket"""
+
+    async def connect(self, width=40, height=40):
+        path_cache.clear()
+        user = await database_sync_to_async(User.objects.create_user)(username='rigger', password='x')
+        self.map = await database_sync_to_async(Map.objects.create)(name='Sprawl', owner=user, width=width, height=height)
+        await database_sync_to_async(initialize_tiles)(self.map)
+        communicator = WebsocketCommunicator(MapConsumer.as_asgi(), f'/ws/maps/{self.map.pk}/')
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'map_id': str(self.map.pk)}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from()
+        return communicator
+
+    async def test_query_is_answered_on_the_socket(self):
+        """Test that a path query gets a path_result with the query id"""
+        communicator = await self.connect()
+        await communicator.send_json_to({'type': 'path_query', 'data': {
+            'id': 'q1', 'start': {'x': 0, 'y': 0}, 'end': {'x': 39, 'y': 0}, 'diagonal': False,
+        }})
+        message = await communicator.receive_json_from()
+        await communicator.send_json_to({'type': 'path_query', 'data': {
+            'id': 'q2', 'start': {'x': 0, 'y': 0}, 'end': {'x': 40, 'y': 0},
+        }})
+        error = await communicator.receive_json_from()
+        await communicator.disconnect()
+
+        self.assertEqual(message['type'], 'path_result')
+        self.assertEqual(message['data']['id'], 'q1')
+        self.assertEqual((message['data']['total_cost'], message['data']['path_length']), (39.0, 40))
+        self.assertEqual(error['data']['code'], 'INVALID_PATH')
+
+    async def test_malformed_query_does_not_stop_answers(self):
+        """Test that a query that is not an object is refused and later queries are still answered"""
+        communicator = await self.connect()
+        await communicator.send_json_to({'type': 'path_query', 'data': [0, 0, 39, 0]})
+        error = await communicator.receive_json_from()
+        await communicator.send_json_to({'type': 'path_query', 'data': {
+            'id': 'q3', 'start': {'x': 0, 'y': 0}, 'end': {'x': 3, 'y': 0},
+        }})
+        message = await communicator.receive_json_from()
+        await communicator.disconnect()
+
+        self.assertEqual((error['type'], error['data']['code']), ('error', 'INVALID_PATH'))
+        self.assertEqual((message['type'], message['data']['id']), ('path_result', 'q3'))
+
+    async def test_overtaken_queries_are_coalesced(self):
+        """Test that a burst of queries is answered in order, ending with the latest"""
+        communicator = await self.connect()
+        for index in range(20):
+            await communicator.send_json_to({'type': 'path_query', 'data': {
+                'id': index, 'start': {'x': 0, 'y': 0}, 'end': {'x': 39, 'y': index}, 'preview': True,
+            }})
+
+        answered, coalesced = [], 0
+        while not answered or answered[-1] != 19:
+            message = await communicator.receive_json_from(timeout=10)
+            answered.append(message['data']['id'])
+            coalesced += message['data']['coalesced']
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+        self.assertEqual(answered, sorted(answered))
+        self.assertEqual(len(answered) + coalesced, 20)
+
+
+class PathfindingHarnessTestCase(TestCase):
+    """Test the pathfinding correctness and benchmark harness"""
+
+    def test_reference_dijkstra_agrees_with_astar_on_mixed_costs(self):
+        """Test that the reference search and A* find the same costs on rough terrain"""
+        navigation = rough_navigation(generated_navigation('bsp', 40, 'ref'), 0.3, 'ref')
+        self.assertFalse(navigation.uniform_cost)
+        for start, end in random_pairs(navigation, 30, 'ref'):
+            expected = astar_grid(navigation, start, end)
+            result = reference_dijkstra(navigation, start, end)
+            self.assertEqual((result['reachable'], result['total_cost']),
+                             (expected['reachable'], expected['total_cost']))
+
+    def test_rough_cases_skip_uniform_only_searches(self):
+        """Test that rough maps drop JPS and report latency percentiles and memory"""
+        case = pathfinding_case('random_walk', 30, seeds=['a'], pairs=20, rough=0.2)
+
+        self.assertEqual(case['name'], 'random_walk@30x30/rough')
+        self.assertNotIn('jps', case['searches'])
+        self.assertEqual(case['cost_mismatches'], 0)
+        astar = case['searches']['astar']
+        self.assertLessEqual(astar['p50_seconds'], astar['p90_seconds'])
+        self.assertLessEqual(astar['p90_seconds'], astar['p99_seconds'])
+        self.assertGreater(astar['peak_bytes'], 0)
+        self.assertGreaterEqual(case['searches']['hpa']['mean_excess'], 0)
+
+    def test_command_covers_every_generator(self):
+        """Test that the command checks all generators and writes its report"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'paths.json')
+            call_command('benchmark_pathfinding', sizes='20', seeds='a', pairs=5, output=output,
+                         stdout=open(os.devnull, 'w'))
+            with open(output) as handle:
+                report = json.load(handle)
+
+        self.assertEqual({case['algorithm'] for case in report['cases']}, {'random', *GENERATION_ALGORITHMS})
+        self.assertEqual(len(report['cases']), 2 * (len(GENERATION_ALGORITHMS) + 1))
+
+
+class FogOfWarTestCase(TestCase):
+    """Test the fog of war bitmap"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='gm', password='testpass123')
+        self.client.login(username='gm', password='testpass123')
+        self.map = Map.objects.create(name='Docks', owner=self.user, width=100, height=100, fog_of_war_enabled=True)
+
+    def test_areas_clip_to_the_map_and_survive_storage(self):
+        """Test that radius edits clip at the edges and round-trip through bytes"""
+        fog = FogMask(10, 8)
+        fog.set_area(0, 0, 1, True)
+        fog.set_area(9, 7, 2, True)
+        fog.set_area(8, 6, 0, False)
+        self.assertEqual(fog.count, 4 + 9 - 1)
+        self.assertIn((1, 1), fog)
+        self.assertNotIn((8, 6), fog)
+        self.assertNotIn((10, 0), fog)
+
+        restored = FogMask.from_bytes(fog.to_bytes(), 10, 8)
+        self.assertEqual(restored.points(), fog.points())
+        # A resized map keeps the tiles both sizes share
+        self.assertEqual(FogMask.from_bytes(fog.to_bytes(), 3, 20).points(), [[0, 0], [1, 0], [0, 1], [1, 1]])
+
+    def test_reveal_and_hide_views_return_versioned_deltas(self):
+        """Test that the fog views edit squares and describe only the changed tiles"""
+        data = self.client.post(reverse('maps:reveal_tile', kwargs={'pk': self.map.pk}),
+                                {'x': 50, 'y': 50, 'radius': 2}).json()
+        self.assertEqual(data['revealed_count'], 25)
+        self.assertEqual(data['fog']['version'], 1)
+        self.assertEqual(data['fog']['runs'], [[row * 100 + 48, 5, 1] for row in range(48, 53)])
+
+        data = self.client.post(reverse('maps:hide_tile', kwargs={'pk': self.map.pk}),
+                                {'x': 50, 'y': 50, 'radius': 1}).json()
+        self.assertEqual((data['revealed_count'], data['fog']['version']), (16, 2))
+        self.assertEqual(data['fog']['runs'], [[row * 100 + 49, 3, 0] for row in range(49, 52)])
+        self.map.refresh_from_db()
+        self.assertNotIn((50, 50), load_fog(self.map))
+
+        # Hiding hidden tiles changes nothing and keeps the version
+        data = self.client.post(reverse('maps:hide_tile', kwargs={'pk': self.map.pk}),
+                                {'x': 50, 'y': 50, 'radius': 1}).json()
+        self.assertIsNone(data['fog'])
+        data = self.client.post(reverse('maps:reset_fog_of_war', kwargs={'pk': self.map.pk})).json()
+        self.assertEqual((data['revealed_count'], data['fog']['version']), (0, 3))
+        self.assertEqual(fog_payload(Map.objects.get(pk=self.map.pk))['version'], 3)
+
+    def test_runs_replay_any_change(self):
+        """Test that applying fog_runs to the old mask reproduces the new one"""
+        rng = np.random.default_rng(3)
+        before = FogMask(37, 23, rng.random((23, 37)) < 0.5)
+        after = rng.random((23, 37)) < 0.5
+        replayed = FogMask(37, 23, before.revealed.copy())
+        replayed.apply_runs(fog_runs(before.revealed, after))
+        self.assertTrue((replayed.revealed == after).all())
+        self.assertEqual(fog_runs(after, after), [])
+
+    def test_payload_is_far_smaller_than_a_coordinate_list(self):
+        """Test that a fully revealed map stores and sends about 50x less than the JSON list"""
+        fog = FogMask(100, 100)
+        fog.set_area(50, 50, 50, True)
+        save_fog(self.map, fog)
+
+        payload = fog_payload(self.map)
+        self.assertEqual(payload['revealed_count'], 10000)
+        self.assertGreater(len(json.dumps(fog.points())) / len(payload['revealed']), 50)
+        self.assertEqual(len(self.map.fog_data), 4 + 1250)
+
+
+class FogMigrationTestCase(TransactionTestCase):
+    """Test the migration from revealed_tiles lists to fog bitmaps"""
+
+    def test_revealed_lists_become_bitmaps_and_back(self):
+        """Test that migrating forwards and backwards preserves the revealed tiles"""
+        executor = MigrationExecutor(connection)
+        old, new = [('maps', '0007_map_revision')], [('maps', '0008_map_fog_data')]
+        executor.migrate(old)
+        apps = executor.loader.project_state(old).apps
+        owner = apps.get_model('auth', 'User').objects.create(username='gm')
+        apps.get_model('maps', 'Map').objects.create(
+            name='Old', owner_id=owner.pk, width=6, height=4, revealed_tiles=[[0, 0], [5, 3], [2, 1], [9, 9]],
+        )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(new)
+        new_map = executor.loader.project_state(new).apps.get_model('maps', 'Map').objects.get(name='Old')
+        fog = FogMask.from_bytes(bytes(new_map.fog_data), 6, 4)
+        self.assertEqual(fog.points(), [[0, 0], [2, 1], [5, 3]])
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(old)
+        old_map = executor.loader.project_state(old).apps.get_model('maps', 'Map').objects.get(name='Old')
+        self.assertEqual(old_map.revealed_tiles, [[0, 0], [2, 1], [5, 3]])
+
+        MigrationExecutor(connection).migrate(executor.loader.graph.leaf_nodes('maps'))
+
+
+class FogBroadcastTestCase(TransactionTestCase):
+    """Test fog of war deltas over the map WebSocket"""
+
+    async def join(self, user, map_obj):
+        communicator = WebsocketCommunicator(MapConsumer.as_asgi(), f'/ws/maps/{map_obj.pk}/')
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'map_id': str(map_obj.pk)}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator, (await communicator.receive_json_from())['data']
+
+    async def test_players_receive_deltas_and_snapshots(self):
+        """Test that reveals broadcast only the changed runs and snapshots carry the version"""
+        gm = await database_sync_to_async(User.objects.create_user)(username='gm', password='x')
+        player = await database_sync_to_async(User.objects.create_user)(username='face', password='x')
+        map_obj = await database_sync_to_async(Map.objects.create)(
+            name='Club', owner=gm, width=100, height=100, is_public=True, fog_of_war_enabled=True,
+        )
+        gm_socket, _ = await self.join(gm, map_obj)
+        player_socket, connected = await self.join(player, map_obj)
+        self.assertEqual(connected['fog_version'], 0)
+        await gm_socket.receive_json_from()  # player joined
+
+        await gm_socket.send_json_to({'type': 'fog_update', 'data': {
+            'action': 'reveal', 'tiles': [[10, 10], {'x': 90, 'y': 90}], 'radius': 2,
+        }})
+        delta = (await player_socket.receive_json_from())['data']
+        self.assertEqual((delta['version'], delta['revealed_count'], delta['fog_enabled']), (1, 18, True))
+        self.assertEqual(len(delta['runs']), 6)
+        self.assertLess(len(json.dumps(delta)), 200)
+
+        await player_socket.send_json_to({'type': 'fog_snapshot', 'data': {}})
+        snapshot = (await player_socket.receive_json_from())['data']
+        fog = FogMask.from_bytes(b'\x64\x00\x64\x00' + base64.b64decode(snapshot['revealed']), 100, 100)
+        self.assertEqual((snapshot['version'], fog.count), (1, 18))
+        self.assertIn((91, 89), fog)
+
+        # Edits through the HTTP views reach the socket too
+        await database_sync_to_async(self.client.force_login)(gm)
+        await database_sync_to_async(self.client.post)(reverse('maps:toggle_fog_of_war', kwargs={'pk': map_obj.pk}))
+        delta = (await player_socket.receive_json_from())['data']
+        self.assertEqual((delta['version'], delta['runs'], delta['fog_enabled']), (2, [], False))
+
+        await gm_socket.disconnect()
+        await player_socket.disconnect()
+
+    async def test_moving_a_token_reveals_what_it_sees(self):
+        """Test that object moves over the socket reveal the token's field of view"""
+        gm = await database_sync_to_async(User.objects.create_user)(username='gm', password='x')
+        map_obj = await database_sync_to_async(Map.objects.create)(
+            name='Alley', owner=gm, width=30, height=30, fog_of_war_enabled=True,
+        )
+        drone = await database_sync_to_async(MapObject.objects.create)(
+            map=map_obj, x=0, y=0, name='Drone', object_type='vehicle', stats={'vision_radius': 2},
+        )
+        gm_socket, _ = await self.join(gm, map_obj)
+
+        await gm_socket.send_json_to({'type': 'object_update', 'data': {
+            'action': 'update', 'object': {'id': drone.pk, 'x': 20, 'y': 20},
+        }})
+        self.assertEqual((await gm_socket.receive_json_from())['type'], 'object_update')
+        delta = (await gm_socket.receive_json_from())['data']
+        self.assertEqual((delta['version'], delta['revealed_count']), (1, 21))
+
+        fog = await database_sync_to_async(lambda: load_fog(Map.objects.get(pk=map_obj.pk)))()
+        self.assertIn((22, 19), fog)
+        self.assertNotIn((0, 0), fog)
+
+        await gm_socket.disconnect()
+
+
+class VisibilityTestCase(TestCase):
+    """Test shadowcasting field of view and automatic fog reveal"""
+
+    def setUp(self):
+        opacity_cache.clear()
+        vision_cache.clear()
+        self.user = User.objects.create_user(username='gm', password='testpass123')
+        self.client.login(username='gm', password='testpass123')
+        self.map = Map.objects.create(name='Warehouse', owner=self.user, width=20, height=10, fog_of_war_enabled=True)
+
+    def test_walls_cast_shadows_and_radius_limits_sight(self):
+        """Test that opaque tiles are seen but hide what is behind them"""
+        tiles = np.zeros((9, 9), dtype=bool)
+        tiles[:, 5] = True
+        tiles[4, 5] = False  # a window
+        field = OpacityGrid(9, 9, tiles, frozenset({(2, 1)})).field_of_view(2, 4).reshape(9, 9)
+
+        self.assertTrue(field[0, 5])  # the wall itself
+        self.assertTrue(field[4, 8])  # through the window
+        self.assertFalse(field[0, 8])
+        self.assertTrue(field[1, 2])  # the crate
+        self.assertFalse(field[0, 2])  # behind the crate
+
+        open_field = OpacityGrid(9, 9, np.zeros((9, 9), dtype=bool), frozenset()).field_of_view(4, 4, 2)
+        self.assertEqual(int(open_field.sum()), 21)
+
+    def test_moving_one_token_recomputes_one_field(self):
+        """Test that party vision only recomputes the fields that changed"""
+        rng = np.random.default_rng(7)
+        opacity = OpacityGrid(100, 100, rng.random((100, 100)) < 0.1, frozenset())
+        party = [Token(f'runner:{i}', 10 + 15 * i, 50, 12) for i in range(6)]
+        vision = PartyVision(opacity)
+
+        self.assertEqual(vision.update(party), 6)
+
+        party[2] = party[2]._replace(x=41, y=52)
+        self.assertEqual(vision.update(party), 1)
+        self.assertEqual(vision.update(party[:5]), 0)
+
+        # Opacity changes only concern tokens within reach
+        tiles = opacity.tiles.copy()
+        tiles[50, 12] = not tiles[50, 12]
+        self.assertEqual(vision.update(party[:5], OpacityGrid(100, 100, tiles, frozenset())), 1)
+
+        expected = np.zeros(100 * 100, dtype=bool)
+        for token in party[:5]:
+            expected |= vision.opacity.field_of_view(token.x, token.y, token.radius)
+        self.assertTrue(np.array_equal(vision.visible.ravel(), expected))
+
+    def test_painted_walls_and_objects_update_the_cached_opacity(self):
+        """Test that tile paints patch the opacity grid and objects overlay it"""
+        self.assertFalse(opacity_grid(self.map).opaque[3 * 20 + 4])
+        update_tiles(self.map, [{'x': 4, 'y': 3, 'terrain_type': 'wall'}])
+        MapObject.objects.create(map=self.map, x=6, y=3, name='Van', blocks_vision=True)
+
+        grid = opacity_grid(self.map)
+        self.assertEqual((opacity_cache.misses, opacity_cache.patches), (1, 1))
+        self.assertTrue(grid.opaque[3 * 20 + 4])
+        self.assertTrue(grid.opaque[3 * 20 + 6])
+
+    def test_tokens_reveal_fog_they_can_see(self):
+        """Test that viewer objects and player participants reveal their field of view"""
+        update_tiles(self.map, [{'x': 10, 'y': y, 'terrain_type': 'wall'} for y in range(10)])
+        MapObject.objects.create(map=self.map, x=2, y=2, name='Decker', object_type='marker',
+                                 stats={'vision_radius': 3})
+        MapObject.objects.create(map=self.map, x=8, y=8, name='Crate', object_type='item')
+        campaign = Campaign.objects.create(name='Seattle', game_master=self.user)
+        session = Session.objects.create(campaign=campaign, session_number=1, title='Run')
+        session.maps_used.add(self.map)
+        encounter = CombatEncounter.objects.create(session=session, name='Raid', status='active')
+        CombatParticipant.objects.create(encounter=encounter, name='Sam', team='player', map_x=15, map_y=5)
+        CombatParticipant.objects.create(encounter=encounter, name='Ganger', team='enemy', map_x=5, map_y=5)
+
+        data = self.client.post(reverse('maps:reveal_party_vision', kwargs={'pk': self.map.pk})).json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['fog']['version'], 1)
+
+        fog = load_fog(Map.objects.get(pk=self.map.pk))
+        self.assertIn((2, 5), fog)
+        self.assertNotIn((2, 6), fog)  # past the decker's radius
+        self.assertIn((10, 5), fog)  # the wall Sam looks at
+        self.assertIn((19, 0), fog)
+        self.assertNotIn((8, 8), fog)  # behind the wall from Sam, too far for the decker
+        self.assertNotIn((5, 8), fog)  # enemies do not reveal
+        self.assertEqual(data['revealed_count'], fog.count)
+
+        # Nothing new in sight: no new fog version
+        data = self.client.post(reverse('maps:reveal_party_vision', kwargs={'pk': self.map.pk})).json()
+        self.assertIsNone(data['fog'])
+        self.assertEqual(data['recomputed'], 0)
+
+
+class LineOfSightTestCase(TestCase):
+    """Test batched line of sight and cover"""
+
+    def setUp(self):
+        opacity_cache.clear()
+        self.user = User.objects.create_user(username='gm', password='testpass123')
+        self.client.login(username='gm', password='testpass123')
+        self.map = Map.objects.create(name='Parking Lot', owner=self.user, width=12, height=12)
+        campaign = Campaign.objects.create(name='Seattle', game_master=self.user)
+        session = Session.objects.create(campaign=campaign, session_number=1, title='Run')
+        session.maps_used.add(self.map)
+        self.encounter = CombatEncounter.objects.create(session=session, name='Shootout', status='active')
+        self.urls = {name: reverse(f'campaigns:{name}', kwargs={
+            'campaign_pk': campaign.pk, 'session_pk': session.pk, 'encounter_pk': self.encounter.pk,
+        }) for name in ('combat_attack', 'combat_sight')}
+
+    def test_walls_block_sight_both_ways(self):
+        """Test that opaque tiles between the ends block sight, symmetrically"""
+        tiles = np.zeros((10, 10), dtype=bool)
+        tiles[5, :] = True
+        tiles[5, 2] = False
+        opacity = OpacityGrid(10, 10, tiles, frozenset())
+        results = lines_of_sight(opacity, [((3, 0), (3, 9)), ((2, 0), (2, 9)), ((3, 5), (3, 0)), ((0, 0), (20, 0))])
+        self.assertEqual([result['visible'] for result in results], [False, True, True, False])
+
+        rng = np.random.default_rng(3)
+        opacity = OpacityGrid(40, 40, rng.random((40, 40)) < 0.2, frozenset())
+        points = [tuple(int(v) for v in rng.integers(40, size=2)) for _ in range(12)]
+        visible, _ = sight_matrix(opacity, points)
+        self.assertEqual(visible, [list(row) for row in zip(*visible)])
+        single = lines_of_sight(opacity, [(points[0], points[5])])[0]
+        self.assertEqual(single['visible'], visible[0][5])
+
+    def test_best_cover_is_the_strongest_nearest_the_target(self):
+        """Test that the highest bonus wins and ties go to the cover nearest the target"""
+        opacity = OpacityGrid(10, 10, np.zeros((10, 10), dtype=bool), frozenset())
+        cover = CoverGrid(10, 10, [
+            {'id': 1, 'name': 'Bin', 'x': 3, 'y': 2, 'cover_level': 'light', 'defense_bonus': 2},
+            {'id': 2, 'name': 'Sign', 'x': 3, 'y': 7, 'cover_level': 'light', 'defense_bonus': 2},
+            {'id': 3, 'name': 'Car', 'x': 6, 'y': 6, 'cover_level': 'medium', 'defense_bonus': 4},
+        ])
+        results = lines_of_sight(opacity, [((3, 0), (3, 9)), ((3, 9), (3, 0)), ((0, 0), (9, 9)), ((5, 5), (6, 6))], cover)
+        self.assertEqual([result['cover'] and result['cover']['id'] for result in results], [2, 1, 3, None])
+
+    def test_attack_applies_cover_and_blind_fire(self):
+        """Test that combat_attack adds cover to defense and reports missing sight"""
+        update_tiles(self.map, [{'x': x, 'y': 8, 'terrain_type': 'wall'} for x in range(12)])
+        MapObject.objects.create(map=self.map, x=5, y=4, name='Dumpster', object_type='cover',
+                                 stats={'cover_level': 'medium', 'defense_bonus': 4})
+        sam = CombatParticipant.objects.create(encounter=self.encounter, name='Sam', team='player', map_x=5, map_y=1)
+        ganger = CombatParticipant.objects.create(encounter=self.encounter, name='Ganger', team='enemy',
+                                                  map_x=5, map_y=6, current_hp=100, max_hp=100)
+        sniper = CombatParticipant.objects.create(encounter=self.encounter, name='Sniper', team='enemy',
+                                                  map_x=5, map_y=10)
+
+        data = self.client.post(self.urls['combat_attack'], {
+            'attacker_id': sam.pk, 'target_id': ganger.pk, 'attack_pool': 10, 'damage_base': '8P',
+        }).json()
+        self.assertTrue(data['success'])
+        self.assertTrue(data['line_of_sight'])
+        self.assertEqual(data['cover']['name'], 'Dumpster')
+        self.assertEqual(CombatLog.objects.filter(encounter=self.encounter).first().data['cover']['defense_bonus'], 4)
+
+        data = self.client.post(self.urls['combat_attack'], {
+            'attacker_id': sam.pk, 'target_id': sniper.pk, 'attack_pool': 10, 'damage_base': '8P',
+        }).json()
+        self.assertFalse(data['line_of_sight'])
+
+        data = self.client.get(self.urls['combat_sight']).json()
+        self.assertEqual([p['name'] for p in data['participants']], ['Ganger', 'Sam', 'Sniper'])
+        self.assertEqual(data['visible'], [[True, True, False], [True, True, False], [False, False, True]])
+        self.assertEqual(data['cover'][1][0]['name'], 'Dumpster')
+        self.assertIsNone(data['cover'][0][2])
@@ -0,0 +1,83 @@
+"""
+Bulk persistence of map tiles.
+
+Writes MapTile rows in fixed-size bulk_create batches inside a single
+transaction, so creating or regenerating a full map costs a handful of
+INSERT statements instead of one per tile.
+"""
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+from django.db import transaction
+
+from .models import Map, MapTile
+
+# Rows handed to each bulk_create call. Django further splits a batch when
+# the backend's bound-parameter limit is lower (e.g. older SQLite builds).
+DEFAULT_BATCH_SIZE = 1000
+
+# Tile fields accepted from tile dictionaries (e.g. generator preview data)
+TILE_FIELDS = (
+    'x', 'y', 'terrain_type', 'is_walkable', 'is_transparent',
+    'color', 'movement_cost', 'notes', 'custom_properties',
+)
+
+
+def build_tiles(map_obj: Map, tile_data: Iterable[Dict]) -> Iterator[MapTile]:
+    """Yield unsaved MapTile instances for the given tile dictionaries"""
+    for tile_info in tile_data:
+        yield MapTile(
+            map=map_obj,
+            **{field: tile_info[field] for field in TILE_FIELDS if field in tile_info}
+        )
+
+
+def default_tile_data(width: int, height: int, **defaults) -> Iterator[Dict]:
+    """Yield tile dictionaries covering a width x height map with the same settings"""
+    for y in range(height):
+        for x in range(width):
+            yield {'x': x, 'y': y, **defaults}
+
+
+def _batches(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def bulk_create_tiles(map_obj: Map, tile_data: Iterable[Dict], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Insert tiles for a map in batches inside one transaction.
+
+    Args:
+        map_obj: The Map the tiles belong to
+        tile_data: Iterable of tile dictionaries (x, y, terrain_type, ...)
+        batch_size: Number of rows per INSERT
+
+    Returns:
+        Number of tiles created
+    """
+    created = 0
+    with transaction.atomic():
+        for batch in _batches(build_tiles(map_obj, tile_data), batch_size):
+            MapTile.objects.bulk_create(batch, batch_size=batch_size)
+            created += len(batch)
+    return created
+
+
+def replace_map_tiles(map_obj: Map, tile_data: Iterable[Dict], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Replace every tile of a map in one transaction (used for regeneration).
+
+    Existing rows are removed with a single DELETE before the new tiles
+    are bulk inserted, so readers never see a half-written map.
+
+    Returns:
+        Number of tiles created
+    """
+    with transaction.atomic():
+        MapTile.objects.filter(map=map_obj).delete()
+        return bulk_create_tiles(map_obj, tile_data, batch_size=batch_size)
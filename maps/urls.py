@@ -11,14 +11,21 @@ urlpatterns = [
     path('<int:pk>/delete/', views.map_delete, name='delete'),
     path('<int:pk>/tile/update/', views.map_tile_update, name='tile_update'),
     path('<int:pk>/pathfind/', views.map_pathfind, name='pathfind'),
+    path('pathfinding/stats/', views.pathfinding_stats, name='pathfinding_stats'),
+    path('<int:pk>/movement-range/', views.map_movement_range, name='movement_range'),
+    path('<int:pk>/flow-paths/', views.map_flow_paths, name='flow_paths'),
+    path('<int:pk>/sectors/', views.map_sectors, name='sectors'),
     path('generate/', views.map_generate, name='generate'),
     path('generate/preview/', views.map_generate_preview, name='generate_preview'),
+    path('generate/jobs/', views.generation_job_create, name='generation_job_create'),
+    path('generate/jobs/<int:pk>/', views.generation_job_status, name='generation_job_status'),
 
     # Fog of War URLs
     path('<int:pk>/fog-of-war/toggle/', views.toggle_fog_of_war, name='toggle_fog_of_war'),
     path('<int:pk>/fog-of-war/reveal/', views.reveal_tile, name='reveal_tile'),
     path('<int:pk>/fog-of-war/hide/', views.hide_tile, name='hide_tile'),
     path('<int:pk>/fog-of-war/reset/', views.reset_fog_of_war, name='reset_fog_of_war'),
+    path('<int:pk>/fog-of-war/vision/', views.reveal_party_vision, name='reveal_party_vision'),
 
     # Map Generation Preset URLs
     path('presets/', views.preset_list, name='preset_list'),
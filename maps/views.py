@@ -7,16 +7,44 @@ import random
 import json
 import logging
 
+from campaigns.models import CombatEncounter
+from characters.models import Character
+from shadowrun_campaign.rng import seeded_random
+
 from . import models
 from .forms import MapForm, MapObjectForm, MapGenerationForm, MapGenerationPresetForm
 from .generators import (
-    generate_bsp_map,
-    generate_cellular_automata_map,
-    generate_random_walk_map,
-    generate_maze_map
+    cover_candidate_tiles,
+    get_terrain_config,
+    terrain_lookup_table,
+)
+from .fog import FogMask, change_fog, fog_payload, load_fog, publish_fog_delta
+from .gallery import gallery_payload
+from .generation_cache import cached_generation
+from .grid_storage import (
+    GridTooLargeError,
+    initialize_tiles,
+    map_tiles,
+    update_tiles,
+    write_terrain_grid,
 )
+from .jobs import job_payload, job_runner
+from .sectors import SECTOR_SIZE, viewport_payload
 from .cover_system import calculate_cover_positions
-from .pathfinding import astar, TERRAIN_COSTS
+from .navigation import navigation_cache, navigation_grid
+from .path_cache import cached_path, path_cache
+from .sector_hierarchy import sector_hierarchies
+from .regions import region_summary
+from .visibility import reveal_vision, visible_payload
+from .pathfinding import (
+    MAX_FLOW_GOALS,
+    MAX_FLOW_STARTS,
+    MAX_MOVEMENT_BUDGET,
+    budget_stop,
+    distance_field,
+    movement_range,
+    movement_range_payload,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -26,9 +54,10 @@ def map_list(request):
     """List all maps accessible to the user"""
     try:
         # Get user's own maps and maps shared with them
-        user_maps = models.Map.objects.filter(owner=request.user)
-        shared_maps = models.Map.objects.filter(shared_with=request.user)
-        public_maps = models.Map.objects.filter(is_public=True).exclude(owner=request.user)
+        maps = models.Map.objects.defer('grid_data')
+        user_maps = maps.filter(owner=request.user)
+        shared_maps = maps.filter(shared_with=request.user)
+        public_maps = maps.filter(is_public=True).exclude(owner=request.user)
 
         context = {
             'user_maps': user_maps,
@@ -57,17 +86,13 @@ def map_create(request):
                     form.save_m2m()  # Save many-to-many relationships (shared_with)
 
                     # Initialize the map with default floor tiles
-                    for y in range(map_obj.height):
-                        for x in range(map_obj.width):
-                            models.MapTile.objects.create(
-                                map=map_obj,
-                                x=x,
-                                y=y,
-                                terrain_type='floor',
-                                is_walkable=True,
-                                is_transparent=True,
-                                color='#E8E8E8'
-                            )
+                    initialize_tiles(
+                        map_obj,
+                        terrain_type='floor',
+                        is_walkable=True,
+                        is_transparent=True,
+                        color='#E8E8E8'
+                    )
 
                     logger.info(f"User {request.user.username} created map '{map_obj.name}' (ID: {map_obj.pk})")
                     messages.success(request, f'Map "{map_obj.name}" created successfully!')
@@ -101,8 +126,8 @@ def map_detail(request, pk):
             messages.error(request, 'You do not have permission to view this map.')
             return redirect('maps:list')
 
-        # Get all tiles and objects for this map
-        tiles = map_obj.tiles.all()
+        # Get all tiles and objects for this map (sectored maps load tiles per viewport)
+        tiles = [] if map_obj.is_sectored else map_tiles(map_obj)
         objects = map_obj.map_objects.all()
 
         # Check if user can edit (owner or shared_with users)
@@ -113,6 +138,7 @@ def map_detail(request, pk):
             'tiles': tiles,
             'objects': objects,
             'can_edit': can_edit,
+            'fog': fog_payload(map_obj),
         }
         logger.info(f"User {request.user.username} viewed map '{map_obj.name}' (ID: {pk})")
         return render(request, 'maps/detail.html', context)
@@ -203,48 +229,17 @@ def map_tile_update(request, pk):
                 'error': 'Invalid coordinates'
             }, status=400)
 
-        # Get or create the tile
-        tile = models.MapTile.objects.filter(map=map_obj, x=x, y=y).first()
-
-        if tile:
-            # Update existing tile
-            tile.terrain_type = terrain_type
-            tile.color = color
-
-            # Set walkable and transparent based on terrain type
-            if terrain_type in ['wall', 'building', 'water', 'mountain']:
-                tile.is_walkable = False
-            else:
-                tile.is_walkable = True
-
-            if terrain_type in ['wall', 'building', 'door', 'forest']:
-                tile.is_transparent = False
-            else:
-                tile.is_transparent = True
-
-            # Sync movement_cost with terrain cost table
-            terrain_cost = TERRAIN_COSTS.get(terrain_type)
-            if terrain_cost is not None:
-                tile.movement_cost = terrain_cost
-
-            tile.save()
-
-            return JsonResponse({
-                'success': True,
-                'tile': {
-                    'x': tile.x,
-                    'y': tile.y,
-                    'terrain_type': tile.terrain_type,
-                    'color': tile.color,
-                    'is_walkable': tile.is_walkable,
-                    'is_transparent': tile.is_transparent
-                }
-            })
-        else:
+        saved = update_tiles(map_obj, [{'x': x, 'y': y, 'terrain_type': terrain_type, 'color': color}])
+        if not saved:
             return JsonResponse({
                 'success': False,
-                'error': 'Tile not found'
-            }, status=404)
+                'error': 'Invalid terrain type'
+            }, status=400)
+
+        return JsonResponse({
+            'success': True,
+            'tile': saved[0]
+        })
 
     except (ValueError, TypeError) as e:
         logger.error(f"Invalid data in map_tile_update for user {request.user.username}, map {pk}: {str(e)}", exc_info=True)
@@ -267,6 +262,11 @@ def map_generate_preview(request):
         if request.method == 'POST':
             form = MapGenerationForm(request.user, request.POST)
             if form.is_valid():
+                if form.cleaned_data.get('large_map'):
+                    return JsonResponse({
+                        'success': False,
+                        'error': 'Large sectored maps are generated as they are viewed and cannot be previewed'
+                    }, status=400)
                 try:
                     # Extract form data
                     width = form.cleaned_data['width']
@@ -276,32 +276,23 @@ def map_generate_preview(request):
                     algorithm = form.cleaned_data.get('algorithm', 'random')
 
                     # Collect algorithm-specific parameters
-                    params = {}
-                    if algorithm == 'bsp':
-                        if form.cleaned_data.get('min_room_size') is not None:
-                            params['min_room_size'] = form.cleaned_data['min_room_size']
-                        if form.cleaned_data.get('max_room_size') is not None:
-                            params['max_room_size'] = form.cleaned_data['max_room_size']
-                        if form.cleaned_data.get('corridor_width') is not None:
-                            params['corridor_width'] = form.cleaned_data['corridor_width']
-                    elif algorithm == 'cellular_automata':
-                        if form.cleaned_data.get('iterations') is not None:
-                            params['iterations'] = form.cleaned_data['iterations']
-                        if form.cleaned_data.get('wall_probability') is not None:
-                            params['wall_probability'] = form.cleaned_data['wall_probability']
-                    elif algorithm == 'random_walk':
-                        if form.cleaned_data.get('steps') is not None:
-                            params['steps'] = form.cleaned_data['steps']
-                        if form.cleaned_data.get('tunnel_width_probability') is not None:
-                            params['tunnel_width_probability'] = form.cleaned_data['tunnel_width_probability']
-                    elif algorithm == 'maze':
-                        if form.cleaned_data.get('path_width') is not None:
-                            params['path_width'] = form.cleaned_data['path_width']
+                    params = collect_algorithm_params(algorithm, form.cleaned_data)
+
+                    # Gallery mode: thumbnails of several seeds generated in parallel
+                    variants = form.cleaned_data.get('variants')
+                    if variants:
+                        gallery = gallery_payload(
+                            width, height, map_type, form.cleaned_data.get('seed'), variants, algorithm, params
+                        )
+                        logger.info(f"User {request.user.username} generated {variants} map variants: {algorithm} {width}x{height}")
+                        return JsonResponse({'success': True, **gallery})
 
                     # Generate tile data without creating database objects
-                    tile_data = generate_preview_tiles(width, height, map_type, seed, algorithm, params)
+                    grid = cached_generation(width, height, map_type, seed, algorithm, params)
+                    config = get_terrain_config(map_type)
+                    tile_data = grid_to_tile_data(grid, config)
 
-                    # Store data in session for later saving
+                    # Store the generation inputs for saving; the grid itself stays in the generation cache
                     request.session['preview_data'] = {
                         'name': form.cleaned_data['name'],
                         'width': width,
@@ -309,17 +300,20 @@ def map_generate_preview(request):
                         'map_type': map_type,
                         'seed': seed,
                         'algorithm': algorithm,
-                        'params': params,
-                        'tile_data': tile_data
+                        'params': params
                     }
 
+                    # Report pockets the players could never walk to
+                    regions = region_summary(grid, terrain_lookup_table(config))
+
                     logger.info(f"User {request.user.username} generated map preview: {algorithm} {width}x{height}")
                     return JsonResponse({
                         'success': True,
                         'width': width,
                         'height': height,
                         'tiles': tile_data,
-                        'seed': seed
+                        'seed': seed,
+                        'regions': regions,
                     })
                 except Exception as e:
                     logger.error(f"Error generating preview for user {request.user.username}: {str(e)}", exc_info=True)
@@ -361,20 +355,17 @@ def map_generate(request):
                         height=preview_data['height'],
                         map_type=preview_data['map_type'],
                         is_generated=True,
-                        generation_seed=preview_data['seed']
+                        generation_seed=preview_data['seed'],
+                        generation_algorithm=preview_data['algorithm'],
+                        generation_params=preview_data['params']
                     )
 
-                    # Create tiles from preview data
-                    for tile_info in preview_data['tile_data']:
-                        models.MapTile.objects.create(
-                            map=map_obj,
-                            x=tile_info['x'],
-                            y=tile_info['y'],
-                            terrain_type=tile_info['terrain_type'],
-                            is_walkable=tile_info['is_walkable'],
-                            is_transparent=tile_info['is_transparent'],
-                            color=tile_info['color']
-                        )
+                    # Write the previewed grid (a generation cache hit unless it was evicted)
+                    grid = cached_generation(
+                        map_obj.width, map_obj.height, map_obj.map_type,
+                        preview_data['seed'], preview_data['algorithm'], preview_data['params']
+                    )
+                    write_terrain_grid(map_obj, grid, terrain_lookup_table(get_terrain_config(map_obj.map_type)))
 
                     # Clear preview data from session
                     del request.session['preview_data']
@@ -393,7 +384,14 @@ def map_generate(request):
             form = MapGenerationForm(request.user, request.POST)
             if form.is_valid():
                 try:
+                    # Get algorithm from form
+                    algorithm = form.cleaned_data.get('algorithm', 'random')
+
+                    # Collect algorithm-specific parameters
+                    params = collect_algorithm_params(algorithm, form.cleaned_data)
+
                     # Create the map
+                    large_map = form.cleaned_data.get('large_map')
                     map_obj = models.Map.objects.create(
                         name=form.cleaned_data['name'],
                         owner=request.user,
@@ -401,34 +399,17 @@ def map_generate(request):
                         height=form.cleaned_data['height'],
                         map_type=form.cleaned_data['map_type'],
                         is_generated=True,
-                        generation_seed=form.cleaned_data.get('seed') or str(random.randint(1000, 9999))
+                        generation_seed=form.cleaned_data.get('seed') or str(random.randint(1000, 9999)),
+                        generation_algorithm=algorithm,
+                        generation_params=params,
+                        tile_storage=models.Map.TILE_STORAGE_SECTORED if large_map else models.Map.TILE_STORAGE_PACKED
                     )
 
-                    # Get algorithm from form
-                    algorithm = form.cleaned_data.get('algorithm', 'random')
-
-                    # Collect algorithm-specific parameters
-                    params = {}
-                    if algorithm == 'bsp':
-                        if form.cleaned_data.get('min_room_size') is not None:
-                            params['min_room_size'] = form.cleaned_data['min_room_size']
-                        if form.cleaned_data.get('max_room_size') is not None:
-                            params['max_room_size'] = form.cleaned_data['max_room_size']
-                        if form.cleaned_data.get('corridor_width') is not None:
-                            params['corridor_width'] = form.cleaned_data['corridor_width']
-                    elif algorithm == 'cellular_automata':
-                        if form.cleaned_data.get('iterations') is not None:
-                            params['iterations'] = form.cleaned_data['iterations']
-                        if form.cleaned_data.get('wall_probability') is not None:
-                            params['wall_probability'] = form.cleaned_data['wall_probability']
-                    elif algorithm == 'random_walk':
-                        if form.cleaned_data.get('steps') is not None:
-                            params['steps'] = form.cleaned_data['steps']
-                        if form.cleaned_data.get('tunnel_width_probability') is not None:
-                            params['tunnel_width_probability'] = form.cleaned_data['tunnel_width_probability']
-                    elif algorithm == 'maze':
-                        if form.cleaned_data.get('path_width') is not None:
-                            params['path_width'] = form.cleaned_data['path_width']
+                    if large_map:
+                        # Sectors are generated from the seed when first viewed
+                        logger.info(f"User {request.user.username} created sectored map '{map_obj.name}' (ID: {map_obj.pk}) with {algorithm}")
+                        messages.success(request, f'Map "{map_obj.name}" created successfully!')
+                        return redirect('maps:detail', pk=map_obj.pk)
 
                     # Generate tiles based on algorithm
                     floor_tiles = generate_map_tiles(map_obj, algorithm=algorithm, params=params)
@@ -441,7 +422,8 @@ def map_generate(request):
                             width=map_obj.width,
                             height=map_obj.height,
                             density=cover_density,
-                            map_type=map_obj.map_type
+                            map_type=map_obj.map_type,
+                            rng=seeded_random(map_obj.generation_seed, 'cover')
                         )
 
                         # Create cover objects in database
@@ -481,6 +463,78 @@ def map_generate(request):
         return redirect('maps:list')
 
 
+@login_required
+def generation_job_create(request):
+    """Queue a background generation job (AJAX endpoint)"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=400)
+
+    form = MapGenerationForm(request.user, request.POST)
+    if not form.is_valid():
+        logger.warning(f"Invalid form data in generation_job_create for user {request.user.username}: {form.errors}")
+        return JsonResponse({'success': False, 'errors': form.errors}, status=400)
+
+    if form.cleaned_data.get('large_map'):
+        return JsonResponse({
+            'success': False,
+            'error': 'Large sectored maps are generated as they are viewed and do not need a job'
+        }, status=400)
+
+    try:
+        algorithm = form.cleaned_data.get('algorithm', 'random')
+        job = models.MapGenerationJob.objects.create(
+            owner=request.user,
+            name=form.cleaned_data['name'],
+            width=form.cleaned_data['width'],
+            height=form.cleaned_data['height'],
+            map_type=form.cleaned_data['map_type'],
+            algorithm=algorithm,
+            seed=form.cleaned_data.get('seed') or str(random.randint(1000, 9999)),
+            params=collect_algorithm_params(algorithm, form.cleaned_data),
+            cover_density=form.cleaned_data.get('cover_density') or 0.0,
+        )
+        job_runner.submit(job)
+
+        logger.info(f"User {request.user.username} queued generation job {job.pk}: {algorithm} {job.width}x{job.height}")
+        return JsonResponse({
+            'success': True,
+            'job': job_payload(job),
+            'progress_socket': f'/ws/maps/jobs/{job.pk}/',
+        }, status=202)
+    except Exception as e:
+        logger.error(f"Error queuing generation job for user {request.user.username}: {str(e)}", exc_info=True)
+        return JsonResponse({'success': False, 'error': 'Failed to queue map generation'}, status=500)
+
+
+@login_required
+def generation_job_status(request, pk):
+    """Current state of a generation job (AJAX endpoint)"""
+    job = get_object_or_404(models.MapGenerationJob, pk=pk, owner=request.user)
+    return JsonResponse({'success': True, 'job': job_payload(job)})
+
+
+# Form fields holding the parameters of each generation algorithm
+ALGORITHM_PARAM_FIELDS = {
+    'bsp': ['min_room_size', 'max_room_size', 'corridor_width'],
+    'cellular_automata': ['iterations', 'wall_probability'],
+    'random_walk': ['steps', 'tunnel_width_probability'],
+    'maze': ['path_width'],
+}
+
+
+def collect_algorithm_params(algorithm, cleaned_data):
+    """Pick the parameters for an algorithm out of MapGenerationForm data"""
+    params = {
+        field: cleaned_data[field]
+        for field in ALGORITHM_PARAM_FIELDS.get(algorithm, [])
+        if cleaned_data.get(field) is not None
+    }
+    # Applies to every algorithm; left out when off so cache keys stay unchanged
+    if cleaned_data.get('connect_regions'):
+        params['connect_regions'] = True
+    return params
+
+
 def generate_preview_tiles(width, height, map_type, seed, algorithm='random', params=None):
     """
     Generate tile data for preview without saving to database.
@@ -496,74 +550,33 @@ def generate_preview_tiles(width, height, map_type, seed, algorithm='random', pa
     Returns:
         List of tile dictionaries with x, y, terrain_type, is_walkable, is_transparent, color
     """
-    if params is None:
-        params = {}
-
-    # Define terrain settings based on map type
-    terrain_config = {
-        'urban': {
-            'floor': {'type': 'street', 'color': '#555555', 'walkable': True, 'transparent': True},
-            'wall': {'type': 'building', 'color': '#8B4513', 'walkable': False, 'transparent': False},
-            'door': {'type': 'door', 'color': '#CD853F', 'walkable': True, 'transparent': False},
-            'secondary': {'type': 'sidewalk', 'color': '#AAAAAA', 'walkable': True, 'transparent': True},
-        },
-        'wilderness': {
-            'floor': {'type': 'grass', 'color': '#7CFC00', 'walkable': True, 'transparent': True},
-            'wall': {'type': 'water', 'color': '#4169E1', 'walkable': False, 'transparent': True},
-            'cave': {'type': 'forest', 'color': '#228B22', 'walkable': True, 'transparent': False},
-            'secondary': {'type': 'mountain', 'color': '#8B7355', 'walkable': False, 'transparent': True},
-        },
-        'corporate': {
-            'floor': {'type': 'floor', 'color': '#E8E8E8', 'walkable': True, 'transparent': True},
-            'wall': {'type': 'wall', 'color': '#696969', 'walkable': False, 'transparent': False},
-            'door': {'type': 'door', 'color': '#8B4513', 'walkable': True, 'transparent': False},
-            'tunnel': {'type': 'stairs', 'color': '#A9A9A9', 'walkable': True, 'transparent': True},
-        },
-        'underground': {
-            'floor': {'type': 'tunnel', 'color': '#8B7355', 'walkable': True, 'transparent': True},
-            'wall': {'type': 'wall', 'color': '#2F4F4F', 'walkable': False, 'transparent': False},
-            'cave': {'type': 'cave', 'color': '#654321', 'walkable': True, 'transparent': True},
-            'tunnel': {'type': 'sewer', 'color': '#556B2F', 'walkable': True, 'transparent': True},
-        },
-        'mixed': {
-            'floor': {'type': 'floor', 'color': '#E8E8E8', 'walkable': True, 'transparent': True},
-            'wall': {'type': 'wall', 'color': '#696969', 'walkable': False, 'transparent': False},
-            'door': {'type': 'door', 'color': '#8B4513', 'walkable': True, 'transparent': False},
-            'cave': {'type': 'grass', 'color': '#7CFC00', 'walkable': True, 'transparent': True},
-        }
-    }
+    grid = cached_generation(width, height, map_type, seed, algorithm, params)
+    return grid_to_tile_data(grid, get_terrain_config(map_type))
 
-    config = terrain_config.get(map_type, terrain_config['corporate'])
-
-    # Generate tile data using selected algorithm
-    if algorithm == 'bsp':
-        raw_tile_data = generate_bsp_map(width, height, seed, params)
-    elif algorithm == 'cellular_automata':
-        raw_tile_data = generate_cellular_automata_map(width, height, seed, params)
-    elif algorithm == 'random_walk':
-        raw_tile_data = generate_random_walk_map(width, height, seed, params)
-    elif algorithm == 'maze':
-        raw_tile_data = generate_maze_map(width, height, seed, params)
-    else:
-        # Random/default algorithm
-        raw_tile_data = generate_random_tiles(width, height, seed, config)
-
-    # Convert to tile dictionaries
-    tiles = []
-    for x, y, base_terrain in raw_tile_data:
-        # Map algorithm terrain types to map-type specific terrain
-        terrain_info = config.get(base_terrain, config['floor'])
-
-        tiles.append({
-            'x': x,
-            'y': y,
-            'terrain_type': terrain_info['type'],
-            'is_walkable': terrain_info['walkable'],
-            'is_transparent': terrain_info['transparent'],
-            'color': terrain_info['color']
-        })
 
-    return tiles
+def grid_to_tile_data(grid, config):
+    """Convert a TerrainGrid into the tile dictionaries used by previews"""
+    return list(iter_tile_data(grid, config))
+
+
+def iter_tile_data(grid, config):
+    """Yield tile dictionaries for every cell of a TerrainGrid in row-major order"""
+    # Map algorithm terrain codes to map-type specific terrain once per code
+    table = [
+        {
+            'terrain_type': info['type'],
+            'is_walkable': info['walkable'],
+            'is_transparent': info['transparent'],
+            'color': info['color'],
+        }
+        for info in terrain_lookup_table(config)
+    ]
+
+    for y, row in enumerate(grid.rows()):
+        for x, code in enumerate(row):
+            tile = {'x': x, 'y': y}
+            tile.update(table[code])
+            yield tile
 
 
 def generate_map_tiles(map_obj, algorithm='random', params=None):
@@ -575,105 +588,32 @@ def generate_map_tiles(map_obj, algorithm='random', params=None):
         algorithm: Generation algorithm ('random', 'bsp', 'cellular_automata', 'random_walk', 'maze')
         params: Dictionary of algorithm-specific parameters
     """
-    seed = map_obj.generation_seed
-    if params is None:
-        params = {}
-
-    # Define terrain settings based on map type
-    terrain_config = {
-        'urban': {
-            'floor': {'type': 'street', 'color': '#555555', 'walkable': True, 'transparent': True},
-            'wall': {'type': 'building', 'color': '#8B4513', 'walkable': False, 'transparent': False},
-            'door': {'type': 'door', 'color': '#CD853F', 'walkable': True, 'transparent': False},
-            'secondary': {'type': 'sidewalk', 'color': '#AAAAAA', 'walkable': True, 'transparent': True},
-        },
-        'wilderness': {
-            'floor': {'type': 'grass', 'color': '#7CFC00', 'walkable': True, 'transparent': True},
-            'wall': {'type': 'water', 'color': '#4169E1', 'walkable': False, 'transparent': True},
-            'cave': {'type': 'forest', 'color': '#228B22', 'walkable': True, 'transparent': False},
-            'secondary': {'type': 'mountain', 'color': '#8B7355', 'walkable': False, 'transparent': True},
-        },
-        'corporate': {
-            'floor': {'type': 'floor', 'color': '#E8E8E8', 'walkable': True, 'transparent': True},
-            'wall': {'type': 'wall', 'color': '#696969', 'walkable': False, 'transparent': False},
-            'door': {'type': 'door', 'color': '#8B4513', 'walkable': True, 'transparent': False},
-            'tunnel': {'type': 'stairs', 'color': '#A9A9A9', 'walkable': True, 'transparent': True},
-        },
-        'underground': {
-            'floor': {'type': 'tunnel', 'color': '#8B7355', 'walkable': True, 'transparent': True},
-            'wall': {'type': 'wall', 'color': '#2F4F4F', 'walkable': False, 'transparent': False},
-            'cave': {'type': 'cave', 'color': '#654321', 'walkable': True, 'transparent': True},
-            'tunnel': {'type': 'sewer', 'color': '#556B2F', 'walkable': True, 'transparent': True},
-        },
-        'mixed': {
-            'floor': {'type': 'floor', 'color': '#E8E8E8', 'walkable': True, 'transparent': True},
-            'wall': {'type': 'wall', 'color': '#696969', 'walkable': False, 'transparent': False},
-            'door': {'type': 'door', 'color': '#8B4513', 'walkable': True, 'transparent': False},
-            'cave': {'type': 'grass', 'color': '#7CFC00', 'walkable': True, 'transparent': True},
-        }
-    }
-
-    config = terrain_config.get(map_obj.map_type, terrain_config['corporate'])
-
-    # Generate tile data using selected algorithm
-    if algorithm == 'bsp':
-        tile_data = generate_bsp_map(map_obj.width, map_obj.height, seed, params)
-    elif algorithm == 'cellular_automata':
-        tile_data = generate_cellular_automata_map(map_obj.width, map_obj.height, seed, params)
-    elif algorithm == 'random_walk':
-        tile_data = generate_random_walk_map(map_obj.width, map_obj.height, seed, params)
-    elif algorithm == 'maze':
-        tile_data = generate_maze_map(map_obj.width, map_obj.height, seed, params)
-    else:
-        # Random/default algorithm
-        tile_data = generate_random_tiles(map_obj.width, map_obj.height, seed, config)
-
-    # Create tiles in database and collect floor tiles for cover placement
-    floor_tiles = []
-    for x, y, base_terrain in tile_data:
-        # Map algorithm terrain types to map-type specific terrain
-        terrain_info = config.get(base_terrain, config['floor'])
-
-        models.MapTile.objects.create(
-            map=map_obj,
-            x=x,
-            y=y,
-            terrain_type=terrain_info['type'],
-            is_walkable=terrain_info['walkable'],
-            is_transparent=terrain_info['transparent'],
-            color=terrain_info['color']
-        )
-
-        # Collect walkable floor tiles for cover placement
-        if terrain_info['walkable'] and base_terrain in ['floor', 'cave', 'tunnel']:
-            floor_tiles.append((x, y, base_terrain))
-
-    return floor_tiles
-
+    config = get_terrain_config(map_obj.map_type)
+    grid = cached_generation(
+        map_obj.width, map_obj.height, map_obj.map_type,
+        map_obj.generation_seed, algorithm, params
+    )
 
-def generate_random_tiles(width, height, seed, config):
-    """Generate random tiles (original algorithm)"""
-    if seed:
-        random.seed(hash(seed))
+    # Write tiles, replacing any existing tiles when regenerating
+    write_terrain_grid(map_obj, grid, terrain_lookup_table(config))
 
-    tiles = []
-    for y in range(height):
-        for x in range(width):
-            rand_val = random.random()
+    return cover_candidate_tiles(grid, config)
 
-            if rand_val < 0.15:  # 15% obstacles
-                terrain = 'wall'
-            elif rand_val < 0.35:  # 20% secondary terrain
-                terrain = 'secondary' if 'secondary' in config else 'floor'
-            else:  # 65% primary terrain
-                terrain = 'floor'
 
-            tiles.append((x, y, terrain))
+# Fog of War Views
 
-    return tiles
+def fog_edit_response(request, map_obj, edit):
+    """Apply a fog edit, broadcast its delta and describe it in the response"""
+    delta = change_fog(map_obj, edit)
+    if delta is not None:
+        publish_fog_delta(map_obj.pk, delta, request.user.id)
 
+    return JsonResponse({
+        'success': True,
+        'revealed_count': delta['revealed_count'] if delta else load_fog(map_obj).count,
+        'fog': delta
+    })
 
-# Fog of War Views
 
 @login_required
 def toggle_fog_of_war(request, pk):
@@ -687,12 +627,13 @@ def toggle_fog_of_war(request, pk):
     if map_obj.owner != request.user:
         return JsonResponse({'success': False, 'error': 'Only the map owner can toggle fog of war'})
 
-    map_obj.fog_of_war_enabled = not map_obj.fog_of_war_enabled
-    map_obj.save()
+    delta = change_fog(map_obj, toggle=True)
+    publish_fog_delta(map_obj.pk, delta, request.user.id)
 
     return JsonResponse({
         'success': True,
-        'fog_of_war_enabled': map_obj.fog_of_war_enabled
+        'fog_of_war_enabled': map_obj.fog_of_war_enabled,
+        'fog': delta
     })
 
 
@@ -713,27 +654,8 @@ def reveal_tile(request, pk):
         y = int(request.POST.get('y'))
         radius = int(request.POST.get('radius', 1))  # Reveal radius
 
-        revealed_tiles = map_obj.revealed_tiles if isinstance(map_obj.revealed_tiles, list) else []
-
         # Reveal tiles in radius
-        for dy in range(-radius, radius + 1):
-            for dx in range(-radius, radius + 1):
-                tile_x = x + dx
-                tile_y = y + dy
-
-                # Check if within map bounds
-                if 0 <= tile_x < map_obj.width and 0 <= tile_y < map_obj.height:
-                    tile_coords = [tile_x, tile_y]
-                    if tile_coords not in revealed_tiles:
-                        revealed_tiles.append(tile_coords)
-
-        map_obj.revealed_tiles = revealed_tiles
-        map_obj.save()
-
-        return JsonResponse({
-            'success': True,
-            'revealed_count': len(revealed_tiles)
-        })
+        return fog_edit_response(request, map_obj, lambda fog: fog.set_area(x, y, radius, True))
 
     except (ValueError, TypeError) as e:
         return JsonResponse({
@@ -759,25 +681,8 @@ def hide_tile(request, pk):
         y = int(request.POST.get('y'))
         radius = int(request.POST.get('radius', 1))  # Hide radius
 
-        revealed_tiles = map_obj.revealed_tiles if isinstance(map_obj.revealed_tiles, list) else []
-
         # Hide tiles in radius
-        for dy in range(-radius, radius + 1):
-            for dx in range(-radius, radius + 1):
-                tile_x = x + dx
-                tile_y = y + dy
-                tile_coords = [tile_x, tile_y]
-
-                if tile_coords in revealed_tiles:
-                    revealed_tiles.remove(tile_coords)
-
-        map_obj.revealed_tiles = revealed_tiles
-        map_obj.save()
-
-        return JsonResponse({
-            'success': True,
-            'revealed_count': len(revealed_tiles)
-        })
+        return fog_edit_response(request, map_obj, lambda fog: fog.set_area(x, y, radius, False))
 
     except (ValueError, TypeError) as e:
         return JsonResponse({
@@ -798,12 +703,41 @@ def reset_fog_of_war(request, pk):
     if map_obj.owner != request.user:
         return JsonResponse({'success': False, 'error': 'Only the map owner can reset fog of war'})
 
-    map_obj.revealed_tiles = []
-    map_obj.save()
+    return fog_edit_response(request, map_obj, FogMask.clear)
+
+
+@login_required
+def reveal_party_vision(request, pk):
+    """
+    Reveal what the map's tokens can see (AJAX).
+
+    Field of view is computed for every player-visible viewer object and
+    placed player/ally participant (see maps.visibility); tiles in sight
+    are revealed and the fog delta broadcast like a manual reveal.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+    map_obj = get_object_or_404(models.Map.objects.defer('grid_data'), pk=pk)
+
+    if not (map_obj.owner == request.user or request.user in map_obj.shared_with.all()):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    try:
+        vision = reveal_vision(map_obj)
+    except GridTooLargeError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    if vision['fog'] is not None:
+        publish_fog_delta(map_obj.pk, vision['fog'], request.user.id)
+
+    logger.info(f"Party vision on map {pk}: {vision['recomputed']} field(s) recomputed")
 
     return JsonResponse({
         'success': True,
-        'revealed_count': 0
+        'recomputed': vision['recomputed'],
+        **visible_payload(vision['visible']),
+        'revealed_count': vision['fog']['revealed_count'] if vision['fog'] else load_fog(map_obj).count,
+        'fog': vision['fog']
     })
 
 
@@ -916,11 +850,22 @@ def preset_delete(request, pk):
 
 @login_required
 def map_pathfind(request, pk):
-    """AJAX endpoint: A* pathfinding with terrain cost between two tiles"""
+    """
+    AJAX endpoint: cheapest path with terrain cost between two tiles.
+
+    Uniform-cost maps are searched with Jump Point Search, others with A*;
+    both return the same total cost. With `preview` set (drag-to-move
+    previews), paths on sectored maps too long to search exactly come from
+    the sector hierarchy instead, and may cost slightly more than the best
+    path.
+    `diagonal` set to 0 or false restricts moves to the four directions.
+    Repeated queries on an unchanged map are answered from the path cache.
+    """
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=400)
 
-    map_obj = get_object_or_404(models.Map, pk=pk)
+    # Tiles come from the navigation cache, so skip loading the packed grid
+    map_obj = get_object_or_404(models.Map.objects.defer('grid_data'), pk=pk)
 
     if not (map_obj.owner == request.user or
             request.user in map_obj.shared_with.all() or
@@ -939,26 +884,22 @@ def map_pathfind(request, pk):
             0 <= end_x < map_obj.width and 0 <= end_y < map_obj.height):
         return JsonResponse({'success': False, 'error': 'Coordinates out of bounds'}, status=400)
 
-    tiles_dict = {
-        (t.x, t.y): {
-            'is_walkable': t.is_walkable,
-            'terrain_type': t.terrain_type,
-            'movement_cost': t.movement_cost,
-        }
-        for t in map_obj.tiles.all()
-    }
-
-    result = astar(
-        tiles_dict,
-        (start_x, start_y),
-        (end_x, end_y),
-        map_obj.width,
-        map_obj.height,
-    )
+    search = {}
+    try:
+        result = cached_path(
+            map_obj,
+            (start_x, start_y),
+            (end_x, end_y),
+            allow_diagonal=request.POST.get('diagonal') not in ('0', 'false'),
+            preview=request.POST.get('preview') in ('1', 'true'),
+            stats=search,
+        )
+    except GridTooLargeError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
     logger.info(
-        f"Pathfind on map {pk} from ({start_x},{start_y}) to ({end_x},{end_y}): "
-        f"reachable={result['reachable']} cost={result['total_cost']}"
+        f"Pathfind on map {pk} from ({start_x},{start_y}) to ({end_x},{end_y}) with {search['algorithm']}: "
+        f"reachable={result['reachable']} cost={result['total_cost']} expanded={search['expanded']}"
     )
 
     return JsonResponse({
@@ -971,6 +912,240 @@ def map_pathfind(request, pk):
     })
 
 
+@login_required
+def pathfinding_stats(request):
+    """AJAX endpoint: hit/miss counters of the navigation grid, path result and sector hierarchy caches (staff only)."""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    return JsonResponse({
+        'success': True,
+        'navigation_cache': navigation_cache.stats(),
+        'path_cache': path_cache.stats(),
+        'sector_hierarchies': sector_hierarchies.stats(),
+    })
+
+
+def valid_budget(budget: float) -> bool:
+    """Is a movement budget within 0..MAX_MOVEMENT_BUDGET? (NaN is not)"""
+    return 0 <= budget <= MAX_MOVEMENT_BUDGET
+
+
+def invalid_budget_response():
+    """400 response for a budget that fails valid_budget"""
+    return JsonResponse({
+        'success': False,
+        'error': f'Movement budget must be between 0 and {MAX_MOVEMENT_BUDGET}'
+    }, status=400)
+
+
+@login_required
+def map_movement_range(request, pk):
+    """
+    AJAX endpoint: every tile reachable from an origin within a movement budget.
+
+    The budget is given in movement points (`budget`), or taken from one of
+    the user's characters (`character_id` with `rate` 'walk' or 'run').
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=400)
+
+    map_obj = get_object_or_404(models.Map.objects.defer('grid_data'), pk=pk)
+
+    if not (map_obj.owner == request.user or
+            request.user in map_obj.shared_with.all() or
+            map_obj.is_public):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    try:
+        x = int(request.POST.get('x'))
+        y = int(request.POST.get('y'))
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Invalid coordinates'}, status=400)
+
+    if not (0 <= x < map_obj.width and 0 <= y < map_obj.height):
+        return JsonResponse({'success': False, 'error': 'Coordinates out of bounds'}, status=400)
+
+    character_id = request.POST.get('character_id')
+    if character_id:
+        try:
+            character_id = int(character_id)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid character'}, status=400)
+        character = Character.objects.filter(pk=character_id, user=request.user).first()
+        if character is None:
+            return JsonResponse({'success': False, 'error': 'Character not found'}, status=404)
+        rate = request.POST.get('rate', 'walk')
+        budget = character.run_rate if rate == 'run' else character.walk_rate
+    else:
+        try:
+            budget = float(request.POST.get('budget'))
+        except (TypeError, ValueError):
+            return JsonResponse({'success': False, 'error': 'Invalid movement budget'}, status=400)
+
+    if not valid_budget(budget):
+        return invalid_budget_response()
+
+    try:
+        navigation = navigation_grid(map_obj)
+    except GridTooLargeError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    reached = movement_range(navigation, (x, y), budget)
+
+    logger.info(f"Movement range on map {pk} from ({x},{y}) with budget {budget}: {len(reached)} tiles")
+
+    return JsonResponse({
+        'success': True,
+        'origin': {'x': x, 'y': y},
+        'budget': budget,
+        **movement_range_payload(navigation, reached),
+    })
+
+
+def parse_points(values) -> list:
+    """Parse [[x, y], ...] or [{'x': x, 'y': y}, ...] into (x, y) tuples"""
+    points = []
+    for value in values or []:
+        if isinstance(value, dict):
+            points.append((int(value['x']), int(value['y'])))
+        else:
+            x, y = value
+            points.append((int(x), int(y)))
+    return points
+
+
+@login_required
+def map_flow_paths(request, pk):
+    """
+    AJAX endpoint: paths for many movers to the nearest of one or more goals.
+
+    JSON body:
+        goals: [[x, y], ...] and/or goal_team (participants of that team)
+        starts: [[x, y], ...] and/or start_team (participants of that team)
+        encounter_id: Combat encounter on this map whose participants'
+            map_x/map_y are used for goal_team / start_team (GM only)
+        budget: Optional movement points; each path reports where a mover
+            with that budget stops
+
+    One reverse Dijkstra pass from the goals serves every start.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=400)
+
+    map_obj = get_object_or_404(models.Map.objects.defer('grid_data'), pk=pk)
+
+    if not (map_obj.owner == request.user or
+            request.user in map_obj.shared_with.all() or
+            map_obj.is_public):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    try:
+        data = json.loads(request.body or '{}')
+        if not isinstance(data, dict):
+            raise TypeError('Request body must be a JSON object')
+        goals = parse_points(data.get('goals'))
+        starts = [{'start': point} for point in parse_points(data.get('starts'))]
+        budget = float(data['budget']) if data.get('budget') is not None else None
+        encounter_id = int(data['encounter_id']) if data.get('encounter_id') is not None else None
+        goal_team, start_team = data.get('goal_team'), data.get('start_team')
+        if not all(team is None or isinstance(team, str) for team in (goal_team, start_team)):
+            raise TypeError('Teams must be strings')
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'success': False, 'error': 'Invalid request data'}, status=400)
+
+    if budget is not None and not valid_budget(budget):
+        return invalid_budget_response()
+
+    if encounter_id is not None and (goal_team or start_team):
+        encounter = CombatEncounter.objects.select_related('session__campaign').filter(
+            pk=encounter_id, session__maps_used=map_obj
+        ).first()
+        if encounter is None:
+            return JsonResponse({'success': False, 'error': 'Encounter not found'}, status=404)
+        if encounter.session.campaign.game_master != request.user:
+            return JsonResponse({'success': False, 'error': 'Only the GM can move participants'}, status=403)
+
+        placed = encounter.participants.filter(is_active=True, map_x__isnull=False, map_y__isnull=False)
+        if goal_team:
+            goals += [(p.map_x, p.map_y) for p in placed.filter(team=goal_team)]
+        if start_team:
+            starts += [
+                {'start': (p.map_x, p.map_y), 'participant_id': p.pk, 'name': p.name}
+                for p in placed.filter(team=start_team)
+            ]
+
+    if not goals or not starts:
+        return JsonResponse({'success': False, 'error': 'At least one goal and one start are required'}, status=400)
+    if len(goals) > MAX_FLOW_GOALS or len(starts) > MAX_FLOW_STARTS:
+        return JsonResponse({
+            'success': False,
+            'error': f'At most {MAX_FLOW_GOALS} goals and {MAX_FLOW_STARTS} starts are allowed'
+        }, status=400)
+
+    try:
+        field = distance_field(navigation_grid(map_obj), goals)
+    except GridTooLargeError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    paths = []
+    for mover in starts:
+        result = field.path_from(mover['start'])
+        entry = {
+            **{key: value for key, value in mover.items() if key != 'start'},
+            'start': {'x': mover['start'][0], 'y': mover['start'][1]},
+            'path': [{'x': p[0], 'y': p[1]} for p in result['path']],
+            'total_cost': result['total_cost'],
+            'reachable': result['reachable'],
+            'path_length': len(result['path']),
+            'terrain_breakdown': result['terrain_breakdown'],
+        }
+        if budget is not None and result['reachable']:
+            stop = budget_stop(field.grid, result['path'], budget)
+            entry['stop'] = {'x': stop[0], 'y': stop[1]}
+        paths.append(entry)
+
+    logger.info(f"Flow paths on map {pk}: {len(starts)} start(s) to {len(goals)} goal(s)")
+
+    return JsonResponse({
+        'success': True,
+        'goals': [{'x': x, 'y': y} for x, y in field.goals],
+        'paths': paths,
+    })
+
+
+@login_required
+def map_sectors(request, pk):
+    """AJAX endpoint: terrain of the sectors overlapping a viewport (in tiles)"""
+    map_obj = get_object_or_404(models.Map.objects.defer('grid_data'), pk=pk)
+
+    if not (map_obj.owner == request.user or
+            request.user in map_obj.shared_with.all() or
+            map_obj.is_public):
+        return JsonResponse({'success': False, 'error': 'Permission denied'}, status=403)
+
+    try:
+        x = int(request.GET.get('x', 0))
+        y = int(request.GET.get('y', 0))
+        width = int(request.GET.get('width', SECTOR_SIZE))
+        height = int(request.GET.get('height', SECTOR_SIZE))
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Invalid viewport'}, status=400)
+
+    if width <= 0 or height <= 0:
+        return JsonResponse({'success': False, 'error': 'Invalid viewport'}, status=400)
+
+    try:
+        if not map_obj.is_sectored:
+            # Whole-grid maps need their packed data after all
+            map_obj.refresh_from_db(fields=['grid_data'])
+        payload = viewport_payload(map_obj, x, y, width, height)
+    except Exception as e:
+        logger.error(f"Error loading sectors of map {pk} for user {request.user.username}: {str(e)}", exc_info=True)
+        return JsonResponse({'success': False, 'error': 'Failed to load map sectors'}, status=500)
+
+    return JsonResponse({'success': True, **payload})
+
+
 @login_required
 def preset_load(request, pk):
     """Load a preset's parameters (AJAX endpoint)"""
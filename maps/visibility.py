@@ -0,0 +1,521 @@
+"""
+Field of view and automatic fog of war reveal.
+
+What a token can see is computed by recursive shadowcasting over an
+OpacityGrid: the tiles that are not transparent (MapTile.is_transparent,
+terrain rules in grid_storage) plus the tiles holding MapObjects that
+block vision. Each of the eight octants around the token is scanned row
+by row outwards; an opaque tile narrows the visible arc of the rows
+behind it, so every tile in sight is visited once and nothing hidden
+behind a wall is looked at. Opaque tiles themselves are visible (a wall
+is seen, not what is behind it).
+
+Opacity grids are kept in process memory per map like the navigation
+grids: valid for one Map.revision and one set of vision-blocking objects,
+patched in place by tile paints in this process (grid_storage.update_tiles),
+and rebuilt from the cached tile layer alone when only objects change.
+
+Tokens are the player side's eyes: player-visible MapObjects that are
+NPCs or vehicles or carry a 'vision_radius' stat, and the placed player
+and ally CombatParticipants of the map's active encounters. Each has its
+own vision radius ('vision_radius' in MapObject.stats, MAP_VISION_RADIUS
+otherwise).
+
+A PartyVision keeps every token's field and how many tokens see each
+tile, so moving one token recomputes one field, and a terrain or object
+change recomputes only the tokens within range of a changed tile.
+reveal_vision brings a map's PartyVision up to date and reveals what the
+party sees through change_fog, so clients get a small fog delta.
+"""
+import base64
+import threading
+from math import isqrt
+from collections import OrderedDict, namedtuple
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from campaigns.models import CombatParticipant
+from .fog import FogMask, change_fog
+from .grid_storage import load_grid
+from .models import Map, MapObject
+
+# Default vision radius of a token, in tiles
+DEFAULT_VISION_RADIUS = 12
+
+# Default number of maps whose opacity grids and party vision are kept
+DEFAULT_MAX_MAPS = 64
+
+# MapObject types that see for the players without a 'vision_radius' stat
+VIEWER_OBJECT_TYPES = {'npc', 'vehicle'}
+
+# CombatParticipant teams whose sight reveals fog
+VIEWER_TEAMS = ('player', 'ally')
+
+# Octant transforms (xx, xy, yx, yy) from scan coordinates to map offsets
+OCTANTS = (
+    (1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+    (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1),
+)
+
+# A vision source: key identifies it across updates ('object:12', 'participant:3')
+Token = namedtuple('Token', ['key', 'x', 'y', 'radius'])
+
+
+class OpacityGrid:
+    """
+    Which tiles of a map block sight.
+
+    Attributes:
+        tiles: (height, width) boolean array, True where the terrain is opaque
+        blockers: (x, y) of every vision-blocking object
+        opaque: Row-major bytearray combining both, 1 where sight is blocked
+    """
+
+    def __init__(self, width: int, height: int, tiles: np.ndarray, blockers: FrozenSet[Tuple[int, int]]):
+        self.width = width
+        self.height = height
+        self.tiles = tiles
+        self.blockers = blockers
+        combined = tiles.copy()
+        for x, y in blockers:
+            if 0 <= x < width and 0 <= y < height:
+                combined[y, x] = True
+        self.opaque = bytearray(combined.astype(np.uint8).tobytes())
+
+    def mask(self) -> np.ndarray:
+        """opaque as a flat boolean array (a view, not a copy)"""
+        return np.frombuffer(self.opaque, dtype=bool)
+
+    def with_blockers(self, blockers: FrozenSet[Tuple[int, int]]) -> 'OpacityGrid':
+        """Same terrain, different vision-blocking objects"""
+        return OpacityGrid(self.width, self.height, self.tiles, blockers)
+
+    def patched(self, tiles: Iterable[Dict]) -> 'OpacityGrid':
+        """Copy with painted tiles (grid_storage.update_tiles dicts) applied"""
+        opaque = self.tiles.copy()
+        for tile in tiles:
+            opaque[tile['y'], tile['x']] = not tile['is_transparent']
+        return OpacityGrid(self.width, self.height, opaque, self.blockers)
+
+    def field_of_view(self, x: int, y: int, radius: Optional[int] = None) -> np.ndarray:
+        """
+        Tiles visible from (x, y) within `radius` tiles (unlimited if None).
+
+        Distance is Euclidean, rounded to the nearest tile.
+
+        Returns:
+            Flat boolean array, True for every visible tile
+        """
+        width, height = self.width, self.height
+        lit = bytearray(width * height)
+        if not (0 <= x < width and 0 <= y < height):
+            return np.frombuffer(lit, dtype=bool)
+        lit[y * width + x] = 1
+        if radius is None:
+            radius = width + height
+        if radius > 0:
+            reach = radius * (radius + 1)
+            for octant in OCTANTS:
+                self._cast(lit, x, y, 1, 1.0, 0.0, radius, reach, octant)
+        return np.frombuffer(lit, dtype=bool)
+
+    def _cast(self, lit: bytearray, cx: int, cy: int, row: int, start: float, end: float,
+              radius: int, reach: int, octant: Tuple[int, int, int, int]) -> None:
+        """Scan one octant from `row` outwards between slopes `start` and `end`"""
+        if start < end:
+            return
+        xx, xy, yx, yy = octant
+        width, height, opaque = self.width, self.height, self.opaque
+        # Rows run outwards along the octant's main axis and across it towards
+        # the diagonal; the map edge ends the scan in both directions (tiles
+        # beyond it neither show nor cast shadows)
+        if xy:
+            rows_left = cx if xy > 0 else width - 1 - cx
+            across_left = cy if yx > 0 else height - 1 - cy
+        else:
+            rows_left = cy if yy > 0 else height - 1 - cy
+            across_left = cx if xx > 0 else width - 1 - cx
+        center = cy * width + cx
+        row_step = yy * width + xy
+        across_step = yx * width + xx
+        step = abs(across_step)
+        new_start = start
+        for distance in range(row, min(radius, rows_left) + 1):
+            dy = -distance
+            row_cell = center + dy * row_step
+            low, high = self._row_span(dy, -min(distance, across_left), start, end)
+            if low > high:
+                continue
+            first, last = row_cell + low * across_step, row_cell + high * across_step
+            if first > last:
+                first, last = last, first
+            if 1 not in opaque[first:last + 1:step]:
+                # Nothing in the way on this row: light it in one go
+                nearest = max(low, -isqrt(reach - dy * dy))
+                if nearest <= high:
+                    first, last = row_cell + nearest * across_step, row_cell + high * across_step
+                    if first > last:
+                        first, last = last, first
+                    lit[first:last + 1:step] = b'\x01' * (high - nearest + 1)
+                continue
+
+            blocked = False
+            for dx in range(low, high + 1):
+                cell = row_cell + dx * across_step
+                if dx * dx + dy * dy <= reach:
+                    lit[cell] = 1
+                if blocked:
+                    if opaque[cell]:
+                        new_start = (dx + 0.5) / (dy - 0.5)
+                    else:
+                        blocked = False
+                        start = new_start
+                elif opaque[cell] and distance < radius:
+                    # Everything past this tile is in its shadow; scan around it
+                    blocked = True
+                    self._cast(lit, cx, cy, distance + 1, start, (dx - 0.5) / (dy + 0.5), radius, reach, octant)
+                    new_start = (dx + 0.5) / (dy - 0.5)
+            if blocked:
+                break
+
+    @staticmethod
+    def _row_span(dy: int, lowest: int, start: float, end: float) -> Tuple[int, int]:
+        """
+        Range of dx (lowest..0) on row dy whose tiles overlap the arc
+        between slopes `start` and `end`, i.e. right slope <= start and
+        left slope >= end.
+        """
+        low = max(lowest, int(start * (dy - 0.5) - 0.5) - 1)
+        while low <= 0 and (low + 0.5) / (dy - 0.5) > start:
+            low += 1
+        high = min(0, int(end * (dy + 0.5) + 0.5) + 1)
+        while high >= low and (high - 0.5) / (dy + 0.5) < end:
+            high -= 1
+        return low, high
+
+
+class OpacityCache:
+    """
+    Thread-safe LRU of OpacityGrids keyed by map id.
+
+    An entry is valid for one Map.revision; vision-blocking objects are
+    applied on top of the cached terrain when they differ.
+    """
+
+    def __init__(self, max_maps: int = DEFAULT_MAX_MAPS):
+        self.max_maps = max_maps
+        self._grids: 'OrderedDict[int, Tuple[int, OpacityGrid]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.patches = 0
+
+    def __len__(self) -> int:
+        return len(self._grids)
+
+    def get(self, map_id: int, revision: int, blockers: FrozenSet[Tuple[int, int]]) -> Optional[OpacityGrid]:
+        """Cached grid for this revision of a map, with these blockers applied"""
+        with self._lock:
+            entry = self._grids.get(map_id)
+            if entry is None or entry[0] != revision:
+                self.misses += 1
+                return None
+            self._grids.move_to_end(map_id)
+            self.hits += 1
+            grid = entry[1]
+            if grid.blockers != blockers:
+                grid = grid.with_blockers(blockers)
+                self._grids[map_id] = (revision, grid)
+            return grid
+
+    def put(self, map_id: int, revision: int, grid: OpacityGrid) -> OpacityGrid:
+        with self._lock:
+            current = self._grids.get(map_id)
+            # Never replace a newer revision with an older one
+            if current is None or current[0] <= revision:
+                self._grids[map_id] = (revision, grid)
+                self._grids.move_to_end(map_id)
+            while len(self._grids) > self.max_maps:
+                self._grids.popitem(last=False)
+        return grid
+
+    def patch(self, map_id: int, previous_revision: int, revision: int, tiles: List[Dict]) -> None:
+        """Bring a cached grid from `previous_revision` to `revision` (see NavigationCache.patch)"""
+        with self._lock:
+            entry = self._grids.get(map_id)
+            if entry is None:
+                return
+            if entry[0] != previous_revision:
+                del self._grids[map_id]
+                return
+
+        # Copying the grid is the slow part; keep other maps' lookups running
+        grid = entry[1].patched(tiles)
+
+        with self._lock:
+            current = self._grids.get(map_id)
+            if current is not None and current[0] == previous_revision:
+                self._grids[map_id] = (revision, grid)
+                self.patches += 1
+
+    def discard(self, map_id: int) -> None:
+        with self._lock:
+            self._grids.pop(map_id, None)
+
+    def clear(self) -> None:
+        """Drop every cached grid and reset the counters"""
+        with self._lock:
+            self._grids.clear()
+            self.hits = self.misses = self.patches = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'maps': len(self._grids),
+                'max_maps': self.max_maps,
+                'hits': self.hits,
+                'misses': self.misses,
+                'patches': self.patches,
+            }
+
+
+opacity_cache = OpacityCache(getattr(settings, 'MAP_VISIBILITY_CACHE_MAPS', DEFAULT_MAX_MAPS))
+
+
+def vision_blockers(map_obj: Map) -> FrozenSet[Tuple[int, int]]:
+    """Tiles holding a MapObject that blocks vision"""
+    return frozenset(MapObject.objects.filter(map=map_obj, blocks_vision=True).values_list('x', 'y'))
+
+
+def opacity_grid(map_obj: Map) -> OpacityGrid:
+    """
+    Opacity grid for the map's current revision and objects.
+
+    Only a cache miss reads the tiles; the map may be loaded with
+    grid_data deferred.
+    """
+    blockers = vision_blockers(map_obj)
+    grid = opacity_cache.get(map_obj.pk, map_obj.revision, blockers)
+    if grid is None:
+        grid = opacity_cache.put(map_obj.pk, map_obj.revision, OpacityGrid(
+            map_obj.width, map_obj.height, ~load_grid(map_obj).transparent, blockers
+        ))
+    return grid
+
+
+class PartyVision:
+    """
+    Fields of view of a set of tokens on one OpacityGrid.
+
+    Attributes:
+        fields: Token key -> (token, flat boolean field of view)
+        counts: Number of tokens that see each tile (row-major)
+        recomputed: Fields computed by the most recent update
+    """
+
+    def __init__(self, opacity: OpacityGrid):
+        self.opacity = opacity
+        self.fields: Dict[str, Tuple[Token, np.ndarray]] = {}
+        self.counts = np.zeros(opacity.width * opacity.height, dtype=np.uint16)
+        self.recomputed = 0
+
+    @property
+    def visible(self) -> np.ndarray:
+        """(height, width) boolean array of tiles any token sees"""
+        return (self.counts > 0).reshape(self.opacity.height, self.opacity.width)
+
+    def update(self, tokens: Iterable[Token], opacity: Optional[OpacityGrid] = None) -> int:
+        """
+        Bring the fields up to date with the tokens (and a new opacity grid).
+
+        Only tokens that are new, moved, changed radius or are within
+        reach of a tile whose opacity changed are recomputed; tokens not
+        listed are dropped.
+
+        Returns:
+            Number of fields recomputed
+        """
+        stale = set()
+        if opacity is not None and opacity is not self.opacity:
+            if (opacity.width, opacity.height) != (self.opacity.width, self.opacity.height):
+                self.fields.clear()
+                self.counts = np.zeros(opacity.width * opacity.height, dtype=np.uint16)
+            else:
+                stale = self._affected(np.flatnonzero(self.opacity.mask() != opacity.mask()))
+            self.opacity = opacity
+
+        tokens = {token.key: token for token in tokens}
+        for key in [key for key in self.fields if key not in tokens]:
+            self.counts -= self.fields.pop(key)[1]
+
+        recomputed = 0
+        for key, token in tokens.items():
+            current = self.fields.get(key)
+            if current is not None:
+                if current[0] == token and key not in stale:
+                    continue
+                self.counts -= current[1]
+            field = self.opacity.field_of_view(token.x, token.y, token.radius)
+            self.fields[key] = (token, field)
+            self.counts += field
+            recomputed += 1
+        self.recomputed = recomputed
+        return recomputed
+
+    def _affected(self, changed: np.ndarray) -> set:
+        """Keys of tokens within their vision radius of a changed tile"""
+        if not changed.size:
+            return set()
+        ys, xs = np.divmod(changed, self.opacity.width)
+        affected = set()
+        for key, (token, _) in self.fields.items():
+            if token.radius is None:
+                affected.add(key)
+                continue
+            near = (np.abs(xs - token.x) <= token.radius) & (np.abs(ys - token.y) <= token.radius)
+            if near.any():
+                affected.add(key)
+        return affected
+
+
+class VisionCache:
+    """
+    Thread-safe LRU of PartyVision keyed by map id.
+    """
+
+    def __init__(self, max_maps: int = DEFAULT_MAX_MAPS):
+        self.max_maps = max_maps
+        self._visions: 'OrderedDict[int, PartyVision]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.fields_computed = 0
+
+    def __len__(self) -> int:
+        return len(self._visions)
+
+    def update(self, map_id: int, opacity: OpacityGrid, tokens: Iterable[Token]) -> Tuple[np.ndarray, int]:
+        """
+        Bring a map's party vision up to date.
+
+        Returns:
+            (tiles the party sees as a (height, width) boolean array,
+            number of fields recomputed)
+        """
+        with self._lock:
+            vision = self._visions.get(map_id)
+            if vision is None:
+                vision = self._visions[map_id] = PartyVision(opacity)
+            self._visions.move_to_end(map_id)
+            while len(self._visions) > self.max_maps:
+                self._visions.popitem(last=False)
+            recomputed = vision.update(tokens, opacity)
+            self.updates += 1
+            self.fields_computed += recomputed
+            return vision.visible, recomputed
+
+    def discard(self, map_id: int) -> None:
+        with self._lock:
+            self._visions.pop(map_id, None)
+
+    def clear(self) -> None:
+        """Drop every party vision and reset the counters"""
+        with self._lock:
+            self._visions.clear()
+            self.updates = self.fields_computed = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'maps': len(self._visions),
+                'max_maps': self.max_maps,
+                'updates': self.updates,
+                'fields_computed': self.fields_computed,
+            }
+
+
+vision_cache = VisionCache(getattr(settings, 'MAP_VISIBILITY_CACHE_MAPS', DEFAULT_MAX_MAPS))
+
+
+def vision_radius(value, default: int) -> Optional[int]:
+    """A 'vision_radius' stat as a radius: default if unset, None (unlimited) if negative"""
+    if value is None:
+        return default
+    try:
+        radius = int(value)
+    except (TypeError, ValueError):
+        return default
+    return None if radius < 0 else radius
+
+
+def object_tokens(map_obj: Map, default_radius: Optional[int] = None) -> List[Token]:
+    """Player-visible MapObjects that see for the players"""
+    if default_radius is None:
+        default_radius = getattr(settings, 'MAP_VISION_RADIUS', DEFAULT_VISION_RADIUS)
+    tokens = []
+    objects = MapObject.objects.filter(map=map_obj, is_visible_to_players=True).values_list(
+        'pk', 'x', 'y', 'object_type', 'stats'
+    )
+    for pk, x, y, object_type, stats in objects:
+        stats = stats if isinstance(stats, dict) else {}
+        if object_type not in VIEWER_OBJECT_TYPES and 'vision_radius' not in stats:
+            continue
+        radius = vision_radius(stats.get('vision_radius'), default_radius)
+        if radius != 0:
+            tokens.append(Token(f'object:{pk}', x, y, radius))
+    return tokens
+
+
+def participant_tokens(map_obj: Map, default_radius: Optional[int] = None) -> List[Token]:
+    """Placed player and ally participants of active encounters in sessions that use the map"""
+    if default_radius is None:
+        default_radius = getattr(settings, 'MAP_VISION_RADIUS', DEFAULT_VISION_RADIUS)
+    participants = CombatParticipant.objects.filter(
+        encounter__status='active',
+        encounter__session__maps_used=map_obj,
+        team__in=VIEWER_TEAMS,
+        is_active=True,
+        is_defeated=False,
+        map_x__isnull=False,
+        map_y__isnull=False,
+    ).values_list('pk', 'map_x', 'map_y').distinct()
+    return [Token(f'participant:{pk}', x, y, default_radius) for pk, x, y in participants]
+
+
+def map_tokens(map_obj: Map) -> List[Token]:
+    """Every vision source on the map"""
+    return object_tokens(map_obj) + participant_tokens(map_obj)
+
+
+def reveal_vision(map_obj: Map, tokens: Optional[List[Token]] = None) -> Dict:
+    """
+    Update the map's party vision and reveal what it sees.
+
+    Tiles are only revealed while fog of war is enabled; revealed tiles
+    stay revealed after the party looks away.
+
+    Returns:
+        {'visible': (height, width) boolean array, 'recomputed': fields
+        recomputed, 'fog': the change_fog delta to broadcast, or None}
+    """
+    if tokens is None:
+        tokens = map_tokens(map_obj)
+    visible, recomputed = vision_cache.update(map_obj.pk, opacity_grid(map_obj), tokens)
+
+    delta = None
+    if map_obj.fog_of_war_enabled and visible.any():
+        delta = change_fog(map_obj, lambda fog: fog.reveal(visible))
+    return {'visible': visible, 'recomputed': recomputed, 'fog': delta}
+
+
+def visible_payload(visible: np.ndarray) -> Dict:
+    """Visible tiles for clients, in fog_payload's bit layout"""
+    height, width = visible.shape
+    mask = FogMask(width, height, visible)
+    return {
+        'width': width,
+        'height': height,
+        'visible_count': mask.count,
+        'visible': base64.b64encode(mask.packed()).decode('ascii'),
+    }
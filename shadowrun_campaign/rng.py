@@ -0,0 +1,34 @@
+"""
+Deterministic random number streams.
+
+Seeds are turned into generator state with a SHA-256 digest rather than
+hash(), which Python salts per process for strings, so a seed produces the
+same stream in every process and on every node. Each caller gets a private
+random.Random instead of reseeding the global `random` module, which is
+shared with unrelated code (e.g. dice rolls) running in the same process.
+"""
+import hashlib
+import random
+from typing import Any, Optional
+
+
+def seed_digest(seed: Any, *streams: Any) -> int:
+    """
+    Stable 256-bit integer for a seed.
+
+    Extra `streams` values derive independent sub-streams from one seed
+    (e.g. one per map sector).
+    """
+    material = ':'.join(str(part) for part in (seed, *streams))
+    return int.from_bytes(hashlib.sha256(material.encode('utf-8')).digest(), 'big')
+
+
+def seeded_random(seed: Optional[Any] = None, *streams: Any) -> random.Random:
+    """
+    Private random.Random for a seed.
+
+    An empty or missing seed gives an unseeded generator (OS entropy).
+    """
+    if seed is None or seed == '':
+        return random.Random()
+    return random.Random(seed_digest(seed, *streams))
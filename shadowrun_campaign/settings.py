@@ -121,6 +121,18 @@ else:
         },
     }
 
+# Worker processes for background map generation jobs (defaults to the CPU count)
+MAP_GENERATION_WORKERS = int(os.getenv('MAP_GENERATION_WORKERS', 0)) or None
+
+# Upper bound on generated terrain kept in the in-process generation cache (cells, one byte each)
+MAP_GENERATION_CACHE_CELLS = int(os.getenv('MAP_GENERATION_CACHE_CELLS', 16 * 1024 * 1024))
+
+# Maps whose pathfinding navigation grids are kept in memory per process
+MAP_NAVIGATION_CACHE_MAPS = int(os.getenv('MAP_NAVIGATION_CACHE_MAPS', 64))
+
+# Sectored maps whose HPA* sector hierarchies (long drag previews) are kept in memory per process
+MAP_SECTOR_HIERARCHY_MAPS = int(os.getenv('MAP_SECTOR_HIERARCHY_MAPS', 8))
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -17,6 +17,7 @@ class MapCollaborationClient {
         this.users = new Map();
         this.cursorThrottleMs = 50;
         this.lastCursorUpdate = 0;
+        this.lastPathQueryId = 0;
 
         // Callbacks
         this.onConnected = options.onConnected || (() => {});
@@ -24,10 +25,13 @@ class MapCollaborationClient {
         this.onTileUpdate = options.onTileUpdate || (() => {});
         this.onObjectUpdate = options.onObjectUpdate || (() => {});
         this.onFogUpdate = options.onFogUpdate || (() => {});
+        this.onFogSnapshot = options.onFogSnapshot || (() => {});
         this.onUserJoined = options.onUserJoined || (() => {});
         this.onUserLeft = options.onUserLeft || (() => {});
         this.onCursorMove = options.onCursorMove || (() => {});
         this.onPresenceUpdate = options.onPresenceUpdate || (() => {});
+        this.onPathPlan = options.onPathPlan || (() => {});
+        this.onPathResult = options.onPathResult || (() => {});
         this.onError = options.onError || (() => {});
 
         // User info (populated on connect)
@@ -133,14 +137,18 @@ class MapCollaborationClient {
 
     /**
      * Send a message to the server.
+     * @param {object} message - Message with type and data
+     * @param {boolean} queue - Queue the message until reconnection if offline
      */
-    send(message) {
+    send(message, queue = true) {
         if (this.connected && this.socket.readyState === WebSocket.OPEN) {
             this.socket.send(JSON.stringify(message));
             return true;
         } else {
             // Queue message for when connection is restored
-            this.pendingUpdates.push(message);
+            if (queue) {
+                this.pendingUpdates.push(message);
+            }
             return false;
         }
     }
@@ -192,6 +200,10 @@ class MapCollaborationClient {
                 this.onFogUpdate(data);
                 break;
 
+            case 'fog_snapshot':
+                this.onFogSnapshot(data);
+                break;
+
             case 'user_joined':
                 this.users.set(data.user_id, {
                     id: data.user_id,
@@ -226,6 +238,17 @@ class MapCollaborationClient {
                 this.onPresenceUpdate(Array.from(this.users.values()));
                 break;
 
+            case 'path_plan':
+                this.onPathPlan(data);
+                break;
+
+            case 'path_result':
+                // Answers to queries that were already superseded are dropped
+                if (data.id === this.lastPathQueryId) {
+                    this.onPathResult(data);
+                }
+                break;
+
             case 'error':
                 console.error('[Collab] Server error:', data);
                 this.onError(data);
@@ -304,6 +327,13 @@ class MapCollaborationClient {
         });
     }
 
+    /**
+     * Ask for the full fog of war state (after missing a fog version).
+     */
+    requestFogSnapshot() {
+        return this.send({ type: 'fog_snapshot', data: {} });
+    }
+
     /**
      * Send cursor position update (throttled).
      * @param {number} x - X coordinate
@@ -322,6 +352,60 @@ class MapCollaborationClient {
         });
     }
 
+    /**
+     * Ask for a path; only the answer to the latest query reaches onPathResult.
+     * Not queued while offline, since the answer would be stale by then.
+     * @param {object} start - {x, y} of the start tile
+     * @param {object} end - {x, y} of the end tile
+     * @param {object} options - diagonal (default true) and preview (default false)
+     * @returns {number|boolean} The query id, or false if offline
+     */
+    sendPathQuery(start, end, { diagonal = true, preview = false } = {}) {
+        const id = ++this.lastPathQueryId;
+        const sent = this.send({
+            type: 'path_query',
+            data: { id, start, end, diagonal, preview }
+        }, false);
+        return sent ? id : false;
+    }
+
+    /**
+     * Open a live path preview; the server answers with a path_plan carrying
+     * the session id and pushes a new path_plan whenever edits reroute it.
+     * Path session messages are not queued: sessions die with the connection.
+     * @param {object} start - {x, y} of the start tile
+     * @param {object} goal - {x, y} of the goal tile
+     */
+    openPathSession(start, goal) {
+        return this.send({
+            type: 'path_session',
+            data: { action: 'open', start, goal }
+        }, false);
+    }
+
+    /**
+     * Move a path session's start (e.g. while dragging the token).
+     * @param {number} sessionId - Session id from the opening path_plan
+     * @param {object} start - {x, y} of the new start tile
+     */
+    movePathSession(sessionId, start) {
+        return this.send({
+            type: 'path_session',
+            data: { action: 'move', session: sessionId, start }
+        }, false);
+    }
+
+    /**
+     * Close a path session.
+     * @param {number} sessionId - Session id from the opening path_plan
+     */
+    closePathSession(sessionId) {
+        return this.send({
+            type: 'path_session',
+            data: { action: 'close', session: sessionId }
+        }, false);
+    }
+
     /**
      * Get list of connected users.
      */
@@ -0,0 +1,221 @@
+/**
+ * Viewport renderer for large sectored maps.
+ * Fetches only the sectors under the visible area and draws each sector
+ * on its own canvas, dropping far-away sectors to keep memory bounded.
+ */
+
+class MapSectorViewer {
+    constructor(viewport, options = {}) {
+        this.viewport = viewport;
+        this.sectorsUrl = options.sectorsUrl;
+        this.tileSize = options.tileSize || 50;
+        this.mapWidth = options.mapWidth;
+        this.mapHeight = options.mapHeight;
+        this.maxCachedSectors = options.maxCachedSectors || 256;
+        this.loadDelayMs = options.loadDelayMs || 100;
+
+        // Callbacks
+        this.onTileClick = options.onTileClick || null;
+        this.onError = options.onError || ((error) => console.error('[Sectors]', error));
+
+        this.sectorSize = null;
+        this.sectors = new Map();  // "sx,sy" -> {sector, terrain, colors, canvas}
+        this.loadTimer = null;
+        this.loading = false;
+
+        // Full-size scroll surface; sector canvases are positioned inside it
+        this.surface = document.createElement('div');
+        this.surface.style.position = 'relative';
+        this.surface.style.width = `${this.mapWidth * this.tileSize}px`;
+        this.surface.style.height = `${this.mapHeight * this.tileSize}px`;
+        this.viewport.appendChild(this.surface);
+
+        this.viewport.addEventListener('scroll', () => this.scheduleLoad());
+        window.addEventListener('resize', () => this.scheduleLoad());
+        if (this.onTileClick) {
+            this.surface.style.cursor = 'pointer';
+            this.surface.addEventListener('click', (event) => this.handleClick(event));
+        }
+
+        this.load();
+    }
+
+    /**
+     * Visible tile rectangle, with one extra tile on each side.
+     */
+    visibleRect() {
+        const x = Math.max(Math.floor(this.viewport.scrollLeft / this.tileSize) - 1, 0);
+        const y = Math.max(Math.floor(this.viewport.scrollTop / this.tileSize) - 1, 0);
+        return {
+            x: x,
+            y: y,
+            width: Math.ceil(this.viewport.clientWidth / this.tileSize) + 2,
+            height: Math.ceil(this.viewport.clientHeight / this.tileSize) + 2,
+        };
+    }
+
+    scheduleLoad() {
+        clearTimeout(this.loadTimer);
+        this.loadTimer = setTimeout(() => this.load(), this.loadDelayMs);
+    }
+
+    /**
+     * Keys of the sectors overlapping a tile rectangle.
+     */
+    sectorKeys(rect) {
+        const keys = [];
+        const size = this.sectorSize;
+        const lastX = Math.min(rect.x + rect.width, this.mapWidth) - 1;
+        const lastY = Math.min(rect.y + rect.height, this.mapHeight) - 1;
+        for (let sy = Math.floor(rect.y / size); sy <= Math.floor(lastY / size); sy++) {
+            for (let sx = Math.floor(rect.x / size); sx <= Math.floor(lastX / size); sx++) {
+                keys.push(`${sx},${sy}`);
+            }
+        }
+        return keys;
+    }
+
+    async load() {
+        if (this.loading) {
+            this.scheduleLoad();
+            return;
+        }
+
+        const rect = this.visibleRect();
+        if (this.sectorSize && this.sectorKeys(rect).every(key => this.sectors.has(key))) {
+            return;
+        }
+
+        this.loading = true;
+        try {
+            const response = await fetch(`${this.sectorsUrl}?${new URLSearchParams(rect)}`, {
+                headers: {'X-Requested-With': 'XMLHttpRequest'}
+            });
+            const data = await response.json();
+            if (!data.success) {
+                this.onError(data.error);
+                return;
+            }
+
+            this.sectorSize = data.sector_size;
+            data.sectors.forEach(sector => this.addSector(sector));
+            this.evict(rect);
+        } catch (error) {
+            this.onError(error);
+        } finally {
+            this.loading = false;
+        }
+    }
+
+    addSector(sector) {
+        const key = `${sector.sector_x},${sector.sector_y}`;
+        if (this.sectors.has(key)) {
+            return;
+        }
+
+        const canvas = document.createElement('canvas');
+        canvas.width = sector.width * this.tileSize;
+        canvas.height = sector.height * this.tileSize;
+        canvas.style.position = 'absolute';
+        canvas.style.left = `${sector.x * this.tileSize}px`;
+        canvas.style.top = `${sector.y * this.tileSize}px`;
+        this.surface.appendChild(canvas);
+
+        const entry = {
+            sector: sector,
+            terrain: MapSectorViewer.decodeBytes(sector.terrain),
+            colors: MapSectorViewer.decodeUint16(sector.colors),
+            canvas: canvas,
+        };
+        this.sectors.set(key, entry);
+        this.drawSector(entry);
+    }
+
+    drawSector(entry) {
+        const ctx = entry.canvas.getContext('2d');
+        for (let y = 0; y < entry.sector.height; y++) {
+            for (let x = 0; x < entry.sector.width; x++) {
+                this.drawTile(ctx, entry, x, y);
+            }
+        }
+    }
+
+    drawTile(ctx, entry, x, y) {
+        const size = this.tileSize;
+        ctx.fillStyle = entry.sector.palette[entry.colors[y * entry.sector.width + x]];
+        ctx.fillRect(x * size, y * size, size, size);
+        ctx.strokeStyle = 'rgba(255, 255, 255, 0.1)';
+        ctx.strokeRect(x * size + 0.5, y * size + 0.5, size - 1, size - 1);
+    }
+
+    /**
+     * Update a tile locally (after it was saved or broadcast by another user).
+     */
+    setTile(x, y, color) {
+        if (!this.sectorSize) {
+            return;
+        }
+        const entry = this.sectors.get(`${Math.floor(x / this.sectorSize)},${Math.floor(y / this.sectorSize)}`);
+        if (!entry) {
+            return;
+        }
+
+        const localX = x - entry.sector.x;
+        const localY = y - entry.sector.y;
+        let index = entry.sector.palette.indexOf(color);
+        if (index === -1) {
+            index = entry.sector.palette.push(color) - 1;
+        }
+        entry.colors[localY * entry.sector.width + localX] = index;
+        this.drawTile(entry.canvas.getContext('2d'), entry, localX, localY);
+    }
+
+    handleClick(event) {
+        const bounds = this.surface.getBoundingClientRect();
+        const x = Math.floor((event.clientX - bounds.left) / this.tileSize);
+        const y = Math.floor((event.clientY - bounds.top) / this.tileSize);
+        if (x >= 0 && x < this.mapWidth && y >= 0 && y < this.mapHeight) {
+            this.onTileClick(x, y);
+        }
+    }
+
+    /**
+     * Drop the sectors furthest from the viewport once the cache is full.
+     */
+    evict(rect) {
+        if (this.sectors.size <= this.maxCachedSectors) {
+            return;
+        }
+
+        const centerX = (rect.x + rect.width / 2) / this.sectorSize;
+        const centerY = (rect.y + rect.height / 2) / this.sectorSize;
+        const byDistance = Array.from(this.sectors.entries()).sort((a, b) => {
+            const da = Math.hypot(a[1].sector.sector_x - centerX, a[1].sector.sector_y - centerY);
+            const db = Math.hypot(b[1].sector.sector_x - centerX, b[1].sector.sector_y - centerY);
+            return db - da;
+        });
+
+        byDistance.slice(0, this.sectors.size - this.maxCachedSectors).forEach(([key, entry]) => {
+            entry.canvas.remove();
+            this.sectors.delete(key);
+        });
+    }
+
+    static decodeBytes(encoded) {
+        const binary = atob(encoded);
+        const bytes = new Uint8Array(binary.length);
+        for (let i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return bytes;
+    }
+
+    static decodeUint16(encoded) {
+        const bytes = MapSectorViewer.decodeBytes(encoded);
+        const values = new Uint16Array(bytes.length / 2);
+        for (let i = 0; i < values.length; i++) {
+            values[i] = bytes[2 * i] | (bytes[2 * i + 1] << 8);
+        }
+        return values;
+    }
+}